@@ -1,9 +1,9 @@
 from django.contrib import admin
 from beneficio.models import (
     TipoCafe, Bodega, Lote, Procesado,
-    Reproceso, Mezcla, DetalleMezcla,
+    Reproceso, Mezcla, DetalleMezcla, CambioComponenteMezcla,
     Catacion, DefectoCatacion, Compra, Comprador,
-    MantenimientoPlanta, HistorialMantenimiento,
+    MantenimientoPlanta, HistorialMantenimiento, UsoPlanta,
     ReciboCafe, Trabajador, PlanillaSemanal, RegistroDiario
 )
 
@@ -50,6 +50,14 @@ class DetalleMezclaAdmin(admin.ModelAdmin):
     list_display = ['mezcla', 'lote', 'peso_kg', 'porcentaje']
     list_filter = ['mezcla']
 
+@admin.register(CambioComponenteMezcla)
+class CambioComponenteMezclaAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'mezcla', 'lote_codigo', 'accion', 'peso_anterior_kg', 'peso_nuevo_kg', 'usuario']
+    list_filter = ['accion', 'fecha']
+    search_fields = ['lote_codigo']
+    date_hierarchy = 'fecha'
+    readonly_fields = ['mezcla', 'lote', 'lote_codigo', 'accion', 'peso_anterior_kg', 'peso_nuevo_kg', 'usuario', 'fecha']
+
 @admin.register(Catacion)
 class CatacionAdmin(admin.ModelAdmin):
     list_display = ['codigo_muestra', 'fecha_catacion', 'tipo_muestra', 'puntaje_total', 'clasificacion', 'catador']
@@ -78,6 +86,12 @@ class CompraAdmin(admin.ModelAdmin):
     date_hierarchy = 'fecha_compra'
     readonly_fields = ['monto_total']
 
+    def delete_queryset(self, request, queryset):
+        # El borrado masivo no pasa por Compra.delete: recalcular los compradores afectados
+        compradores_ids = list(queryset.values_list('comprador_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        Comprador.recalcular_totales(Comprador.objects.filter(pk__in=compradores_ids))
+
 @admin.register(MantenimientoPlanta)
 class MantenimientoPlantaAdmin(admin.ModelAdmin):
     list_display = ['horas_acumuladas', 'limite_horas', 'porcentaje_uso', 'estado', 'horas_restantes']
@@ -89,6 +103,13 @@ class HistorialMantenimientoAdmin(admin.ModelAdmin):
     list_filter = ['tipo_mantenimiento', 'fecha_mantenimiento']
     date_hierarchy = 'fecha_mantenimiento'
 
+@admin.register(UsoPlanta)
+class UsoPlantaAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'tipo_proceso', 'horas', 'procesado', 'reproceso', 'mezcla']
+    list_filter = ['tipo_proceso', 'fecha']
+    date_hierarchy = 'fecha'
+    readonly_fields = ['control_mantenimiento', 'tipo_proceso', 'procesado', 'reproceso', 'mezcla', 'horas', 'fecha']
+
 @admin.register(ReciboCafe)
 class ReciboCafeAdmin(admin.ModelAdmin):
     list_display = ['numero_recibo', 'lote', 'fecha_recibo', 'peso', 'unidad', 'proveedor', 'monto_total']
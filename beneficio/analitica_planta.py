@@ -0,0 +1,295 @@
+"""
+Analítica de operación de planta.
+
+La duración de cada Procesado, Reproceso y Mezcla se calcula en SQL a partir de
+hora_inicio/hora_final. El comando generar_resumen_planta la agrupa cada noche en
+ResumenOperacionPlanta (kg/h por operador y tipo de café) y ResumenTurnoPlanta
+(utilización y tiempos muertos por turno), que es lo que leen las vistas.
+"""
+from collections import defaultdict
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    F, Q, Sum, Count, Case, When, Value, CharField, DateTimeField, DurationField, ExpressionWrapper, FloatField,
+)
+from django.db.models.functions import ExtractHour, ExtractMinute, ExtractSecond, TruncDate, TruncMonth, TruncTime
+from django.db.models.lookups import LessThan
+
+from .models import Procesado, Reproceso, Mezcla, ResumenOperacionPlanta, ResumenTurnoPlanta
+
+SEGUNDOS_DIA = 24 * 3600
+HORAS_TURNO = 12
+# Días que el día de turno puede quedar antes de la fecha de registro (ver dia_turno_expr)
+DIAS_RETROCESO_TURNO = 2
+
+# Turno diurno de 06:00 a 18:00; el resto es nocturno
+INICIO_DIURNO = time(6, 0)
+FIN_DIURNO = time(18, 0)
+INICIO_TURNO_SEGUNDOS = {
+    'diurno': 6 * 3600,
+    'nocturno': 18 * 3600,
+}
+
+FUENTES = [
+    {
+        'tipo_proceso': 'procesado',
+        'modelo': Procesado,
+        'operador': 'operador',
+        'tipo_cafe': 'lote__tipo_cafe',
+        'kg_entrada': 'peso_inicial_en_kg',
+        'kg_salida': 'peso_final_en_kg',
+    },
+    {
+        'tipo_proceso': 'reproceso',
+        'modelo': Reproceso,
+        'operador': 'operador',
+        'tipo_cafe': 'procesado__lote__tipo_cafe',
+        'kg_entrada': 'peso_inicial_kg',
+        'kg_salida': 'peso_final_kg',
+    },
+    {
+        'tipo_proceso': 'mezcla',
+        'modelo': Mezcla,
+        'operador': 'responsable',
+        'tipo_cafe': None,
+        'kg_entrada': 'peso_total_kg',
+        'kg_salida': 'peso_total_kg',
+    },
+]
+
+AGRUPACIONES = {
+    'operador': 'operador__username',
+    'tipo_cafe': 'tipo_cafe',
+    'tipo_proceso': 'tipo_proceso',
+}
+
+
+# ==========================================
+# EXPRESIONES SQL
+# ==========================================
+
+def segundos_del_dia(campo):
+    """Segundos transcurridos desde medianoche para un TimeField"""
+    return ExtractHour(campo) * 3600 + ExtractMinute(campo) * 60 + ExtractSecond(campo)
+
+
+def duracion_segundos(inicio='hora_inicio', final='hora_final'):
+    """Duración en segundos; si hora_final < hora_inicio el proceso cruzó la medianoche"""
+    diferencia = segundos_del_dia(final) - segundos_del_dia(inicio)
+    return Case(
+        When(LessThan(F(final), F(inicio)), then=diferencia + SEGUNDOS_DIA),
+        default=diferencia,
+        output_field=FloatField(),
+    )
+
+
+def turno_expr(inicio='hora_inicio'):
+    """Turno en el que arrancó el proceso"""
+    return Case(
+        When(Q(**{f'{inicio}__gte': INICIO_DIURNO, f'{inicio}__lt': FIN_DIURNO}), then=Value('diurno')),
+        default=Value('nocturno'),
+        output_field=CharField(),
+    )
+
+
+def dia_turno_expr(fecha='fecha', inicio='hora_inicio'):
+    """
+    Día en que empezó el turno del proceso. fecha es cuándo se registró, después
+    de arrancar: si su hora es anterior a hora_inicio, el proceso arrancó el día
+    previo. Un proceso que arrancó de madrugada pertenece al turno nocturno que
+    empezó la tarde anterior.
+    """
+    registrado_antes = Q(LessThan(TruncTime(fecha), F(inicio)))
+    madrugada = Q(**{f'{inicio}__lt': INICIO_DIURNO})
+    retroceso = Case(
+        When(registrado_antes & madrugada, then=Value(timedelta(days=2))),
+        When(registrado_antes | madrugada, then=Value(timedelta(days=1))),
+        default=Value(timedelta(0)),
+        output_field=DurationField(),
+    )
+    return TruncDate(ExpressionWrapper(F(fecha) - retroceso, output_field=DateTimeField()))
+
+
+def procesos_con_duracion(fuente):
+    """Queryset de la fuente con día de turno, turno y duración anotados (solo procesos con horario)"""
+    return fuente['modelo'].objects.filter(
+        hora_inicio__isnull=False,
+        hora_final__isnull=False,
+    ).annotate(
+        dia=dia_turno_expr(),
+        turno=turno_expr(),
+        duracion_seg=duracion_segundos(),
+    )
+
+
+# ==========================================
+# GENERACIÓN DE RESÚMENES
+# ==========================================
+
+def _a_decimal(valor):
+    return Decimal(str(round(float(valor or 0), 2)))
+
+
+def _segundos(hora):
+    return hora.hour * 3600 + hora.minute * 60 + hora.second
+
+
+def _resumir_intervalos(intervalos):
+    """Une los intervalos (en segundos desde el inicio del turno) y mide las pausas entre ellos"""
+    limite = HORAS_TURNO * 3600
+    operacion = 0
+    brechas = []
+    fin_actual = None
+    for inicio, fin in sorted(intervalos):
+        fin = min(fin, limite)
+        if fin_actual is None:
+            operacion += fin - inicio
+            fin_actual = fin
+        elif inicio > fin_actual:
+            brechas.append(inicio - fin_actual)
+            operacion += fin - inicio
+            fin_actual = fin
+        elif fin > fin_actual:
+            operacion += fin - fin_actual
+            fin_actual = fin
+    return operacion, brechas
+
+
+@transaction.atomic
+def generar_resumen(desde, hasta):
+    """
+    Recalcula los resúmenes de planta para el rango de fechas [desde, hasta].
+
+    Los totales por operador/tipo de café salen de un GROUP BY por fuente; la
+    utilización por turno necesita los intervalos de cada día para descontar
+    solapes, así que se arma en memoria solo para el rango pedido.
+    """
+    ResumenOperacionPlanta.objects.filter(fecha__range=(desde, hasta)).delete()
+    ResumenTurnoPlanta.objects.filter(fecha__range=(desde, hasta)).delete()
+
+    filas = []
+    intervalos = defaultdict(list)
+    kg_por_turno = defaultdict(Decimal)
+
+    for fuente in FUENTES:
+        procesos = procesos_con_duracion(fuente).filter(dia__range=(desde, hasta))
+        tipo_cafe = F(fuente['tipo_cafe']) if fuente['tipo_cafe'] else Value('Mezcla', output_field=CharField())
+
+        grupos = procesos.values(
+            'dia', 'turno', usuario=F(fuente['operador']), cafe=tipo_cafe,
+        ).annotate(
+            numero=Count('id'),
+            segundos=Sum('duracion_seg'),
+            kg_entrada=Sum(fuente['kg_entrada']),
+            kg_salida=Sum(fuente['kg_salida']),
+        ).order_by()
+
+        for grupo in grupos:
+            filas.append(ResumenOperacionPlanta(
+                fecha=grupo['dia'],
+                turno=grupo['turno'],
+                tipo_proceso=fuente['tipo_proceso'],
+                operador_id=grupo['usuario'],
+                tipo_cafe=grupo['cafe'] or '',
+                numero_procesos=grupo['numero'],
+                horas_operacion=_a_decimal((grupo['segundos'] or 0) / 3600),
+                kg_procesados=_a_decimal(grupo['kg_entrada']),
+                kg_obtenidos=_a_decimal(grupo['kg_salida']),
+            ))
+
+        for dia, turno, hora_inicio, segundos, kg in procesos.values_list(
+            'dia', 'turno', 'hora_inicio', 'duracion_seg', fuente['kg_entrada'],
+        ).order_by():
+            inicio = (_segundos(hora_inicio) - INICIO_TURNO_SEGUNDOS[turno]) % SEGUNDOS_DIA
+            intervalos[(dia, turno)].append((inicio, inicio + int(segundos or 0)))
+            kg_por_turno[(dia, turno)] += kg or 0
+
+    turnos = []
+    for (dia, turno), lista in intervalos.items():
+        operacion, brechas = _resumir_intervalos(lista)
+        turnos.append(ResumenTurnoPlanta(
+            fecha=dia,
+            turno=turno,
+            horas_disponibles=HORAS_TURNO,
+            horas_operacion=_a_decimal(operacion / 3600),
+            horas_inactivas=_a_decimal(HORAS_TURNO - operacion / 3600),
+            numero_brechas=len(brechas),
+            mayor_brecha_horas=_a_decimal(max(brechas, default=0) / 3600),
+            kg_procesados=_a_decimal(kg_por_turno[(dia, turno)]),
+        ))
+
+    ResumenOperacionPlanta.objects.bulk_create(filas)
+    ResumenTurnoPlanta.objects.bulk_create(turnos)
+    return len(filas), len(turnos)
+
+
+# ==========================================
+# CONSULTAS SOBRE LOS RESÚMENES
+# ==========================================
+
+def utilizacion_por_turno(desde, hasta):
+    """Serie diaria con la utilización (%) de cada turno; los días sin operación quedan en 0"""
+    serie = defaultdict(lambda: {'diurno': 0, 'nocturno': 0, 'horas_inactivas': 0, 'mayor_brecha': 0})
+    for resumen in ResumenTurnoPlanta.objects.filter(fecha__range=(desde, hasta)):
+        dia = serie[resumen.fecha]
+        dia[resumen.turno] = round(resumen.utilizacion, 1)
+        dia['horas_inactivas'] += float(resumen.horas_inactivas)
+        dia['mayor_brecha'] = max(dia['mayor_brecha'], float(resumen.mayor_brecha_horas))
+    return serie
+
+
+def rendimiento_mensual(desde, hasta, agrupar_por=None):
+    """
+    kg procesados por hora de operación, por mes.
+    agrupar_por: None, 'operador', 'tipo_cafe' o 'tipo_proceso'.
+    """
+    campos = ['mes']
+    if agrupar_por:
+        campos.append(AGRUPACIONES[agrupar_por])
+
+    filas = ResumenOperacionPlanta.objects.filter(
+        fecha__range=(desde, hasta)
+    ).annotate(
+        mes=TruncMonth('fecha')
+    ).values(*campos).annotate(
+        procesos=Sum('numero_procesos'),
+        horas=Sum('horas_operacion'),
+        kg=Sum('kg_procesados'),
+        kg_salida=Sum('kg_obtenidos'),
+    ).order_by(*campos)
+
+    resultado = []
+    for fila in filas:
+        horas = float(fila['horas'] or 0)
+        fila['kg_por_hora'] = round(float(fila['kg'] or 0) / horas, 2) if horas > 0 else 0
+        if agrupar_por:
+            fila['grupo'] = fila.pop(AGRUPACIONES[agrupar_por]) or 'Sin asignar'
+        resultado.append(fila)
+    return resultado
+
+
+def ranking(desde, hasta, agrupar_por):
+    """Totales del periodo por operador/tipo de café ordenados por kg/h"""
+    campo = AGRUPACIONES[agrupar_por]
+    filas = ResumenOperacionPlanta.objects.filter(
+        fecha__range=(desde, hasta)
+    ).values(campo).annotate(
+        procesos=Sum('numero_procesos'),
+        horas=Sum('horas_operacion'),
+        kg=Sum('kg_procesados'),
+    ).order_by()
+
+    resultado = []
+    for fila in filas:
+        horas = float(fila['horas'] or 0)
+        resultado.append({
+            'grupo': fila[campo] or 'Sin asignar',
+            'procesos': fila['procesos'],
+            'horas': horas,
+            'kg': float(fila['kg'] or 0),
+            'kg_por_hora': round(float(fila['kg'] or 0) / horas, 2) if horas > 0 else 0,
+        })
+    resultado.sort(key=lambda fila: fila['kg_por_hora'], reverse=True)
+    return resultado
@@ -0,0 +1,206 @@
+"""
+Ficha de calidad por proveedor.
+
+ResumenProveedor junta en una fila por proveedor lo que antes había que
+recorrer a mano: peso entregado y precio por quintal de sus lotes, recibos,
+rendimiento de sus trillas (Procesado) y puntajes de catación (de sus lotes y
+de las trillas de sus lotes). El proveedor se identifica por UPPER(proveedor),
+calculado siempre en SQL para que "Finca A" y "FINCA A" caigan en la misma fila
+con la misma regla que el índice de Lote.
+
+Al confirmar un cambio se recalculan solo los proveedores afectados (registro
+en recalculos.py al final de este módulo); el comando
+generar_resumen_proveedores reconstruye la tabla completa.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Sum
+from django.db.models.functions import Coalesce, Upper
+
+from .models import Catacion, Lote, Procesado, ReciboCafe, ResumenProveedor
+from .recalculos import al_confirmar, cambio, observar, valores
+
+# Campos por los que se puede ordenar la ficha (todos con índice)
+ORDENES = {
+    'proveedor': 'Proveedor',
+    'kg_entregados': 'Kg entregados',
+    'precio_promedio_quintal': 'Precio por quintal',
+    'rendimiento': 'Rendimiento',
+    'puntaje_promedio': 'Puntaje promedio',
+    'ultima_entrega': 'Última entrega',
+}
+ORDEN_POR_DEFECTO = '-kg_entregados'
+
+# Dónde está el proveedor en cada modelo que alimenta la ficha
+CAMPOS_PROVEEDOR = {
+    Lote: ('proveedor',),
+    ReciboCafe: ('proveedor', 'lote__proveedor'),
+    Procesado: ('lote__proveedor',),
+    Catacion: ('lote__proveedor', 'procesado__lote__proveedor'),
+}
+
+
+def _decimal(valor, decimales=2):
+    if valor is None:
+        return None
+    return Decimal(str(round(float(valor), decimales)))
+
+
+def claves_de(modelo, pk):
+    """Claves de proveedor (tal como las calcula la base de datos) ligadas a un registro guardado"""
+    campos = CAMPOS_PROVEEDOR[modelo]
+    fila = modelo.objects.filter(pk=pk).values_list(
+        *[Upper(campo) for campo in campos]
+    ).first()
+    return {clave for clave in (fila or ()) if clave}
+
+
+def _agrupado(queryset, expresion_clave, claves, **agregados):
+    """{clave: agregados} de un queryset agrupado por la clave de proveedor"""
+    queryset = queryset.annotate(clave=expresion_clave)
+    if claves is not None:
+        queryset = queryset.filter(clave__in=claves)
+    return {
+        fila['clave']: fila
+        for fila in queryset.exclude(clave__isnull=True).values('clave').annotate(**agregados).order_by()
+    }
+
+
+# ==========================================
+# GENERACIÓN DEL RESUMEN
+# ==========================================
+
+@transaction.atomic
+def actualizar_proveedores(claves=None):
+    """
+    Recalcula la ficha de los proveedores indicados (None = todos): cuatro
+    consultas agrupadas (lotes, recibos, trillas, cataciones) y un bulk_create.
+    """
+    if claves is not None:
+        claves = {clave for clave in claves if clave}
+        if not claves:
+            return 0
+
+    lotes = _agrupado(
+        Lote.objects.all(), Upper('proveedor'), claves,
+        nombre=Max('proveedor'),
+        numero_lotes=Count('id'),
+        kg=Sum('peso_kg'),
+        valor=Sum(F('peso_kg') * F('precio_quintal')),
+        primera=Min('fecha_ingreso'),
+        ultima=Max('fecha_ingreso'),
+    )
+    recibos = _agrupado(
+        ReciboCafe.objects.all(), Upper('proveedor'), claves,
+        nombre=Max('proveedor'),
+        numero=Count('id'),
+        kg=Sum('peso_kg'),
+        monto=Sum('monto_total'),
+    )
+    trillas = _agrupado(
+        Procesado.objects.all(), Upper('lote__proveedor'), claves,
+        numero=Count('id'),
+        kg_entrada=Sum('peso_inicial_en_kg'),
+        kg_salida=Sum('peso_final_en_kg'),
+    )
+    cataciones = _agrupado(
+        Catacion.objects.filter(puntaje_total__gt=0),
+        Coalesce(Upper('lote__proveedor'), Upper('procesado__lote__proveedor')), claves,
+        numero=Count('id'),
+        promedio=Avg('puntaje_total'),
+        maximo=Max('puntaje_total'),
+    )
+
+    if claves is None:
+        ResumenProveedor.objects.all().delete()
+    else:
+        ResumenProveedor.objects.filter(clave__in=claves).delete()
+
+    filas = []
+    for clave in set(lotes) | set(recibos):
+        lote = lotes.get(clave, {})
+        recibo = recibos.get(clave, {})
+        trilla = trillas.get(clave, {})
+        catacion = cataciones.get(clave, {})
+
+        kg_lotes = lote.get('kg') or 0
+        kg_trillados = trilla.get('kg_entrada') or 0
+        filas.append(ResumenProveedor(
+            clave=clave,
+            proveedor=lote.get('nombre') or recibo.get('nombre') or clave,
+            numero_lotes=lote.get('numero_lotes', 0),
+            kg_entregados=_decimal(kg_lotes),
+            precio_promedio_quintal=_decimal(lote['valor'] / kg_lotes) if kg_lotes else None,
+            primera_entrega=lote.get('primera'),
+            ultima_entrega=lote.get('ultima'),
+            numero_recibos=recibo.get('numero', 0),
+            kg_recibos=_decimal(recibo.get('kg') or 0),
+            monto_recibos=_decimal(recibo.get('monto') or 0),
+            numero_trillas=trilla.get('numero', 0),
+            kg_trillados=_decimal(kg_trillados),
+            kg_oro=_decimal(trilla.get('kg_salida') or 0),
+            rendimiento=_decimal(trilla['kg_salida'] * 100 / kg_trillados) if kg_trillados else None,
+            numero_cataciones=catacion.get('numero', 0),
+            puntaje_promedio=_decimal(catacion.get('promedio')),
+            puntaje_maximo=catacion.get('maximo'),
+        ))
+    ResumenProveedor.objects.bulk_create(filas)
+    return len(filas)
+
+
+# ==========================================
+# RECÁLCULO AL GUARDAR
+# ==========================================
+
+def _tareas(*campos, claves=('clave_proveedor',)):
+    """Proveedores (antes y después) de un registro que cambió alguno de los campos"""
+    def tareas(pk, antes, despues):
+        if cambio(antes, despues, *campos):
+            return {('proveedores', clave) for clave in valores(antes, despues, *claves)}
+        return set()
+    return tareas
+
+
+def _ejecutar(pendientes):
+    actualizar_proveedores(pendientes['proveedores'])
+
+
+observar(
+    Lote, _tareas('proveedor', 'peso_kg', 'precio_quintal', 'fecha_ingreso'),
+    ('proveedor', 'peso_kg', 'precio_quintal', 'fecha_ingreso'), {'clave_proveedor': Upper('proveedor')},
+)
+observar(
+    ReciboCafe,
+    _tareas('lote_id', 'peso_kg', 'monto_total', 'proveedor', claves=('clave_proveedor', 'clave_proveedor_lote')),
+    ('lote_id', 'peso_kg', 'monto_total', 'proveedor'),
+    {'clave_proveedor': Upper('proveedor'), 'clave_proveedor_lote': Upper('lote__proveedor')},
+)
+observar(
+    Procesado, _tareas('lote_id', 'recibo_id', 'peso_inicial_en_kg', 'peso_final_en_kg'),
+    ('lote_id', 'recibo_id', 'peso_inicial_en_kg', 'peso_final_en_kg'), {'clave_proveedor': Upper('lote__proveedor')},
+)
+observar(
+    Catacion, _tareas('lote_id', 'procesado_id', 'puntaje_total', claves=('clave_lote', 'clave_procesado')),
+    ('lote_id', 'procesado_id', 'puntaje_total'),
+    {'clave_lote': Upper('lote__proveedor'), 'clave_procesado': Upper('procesado__lote__proveedor')},
+)
+al_confirmar(30, _ejecutar)
+
+
+# ==========================================
+# CONSULTA
+# ==========================================
+
+def ficha_proveedores(orden=ORDEN_POR_DEFECTO, texto=''):
+    """Ficha ordenada por cualquiera de ORDENES ('-campo' = descendente); una sola consulta"""
+    campo = orden.lstrip('-')
+    if campo not in ORDENES:
+        orden, campo = ORDEN_POR_DEFECTO, ORDEN_POR_DEFECTO.lstrip('-')
+
+    fichas = ResumenProveedor.objects.all()
+    if texto:
+        fichas = fichas.filter(clave__istartswith=texto.strip())
+    if orden.startswith('-'):
+        return fichas.order_by(F(campo).desc(nulls_last=True), 'clave')
+    return fichas.order_by(F(campo).asc(nulls_last=True), 'clave')
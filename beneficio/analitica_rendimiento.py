@@ -0,0 +1,284 @@
+"""
+Rendimiento de trilla (oro obtenido / pergamino procesado) y mermas.
+
+El rendimiento y la merma de cada Procesado se calculan en SQL sobre los pesos
+normalizados a kg. ResumenRendimientoMensual guarda por mes, proveedor, tipo de
+café y operador las sumas de kg y de cada merma (catadura, rechazo electrónica,
+bajo zaranda, barridos). Los percentiles no se pueden sumar entre meses ni
+grupos, así que no se guardan: se calculan al consultar con los rendimientos de
+las trillas del periodo (una columna ordenada en SQL). Al guardar una trilla o
+su lote se recalculan al confirmar solo los grupos que cambiaron (registrados
+en recalculos.py al final de este módulo); el comando
+generar_resumen_rendimiento reconstruye todo el historial.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DateField, F, FloatField, Q, Sum, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Lote, Procesado, ResumenRendimientoMensual
+from .recalculos import al_confirmar, cambio, observar
+
+MERMAS = ['catadura', 'rechazo_electronica', 'bajo_zaranda', 'barridos']
+PERCENTILES = (10, 50, 90)
+PERCENTIL_ATIPICO = 10  # trillas por debajo del percentil 10 de su tipo de café
+
+AGRUPACIONES = {
+    'proveedor': 'proveedor',
+    'tipo_cafe': 'tipo_cafe',
+    'operador': 'operador__username',
+    'mes': 'mes',
+}
+
+
+# ==========================================
+# EXPRESIONES SQL
+# ==========================================
+
+def expresion_rendimiento():
+    """Rendimiento (%) de una trilla: kg finales sobre kg iniciales"""
+    return Case(
+        When(peso_inicial_en_kg__gt=0, then=F('peso_final_en_kg') * 100.0 / F('peso_inicial_en_kg')),
+        default=None,
+        output_field=FloatField(),
+    )
+
+
+def expresion_merma():
+    """Suma de las mermas registradas en la trilla (kg)"""
+    total = F(MERMAS[0])
+    for merma in MERMAS[1:]:
+        total = total + F(merma)
+    return total
+
+
+def trillas_con_rendimiento():
+    """Procesados con mes, proveedor, tipo de café, rendimiento y merma anotados"""
+    return Procesado.objects.annotate(
+        mes=TruncMonth('fecha', output_field=DateField()),
+        proveedor=F('lote__proveedor'),
+        tipo=F('lote__tipo_cafe'),
+        rendimiento_pct=expresion_rendimiento(),
+        merma_kg=expresion_merma(),
+    )
+
+
+def mes_de(fecha):
+    """Primer día del mes (hora local) de una fecha o datetime"""
+    if hasattr(fecha, 'hour') and timezone.is_aware(fecha):
+        fecha = timezone.localtime(fecha)
+    return date(fecha.year, fecha.month, 1)
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) con interpolación lineal de una lista ya ordenada"""
+    if not valores:
+        return None
+    posicion = (len(valores) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicion - inferior)
+
+
+def _a_decimal(valor):
+    return Decimal(str(round(float(valor or 0), 2)))
+
+
+# ==========================================
+# GENERACIÓN DEL RESUMEN
+# ==========================================
+
+def _filas_resumen(trillas):
+    """Filas de ResumenRendimientoMensual (sin guardar) de un queryset de trillas_con_rendimiento()"""
+    grupos = trillas.values('mes', 'proveedor', 'tipo', 'operador_id').annotate(
+        numero=Count('id'),
+        kg_entrada=Sum('peso_inicial_en_kg'),
+        kg_salida=Sum('peso_final_en_kg'),
+        **{merma: Sum(merma) for merma in MERMAS},
+    ).order_by()
+    return [
+        ResumenRendimientoMensual(
+            mes=grupo['mes'],
+            proveedor=grupo['proveedor'] or '',
+            tipo_cafe=grupo['tipo'] or '',
+            operador_id=grupo['operador_id'],
+            numero_trillas=grupo['numero'],
+            kg_entrada=_a_decimal(grupo['kg_entrada']),
+            kg_salida=_a_decimal(grupo['kg_salida']),
+            **{merma: _a_decimal(grupo[merma]) for merma in MERMAS},
+        )
+        for grupo in grupos
+    ]
+
+
+@transaction.atomic
+def actualizar_meses(meses):
+    """
+    Recalcula el resumen de los meses indicados (fechas del día 1) con un
+    GROUP BY por mes, proveedor, tipo de café y operador.
+    """
+    meses = {mes_de(mes) for mes in meses if mes}
+    if not meses:
+        return 0
+    ResumenRendimientoMensual.objects.filter(mes__in=meses).delete()
+    filas = _filas_resumen(trillas_con_rendimiento().filter(mes__in=meses))
+    ResumenRendimientoMensual.objects.bulk_create(filas)
+    return len(filas)
+
+
+@transaction.atomic
+def actualizar_grupos(grupos):
+    """
+    Recalcula solo las filas de los grupos indicados: tuplas (mes, proveedor,
+    tipo de café, operador_id), las que toca una trilla al guardarse o borrarse.
+    """
+    grupos = {(mes_de(mes), proveedor, tipo, operador_id) for mes, proveedor, tipo, operador_id in grupos if mes}
+    if not grupos:
+        return 0
+    en_resumen, en_trillas = Q(pk__in=[]), Q(pk__in=[])
+    for mes, proveedor, tipo, operador_id in grupos:
+        en_resumen |= Q(mes=mes, proveedor=proveedor, tipo_cafe=tipo, operador_id=operador_id)
+        en_trillas |= Q(mes=mes, proveedor=proveedor, tipo=tipo, operador_id=operador_id)
+    ResumenRendimientoMensual.objects.filter(en_resumen).delete()
+    filas = _filas_resumen(trillas_con_rendimiento().filter(en_trillas))
+    ResumenRendimientoMensual.objects.bulk_create(filas)
+    return len(filas)
+
+
+def regenerar_resumen(desde=None, hasta=None):
+    """Reconstruye el resumen de todos los meses con trillas (o los del rango)"""
+    meses = trillas_con_rendimiento()
+    if desde:
+        meses = meses.filter(mes__gte=mes_de(desde))
+    if hasta:
+        meses = meses.filter(mes__lte=mes_de(hasta))
+    meses = set(meses.values_list('mes', flat=True).distinct().order_by())
+
+    if desde is None and hasta is None:
+        # Sin rango también se borran los meses que ya no tienen trillas
+        ResumenRendimientoMensual.objects.exclude(mes__in=meses).delete()
+    return actualizar_meses(meses)
+
+
+# ==========================================
+# RECÁLCULO AL GUARDAR
+# ==========================================
+
+def _tareas_lote(pk, antes, despues):
+    """Proveedor y tipo de café de las trillas salen del lote (al borrarlo, las trillas se borran en cascada)"""
+    tareas = set()
+    if antes and despues and cambio(antes, despues, 'proveedor', 'tipo_cafe'):
+        for mes, operador_id in trillas_con_rendimiento().filter(lote_id=pk).values_list(
+            'mes', 'operador_id',
+        ).distinct().order_by():
+            tareas |= {
+                ('rendimiento', (mes, estado_lote['proveedor'], estado_lote['tipo_cafe'], operador_id))
+                for estado_lote in (antes, despues)
+            }
+    return tareas
+
+
+def _tareas_procesado(pk, antes, despues):
+    if cambio(antes, despues, 'mes', 'lote_id', 'operador_id', 'peso_inicial_en_kg', 'peso_final_en_kg', *MERMAS):
+        return {
+            ('rendimiento', (trilla['mes'], trilla['lote__proveedor'], trilla['lote__tipo_cafe'], trilla['operador_id']))
+            for trilla in (antes, despues) if trilla
+        }
+    return set()
+
+
+def _ejecutar(pendientes):
+    actualizar_grupos(pendientes['rendimiento'])
+
+
+observar(Lote, _tareas_lote, ('proveedor', 'tipo_cafe'))
+observar(Procesado, _tareas_procesado, (
+    'lote_id', 'operador_id', 'peso_inicial_en_kg', 'peso_final_en_kg', *MERMAS, 'lote__proveedor', 'lote__tipo_cafe',
+), {'mes': TruncMonth('fecha', output_field=DateField())})
+al_confirmar(20, _ejecutar)
+
+
+# ==========================================
+# CONSULTAS SOBRE EL RESUMEN
+# ==========================================
+
+def _porcentaje(parte, total):
+    return round(float(parte or 0) / float(total) * 100, 2) if total else None
+
+
+def rendimiento_por(agrupar_por, desde, hasta):
+    """
+    Rendimiento y mermas del periodo por proveedor, tipo de café, operador o mes,
+    ordenado de mayor a menor rendimiento. Sumas y mermas salen del resumen;
+    los percentiles se calculan en vivo con el rendimiento de cada trilla del
+    periodo (una consulta de una columna, ya ordenada en SQL).
+    """
+    campo = AGRUPACIONES[agrupar_por]
+    filas = ResumenRendimientoMensual.objects.filter(
+        mes__range=(mes_de(desde), mes_de(hasta)),
+    ).values(campo).annotate(
+        trillas=Sum('numero_trillas'),
+        kg_entrada_total=Sum('kg_entrada'),
+        kg_salida_total=Sum('kg_salida'),
+        **{f'{merma}_total': Sum(merma) for merma in MERMAS},
+    ).order_by()
+
+    campo_trilla = {'proveedor': 'proveedor', 'tipo_cafe': 'tipo', 'operador': 'operador__username', 'mes': 'mes'}[agrupar_por]
+    rendimientos = defaultdict(list)
+    for grupo, rendimiento in trillas_con_rendimiento().filter(
+        mes__range=(mes_de(desde), mes_de(hasta)), rendimiento_pct__isnull=False,
+    ).values_list(campo_trilla, 'rendimiento_pct').order_by('rendimiento_pct'):
+        rendimientos[grupo].append(rendimiento)
+
+    resultado = []
+    for fila in filas:
+        kg_entrada = fila['kg_entrada_total']
+        merma = sum((fila[f'{nombre}_total'] or 0) for nombre in MERMAS)
+        valores = rendimientos[fila[campo]]
+        resultado.append({
+            'grupo': fila[campo] or 'Sin asignar',
+            'trillas': fila['trillas'],
+            'kg_entrada': float(kg_entrada or 0),
+            'kg_salida': float(fila['kg_salida_total'] or 0),
+            'rendimiento': _porcentaje(fila['kg_salida_total'], kg_entrada),
+            'merma_kg': float(merma),
+            'merma_pct': _porcentaje(merma, kg_entrada),
+            'mermas_pct': {nombre: _porcentaje(fila[f'{nombre}_total'], kg_entrada) for nombre in MERMAS},
+            **{f'p{p}': round(percentil(valores, p), 2) if valores else None for p in PERCENTILES},
+        })
+    resultado.sort(key=lambda fila: (fila['rendimiento'] is None, -(fila['rendimiento'] or 0)))
+    return resultado
+
+
+def trillas_atipicas(desde, hasta, limite=50):
+    """
+    Trillas del periodo cuyo rendimiento queda por debajo del percentil 10 de su
+    tipo de café en el mismo periodo, de la peor a la mejor.
+    """
+    trillas = list(trillas_con_rendimiento().filter(
+        mes__range=(mes_de(desde), mes_de(hasta)), rendimiento_pct__isnull=False,
+    ).values(
+        'id', 'numero_trilla', 'fecha', 'tipo', 'proveedor', 'operador__username',
+        'peso_inicial_en_kg', 'rendimiento_pct', 'merma_kg',
+    ).order_by('rendimiento_pct'))
+
+    por_tipo = defaultdict(list)
+    for trilla in trillas:
+        por_tipo[trilla['tipo']].append(trilla['rendimiento_pct'])
+    umbrales = {tipo: percentil(valores, PERCENTIL_ATIPICO) for tipo, valores in por_tipo.items()}
+
+    atipicas = []
+    for trilla in trillas:
+        umbral = umbrales[trilla['tipo']]
+        if len(por_tipo[trilla['tipo']]) > 1 and trilla['rendimiento_pct'] < umbral:
+            atipicas.append({
+                **trilla,
+                'rendimiento_pct': round(trilla['rendimiento_pct'], 2),
+                'umbral_tipo': round(umbral, 2),
+                'merma_pct': _porcentaje(trilla['merma_kg'], trilla['peso_inicial_en_kg']),
+            })
+    return atipicas[:limite]
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BeneficioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'beneficio'
+
+    def ready(self):
+        # Cada módulo registra sus recálculos derivados (y sus señales) en recalculos.py al importarse
+        from . import analitica_proveedores, analitica_rendimiento, costos, diario_inventario, ubicaciones
@@ -0,0 +1,210 @@
+"""
+Búsqueda de productos para los selectores (autocompletado).
+
+Los formularios ya no embeben tablas completas de lotes, procesados y
+reprocesos: piden aquí los primeros N que coinciden con lo escrito. Los códigos
+(L-0001, T-0001) se generan en mayúsculas y se buscan por prefijo exacto, que
+usa su índice; tipo de café y proveedor se comparan por prefijo sin distinguir
+mayúsculas sobre índices UPPER() con text_pattern_ops (ver Meta de Lote).
+
+resolver_codigo() lleva un código completo (L-0042, T-0107, REC-00031,
+VEN-00012, EXP-00003, PAR-0026A-004, CAT-P-0099) a su registro: el prefijo
+decide la tabla y se hace una sola consulta de igualdad sobre su campo indexado.
+"""
+import re
+
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .inventario import disponible_lote, disponible_procesado
+from .models import (
+    Catacion, Exportacion, Lote, Partida, Procesado, ReciboCafe, Reproceso, SubPartida, Venta,
+)
+from .unidades import expresion_kg
+
+TIPOS_PRODUCTO = ('lote', 'procesado', 'reproceso')
+LIMITE_POR_DEFECTO = 15
+LIMITE_MAXIMO = 50
+
+
+def _relevancia(prefijo_codigo, texto):
+    """0 = código exacto, 1 = código empieza por el texto, 2 = coincide otro campo"""
+    codigo = texto.upper()
+    return Case(
+        When(**{prefijo_codigo: codigo}, then=Value(0)),
+        When(**{f'{prefijo_codigo}__startswith': codigo}, then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    )
+
+
+def _filtro_lote(texto, prefijo=''):
+    """Coincidencia por código, tipo de café o proveedor del lote"""
+    return (
+        Q(**{f'{prefijo}codigo__startswith': texto.upper()})
+        | Q(**{f'{prefijo}tipo_cafe__istartswith': texto})
+        | Q(**{f'{prefijo}proveedor__istartswith': texto})
+    )
+
+
+# ==========================================
+# CONSULTAS POR TIPO
+# ==========================================
+
+def _buscar_lotes(texto, limite):
+    lotes = Lote.objects.filter(activo=True).select_related('bodega').annotate(
+        disponible=disponible_lote(),
+    )
+    if texto:
+        lotes = lotes.filter(_filtro_lote(texto)).annotate(relevancia=_relevancia('codigo', texto))
+    else:
+        lotes = lotes.annotate(relevancia=Value(2))
+
+    return [
+        {
+            'tipo': 'lote',
+            'etiqueta': '📦 Lote',
+            'id': lote.id,
+            'lote_id': lote.id,
+            'codigo': lote.codigo,
+            'descripcion': f"{lote.tipo_cafe} - {lote.proveedor} - Bodega {lote.bodega.codigo}",
+            'peso_disponible': float(lote.disponible),
+            'fecha': lote.fecha_ingreso,
+            'relevancia': lote.relevancia,
+        }
+        for lote in lotes.order_by('relevancia', '-fecha_ingreso')[:limite]
+    ]
+
+
+def _buscar_procesados(texto, limite, pendientes=False):
+    procesados = Procesado.objects.select_related('lote').annotate(
+        disponible=disponible_procesado(),
+    )
+    if pendientes:
+        procesados = procesados.filter(finalizado=False)
+    if texto:
+        procesados = procesados.filter(
+            Q(numero_trilla__startswith=texto.upper()) | _filtro_lote(texto, 'lote__')
+        ).annotate(relevancia=_relevancia('numero_trilla', texto))
+    else:
+        procesados = procesados.annotate(relevancia=Value(2))
+
+    return [
+        {
+            'tipo': 'procesado',
+            'etiqueta': '⚙️ Procesado',
+            'id': procesado.id,
+            'lote_id': procesado.lote_id,
+            'codigo': f"Trilla #{procesado.numero_trilla}",
+            'descripcion': f"Lote {procesado.lote.codigo} - {procesado.lote.tipo_cafe}",
+            'peso_disponible': float(procesado.disponible),
+            'fecha': procesado.fecha,
+            'relevancia': procesado.relevancia,
+        }
+        for procesado in procesados.order_by('relevancia', '-fecha')[:limite]
+    ]
+
+
+def _buscar_reprocesos(texto, limite):
+    reprocesos = Reproceso.objects.select_related('procesado__lote').annotate(
+        disponible=expresion_kg('peso_final_kg', 'unidad_peso_final'),
+    )
+    if texto:
+        filtro = (
+            Q(nombre__istartswith=texto)
+            | Q(procesado__numero_trilla__startswith=texto.upper())
+            | _filtro_lote(texto, 'procesado__lote__')
+        )
+        numero = texto.lstrip('#')
+        if numero.isdigit():
+            filtro |= Q(numero=int(numero))
+        reprocesos = reprocesos.filter(filtro).annotate(
+            relevancia=_relevancia('procesado__numero_trilla', texto)
+        )
+    else:
+        reprocesos = reprocesos.annotate(relevancia=Value(2))
+
+    return [
+        {
+            'tipo': 'reproceso',
+            'etiqueta': '🔄 Reproceso',
+            'id': reproceso.id,
+            'lote_id': reproceso.procesado.lote_id,
+            'codigo': reproceso.nombre or f"Reproceso #{reproceso.numero}",
+            'descripcion': (
+                f"Lote {reproceso.procesado.lote.codigo} - De Trilla #{reproceso.procesado.numero_trilla}"
+            ),
+            'peso_disponible': round(float(reproceso.disponible), 2),
+            'fecha': reproceso.fecha,
+            'relevancia': reproceso.relevancia,
+        }
+        for reproceso in reprocesos.order_by('relevancia', '-fecha')[:limite]
+    ]
+
+
+# ==========================================
+# BÚSQUEDA COMBINADA
+# ==========================================
+
+def buscar_productos(texto='', tipos=TIPOS_PRODUCTO, limite=LIMITE_POR_DEFECTO, pendientes=False):
+    """
+    Primeros `limite` productos que coinciden con texto, de los tipos pedidos.
+    Cada tipo trae a lo sumo `limite` filas ya ordenadas (una consulta por tipo)
+    y se mezclan por relevancia y fecha. pendientes=True deja solo procesados sin
+    finalizar. Sin texto devuelve los más recientes.
+    """
+    texto = (texto or '').strip()
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+
+    resultados = []
+    if 'lote' in tipos:
+        resultados += _buscar_lotes(texto, limite)
+    if 'procesado' in tipos:
+        resultados += _buscar_procesados(texto, limite, pendientes)
+    if 'reproceso' in tipos:
+        resultados += _buscar_reprocesos(texto, limite)
+
+    resultados.sort(key=lambda fila: fila['fecha'], reverse=True)
+    resultados.sort(key=lambda fila: fila['relevancia'])
+    resultados = resultados[:limite]
+    for fila in resultados:
+        del fila['relevancia']
+        del fila['fecha']
+    return resultados
+
+
+# ==========================================
+# CÓDIGOS
+# ==========================================
+
+# (patrón, modelo, campo del código, vista de detalle, campo con el id para la vista, dígitos)
+# El grupo "n" se completa con ceros, así "L-42" encuentra L-0042. El orden importa:
+# una subpartida (PAR-0026A-004) se prueba antes que su partida (PAR-0026A).
+CODIGOS = [
+    (re.compile(r'L-(?P<n>\d+)'), Lote, 'codigo', 'detalle_lote', 'pk', 4),
+    (re.compile(r'T-(?P<n>\d+)'), Procesado, 'numero_trilla', 'detalle_procesado', 'pk', 4),
+    (re.compile(r'REC-(?P<n>\d+)'), ReciboCafe, 'numero_recibo', 'detalle_lote', 'lote_id', 5),
+    (re.compile(r'VEN-(?P<n>\d+)'), Venta, 'codigo_venta', 'venta_detalle', 'pk', 5),
+    (re.compile(r'EXP-(?P<n>\d+)'), Exportacion, 'codigo_exportacion', 'exportacion_detalle', 'pk', 5),
+    (re.compile(r'CAT-(?:PAR|L|P|R|M)-(?P<n>\d+)'), Catacion, 'codigo_muestra', 'detalle_catacion', 'pk', 4),
+    (re.compile(r'PAR-[0-9A-Z]+-(?P<n>\d+)'), SubPartida, 'numero_subpartida', 'detalle_subpartida', 'pk', 3),
+    (re.compile(r'PAR-(?P<n>\d+)[A-Z]*'), Partida, 'numero_partida', 'detalle_partida', 'pk', 4),
+]
+
+
+def normalizar_codigo(texto):
+    """' l-42 ' -> 'L-42' (sin espacios, en mayúsculas)"""
+    return ''.join((texto or '').split()).upper()
+
+
+def resolver_codigo(texto):
+    """(vista de detalle, id) del registro con ese código, o None si no existe o no se reconoce"""
+    codigo = normalizar_codigo(texto)
+    for patron, modelo, campo, vista, campo_id, digitos in CODIGOS:
+        coincidencia = patron.fullmatch(codigo)
+        if not coincidencia:
+            continue
+        inicio, fin = coincidencia.span('n')
+        codigo = codigo[:inicio] + coincidencia.group('n').zfill(digitos) + codigo[fin:]
+        pk = modelo.objects.filter(**{campo: codigo}).values_list(campo_id, flat=True).first()
+        return (vista, pk) if pk else None
+    return None
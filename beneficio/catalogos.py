@@ -0,0 +1,109 @@
+"""
+Caché de catálogos: Bodega, TipoCafe y EtiquetaLote.
+
+Cada proceso guarda en memoria la lista completa de cada catálogo junto con el
+sello de versión con el que la leyó. El sello vive en la caché de Django, que
+comparten los workers; guardar o borrar un registro lo cambia (señales en
+models.py) y el siguiente acceso de cada proceso vuelve a leer la tabla. Así los
+formularios e importadores no consultan estas tablas en cada request.
+
+Los objetos devueltos se comparten entre requests: son de solo lectura.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+# {modelo: (sello, [objetos])}
+_en_memoria = {}
+
+
+def _clave(modelo):
+    return f'catalogo:{modelo._meta.label_lower}:version'
+
+
+def sello(modelo):
+    """Versión vigente del catálogo (se crea la primera vez que se pide)"""
+    valor = cache.get(_clave(modelo))
+    if valor is None:
+        cache.add(_clave(modelo), uuid.uuid4().hex, timeout=None)
+        valor = cache.get(_clave(modelo))
+    # Sin caché disponible (p. ej. DummyCache) se recarga siempre
+    return valor or uuid.uuid4().hex
+
+
+def invalidar(modelo):
+    """Cambia el sello cuando confirma la transacción, para que nadie recargue datos sin confirmar"""
+    transaction.on_commit(lambda: cache.set(_clave(modelo), uuid.uuid4().hex, timeout=None))
+
+
+def obtener(modelo):
+    """Todos los registros del catálogo en el orden del modelo"""
+    vigente = sello(modelo)
+    guardado = _en_memoria.get(modelo)
+    if guardado is None or guardado[0] != vigente:
+        # El sello se lee antes que la tabla: si cambia en medio, la próxima llamada recarga
+        guardado = (vigente, list(modelo.objects.all()))
+        _en_memoria[modelo] = guardado
+    return guardado[1]
+
+
+# ==========================================
+# ACCESOS POR CATÁLOGO
+# ==========================================
+
+def bodegas():
+    from .models import Bodega
+    return obtener(Bodega)
+
+
+def bodegas_activas():
+    return [bodega for bodega in bodegas() if bodega.activo]
+
+
+def bodega(pk):
+    """Bodega por id (None si no existe)"""
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    return next((bodega for bodega in bodegas() if bodega.pk == pk), None)
+
+
+def tipos_cafe():
+    from .models import TipoCafe
+    return obtener(TipoCafe)
+
+
+def etiquetas():
+    from .models import EtiquetaLote
+    return obtener(EtiquetaLote)
+
+
+def etiqueta_por_nombre(nombre):
+    """Etiqueta con ese nombre sin distinguir mayúsculas (None si no existe)"""
+    nombre = (nombre or '').strip().upper()
+    return next((etiqueta for etiqueta in etiquetas() if etiqueta.nombre.upper() == nombre), None) if nombre else None
+
+
+def etiqueta(pk):
+    """Etiqueta por id (None si no existe)"""
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    return next((etiqueta for etiqueta in etiquetas() if etiqueta.pk == pk), None)
+
+
+def etiqueta_para(nombre):
+    """Etiqueta con ese nombre, creándola en el catálogo si es nueva (None si viene vacío)"""
+    from .models import EtiquetaLote
+
+    nombre = (nombre or '').strip()
+    if not nombre:
+        return None
+    return (
+        etiqueta_por_nombre(nombre)
+        or EtiquetaLote.objects.filter(nombre__iexact=nombre).first()
+        or EtiquetaLote.objects.create(nombre=nombre)
+    )
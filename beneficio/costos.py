@@ -0,0 +1,265 @@
+"""
+Costo por kg de cada producto, desde la compra hasta la venta.
+
+La cadena de costo promedio ponderado es:
+
+    Lote       (peso base a precio_quintal + monto de sus recibos) / peso del lote
+    Procesado  costo de lo que entra (recibo propio o lote) / kg obtenidos
+    Reproceso  costo del procesado de origen por kg que entra / kg obtenidos
+    Mezcla     promedio ponderado por kg de sus componentes; cada lote aporta
+               el costo de su café trillado (o el del lote si no tiene trillas)
+
+El resultado queda guardado en costo_kg de cada modelo, de modo que el margen
+de una Venta o Exportación se lee sin recorrer la cadena. Cuando cambia un
+eslabón solo se recalculan sus descendientes: las funciones recalcular_desde_*
+bajan por la cadena a partir de los ids que cambiaron, al confirmar la
+transacción (registro en recalculos.py al final de este módulo). Las escrituras
+son bulk_update y no disparan señales.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import DetalleMezcla, Lote, Mezcla, Procesado, ReciboCafe, Reproceso
+from .recalculos import al_confirmar, cambio, observar, valores
+from .unidades import KG_POR_QUINTAL, a_kg
+
+PRECISION = Decimal('0.0001')
+
+
+def _costo(monto, kg):
+    """monto / kg redondeado a 4 decimales; None si no hay kg"""
+    try:
+        if not kg or Decimal(kg) <= 0 or monto is None:
+            return None
+        return (Decimal(monto) / Decimal(kg)).quantize(PRECISION)
+    except InvalidOperation:
+        return None
+
+
+def _primero(*valores):
+    """Primer valor que no es None (un costo de 0 es válido)"""
+    return next((valor for valor in valores if valor is not None), None)
+
+
+def _guardar(modelo, costos):
+    """costos: {id: costo_kg}. Un bulk_update sin señales"""
+    if costos:
+        modelo.objects.bulk_update(
+            [modelo(pk=pk, costo_kg=costo) for pk, costo in costos.items()], ['costo_kg'], batch_size=500,
+        )
+
+
+# ==========================================
+# COSTEO POR ESLABÓN
+# ==========================================
+
+def _costear_lotes(lote_ids):
+    recibos = {
+        fila['lote_id']: fila
+        for fila in ReciboCafe.objects.filter(lote_id__in=lote_ids).values('lote_id').annotate(
+            kg=Sum('peso_kg'), monto=Sum('monto_total'),
+        ).order_by()
+    }
+    costos = {}
+    for lote in Lote.objects.filter(pk__in=lote_ids).values('id', 'peso_kg', 'precio_quintal'):
+        recibo = recibos.get(lote['id'], {})
+        # Los recibos ya están sumados al peso del lote; el resto es el peso de ingreso
+        kg_base = max(lote['peso_kg'] - (recibo.get('kg') or 0), Decimal('0'))
+        monto = kg_base * lote['precio_quintal'] / KG_POR_QUINTAL + (recibo.get('monto') or 0)
+        costos[lote['id']] = _primero(
+            _costo(monto, lote['peso_kg']), _costo(lote['precio_quintal'], KG_POR_QUINTAL),
+        )
+    _guardar(Lote, costos)
+
+
+def _costear_procesados(procesado_ids):
+    costos = {}
+    for procesado in Procesado.objects.filter(pk__in=procesado_ids).values(
+        'id', 'peso_inicial_en_kg', 'peso_final_en_kg', 'lote__costo_kg', 'recibo__peso_kg', 'recibo__monto_total',
+    ):
+        # Si la trilla sale de un recibo concreto se usa el costo de ese recibo
+        costo_entrada = _primero(
+            _costo(procesado['recibo__monto_total'], procesado['recibo__peso_kg']), procesado['lote__costo_kg'],
+        )
+        costos[procesado['id']] = _costo(
+            procesado['peso_inicial_en_kg'] * costo_entrada if costo_entrada is not None else None,
+            procesado['peso_final_en_kg'],
+        )
+    _guardar(Procesado, costos)
+
+
+def _costear_reprocesos(reproceso_ids):
+    costos = {}
+    for reproceso in Reproceso.objects.filter(pk__in=reproceso_ids).values(
+        'id', 'peso_inicial_kg', 'unidad_peso_inicial', 'peso_final_kg', 'unidad_peso_final', 'procesado__costo_kg',
+    ):
+        costo_entrada = reproceso['procesado__costo_kg']
+        costos[reproceso['id']] = _costo(
+            a_kg(reproceso['peso_inicial_kg'], reproceso['unidad_peso_inicial']) * costo_entrada
+            if costo_entrada is not None else None,
+            a_kg(reproceso['peso_final_kg'], reproceso['unidad_peso_final']),
+        )
+    _guardar(Reproceso, costos)
+
+
+def _costear_mezclas(mezcla_ids):
+    detalles = list(DetalleMezcla.objects.filter(mezcla_id__in=mezcla_ids).values('mezcla_id', 'lote_id', 'peso_kg'))
+    lote_ids = {detalle['lote_id'] for detalle in detalles}
+
+    # Costo del café trillado de cada lote; sin trillas costeadas, el del lote
+    costo_componente = dict(Lote.objects.filter(pk__in=lote_ids).values_list('id', 'costo_kg'))
+    for fila in Procesado.objects.filter(lote_id__in=lote_ids, costo_kg__isnull=False).values('lote_id').annotate(
+        monto=Sum(F('costo_kg') * F('peso_final_en_kg')), kg=Sum('peso_final_en_kg'),
+    ).order_by():
+        costo_componente[fila['lote_id']] = _primero(_costo(fila['monto'], fila['kg']), costo_componente.get(fila['lote_id']))
+
+    montos = {pk: [Decimal('0'), Decimal('0')] for pk in mezcla_ids}
+    sin_costo = set()
+    for detalle in detalles:
+        costo = costo_componente.get(detalle['lote_id'])
+        if costo is None:
+            sin_costo.add(detalle['mezcla_id'])
+            continue
+        montos[detalle['mezcla_id']][0] += detalle['peso_kg'] * costo
+        montos[detalle['mezcla_id']][1] += detalle['peso_kg']
+
+    existentes = set(Mezcla.objects.filter(pk__in=mezcla_ids).values_list('pk', flat=True))
+    _guardar(Mezcla, {
+        pk: None if pk in sin_costo else _costo(monto, kg)
+        for pk, (monto, kg) in montos.items() if pk in existentes
+    })
+
+
+# ==========================================
+# PROPAGACIÓN
+# ==========================================
+
+def _ids(valores):
+    return {valor for valor in valores if valor}
+
+
+@transaction.atomic
+def recalcular_mezclas(mezcla_ids):
+    mezcla_ids = _ids(mezcla_ids)
+    if mezcla_ids:
+        _costear_mezclas(mezcla_ids)
+
+
+def recalcular_mezclas_de_lotes(lote_ids):
+    """Mezclas que tienen como componente alguno de los lotes"""
+    recalcular_mezclas(
+        DetalleMezcla.objects.filter(lote_id__in=_ids(lote_ids)).values_list('mezcla_id', flat=True).distinct()
+    )
+
+
+@transaction.atomic
+def recalcular_reprocesos(reproceso_ids):
+    reproceso_ids = _ids(reproceso_ids)
+    if reproceso_ids:
+        _costear_reprocesos(reproceso_ids)
+
+
+def _procesados_y_reprocesos(procesado_ids):
+    if procesado_ids:
+        _costear_procesados(procesado_ids)
+        recalcular_reprocesos(Reproceso.objects.filter(procesado_id__in=procesado_ids).values_list('pk', flat=True))
+
+
+@transaction.atomic
+def recalcular_desde_procesados(procesado_ids):
+    """Procesados indicados, sus reprocesos y las mezclas que usan sus lotes"""
+    procesado_ids = _ids(procesado_ids)
+    if not procesado_ids:
+        return
+    _procesados_y_reprocesos(procesado_ids)
+    recalcular_mezclas_de_lotes(
+        Procesado.objects.filter(pk__in=procesado_ids).values_list('lote_id', flat=True).distinct()
+    )
+
+
+@transaction.atomic
+def recalcular_desde_lotes(lote_ids):
+    """Lotes indicados y toda su descendencia (trillas, reprocesos, mezclas)"""
+    lote_ids = _ids(lote_ids)
+    if not lote_ids:
+        return
+    _costear_lotes(lote_ids)
+    _procesados_y_reprocesos(set(Procesado.objects.filter(lote_id__in=lote_ids).values_list('pk', flat=True)))
+    recalcular_mezclas_de_lotes(lote_ids)
+
+
+@transaction.atomic
+def recalcular_todo():
+    """Recalcula la cadena completa; devuelve cuántos registros de cada modelo se costearon"""
+    conteo = {}
+    for modelo, costear in (
+        (Lote, _costear_lotes), (Procesado, _costear_procesados),
+        (Reproceso, _costear_reprocesos), (Mezcla, _costear_mezclas),
+    ):
+        ids = set(modelo.objects.values_list('pk', flat=True))
+        if ids:
+            costear(ids)
+        conteo[str(modelo._meta.verbose_name_plural).lower()] = len(ids)
+    return conteo
+
+
+# ==========================================
+# RECÁLCULO AL GUARDAR
+# ==========================================
+
+def _tareas_lote(pk, antes, despues):
+    if despues and cambio(antes, despues, 'peso_kg', 'precio_quintal'):
+        return {('costos_lotes', pk)}
+    return set()
+
+
+def _tareas_recibo(pk, antes, despues):
+    if cambio(antes, despues, 'lote_id', 'peso_kg', 'monto_total'):
+        return {('costos_lotes', lote_id) for lote_id in valores(antes, despues, 'lote_id')}
+    return set()
+
+
+def _tareas_procesado(pk, antes, despues):
+    tareas = set()
+    if cambio(antes, despues, 'lote_id', 'recibo_id', 'peso_inicial_en_kg', 'peso_final_en_kg'):
+        if despues:
+            tareas.add(('costos_procesados', pk))
+        if antes and (despues is None or antes['lote_id'] != despues['lote_id']):
+            # El lote anterior pierde la trilla: cambia el costo del café trillado que usan sus mezclas
+            tareas.add(('costos_mezclas_de_lotes', antes['lote_id']))
+    return tareas
+
+
+def _tareas_reproceso(pk, antes, despues):
+    if despues and cambio(antes, despues, 'procesado_id', 'peso_inicial_kg', 'unidad_peso_inicial',
+                          'peso_final_kg', 'unidad_peso_final'):
+        return {('costos_reprocesos', pk)}
+    return set()
+
+
+def _tareas_detalle_mezcla(pk, antes, despues):
+    """Componente agregado, cambiado o quitado (también en cascada con su lote)"""
+    if cambio(antes, despues, 'mezcla_id', 'lote_id', 'peso_kg'):
+        return {('costos_mezclas', mezcla_id) for mezcla_id in valores(antes, despues, 'mezcla_id')}
+    return set()
+
+
+def _ejecutar(pendientes):
+    """Cada eslabón baja a sus descendientes"""
+    recalcular_desde_lotes(pendientes['costos_lotes'])
+    recalcular_desde_procesados(pendientes['costos_procesados'])
+    recalcular_reprocesos(pendientes['costos_reprocesos'])
+    recalcular_mezclas_de_lotes(pendientes['costos_mezclas_de_lotes'])
+    recalcular_mezclas(pendientes['costos_mezclas'])
+
+
+observar(Lote, _tareas_lote, ('peso_kg', 'precio_quintal'))
+observar(ReciboCafe, _tareas_recibo, ('lote_id', 'peso_kg', 'monto_total'))
+observar(Procesado, _tareas_procesado, ('lote_id', 'recibo_id', 'peso_inicial_en_kg', 'peso_final_en_kg'))
+observar(Reproceso, _tareas_reproceso, (
+    'procesado_id', 'peso_inicial_kg', 'unidad_peso_inicial', 'peso_final_kg', 'unidad_peso_final',
+))
+observar(DetalleMezcla, _tareas_detalle_mezcla, ('mezcla_id', 'lote_id', 'peso_kg'))
+al_confirmar(10, _ejecutar)
@@ -0,0 +1,496 @@
+"""
+Diario de existencias: cada entrada y salida de café queda como una fila de
+MovimientoInventario (kg positivos = entrada, negativos = salida) por bodega y
+producto. El diario solo crece: al editar o borrar un registro no se tocan sus
+filas anteriores, se agrega la diferencia.
+
+Cada registro de origen declara los kg que debería tener en el diario
+(_efectos_*). registrar(origen, pk) compara eso con la suma de lo ya anotado
+para ese origen y agrega solo la corrección, así que es seguro llamarlo de más
+(las correcciones de un mismo origen se serializan con _bloquear).
+Los criterios son los mismos de inventario.py:
+
+    Lote                  + peso de ingreso (sin los recibos)
+    ReciboCafe            + peso del recibo en su lote
+    Procesado             - kg iniciales del lote, + kg finales de la trilla
+    Reproceso             - kg iniciales del procesado, + kg finales del reproceso
+    DetalleMezcla         - kg del componente en su lote, + los mismos en la mezcla
+    SubPartida            + quintales en kg
+    MovimientoSubPartida  - quintales movidos en kg
+    Venta (completada)    - kg vendidos del producto
+    Exportación (entregada) - kg exportados del producto
+
+Si un producto cambia de bodega, trasladar() mueve su saldo con un par de
+filas. La fecha de cada fila es el momento en que se anotó; los puntos de
+control (PuntoControlInventario) guardan el saldo por producto hasta un id del
+diario, y existencias_al() parte del punto más cercano y suma solo lo posterior.
+Los kg del índice de ubicaciones (ubicaciones.py) se refrescan desde aquí.
+Las señales anotan qué registrar y trasladar, y se corre al confirmar la
+transacción (registro en recalculos.py al final de este módulo).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import (
+    DetalleMezcla, Exportacion, Lote, Mezcla, MovimientoInventario, MovimientoSubPartida, Partida, Procesado,
+    PuntoControlInventario, ReciboCafe, Reproceso, SaldoPuntoControl, SubPartida, Venta,
+)
+from .recalculos import al_confirmar, cambio, movido, observar, valores
+from .ubicaciones import actualizar_kg
+from .unidades import KG_POR_QUINTAL, a_kg
+
+# Dónde está la bodega de cada tipo de producto
+BODEGA_DE = {
+    'lote': (Lote, 'bodega_id'),
+    'procesado': (Procesado, 'bodega_destino_id'),
+    'reproceso': (Reproceso, 'bodega_destino_id'),
+    'mezcla': (Mezcla, 'bodega_destino_id'),
+    'partida': (SubPartida, 'partida__bodega_id'),
+}
+
+CERO = Decimal('0')
+
+
+def _producto_de(registro):
+    """(tipo, id) del producto al que apunta una Venta o Exportación"""
+    for tipo in ('procesado', 'reproceso', 'mezcla'):
+        if registro[f'{tipo}_id']:
+            return tipo, registro[f'{tipo}_id']
+    return None
+
+
+# ==========================================
+# EFECTOS DE CADA ORIGEN
+# ==========================================
+# Cada función devuelve (alcance, fecha del evento, {(origen, origen_id, tipo, producto_id): kg}).
+# El alcance es el filtro de las filas del diario que pertenecen a ese origen.
+
+def _efectos_lote(pk):
+    lote = Lote.objects.filter(pk=pk).values('peso_kg', 'fecha_ingreso').first()
+    efectos = {}
+    if lote:
+        kg_recibos = ReciboCafe.objects.filter(lote_id=pk).aggregate(total=Sum('peso_kg'))['total'] or CERO
+        efectos[('lote', pk, 'lote', pk)] = lote['peso_kg'] - kg_recibos
+    return Q(origen='lote', origen_id=pk), lote and lote['fecha_ingreso'], efectos
+
+
+def _efectos_recibo(pk):
+    recibo = ReciboCafe.objects.filter(pk=pk).values('lote_id', 'peso_kg', 'fecha_recibo').first()
+    efectos = {}
+    if recibo:
+        efectos[('recibo', pk, 'lote', recibo['lote_id'])] = recibo['peso_kg']
+    return Q(origen='recibo', origen_id=pk), recibo and recibo['fecha_recibo'], efectos
+
+
+def _efectos_procesado(pk):
+    procesado = Procesado.objects.filter(pk=pk).values(
+        'lote_id', 'peso_inicial_en_kg', 'peso_final_en_kg', 'fecha',
+    ).first()
+    efectos = {}
+    if procesado:
+        efectos[('procesado', pk, 'lote', procesado['lote_id'])] = -procesado['peso_inicial_en_kg']
+        efectos[('procesado', pk, 'procesado', pk)] = procesado['peso_final_en_kg']
+    return Q(origen='procesado', origen_id=pk), procesado and procesado['fecha'], efectos
+
+
+def _efectos_reproceso(pk):
+    reproceso = Reproceso.objects.filter(pk=pk).values(
+        'procesado_id', 'peso_inicial_kg', 'unidad_peso_inicial', 'peso_final_kg', 'unidad_peso_final', 'fecha',
+    ).first()
+    efectos = {}
+    if reproceso:
+        efectos[('reproceso', pk, 'procesado', reproceso['procesado_id'])] = -a_kg(
+            reproceso['peso_inicial_kg'], reproceso['unidad_peso_inicial'],
+        )
+        efectos[('reproceso', pk, 'reproceso', pk)] = a_kg(reproceso['peso_final_kg'], reproceso['unidad_peso_final'])
+    return Q(origen='reproceso', origen_id=pk), reproceso and reproceso['fecha'], efectos
+
+
+def _efectos_mezcla(pk):
+    """
+    Dos filas por componente (salida del lote, entrada en la mezcla); el
+    origen_id es el del DetalleMezcla. Los componentes ya borrados se
+    encuentran por sus filas del lado de la mezcla.
+    """
+    fecha = Mezcla.objects.filter(pk=pk).values_list('fecha', flat=True).first()
+    detalles = list(DetalleMezcla.objects.filter(mezcla_id=pk).values_list('pk', 'lote_id', 'peso_kg')) if fecha else []
+    efectos = {}
+    for detalle_id, lote_id, kg in detalles:
+        efectos[('componente_mezcla', detalle_id, 'lote', lote_id)] = -kg
+        efectos[('componente_mezcla', detalle_id, 'mezcla', pk)] = kg
+
+    detalle_ids = {detalle_id for detalle_id, _, _ in detalles} | set(MovimientoInventario.objects.filter(
+        origen='componente_mezcla', tipo_producto='mezcla', producto_id=pk,
+    ).values_list('origen_id', flat=True))
+    alcance = Q(origen='componente_mezcla') & (
+        Q(tipo_producto='mezcla', producto_id=pk) | Q(origen_id__in=detalle_ids)
+    )
+    return alcance, fecha, efectos
+
+
+def _efectos_subpartida(pk):
+    subpartida = SubPartida.objects.filter(pk=pk).values('quintales', 'fecha_creacion').first()
+    efectos = {}
+    if subpartida:
+        efectos[('subpartida', pk, 'partida', pk)] = subpartida['quintales'] * KG_POR_QUINTAL
+    return Q(origen='subpartida', origen_id=pk), subpartida and subpartida['fecha_creacion'], efectos
+
+
+def _efectos_movimiento_subpartida(pk):
+    movimiento = MovimientoSubPartida.objects.filter(pk=pk).values(
+        'subpartida_id', 'quintales_movidos', 'fecha',
+    ).first()
+    efectos = {}
+    if movimiento:
+        efectos[('movimiento_subpartida', pk, 'partida', movimiento['subpartida_id'])] = (
+            -movimiento['quintales_movidos'] * KG_POR_QUINTAL
+        )
+    return Q(origen='movimiento_subpartida', origen_id=pk), movimiento and movimiento['fecha'], efectos
+
+
+def _efectos_venta(pk):
+    venta = Venta.objects.filter(pk=pk).values(
+        'procesado_id', 'reproceso_id', 'mezcla_id', 'peso_vendido_kg', 'estado', 'fecha_venta',
+    ).first()
+    efectos = {}
+    producto = venta and _producto_de(venta)
+    if producto and venta['estado'] == 'completada':
+        efectos[('venta', pk, *producto)] = -venta['peso_vendido_kg']
+    return Q(origen='venta', origen_id=pk), venta and venta['fecha_venta'], efectos
+
+
+def _efectos_exportacion(pk):
+    exportacion = Exportacion.objects.filter(pk=pk).values(
+        'procesado_id', 'reproceso_id', 'mezcla_id', 'peso_exportado_kg', 'estado', 'fecha_exportacion',
+    ).first()
+    efectos = {}
+    producto = exportacion and _producto_de(exportacion)
+    if producto and exportacion['estado'] == 'entregada':
+        efectos[('exportacion', pk, *producto)] = -exportacion['peso_exportado_kg']
+    return Q(origen='exportacion', origen_id=pk), exportacion and exportacion['fecha_exportacion'], efectos
+
+
+ORIGENES = {
+    'lote': (Lote, _efectos_lote),
+    'recibo': (ReciboCafe, _efectos_recibo),
+    'procesado': (Procesado, _efectos_procesado),
+    'reproceso': (Reproceso, _efectos_reproceso),
+    'componente_mezcla': (Mezcla, _efectos_mezcla),
+    'subpartida': (SubPartida, _efectos_subpartida),
+    'movimiento_subpartida': (MovimientoSubPartida, _efectos_movimiento_subpartida),
+    'venta': (Venta, _efectos_venta),
+    'exportacion': (Exportacion, _efectos_exportacion),
+}
+
+
+# ==========================================
+# ESCRITURA DEL DIARIO
+# ==========================================
+
+def _bodega_actual(tipo, producto_id):
+    """Bodega donde está hoy el producto; si ya no existe, la de su última fila en el diario"""
+    modelo, campo = BODEGA_DE[tipo]
+    fila = list(modelo.objects.filter(pk=producto_id).values_list(campo, flat=True)[:1])
+    if fila:
+        return fila[0]
+    return MovimientoInventario.objects.filter(
+        tipo_producto=tipo, producto_id=producto_id,
+    ).order_by('-pk').values_list('bodega_id', flat=True).first()
+
+
+def _bloquear(clave, modelo, pk):
+    """
+    Serializa las correcciones de un mismo origen o producto: la segunda
+    transacción espera a que confirme la primera y lee lo que esta anotó, en
+    lugar de agregar las dos la misma diferencia. En PostgreSQL es un candado de
+    transacción sobre la clave (vale también para registros ya borrados); en
+    otros motores se bloquea la fila de origen (SQLite ya serializa escrituras).
+    """
+    conexion = transaction.get_connection()
+    if conexion.vendor == 'postgresql':
+        with conexion.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'diario:{clave}:{pk}'])
+    else:
+        list(modelo.objects.select_for_update().filter(pk=pk).values_list('pk', flat=True))
+
+
+@transaction.atomic
+def registrar(origen, pk, historico=False):
+    """
+    Agrega al diario la diferencia entre lo que el registro debería aportar y
+    lo ya anotado. historico=True fecha las filas con la fecha del evento (carga
+    inicial); si no, con el momento actual. Devuelve las filas agregadas.
+    """
+    modelo, efectos = ORIGENES[origen]
+    _bloquear(origen, modelo, pk)
+    alcance, fecha_evento, deseado = efectos(pk)
+    anotado = {
+        (fila['origen'], fila['origen_id'], fila['tipo_producto'], fila['producto_id']): fila['total']
+        for fila in MovimientoInventario.objects.filter(alcance).values(
+            'origen', 'origen_id', 'tipo_producto', 'producto_id',
+        ).annotate(total=Sum('kg')).order_by()
+    }
+
+    fecha = fecha_evento if historico and fecha_evento else timezone.now()
+
+    bodegas = {}
+    filas = []
+    for clave in set(deseado) | set(anotado):
+        diferencia = (deseado.get(clave) or CERO) - (anotado.get(clave) or CERO)
+        if not diferencia:
+            continue
+        origen_fila, origen_id, tipo, producto_id = clave
+        if (tipo, producto_id) not in bodegas:
+            bodegas[(tipo, producto_id)] = _bodega_actual(tipo, producto_id)
+        filas.append(MovimientoInventario(
+            fecha=fecha, bodega_id=bodegas[(tipo, producto_id)], tipo_producto=tipo, producto_id=producto_id,
+            kg=diferencia, origen=origen_fila, origen_id=origen_id,
+        ))
+    MovimientoInventario.objects.bulk_create(filas)
+    actualizar_kg(bodegas)
+    return len(filas)
+
+
+def registrar_recibos_nuevos(lote_id, recibos):
+    """Recibos recién creados con bulk_create (sin filas previas): un solo bulk_create en el diario"""
+    bodega_id = _bodega_actual('lote', lote_id)
+    ahora = timezone.now()
+    MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(fecha=ahora, bodega_id=bodega_id, tipo_producto='lote', producto_id=lote_id,
+                             kg=recibo.peso_kg, origen='recibo', origen_id=recibo.pk)
+        for recibo in recibos if recibo.pk and recibo.peso_kg
+    ])
+    actualizar_kg([('lote', lote_id)])
+
+
+@transaction.atomic
+def trasladar(tipo, producto_id):
+    """Si el producto cambió de bodega, mueve al diario el saldo que quedó en la anterior"""
+    modelo, campo = BODEGA_DE[tipo]
+    _bloquear(f'traslado:{tipo}', modelo, producto_id)
+    fila = list(modelo.objects.filter(pk=producto_id).values_list(campo, flat=True)[:1])
+    if not fila:
+        return 0
+    actual = fila[0]
+
+    filas = []
+    ahora = timezone.now()
+    for anterior in MovimientoInventario.objects.filter(
+        tipo_producto=tipo, producto_id=producto_id,
+    ).exclude(bodega_id=actual).values('bodega_id').annotate(saldo=Sum('kg')).order_by():
+        if not anterior['saldo'] or (actual is None and anterior['bodega_id'] is None):
+            continue
+        filas += [
+            MovimientoInventario(fecha=ahora, bodega_id=anterior['bodega_id'], tipo_producto=tipo,
+                                 producto_id=producto_id, kg=-anterior['saldo'], origen='traslado'),
+            MovimientoInventario(fecha=ahora, bodega_id=actual, tipo_producto=tipo,
+                                 producto_id=producto_id, kg=anterior['saldo'], origen='traslado'),
+        ]
+    MovimientoInventario.objects.bulk_create(filas)
+    return len(filas)
+
+
+def registrar_todo(historico=False):
+    """Concilia el diario con todos los registros existentes (y los borrados); devuelve filas por origen"""
+    conteo = {}
+    for origen, (modelo, _) in ORIGENES.items():
+        # Los ids ya anotados incluyen los registros que se borraron sin pasar por las señales
+        anotados = MovimientoInventario.objects.filter(origen=origen)
+        if origen == 'componente_mezcla':
+            anotados = anotados.filter(tipo_producto='mezcla').values_list('producto_id', flat=True).distinct()
+        else:
+            anotados = anotados.values_list('origen_id', flat=True).distinct()
+        ids = set(modelo.objects.values_list('pk', flat=True)) | set(anotados)
+        conteo[origen] = sum(registrar(origen, pk, historico) for pk in sorted(ids))
+    for tipo, (modelo, _) in BODEGA_DE.items():
+        for pk in modelo.objects.values_list('pk', flat=True):
+            trasladar(tipo, pk)
+    return conteo
+
+
+# ==========================================
+# RECÁLCULO AL GUARDAR
+# ==========================================
+
+def _tareas(origen, *campos, traslado=None, bodega=None):
+    """
+    Vuelve a registrar el origen si se creó, se borró o cambió alguno de los
+    campos; si cambia la bodega, traslada también el producto.
+    """
+    def tareas(pk, antes, despues):
+        pedidas = {('diario', (origen, pk))} if cambio(antes, despues, *campos) else set()
+        if bodega and movido(antes, despues, bodega):
+            pedidas.add(('traslado', (traslado, pk)))
+        return pedidas
+    return tareas
+
+
+def _tareas_mezcla(pk, antes, despues):
+    """Los kg de la mezcla salen de sus componentes (DetalleMezcla)"""
+    tareas = set()
+    if antes is None or despues is None:
+        tareas.add(('diario', ('componente_mezcla', pk)))
+    if movido(antes, despues, 'bodega_destino_id'):
+        tareas.add(('traslado', ('mezcla', pk)))
+    return tareas
+
+
+def _tareas_detalle_mezcla(pk, antes, despues):
+    """Componente agregado, cambiado o quitado (también en cascada con su lote)"""
+    if cambio(antes, despues, 'mezcla_id', 'lote_id', 'peso_kg'):
+        return {('diario', ('componente_mezcla', mezcla_id)) for mezcla_id in valores(antes, despues, 'mezcla_id')}
+    return set()
+
+
+def _tareas_partida(pk, antes, despues):
+    """La bodega de las subpartidas es la de su partida"""
+    if movido(antes, despues, 'bodega_id'):
+        return {
+            ('traslado', ('partida', subpartida_id))
+            for subpartida_id in SubPartida.objects.filter(partida_id=pk).values_list('pk', flat=True)
+        }
+    return set()
+
+
+def _tareas_subpartida(pk, antes, despues):
+    tareas = {('diario', ('subpartida', pk))} if cambio(antes, despues, 'quintales') else set()
+    if movido(antes, despues, 'partida_id'):
+        tareas.add(('traslado', ('partida', pk)))
+    return tareas
+
+
+def _ejecutar(pendientes):
+    for origen, pk in sorted(pendientes['diario']):
+        registrar(origen, pk)
+    for tipo, pk in sorted(pendientes['traslado']):
+        trasladar(tipo, pk)
+
+
+observar(Lote, _tareas('lote', 'peso_kg', traslado='lote', bodega='bodega_id'), ('peso_kg', 'bodega_id'))
+# El peso del lote lo ajusta ReciboCafe con UPDATE antes de confirmar la transacción
+observar(ReciboCafe, _tareas('recibo', 'lote_id', 'peso_kg', 'monto_total'), ('lote_id', 'peso_kg', 'monto_total'))
+observar(
+    Procesado,
+    _tareas(
+        'procesado', 'lote_id', 'recibo_id', 'peso_inicial_en_kg', 'peso_final_en_kg',
+        traslado='procesado', bodega='bodega_destino_id',
+    ),
+    ('lote_id', 'recibo_id', 'peso_inicial_en_kg', 'peso_final_en_kg', 'bodega_destino_id'),
+)
+observar(
+    Reproceso,
+    _tareas(
+        'reproceso', 'procesado_id', 'peso_inicial_kg', 'unidad_peso_inicial', 'peso_final_kg', 'unidad_peso_final',
+        traslado='reproceso', bodega='bodega_destino_id',
+    ),
+    ('procesado_id', 'peso_inicial_kg', 'unidad_peso_inicial', 'peso_final_kg', 'unidad_peso_final',
+     'bodega_destino_id'),
+)
+observar(Mezcla, _tareas_mezcla, ('bodega_destino_id',))
+observar(DetalleMezcla, _tareas_detalle_mezcla, ('mezcla_id', 'lote_id', 'peso_kg'))
+observar(Partida, _tareas_partida, ('bodega_id',))
+observar(SubPartida, _tareas_subpartida, ('partida_id', 'quintales'))
+observar(
+    MovimientoSubPartida, _tareas('movimiento_subpartida', 'subpartida_id', 'quintales_movidos'),
+    ('subpartida_id', 'quintales_movidos'),
+)
+observar(
+    Venta, _tareas('venta', 'procesado_id', 'reproceso_id', 'mezcla_id', 'peso_vendido_kg', 'estado'),
+    ('procesado_id', 'reproceso_id', 'mezcla_id', 'peso_vendido_kg', 'estado'),
+)
+observar(
+    Exportacion, _tareas('exportacion', 'procesado_id', 'reproceso_id', 'mezcla_id', 'peso_exportado_kg', 'estado'),
+    ('procesado_id', 'reproceso_id', 'mezcla_id', 'peso_exportado_kg', 'estado'),
+)
+al_confirmar(40, _ejecutar)
+
+
+# ==========================================
+# PUNTOS DE CONTROL Y CONSULTA A UNA FECHA
+# ==========================================
+
+def _sumar(saldos, movimientos):
+    for bodega_id, tipo, producto_id, kg in movimientos.values_list(
+        'bodega_id', 'tipo_producto', 'producto_id',
+    ).annotate(total=Sum('kg')).order_by():
+        saldos[(bodega_id, tipo, producto_id)] += kg
+    return saldos
+
+
+def _saldos_de(punto):
+    saldos = defaultdict(lambda: CERO)
+    if punto:
+        for bodega_id, tipo, producto_id, kg in punto.saldos.values_list(
+            'bodega_id', 'tipo_producto', 'producto_id', 'kg',
+        ):
+            saldos[(bodega_id, tipo, producto_id)] = kg
+    return saldos
+
+
+@transaction.atomic
+def crear_punto_control():
+    """
+    Guarda el saldo de cada producto y bodega hasta la última fila del diario.
+    Parte del punto anterior, así que solo suma los movimientos nuevos.
+    """
+    anterior = PuntoControlInventario.objects.order_by('-ultimo_movimiento_id').first()
+    ultimo = MovimientoInventario.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    desde = anterior.ultimo_movimiento_id if anterior else 0
+
+    saldos = _sumar(_saldos_de(anterior), MovimientoInventario.objects.filter(pk__gt=desde, pk__lte=ultimo))
+    punto = PuntoControlInventario.objects.create(fecha=timezone.now(), ultimo_movimiento_id=ultimo)
+    SaldoPuntoControl.objects.bulk_create([
+        SaldoPuntoControl(punto=punto, bodega_id=bodega_id, tipo_producto=tipo, producto_id=producto_id, kg=kg)
+        for (bodega_id, tipo, producto_id), kg in saldos.items() if kg
+    ], batch_size=1000)
+    return punto
+
+
+def existencias_al(momento, bodega_id=None):
+    """
+    Saldo por (bodega, tipo, producto) al momento indicado: el punto de control
+    más reciente anterior a esa fecha más los movimientos anotados después de él.
+    Solo devuelve saldos distintos de cero.
+    """
+    punto = PuntoControlInventario.objects.filter(fecha__lte=momento).order_by('-fecha').first()
+    saldos = _saldos_de(punto)
+    movimientos = MovimientoInventario.objects.filter(
+        pk__gt=punto.ultimo_movimiento_id if punto else 0, fecha__lte=momento,
+    )
+    if bodega_id is not None:
+        movimientos = movimientos.filter(bodega_id=bodega_id)
+        saldos = defaultdict(lambda: CERO, {clave: kg for clave, kg in saldos.items() if clave[0] == bodega_id})
+    return {clave: kg for clave, kg in _sumar(saldos, movimientos).items() if kg}
+
+
+def detalle_existencias_al(momento, bodega_id=None):
+    """existencias_al() con el código de cada producto, ordenado por bodega, tipo y código"""
+    from .inventario import FUENTES
+
+    saldos = existencias_al(momento, bodega_id)
+    ids_por_tipo = defaultdict(set)
+    for _, tipo, producto_id in saldos:
+        ids_por_tipo[tipo].add(producto_id)
+
+    codigos = {}
+    for tipo, ids in ids_por_tipo.items():
+        modelo = BODEGA_DE[tipo][0]
+        for pk, codigo in modelo.objects.filter(pk__in=ids).annotate(
+            codigo_diario=FUENTES[tipo][4],
+        ).values_list('pk', 'codigo_diario'):
+            codigos[(tipo, pk)] = codigo
+
+    filas = [
+        {
+            'bodega_id': bodega, 'tipo_producto': tipo, 'producto_id': producto_id, 'kg': kg,
+            'codigo': codigos.get((tipo, producto_id)) or f'#{producto_id} (eliminado)',
+        }
+        for (bodega, tipo, producto_id), kg in saldos.items()
+    ]
+    orden_tipos = list(FUENTES)
+    filas.sort(key=lambda fila: (fila['bodega_id'] or 0, orden_tipos.index(fila['tipo_producto']), fila['codigo']))
+    return filas
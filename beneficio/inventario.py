@@ -0,0 +1,231 @@
+"""
+Existencias y valoración de inventario.
+
+El peso disponible de cada fuente de inventario se expresa en SQL (las
+propiedades peso_disponible de los modelos hacen una consulta por registro):
+
+    Lote        peso_kg - kg iniciales de sus trillas - kg puestos en mezclas
+    Procesado   kg finales - kg enviados a reproceso - ventas completadas
+                - exportaciones entregadas
+    Reproceso   kg finales - ventas completadas - exportaciones entregadas
+    Mezcla      peso total - ventas completadas - exportaciones entregadas
+    SubPartida  (quintales - quintales movidos) en kg
+
+La valoración multiplica esos kg por costo_kg (ver costos.py) y agrupa por
+bodega con una consulta por tipo de producto. Las subpartidas no tienen costo
+registrado: cuentan en kg pero quedan como "sin costo". generar_corte guarda el
+resultado como ValoracionInventario de una fecha.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case, CharField, Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Concat, Greatest
+
+from .models import (
+    DetalleMezcla, Exportacion, Lote, Mezcla, MovimientoSubPartida, Procesado, Reproceso, SubPartida,
+    ValoracionInventario, Venta,
+)
+from .unidades import KG_POR_QUINTAL, expresion_kg
+
+CAMPO_PESO = DecimalField(max_digits=14, decimal_places=2)
+CAMPO_VALOR = DecimalField(max_digits=18, decimal_places=4)
+CERO = Value(Decimal('0'), output_field=CAMPO_PESO)
+
+
+def _suma(queryset, campo):
+    """Subconsulta escalar con la suma de campo; queryset ya viene agrupado con values()"""
+    total = queryset.order_by().annotate(total=Sum(campo)).values('total')
+    return Coalesce(Subquery(total, output_field=CAMPO_PESO), CERO)
+
+
+def _salidas(campo_producto):
+    """kg vendidos (completadas) más exportados (entregadas) del producto de la fila"""
+    vendido = _suma(
+        Venta.objects.filter(**{campo_producto: OuterRef('pk'), 'estado': 'completada'}).values(campo_producto),
+        'peso_vendido_kg',
+    )
+    exportado = _suma(
+        Exportacion.objects.filter(**{campo_producto: OuterRef('pk'), 'estado': 'entregada'}).values(campo_producto),
+        'peso_exportado_kg',
+    )
+    return vendido + exportado
+
+
+# ==========================================
+# PESO DISPONIBLE EN SQL
+# ==========================================
+
+def disponible_lote():
+    procesado = _suma(Procesado.objects.filter(lote=OuterRef('pk')).values('lote'), 'peso_inicial_en_kg')
+    mezclado = _suma(DetalleMezcla.objects.filter(lote=OuterRef('pk')).values('lote'), 'peso_kg')
+    return ExpressionWrapper(F('peso_kg') - procesado - mezclado, output_field=CAMPO_PESO)
+
+
+def disponible_procesado():
+    reprocesado = _suma(
+        Reproceso.objects.filter(procesado=OuterRef('pk')).values('procesado'),
+        expresion_kg('peso_inicial_kg', 'unidad_peso_inicial'),
+    )
+    return Greatest(
+        F('peso_final_en_kg') - reprocesado - _salidas('procesado'), CERO, output_field=CAMPO_PESO,
+    )
+
+
+def disponible_reproceso():
+    return Greatest(
+        expresion_kg('peso_final_kg', 'unidad_peso_final') - _salidas('reproceso'), CERO, output_field=CAMPO_PESO,
+    )
+
+
+def disponible_mezcla():
+    return Greatest(F('peso_total_kg') - _salidas('mezcla'), CERO, output_field=CAMPO_PESO)
+
+
+def disponible_subpartida():
+    movido = _suma(
+        MovimientoSubPartida.objects.filter(subpartida=OuterRef('pk')).values('subpartida'), 'quintales_movidos',
+    )
+    return ExpressionWrapper((F('quintales') - movido) * KG_POR_QUINTAL, output_field=CAMPO_PESO)
+
+
+def _codigo_reproceso():
+    """T-0001/R2: los reprocesos se numeran dentro de su procesado"""
+    return Concat(
+        'procesado__numero_trilla', Value('/R'), Cast('numero', CharField()), output_field=CharField(),
+    )
+
+
+# tipo: (queryset, bodega, disponible, costo por kg, código)
+FUENTES = {
+    'lote': (lambda: Lote.objects.filter(activo=True), 'bodega_id', disponible_lote, 'costo_kg', F('codigo')),
+    'procesado': (
+        Procesado.objects.all, 'bodega_destino_id', disponible_procesado, 'costo_kg', F('numero_trilla'),
+    ),
+    'reproceso': (Reproceso.objects.all, 'bodega_destino_id', disponible_reproceso, 'costo_kg', _codigo_reproceso()),
+    'mezcla': (
+        Mezcla.objects.all, 'bodega_destino_id', disponible_mezcla, 'costo_kg',
+        Concat(Value('M-'), Cast('numero', CharField()), output_field=CharField()),
+    ),
+    'partida': (
+        lambda: SubPartida.objects.filter(activo=True), 'partida__bodega_id', disponible_subpartida, None,
+        F('numero_subpartida'),
+    ),
+}
+
+
+def _existencias(tipo):
+    """Queryset de la fuente con bodega, kg disponibles y costo por kg anotados (solo con saldo)"""
+    queryset, bodega, disponible, costo, _ = FUENTES[tipo]
+    return queryset().annotate(
+        bodega_valoracion=F(bodega),
+        kg_disponible=disponible(),
+        costo_unitario=F(costo) if costo else Value(None, output_field=CAMPO_VALOR),
+    ).filter(kg_disponible__gt=0)
+
+
+# ==========================================
+# VALORACIÓN
+# ==========================================
+
+def valoracion_actual():
+    """
+    Filas {bodega_id, tipo_producto, numero_productos, kg_disponibles,
+    kg_sin_costo, valor} con el inventario de este momento. Una consulta
+    agrupada por tipo de producto.
+    """
+    filas = []
+    for tipo in FUENTES:
+        grupos = _existencias(tipo).values('bodega_valoracion').annotate(
+            numero=Count('pk'),
+            kg=Sum('kg_disponible'),
+            kg_sin_costo=Sum(Case(
+                When(costo_unitario__isnull=True, then=F('kg_disponible')), default=CERO, output_field=CAMPO_PESO,
+            )),
+            valor=Sum(ExpressionWrapper(F('kg_disponible') * F('costo_unitario'), output_field=CAMPO_VALOR)),
+        ).order_by()
+        for grupo in grupos:
+            filas.append({
+                'bodega_id': grupo['bodega_valoracion'],
+                'tipo_producto': tipo,
+                'numero_productos': grupo['numero'],
+                'kg_disponibles': Decimal(grupo['kg'] or 0).quantize(Decimal('0.01')),
+                'kg_sin_costo': Decimal(grupo['kg_sin_costo'] or 0).quantize(Decimal('0.01')),
+                'valor': Decimal(grupo['valor'] or 0).quantize(Decimal('0.01')),
+            })
+    return filas
+
+
+@transaction.atomic
+def generar_corte(fecha):
+    """Guarda la valoración actual como corte de la fecha (reemplaza el corte anterior de ese día)"""
+    ValoracionInventario.objects.filter(fecha=fecha).delete()
+    cortes = ValoracionInventario.objects.bulk_create([
+        ValoracionInventario(fecha=fecha, **fila) for fila in valoracion_actual()
+    ])
+    return len(cortes)
+
+
+def detalle_existencias():
+    """
+    Una fila por producto con saldo: (tipo, código, bodega_id, kg, costo_kg, valor).
+    Generador por bloques (iterator) para exportar sin cargar todo en memoria.
+    """
+    for tipo, (_, _, _, _, codigo) in FUENTES.items():
+        filas = _existencias(tipo).annotate(codigo_valoracion=codigo).order_by('bodega_valoracion', 'pk').values_list(
+            'codigo_valoracion', 'bodega_valoracion', 'kg_disponible', 'costo_unitario',
+        )
+        for codigo_producto, bodega_id, kg, costo in filas.iterator(chunk_size=2000):
+            valor = (Decimal(kg) * costo).quantize(Decimal('0.01')) if costo is not None else None
+            yield tipo, codigo_producto, bodega_id, Decimal(kg).quantize(Decimal('0.01')), costo, valor
+
+
+# ==========================================
+# CONSULTA
+# ==========================================
+
+def fechas_de_corte():
+    return list(ValoracionInventario.objects.values_list('fecha', flat=True).distinct().order_by('-fecha'))
+
+
+def corte_guardado(fecha):
+    """Filas del corte de una fecha con la misma forma que valoracion_actual()"""
+    return list(ValoracionInventario.objects.filter(fecha=fecha).values(
+        'bodega_id', 'tipo_producto', 'numero_productos', 'kg_disponibles', 'kg_sin_costo', 'valor',
+    ))
+
+
+def por_bodega(filas, nombres_bodega):
+    """
+    Agrupa filas de valoración por bodega con subtotales, más el total general.
+    nombres_bodega: {id: nombre} (catalogos.bodegas) para no consultar Bodega de nuevo.
+    """
+    tipos = dict(ValoracionInventario.TIPO_PRODUCTO_CHOICES)
+    orden_tipos = list(tipos)
+    bodegas = {}
+    for fila in filas:
+        bodega = bodegas.setdefault(fila['bodega_id'], {
+            'nombre': nombres_bodega.get(fila['bodega_id'], 'Sin bodega'),
+            'filas': [], 'kg': Decimal('0'), 'kg_sin_costo': Decimal('0'), 'valor': Decimal('0'),
+        })
+        kg_costeados = fila['kg_disponibles'] - fila['kg_sin_costo']
+        bodega['filas'].append({
+            **fila,
+            'tipo': tipos[fila['tipo_producto']],
+            'costo_promedio_kg': (fila['valor'] / kg_costeados).quantize(Decimal('0.0001')) if kg_costeados > 0 else None,
+        })
+        bodega['kg'] += fila['kg_disponibles']
+        bodega['kg_sin_costo'] += fila['kg_sin_costo']
+        bodega['valor'] += fila['valor']
+
+    resultado = sorted(bodegas.values(), key=lambda bodega: (bodega['nombre'] == 'Sin bodega', bodega['nombre']))
+    for bodega in resultado:
+        bodega['filas'].sort(key=lambda fila: orden_tipos.index(fila['tipo_producto']))
+    total = {
+        'kg': sum((bodega['kg'] for bodega in resultado), Decimal('0')),
+        'kg_sin_costo': sum((bodega['kg_sin_costo'] for bodega in resultado), Decimal('0')),
+        'valor': sum((bodega['valor'] for bodega in resultado), Decimal('0')),
+    }
+    return resultado, total
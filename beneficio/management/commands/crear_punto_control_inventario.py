@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from beneficio.diario_inventario import crear_punto_control
+
+
+class Command(BaseCommand):
+    help = 'Guarda un punto de control del diario de existencias (programar periódicamente, p. ej. cada noche)'
+
+    def handle(self, *args, **options):
+        punto = crear_punto_control()
+        self.stdout.write(self.style.SUCCESS(
+            f'Punto de control guardado: {punto.saldos.count()} saldos hasta el movimiento {punto.ultimo_movimiento_id}.'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from beneficio.ubicaciones import regenerar_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de ubicaciones (bodega / percha / fila) de lotes, procesados, reprocesos, mezclas y subpartidas'
+
+    def handle(self, *args, **options):
+        productos = regenerar_indice()
+        self.stdout.write(self.style.SUCCESS(f'Índice de ubicaciones generado: {productos} producto(s) ubicados.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from beneficio.models import PlanillaSemanal
+from beneficio.productividad_corte import regenerar_resumenes, temporada_de
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen de productividad de cortadores a partir de las planillas semanales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--temporada', help='Solo las planillas de la temporada indicada (p. ej. 2025-2026)')
+
+    def handle(self, *args, **options):
+        planillas = PlanillaSemanal.objects.all()
+        if options['temporada']:
+            ids = [
+                planilla.pk for planilla in planillas.only('fecha_inicio')
+                if temporada_de(planilla.fecha_inicio) == options['temporada']
+            ]
+            planillas = planillas.filter(pk__in=ids)
+
+        filas = regenerar_resumenes(planillas)
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumen de corte generado: {filas} filas de {planillas.count()} planilla(s).'
+        ))
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from beneficio.analitica_planta import DIAS_RETROCESO_TURNO, generar_resumen
+from beneficio.models import Procesado, Reproceso, Mezcla
+
+
+class Command(BaseCommand):
+    help = 'Precalcula los resúmenes de operación de planta (kg/h, utilización por turno, tiempos muertos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=2,
+            help='Recalcular lo registrado en los últimos N días (por defecto 2, para ejecutar cada noche)',
+        )
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD)')
+        parser.add_argument(
+            '--todo',
+            action='store_true',
+            help='Recalcular todo el historial',
+        )
+
+    def _fecha(self, valor):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {valor} (use AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        hasta = self._fecha(options['hasta']) if options['hasta'] else hoy
+
+        if options['todo']:
+            fechas = [
+                modelo.objects.aggregate(primera=Min('fecha'))['primera']
+                for modelo in (Procesado, Reproceso, Mezcla)
+            ]
+            fechas = [fecha for fecha in fechas if fecha]
+            # El día de turno puede ser anterior al registro (ver dia_turno_expr)
+            desde = timezone.localtime(min(fechas)).date() - timedelta(days=DIAS_RETROCESO_TURNO) if fechas else hoy
+        elif options['desde']:
+            desde = self._fecha(options['desde'])
+        else:
+            # Lo registrado en los últimos N días puede pertenecer a turnos de hasta
+            # DIAS_RETROCESO_TURNO días antes, que también hay que rehacer
+            desde = hasta - timedelta(days=max(options['dias'], 1) - 1 + DIAS_RETROCESO_TURNO)
+
+        if desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+
+        self.stdout.write(f'Generando resumen de planta del {desde} al {hasta}...')
+        filas, turnos = generar_resumen(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumen generado: {filas} filas de operación, {turnos} turnos.'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from beneficio.analitica_proveedores import actualizar_proveedores
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la ficha de proveedores (entregas, precio, rendimiento de trilla y catación)'
+
+    def handle(self, *args, **options):
+        filas = actualizar_proveedores()
+        self.stdout.write(self.style.SUCCESS(f'Ficha de proveedores generada: {filas} proveedor(es).'))
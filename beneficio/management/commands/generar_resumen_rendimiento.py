@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from beneficio.analitica_rendimiento import regenerar_resumen
+
+
+class Command(BaseCommand):
+    help = 'Precalcula el rendimiento y las mermas de trilla por mes, proveedor, tipo de café y operador'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD); se toma su mes completo')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD); se toma su mes completo')
+
+    def _fecha(self, valor):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {valor} (use AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        desde = self._fecha(options['desde']) if options['desde'] else None
+        hasta = self._fecha(options['hasta']) if options['hasta'] else None
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+
+        self.stdout.write('Generando resumen de rendimiento...')
+        filas = regenerar_resumen(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(f'Resumen generado: {filas} filas.'))
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from beneficio.inventario import generar_corte
+
+
+class Command(BaseCommand):
+    help = 'Guarda el corte de inventario valorizado (kg disponibles y valor a costo promedio por bodega)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Fecha del corte (AAAA-MM-DD); por defecto hoy')
+
+    def handle(self, *args, **options):
+        fecha = timezone.localdate()
+        if options['fecha']:
+            try:
+                fecha = datetime.strptime(options['fecha'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f"Fecha inválida: {options['fecha']} (use AAAA-MM-DD)")
+
+        self.stdout.write(f'Valorizando inventario al {fecha}...')
+        filas = generar_corte(fecha)
+        self.stdout.write(self.style.SUCCESS(f'Corte guardado: {filas} filas.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from beneficio.costos import recalcular_todo
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el costo por kg de lotes, procesados, reprocesos y mezclas (costo promedio ponderado)'
+
+    def handle(self, *args, **options):
+        conteo = recalcular_todo()
+        detalle = ', '.join(f'{cantidad} {nombre}' for nombre, cantidad in conteo.items())
+        self.stdout.write(self.style.SUCCESS(f'Costos recalculados: {detalle}.'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from beneficio.models import MantenimientoPlanta
+
+
+class Command(BaseCommand):
+    help = 'Recalcula horas_acumuladas y el pronóstico del control de mantenimiento a partir de los eventos UsoPlanta'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar el resultado sin guardar cambios',
+        )
+
+    def handle(self, *args, **options):
+        control = MantenimientoPlanta.get_or_create_control()
+        horas_actuales = control.horas_acumuladas
+
+        # Cada mantenimiento deja un ajuste negativo, así que la suma de todos los eventos es el contador
+        usos = control.usos.all()
+        self.stdout.write(f'Eventos registrados: {usos.count()}')
+
+        if options['dry_run']:
+            total = usos.aggregate(total=Sum('horas'))['total'] or 0
+            self.stdout.write(f'Horas actuales: {horas_actuales} | Horas según eventos: {total}')
+            return
+
+        with transaction.atomic():
+            control = MantenimientoPlanta.objects.select_for_update().get(pk=control.pk)
+            total = control.recalcular_desde_usos()
+            control.recalcular_pronostico()
+
+        self.stdout.write(f'Horas anteriores: {horas_actuales} | Horas recalculadas: {total}')
+        self.stdout.write(f'Ritmo de uso: {control.tasa_estimada:.2f} h/día | '
+                          f'Próximo mantenimiento estimado: {control.proximo_mantenimiento_estimado or "sin datos"}')
+        self.stdout.write(self.style.SUCCESS(f'Contador actualizado. Estado: {control.get_estado_display()}'))
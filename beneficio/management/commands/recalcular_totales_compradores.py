@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from beneficio.models import Comprador
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los totales acumulados de cada comprador a partir de sus compras'
+
+    def handle(self, *args, **options):
+        actualizados = Comprador.recalcular_totales()
+        self.stdout.write(self.style.SUCCESS(f'Totales recalculados para {actualizados} comprador(es).'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from beneficio.diario_inventario import registrar_todo
+
+
+class Command(BaseCommand):
+    help = 'Concilia el diario de existencias con los registros actuales (solo agrega las diferencias)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--historico', action='store_true',
+            help='Fechar las filas nuevas con la fecha de cada registro (carga inicial del diario)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Conciliando diario de existencias...')
+        conteo = registrar_todo(historico=options['historico'])
+        detalle = ', '.join(f'{origen}: {filas}' for origen, filas in conteo.items())
+        self.stdout.write(self.style.SUCCESS(f'Diario conciliado ({detalle}).'))
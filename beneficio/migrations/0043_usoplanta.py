@@ -0,0 +1,46 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def registrar_saldo_inicial(apps, schema_editor):
+    """Registra las horas ya acumuladas como evento de ajuste para que el contador sea reconstruible"""
+    MantenimientoPlanta = apps.get_model('beneficio', 'MantenimientoPlanta')
+    UsoPlanta = apps.get_model('beneficio', 'UsoPlanta')
+    for control in MantenimientoPlanta.objects.filter(horas_acumuladas__gt=0):
+        UsoPlanta.objects.create(
+            control_mantenimiento=control,
+            tipo_proceso='ajuste',
+            horas=control.horas_acumuladas,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0042_add_metodo_pago_choices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsoPlanta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_proceso', models.CharField(choices=[('procesado', 'Procesado/Trilla'), ('reproceso', 'Reproceso'), ('mezcla', 'Mezcla'), ('ajuste', 'Ajuste Manual')], max_length=20)),
+                ('horas', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('control_mantenimiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usos', to='beneficio.mantenimientoplanta')),
+                ('mezcla', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usos_planta', to='beneficio.mezcla')),
+                ('procesado', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usos_planta', to='beneficio.procesado')),
+                ('reproceso', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='usos_planta', to='beneficio.reproceso')),
+            ],
+            options={
+                'verbose_name': 'Uso de Planta',
+                'verbose_name_plural': 'Usos de Planta',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.RunPython(registrar_saldo_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0043_usoplanta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenOperacionPlanta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('turno', models.CharField(choices=[('diurno', 'Diurno (06:00-18:00)'), ('nocturno', 'Nocturno (18:00-06:00)')], max_length=10)),
+                ('tipo_proceso', models.CharField(choices=[('procesado', 'Procesado/Trilla'), ('reproceso', 'Reproceso'), ('mezcla', 'Mezcla'), ('ajuste', 'Ajuste Manual')], max_length=20)),
+                ('tipo_cafe', models.CharField(blank=True, default='', max_length=100)),
+                ('numero_procesos', models.PositiveIntegerField(default=0)),
+                ('horas_operacion', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('kg_procesados', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('kg_obtenidos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Operación',
+                'verbose_name_plural': 'Resúmenes de Operación',
+                'ordering': ['fecha', 'turno'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenTurnoPlanta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('turno', models.CharField(choices=[('diurno', 'Diurno (06:00-18:00)'), ('nocturno', 'Nocturno (18:00-06:00)')], max_length=10)),
+                ('horas_disponibles', models.DecimalField(decimal_places=2, default=12, max_digits=5)),
+                ('horas_operacion', models.DecimalField(decimal_places=2, default=0, help_text='Horas con al menos un proceso en marcha', max_digits=5)),
+                ('horas_inactivas', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('numero_brechas', models.PositiveIntegerField(default=0, help_text='Pausas entre procesos dentro del turno')),
+                ('mayor_brecha_horas', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('kg_procesados', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Turno',
+                'verbose_name_plural': 'Resúmenes de Turno',
+                'ordering': ['fecha', 'turno'],
+            },
+        ),
+        migrations.AddField(
+            model_name='resumenoperacionplanta',
+            name='operador',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_operacion', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='resumenturnoplanta',
+            unique_together={('fecha', 'turno')},
+        ),
+        migrations.AddIndex(
+            model_name='resumenoperacionplanta',
+            index=models.Index(fields=['fecha', 'turno'], name='beneficio_r_fecha_fca1f3_idx'),
+        ),
+    ]
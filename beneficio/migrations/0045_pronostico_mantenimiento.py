@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0044_resumen_planta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mantenimientoplanta',
+            name='fecha_dia_en_curso',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mantenimientoplanta',
+            name='horas_dia_en_curso',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Horas registradas en el último día con uso', max_digits=6),
+        ),
+        migrations.AddField(
+            model_name='mantenimientoplanta',
+            name='tasa_horas_dia',
+            field=models.DecimalField(decimal_places=4, default=0, help_text='Promedio móvil de horas de uso por día', max_digits=8),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:21
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+FACTORES_KG = {'kg': Decimal('1'), 'qq': Decimal('46'), 'lb': Decimal('0.453592')}
+
+
+def calcular_totales(apps, schema_editor):
+    """Carga los totales de cada comprador a partir de sus compras existentes"""
+    Comprador = apps.get_model('beneficio', 'Comprador')
+    Compra = apps.get_model('beneficio', 'Compra')
+    for comprador in Comprador.objects.all():
+        compras = Compra.objects.filter(comprador=comprador)
+        totales = compras.aggregate(numero=Count('id'), monto=Sum('monto_total'), ultima=Max('fecha_compra'))
+        pendiente = compras.exclude(estado_pago='pagado').aggregate(monto=Sum('monto_total'))['monto']
+        kg = sum(
+            (Decimal(cantidad) * FACTORES_KG.get(unidad, Decimal('1'))).quantize(Decimal('0.01'))
+            for cantidad, unidad in compras.values_list('cantidad', 'unidad')
+        )
+        Comprador.objects.filter(pk=comprador.pk).update(
+            numero_compras=totales['numero'],
+            monto_comprado=totales['monto'] or 0,
+            kg_comprados=kg,
+            monto_pendiente=pendiente or 0,
+            fecha_ultima_compra=totales['ultima'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0045_pronostico_mantenimiento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comprador',
+            name='fecha_ultima_compra',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='comprador',
+            name='kg_comprados',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='comprador',
+            name='monto_comprado',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='comprador',
+            name='monto_pendiente',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Monto de compras no pagadas por completo', max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='comprador',
+            name='numero_compras',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0046_comprador_totales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['fecha_compra', 'id'], name='beneficio_c_fecha_c_0d2bca_idx'),
+        ),
+    ]
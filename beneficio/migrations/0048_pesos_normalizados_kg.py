@@ -0,0 +1,88 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:25
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+# Factores vigentes al crear las columnas (ver beneficio/unidades.py)
+FACTORES_KG = {'kg': Decimal('1'), 'g': Decimal('0.001'), 'qq': Decimal('46'), 'lb': Decimal('0.453592')}
+ALIAS = {'kilogramos': 'kg', 'kilos': 'kg', 'gramos': 'g', 'quintales': 'qq', 'libras': 'lb'}
+
+
+def a_kg(valor, unidad):
+    unidad = (unidad or '').strip().lower()
+    factor = FACTORES_KG.get(ALIAS.get(unidad, unidad), Decimal('1'))
+    return (Decimal(valor or 0) * factor).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+
+def calcular_pesos_kg(apps, schema_editor):
+    """Llena las columnas normalizadas a kg de los registros existentes"""
+    Compra = apps.get_model('beneficio', 'Compra')
+    ReciboCafe = apps.get_model('beneficio', 'ReciboCafe')
+    Procesado = apps.get_model('beneficio', 'Procesado')
+
+    compras = list(Compra.objects.only('cantidad', 'unidad'))
+    for compra in compras:
+        compra.cantidad_kg = a_kg(compra.cantidad, compra.unidad)
+    Compra.objects.bulk_update(compras, ['cantidad_kg'], batch_size=500)
+
+    recibos = list(ReciboCafe.objects.only('peso', 'unidad'))
+    for recibo in recibos:
+        recibo.peso_kg = a_kg(recibo.peso, recibo.unidad)
+    ReciboCafe.objects.bulk_update(recibos, ['peso_kg'], batch_size=500)
+
+    procesados = list(Procesado.objects.only(
+        'peso_inicial_kg', 'unidad_peso_inicial', 'peso_final_kg', 'unidad_peso_final',
+        'cafe_primera', 'unidad_cafe_primera', 'cafe_segunda', 'unidad_cafe_segunda',
+    ))
+    for procesado in procesados:
+        procesado.peso_inicial_en_kg = a_kg(procesado.peso_inicial_kg, procesado.unidad_peso_inicial)
+        procesado.peso_final_en_kg = a_kg(procesado.peso_final_kg, procesado.unidad_peso_final)
+        procesado.cafe_primera_kg = a_kg(procesado.cafe_primera, procesado.unidad_cafe_primera)
+        procesado.cafe_segunda_kg = a_kg(procesado.cafe_segunda, procesado.unidad_cafe_segunda)
+    Procesado.objects.bulk_update(
+        procesados,
+        ['peso_inicial_en_kg', 'peso_final_en_kg', 'cafe_primera_kg', 'cafe_segunda_kg'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0047_compra_indice_fecha_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compra',
+            name='cantidad_kg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Cantidad normalizada a kg (los sacos se toman tal cual)', max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='procesado',
+            name='cafe_primera_kg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='procesado',
+            name='cafe_segunda_kg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='procesado',
+            name='peso_final_en_kg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='procesado',
+            name='peso_inicial_en_kg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='recibocafe',
+            name='peso_kg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Peso normalizado a kg', max_digits=12),
+        ),
+        migrations.RunPython(calcular_pesos_kg, migrations.RunPython.noop),
+    ]
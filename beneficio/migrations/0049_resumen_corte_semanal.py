@@ -0,0 +1,84 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def generar_resumen(apps, schema_editor):
+    """Resumen inicial de las planillas existentes (temporada de octubre a septiembre)"""
+    PlanillaSemanal = apps.get_model('beneficio', 'PlanillaSemanal')
+    RegistroDiario = apps.get_model('beneficio', 'RegistroDiario')
+    ResumenCorteSemanal = apps.get_model('beneficio', 'ResumenCorteSemanal')
+
+    filas = []
+    for planilla in PlanillaSemanal.objects.all():
+        inicio = planilla.fecha_inicio.year if planilla.fecha_inicio.month >= 10 else planilla.fecha_inicio.year - 1
+        grupos = {}
+        for registro in RegistroDiario.objects.filter(planilla=planilla).select_related('tipo_cafe'):
+            if registro.tipo_cafe:
+                tipo = registro.tipo_cafe.nombre
+            else:
+                tipo = registro.tipo_cafe_manual or "No especificado"
+            grupo = grupos.setdefault((registro.trabajador_id, tipo), {'libras': 0, 'dias': set()})
+            grupo['libras'] += registro.libras_cortadas
+            grupo['dias'].add(registro.dia_semana)
+        for (trabajador_id, tipo), grupo in grupos.items():
+            filas.append(ResumenCorteSemanal(
+                planilla=planilla,
+                trabajador_id=trabajador_id,
+                tipo_cafe=tipo,
+                semana=planilla.fecha_inicio,
+                temporada=f"{inicio}-{inicio + 1}",
+                dias_trabajados=len(grupo['dias']),
+                libras_cortadas=grupo['libras'],
+            ))
+    ResumenCorteSemanal.objects.bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0048_pesos_normalizados_kg'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCorteSemanal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_cafe', models.CharField(max_length=100)),
+                ('semana', models.DateField(help_text='Fecha de inicio de la planilla')),
+                ('temporada', models.CharField(help_text='Cosecha de octubre a septiembre, p. ej. 2025-2026', max_length=9)),
+                ('dias_trabajados', models.PositiveIntegerField(default=0)),
+                ('libras_cortadas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Corte Semanal',
+                'verbose_name_plural': 'Resúmenes de Corte Semanal',
+                'ordering': ['semana', 'trabajador'],
+            },
+        ),
+        migrations.AddField(
+            model_name='resumencortesemanal',
+            name='planilla',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_corte', to='beneficio.planillasemanal'),
+        ),
+        migrations.AddField(
+            model_name='resumencortesemanal',
+            name='trabajador',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_corte', to='beneficio.trabajador'),
+        ),
+        migrations.AddIndex(
+            model_name='resumencortesemanal',
+            index=models.Index(fields=['temporada', 'semana'], name='beneficio_r_tempora_f15c7b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumencortesemanal',
+            index=models.Index(fields=['temporada', 'trabajador'], name='beneficio_r_tempora_e76d01_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='resumencortesemanal',
+            unique_together={('planilla', 'trabajador', 'tipo_cafe')},
+        ),
+        migrations.RunPython(generar_resumen, migrations.RunPython.noop),
+    ]
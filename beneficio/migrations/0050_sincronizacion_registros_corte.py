@@ -0,0 +1,60 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0049_resumen_corte_semanal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OperacionSincronizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, unique=True)),
+                ('aplicada_en', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Operación de Sincronización',
+                'verbose_name_plural': 'Operaciones de Sincronización',
+                'ordering': ['-aplicada_en'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RegistroDiarioEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registro_id', models.PositiveIntegerField()),
+                ('planilla_id', models.PositiveIntegerField()),
+                ('trabajador_id', models.PositiveIntegerField()),
+                ('dia_semana', models.CharField(max_length=10)),
+                ('fecha', models.DateField()),
+                ('eliminado_en', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Registro Diario Eliminado',
+                'verbose_name_plural': 'Registros Diarios Eliminados',
+                'ordering': ['eliminado_en'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='registrodiario',
+            index=models.Index(fields=['updated_at', 'id'], name='beneficio_r_updated_eadc04_idx'),
+        ),
+        migrations.AddField(
+            model_name='operacionsincronizacion',
+            name='registro',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='operaciones_sincronizacion', to='beneficio.registrodiario'),
+        ),
+        migrations.AddField(
+            model_name='operacionsincronizacion',
+            name='usuario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:38
+
+import beneficio.models
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0050_sincronizacion_registros_corte'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(beneficio.models.ClaseOperadores(django.db.models.functions.text.Upper('tipo_cafe'), name='text_pattern_ops'), name='lote_tipo_cafe_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(beneficio.models.ClaseOperadores(django.db.models.functions.text.Upper('proveedor'), name='text_pattern_ops'), name='lote_proveedor_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='procesado',
+            index=models.Index(fields=['numero_trilla'], name='procesado_trilla_like_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='reproceso',
+            index=models.Index(beneficio.models.ClaseOperadores(django.db.models.functions.text.Upper('nombre'), name='text_pattern_ops'), name='reproceso_nombre_upper_idx'),
+        ),
+    ]
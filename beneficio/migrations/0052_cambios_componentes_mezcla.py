@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0051_autocompletado_productos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioComponenteMezcla',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lote_codigo', models.CharField(max_length=50)),
+                ('accion', models.CharField(choices=[('agregado', 'Agregado'), ('modificado', 'Modificado'), ('eliminado', 'Eliminado')], max_length=20)),
+                ('peso_anterior_kg', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('peso_nuevo_kg', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Cambio de Componente de Mezcla',
+                'verbose_name_plural': 'Cambios de Componentes de Mezcla',
+                'ordering': ['-fecha', 'lote_codigo'],
+            },
+        ),
+        migrations.AddField(
+            model_name='cambiocomponentemezcla',
+            name='lote',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cambios_mezcla', to='beneficio.lote'),
+        ),
+        migrations.AddField(
+            model_name='cambiocomponentemezcla',
+            name='mezcla',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cambios_componentes', to='beneficio.mezcla'),
+        ),
+        migrations.AddField(
+            model_name='cambiocomponentemezcla',
+            name='usuario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cambios_mezcla', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0052_cambios_componentes_mezcla'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenRendimientoMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primer día del mes')),
+                ('proveedor', models.CharField(blank=True, default='', max_length=200)),
+                ('tipo_cafe', models.CharField(blank=True, default='', max_length=100)),
+                ('numero_trillas', models.PositiveIntegerField(default=0)),
+                ('kg_entrada', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('kg_salida', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('catadura', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('rechazo_electronica', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('bajo_zaranda', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('barridos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('rendimiento_p10', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('rendimiento_p50', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('rendimiento_p90', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Rendimiento',
+                'verbose_name_plural': 'Resúmenes de Rendimiento',
+                'ordering': ['mes', 'proveedor', 'tipo_cafe'],
+            },
+        ),
+        migrations.AddField(
+            model_name='resumenrendimientomensual',
+            name='operador',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_rendimiento', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='resumenrendimientomensual',
+            index=models.Index(fields=['mes', 'proveedor'], name='beneficio_r_mes_2b69d9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumenrendimientomensual',
+            index=models.Index(fields=['mes', 'tipo_cafe'], name='beneficio_r_mes_e09298_idx'),
+        ),
+    ]
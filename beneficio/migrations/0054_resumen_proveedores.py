@@ -0,0 +1,66 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0053_resumen_rendimiento_mensual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(help_text='UPPER(proveedor)', max_length=200, unique=True)),
+                ('proveedor', models.CharField(max_length=200)),
+                ('numero_lotes', models.PositiveIntegerField(default=0)),
+                ('kg_entregados', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('precio_promedio_quintal', models.DecimalField(blank=True, decimal_places=2, help_text='Promedio ponderado por kg de los lotes', max_digits=10, null=True)),
+                ('primera_entrega', models.DateTimeField(blank=True, null=True)),
+                ('ultima_entrega', models.DateTimeField(blank=True, null=True)),
+                ('numero_recibos', models.PositiveIntegerField(default=0)),
+                ('kg_recibos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('monto_recibos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('numero_trillas', models.PositiveIntegerField(default=0)),
+                ('kg_trillados', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('kg_oro', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('rendimiento', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('numero_cataciones', models.PositiveIntegerField(default=0)),
+                ('puntaje_promedio', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('puntaje_maximo', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Proveedor',
+                'verbose_name_plural': 'Resúmenes de Proveedores',
+                'ordering': ['-kg_entregados'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='resumenproveedor',
+            index=models.Index(fields=['proveedor'], name='beneficio_r_proveed_54dcdf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumenproveedor',
+            index=models.Index(fields=['kg_entregados'], name='beneficio_r_kg_entr_7dce99_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumenproveedor',
+            index=models.Index(fields=['precio_promedio_quintal'], name='beneficio_r_precio__f0ad6f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumenproveedor',
+            index=models.Index(fields=['rendimiento'], name='beneficio_r_rendimi_a02a42_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumenproveedor',
+            index=models.Index(fields=['puntaje_promedio'], name='beneficio_r_puntaje_6764d8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumenproveedor',
+            index=models.Index(fields=['ultima_entrega'], name='beneficio_r_ultima__a58de2_idx'),
+        ),
+    ]
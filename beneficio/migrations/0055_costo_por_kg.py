@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0054_resumen_proveedores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lote',
+            name='costo_kg',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, help_text='Costo promedio ponderado por kg (precio de ingreso y recibos; ver costos.py)', max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='mezcla',
+            name='costo_kg',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, help_text='Costo por kg ponderado de sus componentes (ver costos.py)', max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='procesado',
+            name='costo_kg',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, help_text='Costo por kg obtenido (ver costos.py)', max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='reproceso',
+            name='costo_kg',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, help_text='Costo por kg obtenido (ver costos.py)', max_digits=12, null=True),
+        ),
+    ]
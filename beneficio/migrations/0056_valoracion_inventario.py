@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0055_costo_por_kg'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValoracionInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(db_index=True)),
+                ('tipo_producto', models.CharField(choices=[('lote', 'Lote'), ('procesado', 'Procesado'), ('reproceso', 'Reproceso'), ('mezcla', 'Mezcla'), ('partida', 'Partida')], max_length=20)),
+                ('numero_productos', models.PositiveIntegerField(default=0)),
+                ('kg_disponibles', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('kg_sin_costo', models.DecimalField(decimal_places=2, default=0, help_text='Kg sin costo por kg calculado (no suman al valor)', max_digits=14)),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('generado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Valoración de Inventario',
+                'verbose_name_plural': 'Valoraciones de Inventario',
+                'ordering': ['-fecha', 'bodega', 'tipo_producto'],
+            },
+        ),
+        migrations.AddField(
+            model_name='valoracioninventario',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='valoraciones', to='beneficio.bodega'),
+        ),
+    ]
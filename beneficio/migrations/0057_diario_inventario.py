@@ -0,0 +1,85 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0056_valoracion_inventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('tipo_producto', models.CharField(choices=[('lote', 'Lote'), ('procesado', 'Procesado'), ('reproceso', 'Reproceso'), ('mezcla', 'Mezcla'), ('partida', 'Partida')], max_length=20)),
+                ('producto_id', models.PositiveIntegerField()),
+                ('kg', models.DecimalField(decimal_places=2, help_text='Positivo = entrada, negativo = salida', max_digits=14)),
+                ('origen', models.CharField(choices=[('lote', 'Ingreso de lote'), ('recibo', 'Recibo de café'), ('procesado', 'Trilla'), ('reproceso', 'Reproceso'), ('componente_mezcla', 'Componente de mezcla'), ('subpartida', 'Ingreso de subpartida'), ('movimiento_subpartida', 'Salida de subpartida'), ('venta', 'Venta'), ('exportacion', 'Exportación'), ('traslado', 'Traslado entre bodegas')], max_length=30)),
+                ('origen_id', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Inventario',
+                'verbose_name_plural': 'Movimientos de Inventario',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PuntoControlInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('ultimo_movimiento_id', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Punto de Control de Inventario',
+                'verbose_name_plural': 'Puntos de Control de Inventario',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoPuntoControl',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_producto', models.CharField(choices=[('lote', 'Lote'), ('procesado', 'Procesado'), ('reproceso', 'Reproceso'), ('mezcla', 'Mezcla'), ('partida', 'Partida')], max_length=20)),
+                ('producto_id', models.PositiveIntegerField()),
+                ('kg', models.DecimalField(decimal_places=2, max_digits=14)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_inventario', to='beneficio.bodega'),
+        ),
+        migrations.AddField(
+            model_name='saldopuntocontrol',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='saldos_punto_control', to='beneficio.bodega'),
+        ),
+        migrations.AddField(
+            model_name='saldopuntocontrol',
+            name='punto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='beneficio.puntocontrolinventario'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['origen', 'origen_id'], name='beneficio_m_origen_dc31b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['tipo_producto', 'producto_id'], name='beneficio_m_tipo_pr_9d30fe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['bodega', 'fecha'], name='beneficio_m_bodega__078814_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saldopuntocontrol',
+            index=models.Index(fields=['punto', 'bodega'], name='beneficio_s_punto_i_00eadd_idx'),
+        ),
+    ]
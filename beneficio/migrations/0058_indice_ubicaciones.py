@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-10-19 14:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0057_diario_inventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContenidoUbicacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_producto', models.CharField(choices=[('lote', 'Lote'), ('procesado', 'Procesado'), ('reproceso', 'Reproceso'), ('mezcla', 'Mezcla'), ('partida', 'Partida')], max_length=20)),
+                ('producto_id', models.PositiveIntegerField()),
+                ('codigo', models.CharField(blank=True, max_length=50)),
+                ('kg', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Contenido de Ubicación',
+                'verbose_name_plural': 'Contenidos de Ubicación',
+            },
+        ),
+        migrations.CreateModel(
+            name='UbicacionBodega',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('percha', models.CharField(blank=True, default='', max_length=100)),
+                ('fila', models.CharField(blank=True, default='', max_length=50)),
+                ('activo', models.BooleanField(default=True, help_text='Las inactivas no se proponen como libres')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Ubicación de Bodega',
+                'verbose_name_plural': 'Ubicaciones de Bodega',
+                'ordering': ['bodega', 'percha', 'fila'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ubicacionbodega',
+            name='bodega',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ubicaciones', to='beneficio.bodega'),
+        ),
+        migrations.AddField(
+            model_name='contenidoubicacion',
+            name='ubicacion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contenido', to='beneficio.ubicacionbodega'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ubicacionbodega',
+            unique_together={('bodega', 'percha', 'fila')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='contenidoubicacion',
+            unique_together={('tipo_producto', 'producto_id')},
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0058_indice_ubicaciones'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='subpartida',
+            old_name='etiqueta',
+            new_name='etiqueta_texto',
+        ),
+        migrations.AddField(
+            model_name='subpartida',
+            name='etiqueta',
+            field=models.ForeignKey(blank=True, help_text='Etiqueta del lote', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='subpartidas', to='beneficio.etiquetalote'),
+        ),
+    ]
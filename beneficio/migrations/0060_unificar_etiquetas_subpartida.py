@@ -0,0 +1,69 @@
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def unificar_etiquetas(apps, schema_editor):
+    """
+    Pasa el texto de cada subpartida a la etiqueta del catálogo. Las variantes
+    de mayúsculas ("Premium", "PREMIUM ") se unen en una sola: se conserva la
+    etiqueta del catálogo más antigua y, si no hay, el texto más usado.
+    """
+    EtiquetaLote = apps.get_model('beneficio', 'EtiquetaLote')
+    SubPartida = apps.get_model('beneficio', 'SubPartida')
+
+    # {texto tal cual está guardado: número de subpartidas}
+    textos = Counter(dict(
+        SubPartida.objects.exclude(etiqueta_texto__isnull=True).values_list('etiqueta_texto').annotate(
+            total=models.Count('id'),
+        ).order_by()
+    ))
+    variantes = defaultdict(Counter)
+    for texto, total in textos.items():
+        if texto.strip():
+            variantes[texto.strip().upper()][texto.strip()] += total
+
+    principales = {}
+    for etiqueta in EtiquetaLote.objects.order_by('pk'):
+        clave = etiqueta.nombre.strip().upper()
+        if clave in principales:
+            etiqueta.delete()
+        else:
+            principales[clave] = etiqueta
+    # Los nombres se guardan sin espacios alrededor (EtiquetaLote.save hace lo mismo)
+    for etiqueta in principales.values():
+        if etiqueta.nombre != etiqueta.nombre.strip():
+            etiqueta.nombre = etiqueta.nombre.strip()
+            etiqueta.save(update_fields=['nombre'])
+    for clave, conteo in variantes.items():
+        if clave not in principales:
+            principales[clave] = EtiquetaLote.objects.create(nombre=conteo.most_common(1)[0][0])
+
+    for texto in textos:
+        if texto.strip():
+            SubPartida.objects.filter(etiqueta_texto=texto).update(etiqueta=principales[texto.strip().upper()])
+
+
+def copiar_nombres(apps, schema_editor):
+    EtiquetaLote = apps.get_model('beneficio', 'EtiquetaLote')
+    SubPartida = apps.get_model('beneficio', 'SubPartida')
+    SubPartida.objects.filter(etiqueta__isnull=False).update(etiqueta_texto=Subquery(
+        EtiquetaLote.objects.filter(pk=OuterRef('etiqueta_id')).values('nombre')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+    """
+    Solo datos: en PostgreSQL las actualizaciones dejan eventos de trigger
+    pendientes en subpartidas (la FK es diferida) y un ALTER TABLE en la misma
+    transacción fallaría, por eso el cambio de esquema va en 0059 y 0061.
+    """
+
+    dependencies = [
+        ('beneficio', '0059_subpartida_etiqueta_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(unificar_etiquetas, copiar_nombres),
+    ]
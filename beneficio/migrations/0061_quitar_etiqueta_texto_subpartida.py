@@ -0,0 +1,20 @@
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0060_unificar_etiquetas_subpartida'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='subpartida',
+            name='etiqueta_texto',
+        ),
+        migrations.AddConstraint(
+            model_name='etiquetalote',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper(django.db.models.functions.text.Trim('nombre')), name='etiqueta_lote_nombre_upper_uniq'),
+        ),
+    ]
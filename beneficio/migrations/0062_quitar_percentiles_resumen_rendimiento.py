@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0061_quitar_etiqueta_texto_subpartida'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='resumenrendimientomensual',
+            name='rendimiento_p10',
+        ),
+        migrations.RemoveField(
+            model_name='resumenrendimientomensual',
+            name='rendimiento_p50',
+        ),
+        migrations.RemoveField(
+            model_name='resumenrendimientomensual',
+            name='rendimiento_p90',
+        ),
+    ]
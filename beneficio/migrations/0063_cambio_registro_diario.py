@@ -0,0 +1,70 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def poblar_bitacora(apps, schema_editor):
+    """
+    Una fila por registro existente (en el orden del cursor anterior, updated_at
+    e id) y una por cada borrado ya anotado, intercaladas por momento: así los
+    dispositivos que sincronicen desde cero o con un cursor viejo lo reciben todo.
+    """
+    RegistroDiario = apps.get_model('beneficio', 'RegistroDiario')
+    RegistroDiarioEliminado = apps.get_model('beneficio', 'RegistroDiarioEliminado')
+    CambioRegistroDiario = apps.get_model('beneficio', 'CambioRegistroDiario')
+
+    campos = ('planilla_id', 'trabajador_id', 'dia_semana', 'fecha')
+    cambios = [
+        CambioRegistroDiario(registro_id=fila['id'], momento=fila['updated_at'], **{campo: fila[campo] for campo in campos})
+        for fila in RegistroDiario.objects.values('id', 'updated_at', *campos).iterator()
+    ] + [
+        CambioRegistroDiario(
+            registro_id=fila['registro_id'], momento=fila['eliminado_en'], eliminado=True,
+            **{campo: fila[campo] for campo in campos},
+        )
+        for fila in RegistroDiarioEliminado.objects.values('registro_id', 'eliminado_en', *campos).iterator()
+    ]
+    cambios.sort(key=lambda cambio: (cambio.momento, cambio.eliminado, cambio.registro_id))
+    CambioRegistroDiario.objects.bulk_create(cambios, batch_size=1000)
+
+
+def restaurar_eliminados(apps, schema_editor):
+    RegistroDiarioEliminado = apps.get_model('beneficio', 'RegistroDiarioEliminado')
+    CambioRegistroDiario = apps.get_model('beneficio', 'CambioRegistroDiario')
+
+    RegistroDiarioEliminado.objects.bulk_create([
+        RegistroDiarioEliminado(
+            registro_id=cambio.registro_id, planilla_id=cambio.planilla_id, trabajador_id=cambio.trabajador_id,
+            dia_semana=cambio.dia_semana, fecha=cambio.fecha, eliminado_en=cambio.momento,
+        )
+        for cambio in CambioRegistroDiario.objects.filter(eliminado=True).iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    """El cambio de esquema (quitar RegistroDiarioEliminado) va aparte en 0064, como en 0060"""
+
+    dependencies = [
+        ('beneficio', '0062_quitar_percentiles_resumen_rendimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioRegistroDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registro_id', models.PositiveIntegerField()),
+                ('planilla_id', models.PositiveIntegerField(db_index=True)),
+                ('trabajador_id', models.PositiveIntegerField()),
+                ('dia_semana', models.CharField(max_length=10)),
+                ('fecha', models.DateField()),
+                ('eliminado', models.BooleanField(default=False)),
+                ('momento', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Cambio de Registro Diario',
+                'verbose_name_plural': 'Cambios de Registros Diarios',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(poblar_bitacora, restaurar_eliminados),
+    ]
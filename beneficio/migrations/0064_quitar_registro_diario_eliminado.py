@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficio', '0063_cambio_registro_diario'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='RegistroDiarioEliminado',
+        ),
+        migrations.RemoveIndex(
+            model_name='registrodiario',
+            name='beneficio_r_updated_eadc04_idx',
+        ),
+    ]
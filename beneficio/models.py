@@ -2,9 +2,26 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.contrib.postgres.indexes import OpClass
 from django.db.models import Sum, Max
+from django.db.models.functions import Trim, Upper
 from decimal import Decimal
 
+from .unidades import a_kg, describir_sacos, kg_a_libras, kg_a_quintales, kg_a_quintales_venta
+
+
+class ClaseOperadores(OpClass):
+    """
+    OpClass para índices de prefijo (LIKE 'x%'). En PostgreSQL con intercalación
+    distinta de C un índice btree normal no sirve para LIKE; en SQLite (desarrollo)
+    la clase de operadores no existe y se indexa la expresión sola.
+    """
+
+    def as_sql(self, compiler, connection, **extra_context):
+        if connection.vendor != 'postgresql':
+            return compiler.compile(self.get_source_expressions()[0])
+        return super().as_sql(compiler, connection, **extra_context)
+
 # MODELOS BÁSICOS DEL SISTEMA
 
 class TipoCafe(models.Model):
@@ -66,6 +83,8 @@ class Lote(models.Model):
     fecha_ingreso = models.DateTimeField()
     proveedor = models.CharField(max_length=200)
     precio_quintal = models.DecimalField(max_digits=10, decimal_places=2)
+    costo_kg = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, editable=False,
+                                   help_text="Costo promedio ponderado por kg (precio de ingreso y recibos; ver costos.py)")
     observaciones = models.TextField(blank=True, null=True)
     activo = models.BooleanField(default=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
@@ -73,6 +92,13 @@ class Lote(models.Model):
     
     class Meta:
         ordering = ['-fecha_ingreso']
+        indexes = [
+            # Autocompletado de productos (beneficio/busqueda.py): __istartswith compila a
+            # UPPER(campo::text) LIKE 'X%', que solo usa un índice sobre la misma expresión
+            # con text_pattern_ops (la intercalación de la base no es C)
+            models.Index(ClaseOperadores(Upper('tipo_cafe'), name='text_pattern_ops'), name='lote_tipo_cafe_upper_idx'),
+            models.Index(ClaseOperadores(Upper('proveedor'), name='text_pattern_ops'), name='lote_proveedor_upper_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.codigo:
@@ -107,16 +133,13 @@ class Lote(models.Model):
     @property
     def peso_total_recibido(self):
         """Retorna el peso total de todos los recibos adicionales en kg"""
-        total_kg = 0
-        for recibo in self.recibos.all():
-            total_kg += recibo.convertir_a_kg()
-        return Decimal(str(total_kg))
+        return self.recibos.aggregate(total=Sum('peso_kg'))['total'] or Decimal('0')
     
     @property
     def monto_total_invertido(self):
         """Retorna el monto total invertido en este lote (inicial + recibos)"""
         # Inversión inicial del lote
-        peso_inicial_qq = Decimal(str(self.peso_kg)) / Decimal('46')
+        peso_inicial_qq = kg_a_quintales(self.peso_kg)
         inversion_inicial = peso_inicial_qq * self.precio_quintal
         
         # Sumar recibos adicionales
@@ -264,6 +287,15 @@ class Procesado(models.Model):
     cafe_segunda = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     unidad_cafe_segunda = models.CharField(max_length=20, default='kg')
     
+    # Pesos normalizados a kg (se calculan al guardar según las unidades)
+    peso_inicial_en_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    peso_final_en_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    cafe_primera_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    cafe_segunda_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
+    costo_kg = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, editable=False,
+                                   help_text="Costo por kg obtenido (ver costos.py)")
+    
     # Mermas
     catadura = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     rechazo_electronica = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -277,6 +309,11 @@ class Procesado(models.Model):
         verbose_name = "Procesado"
         verbose_name_plural = "Procesados"
         ordering = ['-fecha']
+        indexes = [
+            # Autocompletado por código de trilla (__startswith, LIKE 'T-00%')
+            models.Index(fields=['numero_trilla'], name='procesado_trilla_like_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
     
     def save(self, *args, **kwargs):
         # CORREGIDO: Detectar si es nuevo ANTES del super().save()
@@ -288,6 +325,15 @@ class Procesado(models.Model):
             siguiente_numero = (ultimo_procesado or 0) + 1
             self.numero_trilla = f"T-{siguiente_numero:04d}"
         
+        self.peso_inicial_en_kg = a_kg(self.peso_inicial_kg, self.unidad_peso_inicial)
+        self.peso_final_en_kg = a_kg(self.peso_final_kg, self.unidad_peso_final)
+        self.cafe_primera_kg = a_kg(self.cafe_primera, self.unidad_cafe_primera)
+        self.cafe_segunda_kg = a_kg(self.cafe_segunda, self.unidad_cafe_segunda)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {
+                'peso_inicial_en_kg', 'peso_final_en_kg', 'cafe_primera_kg', 'cafe_segunda_kg',
+            }
+        
         super().save(*args, **kwargs)
         
         # Sumar horas al control de mantenimiento
@@ -314,8 +360,7 @@ class Procesado(models.Model):
             duracion_horas = (final - inicio).seconds / 3600
             
             try:
-                control = MantenimientoPlanta.get_or_create_control()
-                control.agregar_horas(duracion_horas)
+                MantenimientoPlanta.registrar_uso(duracion_horas, procesado=self)
             except Exception as e:
                 # No fallar el guardado si hay error en mantenimiento
                 print(f"Error al actualizar mantenimiento: {e}")
@@ -354,70 +399,22 @@ class Procesado(models.Model):
             return f"{horas}h {minutos}min"
         return "No registrado"
     
-    # ========== PROPIEDADES PARA SACOS DE 1.52 LB (69 KG) ==========
+    # ========== PROPIEDADES PARA SACOS DE 152 LB (69 KG) ==========
     
     @property
     def sacos_cafe_primera(self):
         """Calcula sacos de 152 lb (69kg) para café de primera"""
         if self.cafe_primera <= 0:
             return "Sin café 1ra"
-        
-        peso_valor = float(self.cafe_primera)
-        
-        # Convertir TODO a LIBRAS primero
-        if self.unidad_cafe_primera == 'kg':
-            peso_lb = peso_valor / 0.453592  # kg a libras
-        elif self.unidad_cafe_primera == 'qq' or self.unidad_cafe_primera == 'quintales':
-            peso_lb = (peso_valor * 46) / 0.453592  # qq → kg → libras
-        elif self.unidad_cafe_primera == 'lb' or self.unidad_cafe_primera == 'libras':
-            peso_lb = peso_valor  # Ya está en libras
-        else:
-            peso_lb = peso_valor  # Por defecto asumir que está en libras
-        
-        # 1 saco = 152 libras
-        sacos_completos = int(peso_lb // 152)
-        sobrante_lb = peso_lb % 152
-        
-        if sacos_completos == 0:
-            # Menos de 1 saco
-            return f"1 saco de {sobrante_lb:.2f} lb ({sobrante_lb * 0.453592:.2f} kg)"
-        elif sobrante_lb < 1:  # Despreciar sobrantes menores a 1 lb
-            return f"{sacos_completos} sacos de 152 lb (69 kg)"
-        else:
-            # Mostrar sacos completos + sobrante
-            return f"{sacos_completos} sacos de 152 lb + 1 de {sobrante_lb:.2f} lb ({sobrante_lb * 0.453592:.2f} kg)"
+        return describir_sacos(self.cafe_primera, self.unidad_cafe_primera)
     
     @property
     def sacos_cafe_segunda(self):
         """Calcula sacos de 152 lb (69kg) para café de segunda"""
         if self.cafe_segunda <= 0:
             return "Sin café 2da"
-        
-        peso_valor = float(self.cafe_segunda)
-        
-        # Convertir TODO a LIBRAS primero
-        if self.unidad_cafe_segunda == 'kg':
-            peso_lb = peso_valor / 0.453592  # kg a libras
-        elif self.unidad_cafe_segunda == 'qq' or self.unidad_cafe_segunda == 'quintales':
-            peso_lb = (peso_valor * 46) / 0.453592  # qq → kg → libras
-        elif self.unidad_cafe_segunda == 'lb' or self.unidad_cafe_segunda == 'libras':
-            peso_lb = peso_valor  # Ya está en libras
-        else:
-            peso_lb = peso_valor  # Por defecto asumir que está en libras
-        
-        # 1 saco = 152 libras
-        sacos_completos = int(peso_lb // 152)
-        sobrante_lb = peso_lb % 152
-        
-        if sacos_completos == 0:
-            # Menos de 1 saco
-            return f"1 saco de {sobrante_lb:.2f} lb ({sobrante_lb * 0.453592:.2f} kg)"
-        elif sobrante_lb < 1:  # Despreciar sobrantes menores a 1 lb
-            return f"{sacos_completos} sacos de 152 lb (69 kg)"
-        else:
-            # Mostrar sacos completos + sobrante
-            return f"{sacos_completos} sacos de 152 lb + 1 de {sobrante_lb:.2f} lb ({sobrante_lb * 0.453592:.2f} kg)"
-        
+        return describir_sacos(self.cafe_segunda, self.unidad_cafe_segunda)
+    
     @property
     def esta_vendido(self):
         """Verifica si el procesado tiene ventas asociadas completadas"""
@@ -523,6 +520,9 @@ class Reproceso(models.Model):
     unidad_cafe_primera = models.CharField(max_length=20, default='kg')
     cafe_segunda = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     unidad_cafe_segunda = models.CharField(max_length=20, default='kg')
+
+    costo_kg = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, editable=False,
+                                   help_text="Costo por kg obtenido (ver costos.py)")
     
     # Mermas
     catadura = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -536,6 +536,10 @@ class Reproceso(models.Model):
     
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            # Autocompletado por nombre (__istartswith), ver Meta de Lote
+            models.Index(ClaseOperadores(Upper('nombre'), name='text_pattern_ops'), name='reproceso_nombre_upper_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         is_new = self.pk is None
@@ -572,8 +576,7 @@ class Reproceso(models.Model):
             duracion_horas = (final - inicio).seconds / 3600
             
             try:
-                control = MantenimientoPlanta.get_or_create_control()
-                control.agregar_horas(duracion_horas)
+                MantenimientoPlanta.registrar_uso(duracion_horas, reproceso=self)
             except Exception as e:
                 print(f"Error al actualizar mantenimiento: {e}")
     
@@ -607,65 +610,22 @@ class Reproceso(models.Model):
             return f"{horas}h {minutos}min"
         return "No registrado"
     
-    # ========== PROPIEDADES PARA SACOS DE 1.52 LB (69 KG) ==========
+    # ========== PROPIEDADES PARA SACOS DE 152 LB (69 KG) ==========
     
     @property
     def sacos_cafe_primera(self):
-        """Calcula sacos de 1.52 lb (69kg) para café de primera"""
+        """Calcula sacos de 152 lb (69kg) para café de primera"""
         if self.cafe_primera <= 0:
             return "Sin café 1ra"
-        
-        # Convertir a libras
-        peso_lb = float(self.cafe_primera)
-        if self.unidad_cafe_primera == 'kg':
-            peso_lb = peso_lb / 0.453592  # 1 kg = 2.20462 lb
-        elif self.unidad_cafe_primera == 'qq':
-            peso_lb = (peso_lb * 46) / 0.453592  # qq a kg a lb
-        
-        # 1 saco = 1.52 lb = 69 kg
-        saco_lb = 1.52
-        sacos_completos = int(peso_lb // saco_lb)
-        sobrante_lb = peso_lb % saco_lb
-        
-        if sacos_completos == 0:
-            # Menos de 1 saco - mostrar el sobrante en lb y kg
-            kg_sobrante = sobrante_lb * 0.453592
-            return f"1 saco de {sobrante_lb:.2f} lb ({kg_sobrante:.0f} kg)"
-        elif sobrante_lb < 0.05:  # Despreciar sobrantes menores a 0.05 lb
-            return f"{sacos_completos} sacos de 1.52 lb (69 kg)"
-        else:
-            # Mostrar sacos completos + sobrante
-            kg_sobrante = sobrante_lb * 0.453592
-            return f"{sacos_completos} sacos de 1.52 lb + 1 de {sobrante_lb:.2f} lb ({kg_sobrante:.0f} kg)"
+        return describir_sacos(self.cafe_primera, self.unidad_cafe_primera)
     
     @property
     def sacos_cafe_segunda(self):
-        """Calcula sacos de 1.52 lb (69kg) para café de segunda"""
+        """Calcula sacos de 152 lb (69kg) para café de segunda"""
         if self.cafe_segunda <= 0:
             return "Sin café 2da"
-        
-        # Convertir a libras
-        peso_lb = float(self.cafe_segunda)
-        if self.unidad_cafe_segunda == 'kg':
-            peso_lb = peso_lb / 0.453592  # 1 kg = 2.20462 lb
-        elif self.unidad_cafe_segunda == 'qq':
-            peso_lb = (peso_lb * 46) / 0.453592  # qq a kg a lb
-        
-        # 1 saco = 1.52 lb = 69 kg
-        saco_lb = 1.52
-        sacos_completos = int(peso_lb // saco_lb)
-        sobrante_lb = peso_lb % saco_lb
-        
-        if sacos_completos == 0:
-            # Menos de 1 saco
-            kg_sobrante = sobrante_lb * 0.453592
-            return f"1 saco de {sobrante_lb:.2f} lb ({kg_sobrante:.0f} kg)"
-        elif sobrante_lb < 0.05:
-            return f"{sacos_completos} sacos de 1.52 lb (69 kg)"
-        else:
-            # Mostrar sacos completos + sobrante
-            kg_sobrante = sobrante_lb * 0.453592
-            return f"{sacos_completos} sacos de 1.52 lb + 1 de {sobrante_lb:.2f} lb ({kg_sobrante:.0f} kg)"
+        return describir_sacos(self.cafe_segunda, self.unidad_cafe_segunda)
+    
     @property
     def peso_procesado(self):
         """
@@ -771,6 +731,8 @@ class Mezcla(models.Model):
     numero = models.PositiveIntegerField(unique=True, editable=False)
     fecha = models.DateTimeField(default=timezone.now)
     peso_total_kg = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    costo_kg = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, editable=False,
+                                   help_text="Costo por kg ponderado de sus componentes (ver costos.py)")
     descripcion = models.TextField()
     destino = models.CharField(max_length=200)
     responsable = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='mezclas_responsables')
@@ -809,8 +771,17 @@ class Mezcla(models.Model):
         # NUEVO: Sumar horas al control de mantenimiento
         if is_new and self.hora_inicio and self.hora_final:
             from datetime import datetime, timedelta
-            inicio = datetime.combine(datetime.today(), self.hora_inicio)
-            final = datetime.combine(datetime.today(), self.hora_final)
+
+            # Desde el formulario llegan como texto 'HH:MM'
+            hora_inicio = self.hora_inicio
+            if isinstance(hora_inicio, str):
+                hora_inicio = datetime.strptime(hora_inicio, '%H:%M').time()
+            hora_final = self.hora_final
+            if isinstance(hora_final, str):
+                hora_final = datetime.strptime(hora_final, '%H:%M').time()
+
+            inicio = datetime.combine(datetime.today(), hora_inicio)
+            final = datetime.combine(datetime.today(), hora_final)
             
             if final < inicio:
                 final += timedelta(days=1)
@@ -818,8 +789,7 @@ class Mezcla(models.Model):
             duracion_horas = (final - inicio).seconds / 3600
             
             # Agregar horas al control
-            control = MantenimientoPlanta.get_or_create_control()
-            control.agregar_horas(duracion_horas)
+            MantenimientoPlanta.registrar_uso(duracion_horas, mezcla=self)
         
     def __str__(self):
         return f"Mezcla No.{self.numero} - {self.fecha.strftime('%d/%m/%Y')}"
@@ -883,6 +853,33 @@ class DetalleMezcla(models.Model):
     def __str__(self):
         return f"Lote {self.lote.codigo} en Mezcla {self.mezcla.numero}"
 
+
+class CambioComponenteMezcla(models.Model):
+    """Constancia de cada componente agregado, modificado o quitado al editar una mezcla"""
+    ACCION_CHOICES = [
+        ('agregado', 'Agregado'),
+        ('modificado', 'Modificado'),
+        ('eliminado', 'Eliminado'),
+    ]
+
+    mezcla = models.ForeignKey(Mezcla, on_delete=models.CASCADE, related_name='cambios_componentes')
+    lote = models.ForeignKey(Lote, on_delete=models.SET_NULL, null=True, blank=True, related_name='cambios_mezcla')
+    lote_codigo = models.CharField(max_length=50)  # se conserva aunque el lote se borre
+    accion = models.CharField(max_length=20, choices=ACCION_CHOICES)
+    peso_anterior_kg = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    peso_nuevo_kg = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='cambios_mezcla')
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-fecha', 'lote_codigo']
+        verbose_name = "Cambio de Componente de Mezcla"
+        verbose_name_plural = "Cambios de Componentes de Mezcla"
+
+    def __str__(self):
+        return f"Mezcla {self.mezcla_id} - {self.get_accion_display()} lote {self.lote_codigo}"
+
 class Catacion(models.Model):
     """Modelo para evaluación de catación según estándares SCA 2025"""
     TIPO_MUESTRA = [
@@ -1201,6 +1198,16 @@ class Comprador(models.Model):
     activo = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+
+    # Totales acumulados (los mantiene Compra.save/delete, no se editan a mano)
+    numero_compras = models.PositiveIntegerField(default=0, editable=False)
+    monto_comprado = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    kg_comprados = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    monto_pendiente = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False,
+                                          help_text="Monto de compras no pagadas por completo")
+    fecha_ultima_compra = models.DateTimeField(null=True, blank=True, editable=False)
+
+    CAMPOS_TOTALES = ['numero_compras', 'monto_comprado', 'kg_comprados', 'monto_pendiente', 'fecha_ultima_compra']
     
     class Meta:
         ordering = ['nombre']
@@ -1209,20 +1216,89 @@ class Comprador(models.Model):
     
     def __str__(self):
         return self.nombre
+
+    def save(self, *args, **kwargs):
+        # Al editar datos del comprador no se sobreescriben los totales con valores en memoria
+        if self.pk and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_TOTALES
+            ]
+        super().save(*args, **kwargs)
     
     def total_compras(self):
         """Retorna el número total de compras de este comprador"""
-        return self.compras.count()
+        return self.numero_compras
     
     def monto_total_comprado(self):
         """Retorna el monto total de todas sus compras"""
-        total = self.compras.aggregate(Sum('monto_total'))['monto_total__sum']
-        return total or 0
+        return self.monto_comprado
     
     def cantidad_total_comprada(self):
-        """Retorna la cantidad total comprada (en kg o qq)"""
-        total = self.compras.aggregate(Sum('cantidad'))['cantidad__sum']
-        return total or 0
+        """Retorna la cantidad total comprada en kg"""
+        return self.kg_comprados
+
+    @classmethod
+    def sumar_compra(cls, comprador_id, compra, signo=1):
+        """Suma (signo=1) o resta (signo=-1) una compra de los totales con un UPDATE atómico"""
+        from django.db.models import F, Q, Case, When, Value
+
+        monto = Decimal(compra.monto_total or 0) * signo
+        cambios = {
+            'numero_compras': F('numero_compras') + signo,
+            'monto_comprado': F('monto_comprado') + monto,
+            'kg_comprados': F('kg_comprados') + Decimal(compra.cantidad_kg or 0) * signo,
+        }
+        if compra.estado_pago != 'pagado':
+            cambios['monto_pendiente'] = F('monto_pendiente') + monto
+        if signo > 0:
+            # Las vistas asignan fecha_compra como texto del formulario
+            fecha = Compra._meta.get_field('fecha_compra').to_python(compra.fecha_compra)
+            if timezone.is_naive(fecha):
+                fecha = timezone.make_aware(fecha)
+            cambios['fecha_ultima_compra'] = Case(
+                When(Q(fecha_ultima_compra__isnull=True) | Q(fecha_ultima_compra__lt=fecha),
+                     then=Value(fecha)),
+                default=F('fecha_ultima_compra'),
+            )
+        else:
+            # Al quitar una compra la última fecha puede cambiar: se busca con el índice de comprador
+            cambios['fecha_ultima_compra'] = cls._subconsulta_ultima_fecha()
+        cls.objects.filter(pk=comprador_id).update(**cambios)
+
+    @staticmethod
+    def _subconsulta_ultima_fecha():
+        from django.db.models import OuterRef, Subquery
+        return Subquery(
+            Compra.objects.filter(comprador=OuterRef('pk')).order_by('-fecha_compra').values('fecha_compra')[:1]
+        )
+
+    @classmethod
+    def recalcular_totales(cls, compradores=None):
+        """Recalcula los totales desde las compras (compradores: queryset o None para todos)"""
+        from django.db.models import OuterRef, Subquery, Count, Q, Value
+        from django.db.models.functions import Coalesce
+
+        if compradores is None:
+            compradores = cls.objects.all()
+
+        def total(expresion, filtro=None):
+            compras = Compra.objects.filter(comprador=OuterRef('pk'))
+            if filtro:
+                compras = compras.filter(filtro)
+            return Coalesce(
+                Subquery(compras.order_by().values('comprador').annotate(total=expresion).values('total')),
+                Value(0),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            )
+
+        return compradores.update(
+            numero_compras=total(Count('id')),
+            monto_comprado=total(Sum('monto_total')),
+            kg_comprados=total(Sum('cantidad_kg')),
+            monto_pendiente=total(Sum('monto_total'), ~Q(estado_pago='pagado')),
+            fecha_ultima_compra=cls._subconsulta_ultima_fecha(),
+        )
 
 
 class Compra(models.Model):
@@ -1253,6 +1329,8 @@ class Compra(models.Model):
     # Cantidad y precio
     cantidad = models.DecimalField(max_digits=10, decimal_places=2)
     unidad = models.CharField(max_length=10, choices=UNIDAD_CHOICES, default='qq')
+    cantidad_kg = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False,
+                                      help_text="Cantidad normalizada a kg (los sacos se toman tal cual)")
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     monto_total = models.DecimalField(max_digits=12, decimal_places=2, editable=False)
 
@@ -1279,11 +1357,45 @@ class Compra(models.Model):
         ordering = ['-fecha_compra']
         verbose_name = "Compra"
         verbose_name_plural = "Compras"
+        indexes = [
+            # Paginación por cursor en lista_compras
+            models.Index(fields=['fecha_compra', 'id']),
+        ]
     
     def save(self, *args, **kwargs):
+        from django.db import transaction
+
         # Calcular monto total automáticamente
-        self.monto_total = float(self.cantidad) * float(self.precio_unitario)
-        super().save(*args, **kwargs)
+        self.monto_total = Decimal(str(round(float(self.cantidad) * float(self.precio_unitario), 2)))
+        self.cantidad_kg = a_kg(self.cantidad, self.unidad)
+
+        with transaction.atomic():
+            # La fila se bloquea para que dos ediciones simultáneas no descuenten
+            # los mismos valores anteriores de los totales del comprador
+            anterior = None
+            if self.pk:
+                anterior = Compra.objects.select_for_update().filter(pk=self.pk).only(
+                    'comprador_id', 'cantidad_kg', 'monto_total', 'estado_pago', 'fecha_compra'
+                ).first()
+            super().save(*args, **kwargs)
+
+            # Actualizar totales del comprador
+            if anterior is not None:
+                Comprador.sumar_compra(anterior.comprador_id, anterior, signo=-1)
+            Comprador.sumar_compra(self.comprador_id, self)
+
+    def delete(self, *args, **kwargs):
+        from django.db import transaction
+
+        with transaction.atomic():
+            # Se descuentan los valores guardados (con la fila bloqueada), no los que tenga la instancia en memoria
+            guardada = Compra.objects.select_for_update().filter(pk=self.pk).only(
+                'comprador_id', 'cantidad_kg', 'monto_total', 'estado_pago', 'fecha_compra'
+            ).first()
+            resultado = super().delete(*args, **kwargs)
+            if guardada is not None:
+                Comprador.sumar_compra(guardada.comprador_id, guardada, signo=-1)
+        return resultado
     
     def __str__(self):
         return f"Compra #{self.id} - {self.comprador.nombre} - Q{self.monto_total}"
@@ -1308,6 +1420,13 @@ class MantenimientoPlanta(models.Model):
     ultimo_mantenimiento = models.DateTimeField(null=True, blank=True)
     proximo_mantenimiento_estimado = models.DateTimeField(null=True, blank=True)
     
+    # Pronóstico: media móvil de horas por día, se actualiza con cada UsoPlanta
+    tasa_horas_dia = models.DecimalField(max_digits=8, decimal_places=4, default=0,
+                                         help_text="Promedio móvil de horas de uso por día")
+    horas_dia_en_curso = models.DecimalField(max_digits=6, decimal_places=2, default=0,
+                                             help_text="Horas registradas en el último día con uso")
+    fecha_dia_en_curso = models.DateField(null=True, blank=True)
+    
     # Información adicional
     notas = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -1338,28 +1457,182 @@ class MantenimientoPlanta(models.Model):
         """Verifica si la planta requiere mantenimiento"""
         return self.horas_acumuladas >= self.limite_horas
     
-    def agregar_horas(self, horas):
+    def agregar_horas(self, horas, **origen):
         """Agrega horas al contador y verifica si requiere mantenimiento"""
-        self.horas_acumuladas += horas
+        MantenimientoPlanta.registrar_uso(horas, control_id=self.pk, **origen)
+        self.refresh_from_db(fields=['horas_acumuladas', 'estado', 'updated_at'])
+
+    @classmethod
+    def registrar_uso(cls, horas, control_id=1, procesado=None, reproceso=None, mezcla=None):
+        """
+        Registra un evento de uso (UsoPlanta) y suma las horas al contador
+        con un UPDATE atómico, sin leer la fila del control.
+
+        El cambio de estado a 'requiere_mantenimiento' se resuelve en el mismo
+        UPDATE, así que guardados concurrentes no pierden horas. La tasa del
+        pronóstico se actualiza con el evento, sin recorrer el historial.
+        """
+        from django.db import transaction
+        from django.db.models import F, Case, When, Value
+        from django.db.models.lookups import GreaterThanOrEqual
+
+        horas = Decimal(str(round(float(horas), 2)))
+        if procesado is not None:
+            tipo_proceso = 'procesado'
+        elif reproceso is not None:
+            tipo_proceso = 'reproceso'
+        elif mezcla is not None:
+            tipo_proceso = 'mezcla'
+        else:
+            tipo_proceso = 'ajuste'
+
+        nuevo_total = F('horas_acumuladas') + Value(horas, output_field=models.DecimalField())
+        cambios = {
+            'horas_acumuladas': nuevo_total,
+            'estado': Case(
+                When(GreaterThanOrEqual(nuevo_total, F('limite_horas')), then=Value('requiere_mantenimiento')),
+                default=F('estado'),
+            ),
+            'updated_at': timezone.now(),
+        }
+
+        with transaction.atomic():
+            actualizados = cls.objects.filter(pk=control_id).update(**cambios)
+            if not actualizados:
+                # Primera vez: crear el registro único y repetir el UPDATE
+                cls.get_or_create_control()
+                cls.objects.filter(pk=control_id).update(**cambios)
+
+            uso = UsoPlanta.objects.create(
+                control_mantenimiento_id=control_id,
+                tipo_proceso=tipo_proceso,
+                procesado=procesado,
+                reproceso=reproceso,
+                mezcla=mezcla,
+                horas=horas,
+            )
+            # El UPDATE anterior ya bloqueó la fila, así que leerla aquí es consistente.
+            # Los ajustes manuales no son uso diario y no entran en la tasa.
+            horas_tasa = horas if tipo_proceso != 'ajuste' else Decimal('0')
+            cls._actualizar_pronostico(control_id, horas_tasa, timezone.localdate(uso.fecha))
+            return uso
+
+    @classmethod
+    def _actualizar_pronostico(cls, control_id, horas, fecha):
+        """Incorpora un evento a la tasa de horas por día y recalcula la fecha estimada"""
+        from .pronostico_mantenimiento import actualizar_tasa
+
+        control = cls.objects.only(
+            'horas_acumuladas', 'limite_horas', 'tasa_horas_dia',
+            'horas_dia_en_curso', 'fecha_dia_en_curso',
+        ).get(pk=control_id)
+        control.tasa_horas_dia, control.horas_dia_en_curso, control.fecha_dia_en_curso = actualizar_tasa(
+            control.tasa_horas_dia, control.horas_dia_en_curso, control.fecha_dia_en_curso, horas, fecha,
+        )
+        cls.objects.filter(pk=control_id).update(
+            tasa_horas_dia=round(control.tasa_horas_dia, 4),
+            horas_dia_en_curso=control.horas_dia_en_curso,
+            fecha_dia_en_curso=control.fecha_dia_en_curso,
+            proximo_mantenimiento_estimado=control.calcular_fecha_estimada(),
+        )
+
+    @property
+    def tasa_estimada(self):
+        """Horas por día usadas para proyectar el próximo mantenimiento"""
+        from .pronostico_mantenimiento import tasa_estimada
+        return tasa_estimada(self.tasa_horas_dia, self.horas_dia_en_curso)
+
+    def calcular_fecha_estimada(self):
+        """Fecha y hora estimada en que se alcanzará el límite de horas (None sin datos de uso)"""
+        from datetime import datetime, time
+        from .pronostico_mantenimiento import proyectar_fecha_limite
+
+        fecha = proyectar_fecha_limite(
+            self.horas_acumuladas, self.limite_horas, self.tasa_estimada, timezone.localdate(),
+        )
+        if fecha is None:
+            return None
+        return timezone.make_aware(datetime.combine(fecha, time.min))
+
+    def simular_mantenimiento(self, planificados=None):
+        """
+        Proyecta el próximo mantenimiento considerando procesos planificados.
+        planificados: {fecha: horas}. Devuelve (fecha_limite, serie diaria).
+        """
+        from .pronostico_mantenimiento import simular
+        return simular(
+            self.horas_acumuladas, self.limite_horas, self.tasa_estimada,
+            timezone.localdate(), planificados,
+        )
+
+    def recalcular_pronostico(self):
+        """Reconstruye la tasa de horas por día recorriendo todos los eventos de uso"""
+        from .pronostico_mantenimiento import actualizar_tasa
+
+        tasa, horas_dia, fecha_dia = Decimal('0'), Decimal('0'), None
+        usos = self.usos.exclude(tipo_proceso='ajuste').order_by('fecha')
+        for horas, fecha in usos.values_list('horas', 'fecha'):
+            tasa, horas_dia, fecha_dia = actualizar_tasa(
+                tasa, horas_dia, fecha_dia, horas, timezone.localdate(fecha),
+            )
+        self.tasa_horas_dia = round(tasa, 4)
+        self.horas_dia_en_curso = horas_dia
+        self.fecha_dia_en_curso = fecha_dia
+        self.proximo_mantenimiento_estimado = self.calcular_fecha_estimada()
+        self.save(update_fields=[
+            'tasa_horas_dia', 'horas_dia_en_curso', 'fecha_dia_en_curso',
+            'proximo_mantenimiento_estimado', 'updated_at',
+        ])
+
+    def recalcular_desde_usos(self):
+        """
+        Recalcula horas_acumuladas sumando los eventos de uso. Cada mantenimiento
+        deja un ajuste negativo que devuelve la suma a cero, así que basta con
+        sumarlos todos.
+        """
+        total = self.usos.aggregate(total=Sum('horas'))['total'] or Decimal('0')
+
+        self.horas_acumuladas = total
         if self.horas_acumuladas >= self.limite_horas:
             self.estado = 'requiere_mantenimiento'
-        self.save()
+        elif self.estado == 'requiere_mantenimiento':
+            self.estado = 'operativa'
+        self.save(update_fields=['horas_acumuladas', 'estado', 'updated_at'])
+        return total
     
-    def realizar_mantenimiento(self, usuario, observaciones=''):
-        """Registra un mantenimiento y reinicia el contador"""
-        # Crear registro de mantenimiento
-        HistorialMantenimiento.objects.create(
-            control_mantenimiento=self,
-            horas_acumuladas=self.horas_acumuladas,
-            realizado_por=usuario,
-            observaciones=observaciones
-        )
-        
-        # Reiniciar contador
-        self.horas_acumuladas = 0
-        self.estado = 'operativa'
-        self.ultimo_mantenimiento = timezone.now()
-        self.save()
+    def realizar_mantenimiento(self, usuario, observaciones='', **detalles):
+        """
+        Registra un mantenimiento y reinicia el contador.
+
+        La fila del control se bloquea antes de leer las horas, así el historial
+        guarda las mismas horas que se descuentan aunque haya registrar_uso en
+        curso. El reinicio queda como un UsoPlanta 'ajuste' negativo.
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            control = MantenimientoPlanta.objects.select_for_update().get(pk=self.pk)
+            historial = HistorialMantenimiento.objects.create(
+                control_mantenimiento=control,
+                horas_acumuladas=control.horas_acumuladas,
+                realizado_por=usuario,
+                observaciones=observaciones,
+                **detalles,
+            )
+
+            pendientes = control.usos.aggregate(total=Sum('horas'))['total'] or Decimal('0')
+            if pendientes:
+                UsoPlanta.objects.create(control_mantenimiento=control, tipo_proceso='ajuste', horas=-pendientes)
+
+            control.horas_acumuladas = 0
+            control.estado = 'operativa'
+            control.ultimo_mantenimiento = timezone.now()
+            control.proximo_mantenimiento_estimado = control.calcular_fecha_estimada()
+            control.save(update_fields=['horas_acumuladas', 'estado', 'ultimo_mantenimiento',
+                                        'proximo_mantenimiento_estimado', 'updated_at'])
+
+        self.refresh_from_db()
+        return historial
     
     @classmethod
     def get_or_create_control(cls):
@@ -1410,7 +1683,334 @@ class HistorialMantenimiento(models.Model):
     
     def __str__(self):
         return f"Mantenimiento - {self.fecha_mantenimiento.strftime('%d/%m/%Y')} - {self.horas_acumuladas}h"
-    
+
+
+class UsoPlanta(models.Model):
+    """Evento de uso de la planta (solo se insertan, nunca se editan)"""
+    TIPO_PROCESO_CHOICES = [
+        ('procesado', 'Procesado/Trilla'),
+        ('reproceso', 'Reproceso'),
+        ('mezcla', 'Mezcla'),
+        ('ajuste', 'Ajuste Manual'),
+    ]
+
+    control_mantenimiento = models.ForeignKey(MantenimientoPlanta, on_delete=models.CASCADE,
+                                              related_name='usos')
+    tipo_proceso = models.CharField(max_length=20, choices=TIPO_PROCESO_CHOICES)
+    procesado = models.ForeignKey(Procesado, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='usos_planta')
+    reproceso = models.ForeignKey(Reproceso, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='usos_planta')
+    mezcla = models.ForeignKey(Mezcla, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='usos_planta')
+    horas = models.DecimalField(max_digits=6, decimal_places=2)
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = "Uso de Planta"
+        verbose_name_plural = "Usos de Planta"
+
+    def __str__(self):
+        return f"{self.get_tipo_proceso_display()} - {self.horas}h ({self.fecha.strftime('%d/%m/%Y %H:%M')})"
+
+
+class ResumenOperacionPlanta(models.Model):
+    """Resumen precalculado de operación por día, turno, tipo de proceso, operador y tipo de café"""
+    TURNO_CHOICES = [
+        ('diurno', 'Diurno (06:00-18:00)'),
+        ('nocturno', 'Nocturno (18:00-06:00)'),
+    ]
+
+    fecha = models.DateField()
+    turno = models.CharField(max_length=10, choices=TURNO_CHOICES)
+    tipo_proceso = models.CharField(max_length=20, choices=UsoPlanta.TIPO_PROCESO_CHOICES)
+    operador = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='resumenes_operacion')
+    tipo_cafe = models.CharField(max_length=100, blank=True, default='')
+
+    numero_procesos = models.PositiveIntegerField(default=0)
+    horas_operacion = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    kg_procesados = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    kg_obtenidos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['fecha', 'turno']
+        verbose_name = "Resumen de Operación"
+        verbose_name_plural = "Resúmenes de Operación"
+        indexes = [
+            models.Index(fields=['fecha', 'turno']),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha.strftime('%d/%m/%Y')} {self.get_turno_display()} - {self.get_tipo_proceso_display()}"
+
+    @property
+    def kg_por_hora(self):
+        """Rendimiento de la planta en kg procesados por hora"""
+        if self.horas_operacion > 0:
+            return float(self.kg_procesados) / float(self.horas_operacion)
+        return 0
+
+
+class ResumenTurnoPlanta(models.Model):
+    """Utilización y tiempos muertos de la planta por día y turno"""
+    fecha = models.DateField()
+    turno = models.CharField(max_length=10, choices=ResumenOperacionPlanta.TURNO_CHOICES)
+
+    horas_disponibles = models.DecimalField(max_digits=5, decimal_places=2, default=12)
+    horas_operacion = models.DecimalField(max_digits=5, decimal_places=2, default=0,
+                                          help_text="Horas con al menos un proceso en marcha")
+    horas_inactivas = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    numero_brechas = models.PositiveIntegerField(default=0,
+                                                 help_text="Pausas entre procesos dentro del turno")
+    mayor_brecha_horas = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    kg_procesados = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['fecha', 'turno']
+        unique_together = ['fecha', 'turno']
+        verbose_name = "Resumen de Turno"
+        verbose_name_plural = "Resúmenes de Turno"
+
+    def __str__(self):
+        return f"{self.fecha.strftime('%d/%m/%Y')} {self.get_turno_display()} - {self.utilizacion:.0f}%"
+
+    @property
+    def utilizacion(self):
+        """Porcentaje del turno con la planta en operación"""
+        if self.horas_disponibles > 0:
+            return (float(self.horas_operacion) / float(self.horas_disponibles)) * 100
+        return 0
+
+
+class ResumenRendimientoMensual(models.Model):
+    """Rendimiento y mermas de trilla precalculados por mes, proveedor, tipo de café y operador"""
+    mes = models.DateField(help_text="Primer día del mes")
+    proveedor = models.CharField(max_length=200, blank=True, default='')
+    tipo_cafe = models.CharField(max_length=100, blank=True, default='')
+    operador = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='resumenes_rendimiento')
+
+    numero_trillas = models.PositiveIntegerField(default=0)
+    kg_entrada = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    kg_salida = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # Mermas (kg)
+    catadura = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    rechazo_electronica = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    bajo_zaranda = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    barridos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['mes', 'proveedor', 'tipo_cafe']
+        verbose_name = "Resumen de Rendimiento"
+        verbose_name_plural = "Resúmenes de Rendimiento"
+        indexes = [
+            models.Index(fields=['mes', 'proveedor']),
+            models.Index(fields=['mes', 'tipo_cafe']),
+        ]
+
+    def __str__(self):
+        return f"{self.mes.strftime('%m/%Y')} {self.proveedor} - {self.tipo_cafe} ({self.rendimiento:.1f}%)"
+
+    @property
+    def rendimiento(self):
+        """Rendimiento ponderado del grupo: kg obtenidos sobre kg procesados"""
+        if self.kg_entrada > 0:
+            return float(self.kg_salida) / float(self.kg_entrada) * 100
+        return 0
+
+    @property
+    def merma_total(self):
+        return float(self.catadura) + float(self.rechazo_electronica) + float(self.bajo_zaranda) + float(self.barridos)
+
+
+class ResumenProveedor(models.Model):
+    """Ficha precalculada por proveedor: entregas, precio, rendimiento de trilla y catación"""
+    clave = models.CharField(max_length=200, unique=True, help_text="UPPER(proveedor)")
+    proveedor = models.CharField(max_length=200)
+
+    # Entregas (Lote y ReciboCafe)
+    numero_lotes = models.PositiveIntegerField(default=0)
+    kg_entregados = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    precio_promedio_quintal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                                  help_text="Promedio ponderado por kg de los lotes")
+    primera_entrega = models.DateTimeField(null=True, blank=True)
+    ultima_entrega = models.DateTimeField(null=True, blank=True)
+    numero_recibos = models.PositiveIntegerField(default=0)
+    kg_recibos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    monto_recibos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    # Trillas de sus lotes
+    numero_trillas = models.PositiveIntegerField(default=0)
+    kg_trillados = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    kg_oro = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    rendimiento = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+
+    # Cataciones de sus lotes y trillas
+    numero_cataciones = models.PositiveIntegerField(default=0)
+    puntaje_promedio = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    puntaje_maximo = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-kg_entregados']
+        verbose_name = "Resumen de Proveedor"
+        verbose_name_plural = "Resúmenes de Proveedores"
+        # Un índice por cada columna por la que se ordena la ficha
+        indexes = [
+            models.Index(fields=['proveedor']),
+            models.Index(fields=['kg_entregados']),
+            models.Index(fields=['precio_promedio_quintal']),
+            models.Index(fields=['rendimiento']),
+            models.Index(fields=['puntaje_promedio']),
+            models.Index(fields=['ultima_entrega']),
+        ]
+
+    def __str__(self):
+        return self.proveedor
+
+
+class ValoracionInventario(models.Model):
+    """Corte de inventario valorizado: kg disponibles y valor a costo promedio por bodega y tipo de producto"""
+    TIPO_PRODUCTO_CHOICES = [
+        ('lote', 'Lote'),
+        ('procesado', 'Procesado'),
+        ('reproceso', 'Reproceso'),
+        ('mezcla', 'Mezcla'),
+        ('partida', 'Partida'),
+    ]
+
+    fecha = models.DateField(db_index=True)
+    bodega = models.ForeignKey(Bodega, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='valoraciones')
+    tipo_producto = models.CharField(max_length=20, choices=TIPO_PRODUCTO_CHOICES)
+    numero_productos = models.PositiveIntegerField(default=0)
+    kg_disponibles = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    kg_sin_costo = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                       help_text="Kg sin costo por kg calculado (no suman al valor)")
+    valor = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    generado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-fecha', 'bodega', 'tipo_producto']
+        verbose_name = "Valoración de Inventario"
+        verbose_name_plural = "Valoraciones de Inventario"
+
+    def __str__(self):
+        return f"{self.fecha} - {self.bodega or 'Sin bodega'} - {self.get_tipo_producto_display()}"
+
+    @property
+    def costo_promedio_kg(self):
+        """Valor entre los kg que tienen costo"""
+        kg_costeados = self.kg_disponibles - self.kg_sin_costo
+        if kg_costeados <= 0:
+            return None
+        return (self.valor / kg_costeados).quantize(Decimal('0.0001'))
+
+
+class MovimientoInventario(models.Model):
+    """Diario de existencias: solo se agregan filas; las ediciones y borrados se anotan como corrección"""
+    ORIGEN_CHOICES = [
+        ('lote', 'Ingreso de lote'),
+        ('recibo', 'Recibo de café'),
+        ('procesado', 'Trilla'),
+        ('reproceso', 'Reproceso'),
+        ('componente_mezcla', 'Componente de mezcla'),
+        ('subpartida', 'Ingreso de subpartida'),
+        ('movimiento_subpartida', 'Salida de subpartida'),
+        ('venta', 'Venta'),
+        ('exportacion', 'Exportación'),
+        ('traslado', 'Traslado entre bodegas'),
+    ]
+
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+    bodega = models.ForeignKey(Bodega, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='movimientos_inventario')
+    tipo_producto = models.CharField(max_length=20, choices=ValoracionInventario.TIPO_PRODUCTO_CHOICES)
+    producto_id = models.PositiveIntegerField()
+    kg = models.DecimalField(max_digits=14, decimal_places=2, help_text="Positivo = entrada, negativo = salida")
+    origen = models.CharField(max_length=30, choices=ORIGEN_CHOICES)
+    origen_id = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Movimiento de Inventario"
+        verbose_name_plural = "Movimientos de Inventario"
+        indexes = [
+            models.Index(fields=['origen', 'origen_id']),
+            models.Index(fields=['tipo_producto', 'producto_id']),
+            models.Index(fields=['bodega', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y %H:%M} {self.get_origen_display()} {self.kg} kg"
+
+
+class PuntoControlInventario(models.Model):
+    """Saldo de existencias hasta una fila del diario, para no recorrerlo completo en cada consulta"""
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+    ultimo_movimiento_id = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = "Punto de Control de Inventario"
+        verbose_name_plural = "Puntos de Control de Inventario"
+
+    def __str__(self):
+        return f"Punto de control {self.fecha:%d/%m/%Y %H:%M}"
+
+
+class SaldoPuntoControl(models.Model):
+    punto = models.ForeignKey(PuntoControlInventario, on_delete=models.CASCADE, related_name='saldos')
+    bodega = models.ForeignKey(Bodega, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='saldos_punto_control')
+    tipo_producto = models.CharField(max_length=20, choices=ValoracionInventario.TIPO_PRODUCTO_CHOICES)
+    producto_id = models.PositiveIntegerField()
+    kg = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        indexes = [models.Index(fields=['punto', 'bodega'])]
+
+
+class UbicacionBodega(models.Model):
+    """Lugar físico dentro de una bodega (percha y fila normalizadas); ver ubicaciones.py"""
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name='ubicaciones')
+    percha = models.CharField(max_length=100, blank=True, default='')
+    fila = models.CharField(max_length=50, blank=True, default='')
+    activo = models.BooleanField(default=True, help_text="Las inactivas no se proponen como libres")
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # El índice único (bodega, percha, fila) sirve para buscar por lugar
+        unique_together = ['bodega', 'percha', 'fila']
+        ordering = ['bodega', 'percha', 'fila']
+        verbose_name = "Ubicación de Bodega"
+        verbose_name_plural = "Ubicaciones de Bodega"
+
+    def __str__(self):
+        partes = [self.bodega.nombre, self.percha and f"Percha {self.percha}", self.fila and f"Fila {self.fila}"]
+        return " → ".join(parte for parte in partes if parte)
+
+
+class ContenidoUbicacion(models.Model):
+    """Producto ubicado en una UbicacionBodega, con sus kg según el diario de existencias"""
+    ubicacion = models.ForeignKey(UbicacionBodega, on_delete=models.CASCADE, related_name='contenido')
+    tipo_producto = models.CharField(max_length=20, choices=ValoracionInventario.TIPO_PRODUCTO_CHOICES)
+    producto_id = models.PositiveIntegerField()
+    codigo = models.CharField(max_length=50, blank=True)
+    kg = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['tipo_producto', 'producto_id']
+        verbose_name = "Contenido de Ubicación"
+        verbose_name_plural = "Contenidos de Ubicación"
+
+    def __str__(self):
+        return f"{self.get_tipo_producto_display()} {self.codigo} en {self.ubicacion}"
+
 class ReciboCafe(models.Model):
     """Modelo para registrar recibos individuales de café dentro de un lote"""
     
@@ -1433,6 +2033,8 @@ class ReciboCafe(models.Model):
     # Información del recibo
     peso = models.DecimalField(max_digits=10, decimal_places=2)
     unidad = models.CharField(max_length=10, choices=UNIDAD_CHOICES, default='qq')
+    peso_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False,
+                                  help_text="Peso normalizado a kg")
     humedad = models.DecimalField(max_digits=5, decimal_places=2)
     proveedor = models.CharField(max_length=200)
     precio_quintal = models.DecimalField(max_digits=10, decimal_places=2)
@@ -1455,14 +2057,9 @@ class ReciboCafe(models.Model):
         verbose_name = "Recibo de Café"
         verbose_name_plural = "Recibos de Café"
     
-    def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        
-        # Generar número de recibo automáticamente
-        if not self.numero_recibo:
-            ultimo_recibo = ReciboCafe.objects.aggregate(models.Max('id'))['id__max']
-            siguiente_numero = (ultimo_recibo or 0) + 1
-            self.numero_recibo = f"REC-{siguiente_numero:05d}"  # Formato: REC-00001
+    def _preparar(self):
+        """Calcula peso en kg, monto y estado antes de guardar (también se usa en crear_varios)"""
+        self.peso_kg = a_kg(self.peso, self.unidad)
         
         # Calcular monto total
         peso_qq = self.convertir_a_quintales()
@@ -1475,39 +2072,124 @@ class ReciboCafe(models.Model):
             self.estado = 'proceso_parcial'
         else:
             self.estado = 'pendiente'
+
+    # Reintentos si otro recibo toma el mismo número entre la lectura de max(id) y el INSERT
+    INTENTOS_NUMERACION = 3
+
+    @staticmethod
+    def numero_desde(ultimo_id, posicion=1):
+        return f"REC-{(ultimo_id or 0) + posicion:05d}"  # Formato: REC-00001
+
+    def save(self, *args, **kwargs):
+        from django.db import IntegrityError, transaction
+
+        # Generar número de recibo automáticamente
+        numero_automatico = not self.numero_recibo
         
-        super().save(*args, **kwargs)
+        self._preparar()
         
-        # Si es nuevo, actualizar el peso del lote
-        if is_new:
-            peso_kg = self.convertir_a_kg()
-            self.lote.peso_kg = Decimal(str(self.lote.peso_kg)) + Decimal(str(peso_kg))
-            self.lote.save(update_fields=['peso_kg'])
+        with transaction.atomic():
+            anterior = None
+            if self.pk:
+                anterior = ReciboCafe.objects.filter(pk=self.pk).only('lote_id', 'peso_kg').first()
+            for intento in range(self.INTENTOS_NUMERACION):
+                if numero_automatico:
+                    self.numero_recibo = ReciboCafe.numero_desde(ReciboCafe.objects.aggregate(Max('id'))['id__max'])
+                try:
+                    with transaction.atomic():
+                        super().save(*args, **kwargs)
+                    break
+                except IntegrityError:
+                    if not numero_automatico or intento == self.INTENTOS_NUMERACION - 1:
+                        raise
+
+            # Ajustar el peso del lote con la diferencia (nuevo, edición o cambio de lote)
+            if anterior is not None:
+                ReciboCafe.ajustar_peso_lote(anterior.lote_id, -anterior.peso_kg)
+            ReciboCafe.ajustar_peso_lote(self.lote_id, self.peso_kg)
+        self._refrescar_lote()
     
     def delete(self, *args, **kwargs):
-        # Al eliminar, restar el peso del lote
-        peso_kg = self.convertir_a_kg()
-        self.lote.peso_kg = Decimal(str(self.lote.peso_kg)) - Decimal(str(peso_kg))
-        self.lote.save(update_fields=['peso_kg'])
-        super().delete(*args, **kwargs)
+        from django.db import transaction
+
+        with transaction.atomic():
+            # Se resta lo guardado, no lo que tenga la instancia en memoria
+            guardado = ReciboCafe.objects.filter(pk=self.pk).only('lote_id', 'peso_kg').first()
+            resultado = super().delete(*args, **kwargs)
+            if guardado is not None:
+                ReciboCafe.ajustar_peso_lote(guardado.lote_id, -guardado.peso_kg)
+        self._refrescar_lote()
+        return resultado
+
+    @staticmethod
+    def ajustar_peso_lote(lote_id, delta_kg):
+        """Suma delta_kg al peso del lote con un UPDATE atómico"""
+        from django.db.models import F
+
+        if delta_kg:
+            Lote.objects.filter(pk=lote_id).update(peso_kg=F('peso_kg') + delta_kg)
+
+    def _refrescar_lote(self):
+        # El UPDATE con F() no toca la instancia del lote que ya esté cargada
+        if ReciboCafe.lote.is_cached(self):
+            self.lote.refresh_from_db(fields=['peso_kg'])
+
+    @classmethod
+    def crear_varios(cls, lote, recibos, usuario=None):
+        """
+        Inserta varios recibos de un lote en una sola transacción: un bulk_create
+        y un único UPDATE del peso del lote. recibos es una lista de ReciboCafe sin guardar.
+        """
+        from django.db import IntegrityError, transaction
+
+        total_kg = Decimal('0')
+        for recibo in recibos:
+            recibo.lote = lote
+            recibo.registrado_por = usuario
+            recibo._preparar()
+            total_kg += recibo.peso_kg
+
+        with transaction.atomic():
+            # La numeración sale de max(id): si otra carga o un save() toma los mismos
+            # números antes del INSERT, el índice único lo rechaza y se vuelve a numerar
+            for intento in range(cls.INTENTOS_NUMERACION):
+                ultimo_recibo = cls.objects.aggregate(Max('id'))['id__max']
+                for posicion, recibo in enumerate(recibos, start=1):
+                    recibo.numero_recibo = cls.numero_desde(ultimo_recibo, posicion)
+                try:
+                    with transaction.atomic():
+                        creados = cls.objects.bulk_create(recibos)
+                    break
+                except IntegrityError:
+                    if intento == cls.INTENTOS_NUMERACION - 1:
+                        raise
+            cls.ajustar_peso_lote(lote.pk, total_kg)
+
+            # bulk_create no envía señales: el diario se anota aquí en un solo INSERT, y
+            # costos y ficha de proveedores quedan para el final de la transacción
+            from .diario_inventario import registrar_recibos_nuevos
+            registrar_recibos_nuevos(lote.pk, creados)
+
+            from .analitica_proveedores import claves_de
+            from .recalculos import anotar
+            claves = claves_de(Lote, lote.pk) | set(
+                cls.objects.filter(pk__in=[recibo.pk for recibo in creados if recibo.pk])
+                .annotate(clave=Upper('proveedor')).values_list('clave', flat=True)
+            )
+            anotar({('costos_lotes', lote.pk)} | {('proveedores', clave) for clave in claves})
+        lote.refresh_from_db(fields=['peso_kg'])
+        return creados
     
     def __str__(self):
         return f"{self.numero_recibo} - Lote {self.lote.codigo}"
     
     def convertir_a_kg(self):
         """Convierte el peso a kilogramos"""
-        if self.unidad == 'kg':
-            return float(self.peso)
-        elif self.unidad == 'qq':
-            return float(self.peso) * 46  # 1 quintal = 46 kg
-        elif self.unidad == 'lb':
-            return float(self.peso) * 0.453592  # 1 libra = 0.453592 kg
-        return 0
+        return float(a_kg(self.peso, self.unidad))
     
     def convertir_a_quintales(self):
         """Convierte el peso a quintales"""
-        peso_kg = self.convertir_a_kg()
-        return peso_kg / 46
+        return float(kg_a_quintales(a_kg(self.peso, self.unidad)))
     
     @property
     def peso_disponible(self):
@@ -1645,8 +2327,8 @@ class Venta(models.Model):
             siguiente = (ultimo or 0) + 1
             self.codigo_venta = f"VEN-{siguiente:05d}"
         
-        # Calcular precio total (peso en kg / 45.36 para quintales * precio)
-        quintales = Decimal(str(self.peso_vendido_kg)) / Decimal('45.36')
+        # Calcular precio total (peso en quintales de 45.36 kg * precio)
+        quintales = kg_a_quintales_venta(self.peso_vendido_kg)
         self.precio_total = quintales * self.precio_quintal
         
         super().save(*args, **kwargs)
@@ -1657,7 +2339,7 @@ class Venta(models.Model):
     @property
     def quintales_vendidos(self):
         """Calcula los quintales vendidos"""
-        return float(self.peso_vendido_kg) / 45.36
+        return float(kg_a_quintales_venta(self.peso_vendido_kg))
     
     @property
     def producto_descripcion(self):
@@ -1669,6 +2351,30 @@ class Venta(models.Model):
         elif self.tipo_producto == 'mezcla' and self.mezcla:
             return f"Mezcla {self.mezcla.codigo}"
         return "Producto no especificado"
+
+    # Costo y margen: se leen del costo_kg guardado en el producto (ver costos.py)
+    @property
+    def producto(self):
+        return getattr(self, self.tipo_producto, None) if self.tipo_producto else None
+
+    @property
+    def costo_total(self):
+        costo_kg = getattr(self.producto, 'costo_kg', None)
+        if costo_kg is None:
+            return None
+        return (Decimal(self.peso_vendido_kg) * costo_kg).quantize(Decimal('0.01'))
+
+    @property
+    def margen(self):
+        costo = self.costo_total
+        return None if costo is None else self.precio_total - costo
+
+    @property
+    def margen_porcentaje(self):
+        margen = self.margen
+        if margen is None or not self.precio_total:
+            return None
+        return float(margen) / float(self.precio_total) * 100
     
     # ✅ NUEVO: Métodos de utilidad para mostrar información
     def get_descripcion_venta(self):
@@ -1680,7 +2386,7 @@ class Venta(models.Model):
     
     def cantidad_en_libras(self):
         """Convierte el peso vendido a libras"""
-        return self.peso_vendido_kg / Decimal('0.453592')
+        return kg_a_libras(self.peso_vendido_kg)
     
     def cantidad_en_gramos(self):
         """Convierte el peso vendido a gramos"""
@@ -1791,8 +2497,8 @@ class Exportacion(models.Model):
             self.codigo_exportacion = f"EXP-{siguiente:05d}"
         
         # Calcular precio total
-        quintales = Decimal(str(self.peso_exportado_kg)) / Decimal('45.36')
-        self.precio_total = Decimal(quintales) * self.precio_quintal
+        quintales = kg_a_quintales_venta(self.peso_exportado_kg)
+        self.precio_total = quintales * self.precio_quintal
         
         super().save(*args, **kwargs)
     
@@ -1802,7 +2508,7 @@ class Exportacion(models.Model):
     @property
     def quintales_exportados(self):
         """Calcula los quintales exportados"""
-        return float(self.peso_exportado_kg) / 45.36
+        return float(kg_a_quintales_venta(self.peso_exportado_kg))
     
     @property
     def producto_descripcion(self):
@@ -1814,6 +2520,30 @@ class Exportacion(models.Model):
         elif self.tipo_producto == 'mezcla' and self.mezcla:
             return f"Mezcla {self.mezcla.codigo}"
         return "Producto no especificado"
+
+    # Costo y margen: se leen del costo_kg guardado en el producto (ver costos.py)
+    @property
+    def producto(self):
+        return getattr(self, self.tipo_producto, None) if self.tipo_producto else None
+
+    @property
+    def costo_total(self):
+        costo_kg = getattr(self.producto, 'costo_kg', None)
+        if costo_kg is None:
+            return None
+        return (Decimal(self.peso_exportado_kg) * costo_kg).quantize(Decimal('0.01'))
+
+    @property
+    def margen(self):
+        costo = self.costo_total
+        return None if costo is None else self.precio_total - costo
+
+    @property
+    def margen_porcentaje(self):
+        margen = self.margen
+        if margen is None or not self.precio_total:
+            return None
+        return float(margen) / float(self.precio_total) * 100
     
 class Partida(models.Model):
     """Partida Principal - Contenedor de sub-partidas"""
@@ -1884,11 +2614,11 @@ class Partida(models.Model):
     
     @property
     def peso_en_quintales(self):
-        return float(self.peso_total_kg) / 46
+        return float(kg_a_quintales(self.peso_total_kg))
     
     @property
     def peso_en_libras(self):
-        return float(self.peso_total_kg) * 2.20462
+        return float(kg_a_libras(self.peso_total_kg))
     
     @property
     def ubicacion_completa(self):
@@ -1910,10 +2640,18 @@ class EtiquetaLote(models.Model):
         verbose_name = 'Etiqueta de Lote'
         verbose_name_plural = 'Etiquetas de Lote'
         ordering = ['nombre']
+        constraints = [
+            # "Premium", "PREMIUM" y " premium " son la misma etiqueta
+            models.UniqueConstraint(Upper(Trim('nombre')), name='etiqueta_lote_nombre_upper_uniq'),
+        ]
 
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        self.nombre = (self.nombre or '').strip()
+        super().save(*args, **kwargs)
+
 
 class SubPartida(models.Model):
     """Sub-Partida - Entrada individual dentro de una partida (Lote de Punto)"""
@@ -1949,7 +2687,8 @@ class SubPartida(models.Model):
 
     # UBICACIÓN FÍSICA ⭐
     fila = models.CharField(max_length=50, blank=True, null=True, help_text="Fila en la percha")
-    etiqueta = models.CharField(max_length=100, blank=True, null=True, help_text="Etiqueta del lote")
+    etiqueta = models.ForeignKey(EtiquetaLote, on_delete=models.SET_NULL, blank=True, null=True,
+                                 related_name='subpartidas', help_text="Etiqueta del lote")
 
     # Información del café
     tipo_proceso = models.CharField(max_length=20, choices=TIPO_PROCESO_CHOICES, default='LAVADO', help_text="Tipo de proceso del café")
@@ -2039,23 +2778,15 @@ class SubPartida(models.Model):
     
     @staticmethod
     def convertir_a_kg(valor, unidad):
-        from decimal import Decimal
-        valor = Decimal(str(valor))
-        
-        if unidad == 'qq':
-            return valor * 46
-        elif unidad == 'lb':
-            return valor * Decimal('0.453592')
-        else:
-            return valor
+        return a_kg(valor, unidad, redondear=False)
     
     @property
     def peso_en_quintales(self):
-        return float(self.peso_neto_kg) / 46
+        return float(kg_a_quintales(self.peso_neto_kg))
     
     @property
     def peso_en_libras(self):
-        return float(self.peso_neto_kg) * 2.20462
+        return float(kg_a_libras(self.peso_neto_kg))
     
     @property
     def porcentaje_tara(self):
@@ -2124,6 +2855,19 @@ def actualizar_partida_on_delete(sender, instance, **kwargs):
         instance.partida.actualizar_totales()
 
 
+@receiver(post_save, sender=Bodega)
+@receiver(post_delete, sender=Bodega)
+@receiver(post_save, sender=TipoCafe)
+@receiver(post_delete, sender=TipoCafe)
+@receiver(post_save, sender=EtiquetaLote)
+@receiver(post_delete, sender=EtiquetaLote)
+def invalidar_catalogo(sender, **kwargs):
+    """Los catálogos en memoria se recargan al cambiar su sello de versión"""
+    from .catalogos import invalidar
+
+    invalidar(sender)
+
+
 # =====================================================================
 # MODELO: MOVIMIENTO DE SUBPARTIDA (Trazabilidad de Inventario)
 # =====================================================================
@@ -2275,6 +3019,13 @@ class PlanillaSemanal(models.Model):
         """Calcula el total en quintales (qq) de la semana"""
         return self.total_libras_semana() / Decimal('100.00')
 
+    def fecha_del_dia(self, dia_semana):
+        """Fecha de la semana que corresponde a dia_semana ('lunes' ... 'sabado')"""
+        from datetime import timedelta
+
+        indice = [codigo for codigo, _ in RegistroDiario.DIAS_SEMANA].index(dia_semana)
+        return self.fecha_inicio + timedelta(days=(indice - self.fecha_inicio.weekday()) % 7)
+
 
 class RegistroDiario(models.Model):
     """Registro diario de corte por trabajador"""
@@ -2353,6 +3104,167 @@ class RegistroDiario(models.Model):
             return self.tipo_cafe_manual
         return "No especificado"
 
+    @staticmethod
+    def expresion_tipo_cafe(prefijo=''):
+        """
+        Expresión SQL equivalente a get_tipo_cafe_display_full().
+        prefijo permite usarla desde otra tabla, p. ej. 'registros__'.
+        """
+        from django.db.models import F, Q, Case, When, Value, CharField
+
+        return Case(
+            When(**{f'{prefijo}tipo_cafe__isnull': False}, then=F(f'{prefijo}tipo_cafe__nombre')),
+            When(
+                Q(**{f'{prefijo}tipo_cafe_manual__isnull': False}) & ~Q(**{f'{prefijo}tipo_cafe_manual': ''}),
+                then=F(f'{prefijo}tipo_cafe_manual'),
+            ),
+            default=Value("No especificado"),
+            output_field=CharField(),
+        )
+
     def quintales(self):
         """Convierte libras a quintales"""
-        return self.libras_cortadas / Decimal('100.00')
\ No newline at end of file
+        return self.libras_cortadas / Decimal('100.00')
+
+class ResumenCorteSemanal(models.Model):
+    """
+    Libras cortadas por trabajador y tipo de café en una planilla semanal.
+    Se recalcula por planilla cuando cambian sus registros (ver productividad_corte.py).
+    """
+    planilla = models.ForeignKey(PlanillaSemanal, on_delete=models.CASCADE, related_name='resumenes_corte')
+    trabajador = models.ForeignKey(Trabajador, on_delete=models.CASCADE, related_name='resumenes_corte')
+    tipo_cafe = models.CharField(max_length=100)
+    semana = models.DateField(help_text="Fecha de inicio de la planilla")
+    temporada = models.CharField(max_length=9, help_text="Cosecha de octubre a septiembre, p. ej. 2025-2026")
+
+    dias_trabajados = models.PositiveIntegerField(default=0)
+    libras_cortadas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['semana', 'trabajador']
+        unique_together = ['planilla', 'trabajador', 'tipo_cafe']
+        verbose_name = "Resumen de Corte Semanal"
+        verbose_name_plural = "Resúmenes de Corte Semanal"
+        indexes = [
+            models.Index(fields=['temporada', 'semana']),
+            models.Index(fields=['temporada', 'trabajador']),
+        ]
+
+    def __str__(self):
+        return f"{self.trabajador} - {self.semana.strftime('%d/%m/%Y')} {self.tipo_cafe} ({self.libras_cortadas} lb)"
+
+
+@receiver(post_save, sender=RegistroDiario)
+def actualizar_resumen_corte_on_save(sender, instance, **kwargs):
+    """Recalcular el resumen de corte del trabajador en la planilla del registro"""
+    from .productividad_corte import actualizar_resumen_planilla
+
+    actualizar_resumen_planilla(instance.planilla_id, [instance.trabajador_id])
+
+
+@receiver(post_delete, sender=RegistroDiario)
+def actualizar_resumen_corte_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    Solo para borrados de un registro suelto: si se borra la planilla o el trabajador
+    el resumen se elimina en cascada, y los borrados masivos recalculan por su cuenta.
+    """
+    if isinstance(origin, RegistroDiario):
+        from .productividad_corte import actualizar_resumen_planilla
+
+        actualizar_resumen_planilla(instance.planilla_id, [instance.trabajador_id])
+
+
+@receiver(post_save, sender=PlanillaSemanal)
+def actualizar_resumen_corte_planilla(sender, instance, created, **kwargs):
+    """Las fechas de la planilla definen la semana y la temporada del resumen"""
+    if not created:
+        from .productividad_corte import actualizar_resumen_planilla
+
+        actualizar_resumen_planilla(instance.pk)
+
+
+class OperacionSincronizacion(models.Model):
+    """
+    Clave de idempotencia de una operación enviada desde un dispositivo de campo.
+    Si el dispositivo reintenta el lote, las claves ya aplicadas no se vuelven a aplicar.
+    """
+    clave = models.CharField(max_length=64, unique=True)
+    registro = models.ForeignKey(RegistroDiario, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='operaciones_sincronizacion')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    aplicada_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-aplicada_en']
+        verbose_name = "Operación de Sincronización"
+        verbose_name_plural = "Operaciones de Sincronización"
+
+    def __str__(self):
+        return f"{self.clave} ({self.aplicada_en.strftime('%d/%m/%Y %H:%M')})"
+
+
+class CambioRegistroDiario(models.Model):
+    """
+    Bitácora de cambios de RegistroDiario para la sincronización de dispositivos
+    de campo: cada guardado o borrado agrega una fila y el cursor del dispositivo
+    es el id de la última recibida. Ver anotar() sobre el orden de los ids.
+    """
+    registro_id = models.PositiveIntegerField()
+    planilla_id = models.PositiveIntegerField(db_index=True)
+    trabajador_id = models.PositiveIntegerField()
+    dia_semana = models.CharField(max_length=10)
+    fecha = models.DateField()
+    eliminado = models.BooleanField(default=False)
+    momento = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Cambio de Registro Diario"
+        verbose_name_plural = "Cambios de Registros Diarios"
+
+    def __str__(self):
+        accion = 'eliminado' if self.eliminado else 'guardado'
+        return f"Registro {self.registro_id} {accion} {self.momento.strftime('%d/%m/%Y %H:%M')}"
+
+    @classmethod
+    def anotar(cls, registros, eliminado=False):
+        """
+        Agrega a la bitácora los registros guardados o borrados. Los ids se
+        toman bajo un candado que dura hasta el final de la transacción, así se
+        confirman en orden: un dispositivo que ya leyó el id N no puede perder
+        después un id menor que seguía sin confirmar. En SQLite las escrituras
+        ya van de una en una.
+        """
+        from django.db import transaction
+
+        registros = list(registros)
+        if not registros:
+            return
+        with transaction.atomic():
+            conexion = transaction.get_connection()
+            if conexion.vendor == 'postgresql':
+                with conexion.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('cambios_registro_diario'))")
+            cls.objects.bulk_create([
+                cls(
+                    registro_id=registro.pk,
+                    planilla_id=registro.planilla_id,
+                    trabajador_id=registro.trabajador_id,
+                    dia_semana=registro.dia_semana,
+                    fecha=registro.fecha,
+                    eliminado=eliminado,
+                )
+                for registro in registros
+            ])
+
+
+@receiver(post_save, sender=RegistroDiario)
+def anotar_registro_guardado(sender, instance, **kwargs):
+    """Deja constancia del cambio para la sincronización de dispositivos"""
+    CambioRegistroDiario.anotar([instance])
+
+
+@receiver(post_delete, sender=RegistroDiario)
+def anotar_registro_eliminado(sender, instance, **kwargs):
+    """Deja constancia del borrado para la sincronización de dispositivos"""
+    CambioRegistroDiario.anotar([instance], eliminado=True)
@@ -0,0 +1,185 @@
+"""
+Productividad de cortadores por temporada.
+
+ResumenCorteSemanal guarda las libras y días trabajados por planilla, trabajador
+y tipo de café. Se recalcula por planilla cuando cambian sus registros (señales
+de RegistroDiario y guardado en cuadrícula), así los rankings de la temporada
+leen unas pocas filas por semana en lugar de todos los registros diarios.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import PlanillaSemanal, RegistroDiario, ResumenCorteSemanal
+
+# La cosecha va de octubre a septiembre del año siguiente
+MES_INICIO_TEMPORADA = 10
+LIBRAS_POR_QUINTAL = Decimal('100.00')  # mismo quintal de la planilla
+
+
+def temporada_de(fecha):
+    """Temporada de cosecha ('2025-2026') a la que pertenece una fecha"""
+    inicio = fecha.year if fecha.month >= MES_INICIO_TEMPORADA else fecha.year - 1
+    return f"{inicio}-{inicio + 1}"
+
+
+# ==========================================
+# ACTUALIZACIÓN DEL RESUMEN
+# ==========================================
+
+@transaction.atomic
+def actualizar_resumen_planilla(planilla_id, trabajador_ids=None):
+    """
+    Recalcula las filas de una planilla (solo de trabajador_ids si se indican)
+    con un GROUP BY trabajador × tipo de café sobre sus registros.
+    """
+    planilla = PlanillaSemanal.objects.filter(pk=planilla_id).only('fecha_inicio').first()
+    if planilla is None:
+        return 0
+
+    resumenes = ResumenCorteSemanal.objects.filter(planilla_id=planilla_id)
+    registros = RegistroDiario.objects.filter(planilla_id=planilla_id)
+    if trabajador_ids is not None:
+        resumenes = resumenes.filter(trabajador_id__in=trabajador_ids)
+        registros = registros.filter(trabajador_id__in=trabajador_ids)
+    resumenes.delete()
+
+    grupos = registros.values(
+        'trabajador_id', tipo=RegistroDiario.expresion_tipo_cafe(),
+    ).annotate(
+        libras=Sum('libras_cortadas'),
+        dias=Count('dia_semana', distinct=True),
+    ).order_by()
+
+    temporada = temporada_de(planilla.fecha_inicio)
+    filas = [
+        ResumenCorteSemanal(
+            planilla_id=planilla_id,
+            trabajador_id=grupo['trabajador_id'],
+            tipo_cafe=grupo['tipo'],
+            semana=planilla.fecha_inicio,
+            temporada=temporada,
+            dias_trabajados=grupo['dias'],
+            libras_cortadas=grupo['libras'] or 0,
+        )
+        for grupo in grupos
+    ]
+    ResumenCorteSemanal.objects.bulk_create(filas)
+    return len(filas)
+
+
+def regenerar_resumenes(planillas=None):
+    """Reconstruye el resumen de todas las planillas (o de las indicadas)"""
+    planillas = planillas if planillas is not None else PlanillaSemanal.objects.all()
+    filas = 0
+    for planilla_id in planillas.values_list('pk', flat=True):
+        filas += actualizar_resumen_planilla(planilla_id)
+    return filas
+
+
+# ==========================================
+# CONSULTAS SOBRE EL RESUMEN
+# ==========================================
+
+def temporadas_disponibles():
+    return list(
+        ResumenCorteSemanal.objects.values_list('temporada', flat=True).distinct().order_by('-temporada')
+    )
+
+
+def tipos_cafe_temporada(temporada):
+    return list(
+        ResumenCorteSemanal.objects.filter(temporada=temporada)
+        .values_list('tipo_cafe', flat=True).distinct().order_by('tipo_cafe')
+    )
+
+
+def ranking_temporada(temporada, tipo_cafe=None, limite=None):
+    """
+    Ranking de cortadores de la temporada por libras, con el desglose por tipo de
+    café y la variación de la última semana frente a la anterior.
+    """
+    resumenes = ResumenCorteSemanal.objects.filter(temporada=temporada)
+    if tipo_cafe:
+        resumenes = resumenes.filter(tipo_cafe=tipo_cafe)
+
+    semanas = list(resumenes.values_list('semana', flat=True).distinct().order_by('-semana')[:2])
+    ultima = semanas[0] if semanas else None
+    anterior = semanas[1] if len(semanas) > 1 else None
+
+    filas = resumenes.values(
+        'trabajador_id', 'trabajador__nombre_completo',
+    ).annotate(
+        libras=Sum('libras_cortadas'),
+        dias=Sum('dias_trabajados'),
+        semanas=Count('semana', distinct=True),
+        libras_ultima=Sum('libras_cortadas', filter=Q(semana=ultima)),
+        libras_anterior=Sum('libras_cortadas', filter=Q(semana=anterior)),
+    ).order_by('-libras', 'trabajador__nombre_completo')
+    if limite:
+        filas = filas[:limite]
+    filas = list(filas)
+
+    desglose = defaultdict(dict)
+    for fila in resumenes.filter(
+        trabajador_id__in=[fila['trabajador_id'] for fila in filas]
+    ).values('trabajador_id', 'tipo_cafe').annotate(libras=Sum('libras_cortadas')).order_by():
+        desglose[fila['trabajador_id']][fila['tipo_cafe']] = float(fila['libras'])
+
+    ranking = []
+    for posicion, fila in enumerate(filas, start=1):
+        libras = fila['libras'] or Decimal('0')
+        ultima_libras = fila['libras_ultima'] or Decimal('0')
+        anterior_libras = fila['libras_anterior'] or Decimal('0')
+        ranking.append({
+            'posicion': posicion,
+            'trabajador_id': fila['trabajador_id'],
+            'trabajador': fila['trabajador__nombre_completo'],
+            'libras': float(libras),
+            'quintales': float(libras / LIBRAS_POR_QUINTAL),
+            'dias': fila['dias'],
+            'semanas': fila['semanas'],
+            'libras_por_dia': round(float(libras) / fila['dias'], 2) if fila['dias'] else 0,
+            'libras_ultima_semana': float(ultima_libras),
+            'libras_semana_anterior': float(anterior_libras),
+            'variacion_semanal': float(ultima_libras - anterior_libras),
+            'variacion_porcentaje': (
+                round(float((ultima_libras - anterior_libras) / anterior_libras * 100), 1)
+                if anterior_libras else None
+            ),
+            'por_tipo_cafe': desglose[fila['trabajador_id']],
+        })
+
+    return {
+        'temporada': temporada,
+        'tipo_cafe': tipo_cafe,
+        'ultima_semana': ultima,
+        'semana_anterior': anterior,
+        'ranking': ranking,
+    }
+
+
+def semanas_trabajador(temporada, trabajador_id):
+    """Serie semanal de un cortador con el desglose por tipo de café y la variación contra la semana previa"""
+    filas = ResumenCorteSemanal.objects.filter(
+        temporada=temporada, trabajador_id=trabajador_id,
+    ).values('semana', 'tipo_cafe').annotate(
+        libras=Sum('libras_cortadas'), dias=Sum('dias_trabajados'),
+    ).order_by('semana', 'tipo_cafe')
+
+    semanas = {}
+    for fila in filas:
+        semana = semanas.setdefault(fila['semana'], {'semana': fila['semana'], 'libras': 0.0, 'dias': 0, 'por_tipo_cafe': {}})
+        semana['libras'] += float(fila['libras'])
+        semana['dias'] += fila['dias']
+        semana['por_tipo_cafe'][fila['tipo_cafe']] = float(fila['libras'])
+
+    serie = []
+    previa = None
+    for semana in semanas.values():
+        semana['variacion_semanal'] = round(semana['libras'] - previa, 2) if previa is not None else None
+        previa = semana['libras']
+        serie.append(semana)
+    return serie
@@ -0,0 +1,92 @@
+"""
+Pronóstico de mantenimiento de planta.
+
+La tasa de uso es una media móvil exponencial de horas por día que se actualiza
+con cada evento UsoPlanta (ver MantenimientoPlanta.registrar_uso), sin recorrer
+el historial. Con esa tasa se proyecta la fecha en que horas_acumuladas alcanza
+limite_horas, opcionalmente sumando procesos planificados.
+"""
+import math
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Peso del último día cerrado en la media móvil
+ALFA = Decimal('0.3')
+HORIZONTE_DIAS = 365
+
+
+def actualizar_tasa(tasa, horas_dia, fecha_dia, horas, fecha):
+    """
+    Incorpora un evento de uso a la media móvil.
+
+    horas_dia/fecha_dia son las horas del día todavía abierto. Cuando llega un
+    evento de un día posterior, ese día se cierra dentro de la media y los días
+    intermedios sin uso cuentan como 0 horas.
+    Devuelve (tasa, horas_dia, fecha_dia).
+    """
+    tasa = Decimal(tasa or 0)
+    horas = Decimal(horas)
+    if fecha_dia is None:
+        return tasa, horas, fecha
+    if fecha <= fecha_dia:
+        return tasa, Decimal(horas_dia or 0) + horas, fecha_dia
+
+    tasa = ALFA * Decimal(horas_dia or 0) + (1 - ALFA) * tasa
+    dias_sin_uso = (fecha - fecha_dia).days - 1
+    if dias_sin_uso > 0:
+        tasa *= (1 - ALFA) ** dias_sin_uso
+    return tasa, horas, fecha
+
+
+def tasa_estimada(tasa, horas_dia):
+    """Horas por día a usar en la proyección; sin días cerrados se usa el día en curso"""
+    tasa = Decimal(tasa or 0)
+    if tasa > 0:
+        return tasa
+    return Decimal(horas_dia or 0)
+
+
+def horas_entre(hora_inicio, hora_final):
+    """Duración en horas entre dos horas del día (cruza la medianoche si final < inicio)"""
+    inicio = datetime.combine(datetime.today(), hora_inicio)
+    final = datetime.combine(datetime.today(), hora_final)
+    if final < inicio:
+        final += timedelta(days=1)
+    return Decimal(str(round((final - inicio).seconds / 3600, 2)))
+
+
+def proyectar_fecha_limite(horas_acumuladas, limite_horas, tasa, hoy):
+    """Fecha estimada en que se alcanza el límite con la tasa actual (None si no hay uso)"""
+    restantes = Decimal(limite_horas) - Decimal(horas_acumuladas)
+    if restantes <= 0:
+        return hoy
+    if tasa <= 0:
+        return None
+    return hoy + timedelta(days=math.ceil(restantes / Decimal(tasa)))
+
+
+def simular(horas_acumuladas, limite_horas, tasa, hoy, planificados=None, horizonte=HORIZONTE_DIAS):
+    """
+    Proyección día a día. planificados es {fecha: horas}; en los días con procesos
+    planificados se usan esas horas en lugar de la tasa estimada.
+    Devuelve (fecha_limite o None, serie [(fecha, horas_acumuladas)]).
+    """
+    planificados = planificados or {}
+    acumuladas = Decimal(horas_acumuladas)
+    limite = Decimal(limite_horas)
+    tasa = Decimal(tasa)
+    serie = []
+
+    if acumuladas >= limite:
+        return hoy, [(hoy, acumuladas)]
+
+    ultimo_plan = max(planificados, default=hoy)
+    for dia_numero in range(horizonte):
+        dia = hoy + timedelta(days=dia_numero)
+        acumuladas += planificados.get(dia, tasa)
+        serie.append((dia, acumuladas))
+        if acumuladas >= limite:
+            return dia, serie
+        if tasa <= 0 and dia >= ultimo_plan:
+            break
+    return None, serie
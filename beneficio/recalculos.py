@@ -0,0 +1,168 @@
+"""
+Recálculos que dependen de los registros de café: costos (costos.py), resumen
+de rendimiento (analitica_rendimiento.py), ficha de proveedores
+(analitica_proveedores.py), diario de existencias (diario_inventario.py) e
+índice de ubicaciones (ubicaciones.py).
+
+Cada uno se registra con dos piezas (al importarse su módulo, ver apps.py):
+
+- observar(modelo, tareas, campos, expresiones): antes de guardar o borrar se
+  lee el estado guardado del registro con estado() (una sola consulta con los
+  campos de todos los observadores del modelo) y después el nuevo. tareas(pk,
+  antes, despues) compara los dos y devuelve solo lo que cambió: a una trilla
+  que cambia de percha no se le recalculan costos ni proveedores.
+- al_confirmar(orden, ejecutar): anotar() junta las tareas de la transacción
+  en curso y ejecutar_pendientes() las pasa una sola vez al confirmarla
+  (transaction.on_commit) a cada ejecutar(pendientes), por orden y dentro de un
+  único transaction.atomic(): o quedan al día todos los resúmenes o ninguno.
+  Fuera de una transacción se ejecutan en el acto.
+
+El rendimiento se recalcula por grupo (mes, proveedor, tipo de café, operador)
+y la ficha solo de los proveedores tocados. Los comandos recalcular_costos,
+generar_resumen_*, registrar_diario_inventario y generar_indice_ubicaciones
+siguen reconstruyendo todo.
+"""
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+_pendientes = threading.local()
+
+# modelo: [(tareas, campos, expresiones)]
+_observadores = defaultdict(list)
+# [(orden, ejecutar)]
+_ejecutores = []
+
+
+# ==========================================
+# REGISTRO
+# ==========================================
+
+def observar(modelo, tareas, campos=(), expresiones=None):
+    """
+    tareas(pk, antes, despues) devuelve las tareas {(tipo, valor)} que pide un
+    cambio del modelo; antes/despues traen campos y expresiones (None si el
+    registro no existía o ya no existe).
+    """
+    if modelo not in _observadores:
+        pre_save.connect(recordar_estado, sender=modelo)
+        pre_delete.connect(recordar_estado, sender=modelo)
+        post_save.connect(anotar_guardado, sender=modelo)
+        post_delete.connect(anotar_eliminado, sender=modelo)
+    _observadores[modelo].append((tareas, tuple(campos), dict(expresiones or {})))
+
+
+def al_confirmar(orden, ejecutar):
+    """ejecutar(pendientes) recibe {tipo: valores} de todas las tareas anotadas y toma las suyas"""
+    _ejecutores.append((orden, ejecutar))
+    _ejecutores.sort(key=lambda ejecutor: ejecutor[0])
+
+
+# ==========================================
+# ESTADO GUARDADO Y CAMBIOS
+# ==========================================
+
+def estado(modelo, pk):
+    """Campos observados del registro tal como están guardados; None si no existe"""
+    campos, expresiones = set(), {}
+    for _, campos_observador, expresiones_observador in _observadores[modelo]:
+        campos.update(campos_observador)
+        expresiones.update(expresiones_observador)
+    return modelo.objects.filter(pk=pk).values(*campos, **expresiones).first()
+
+
+def cambio(antes, despues, *campos):
+    """El registro se creó, se borró o cambió alguno de los campos"""
+    if antes is None or despues is None:
+        return True
+    return any(antes[campo] != despues[campo] for campo in campos)
+
+
+def movido(antes, despues, campo):
+    """Cambió de valor un registro que ya existía y sigue existiendo"""
+    return antes is not None and despues is not None and antes[campo] != despues[campo]
+
+
+def valores(antes, despues, *campos):
+    """Valores no vacíos de los campos antes y después del cambio"""
+    return {
+        estado_registro[campo]
+        for estado_registro in (antes, despues) if estado_registro
+        for campo in campos if estado_registro[campo]
+    }
+
+
+def tareas(modelo, pk, antes, despues):
+    """Recálculos que pide el cambio de un registro; antes/despues son estado() o None si no existía"""
+    if antes is None and despues is None:
+        return set()
+    pedidas = set()
+    for tareas_observador, _, _ in _observadores[modelo]:
+        pedidas |= tareas_observador(pk, antes, despues)
+    return pedidas
+
+
+# ==========================================
+# SEÑALES
+# ==========================================
+
+def recordar_estado(sender, instance, **kwargs):
+    """Estado guardado antes del cambio, para comparar en post_save / post_delete"""
+    instance._estado_recalculos = estado(sender, instance.pk) if instance.pk else None
+
+
+def anotar_guardado(sender, instance, **kwargs):
+    antes = getattr(instance, '_estado_recalculos', None)
+    anotar(tareas(sender, instance.pk, antes, estado(sender, instance.pk)))
+
+
+def anotar_eliminado(sender, instance, **kwargs):
+    anotar(tareas(sender, instance.pk, getattr(instance, '_estado_recalculos', None), None))
+
+
+# ==========================================
+# EJECUCIÓN AL CONFIRMAR LA TRANSACCIÓN
+# ==========================================
+
+def _tareas_pendientes():
+    if not hasattr(_pendientes, 'tareas'):
+        _pendientes.tareas = defaultdict(set)
+    return _pendientes.tareas
+
+
+def _ejecucion_pedida():
+    """Sigue en cola algún ejecutar_pendientes() de la transacción en curso"""
+    return any(funcion is ejecutar_pendientes for _, funcion, _ in transaction.get_connection().run_on_commit)
+
+
+def anotar(nuevas):
+    """
+    Agrega tareas a las pendientes del hilo y pide ejecutarlas al confirmar la
+    transacción. Se pide en cada llamada: si un savepoint se revierte, su
+    on_commit se descarta pero las tareas siguen pendientes para el siguiente.
+    Si ya no queda ningún pedido en cola, las tareas anteriores eran de una
+    transacción (o savepoint) revertida y se descartan.
+    """
+    if not nuevas:
+        return
+    pendientes = _tareas_pendientes()
+    if pendientes and not _ejecucion_pedida():
+        pendientes.clear()
+    for tipo, valor in nuevas:
+        pendientes[tipo].add(valor)
+    transaction.on_commit(ejecutar_pendientes)
+
+
+def ejecutar_pendientes():
+    """Corre todas las tareas anotadas, cada una una vez, en el orden de registro"""
+    pendientes = _tareas_pendientes()
+    if not pendientes:
+        return
+    _pendientes.tareas = defaultdict(set)
+
+    with transaction.atomic():
+        for _, ejecutar in _ejecutores:
+            ejecutar(pendientes)
+
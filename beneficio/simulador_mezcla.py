@@ -0,0 +1,224 @@
+"""
+Simulador de mezclas.
+
+Predice la calidad de una mezcla candidata antes de crearla: puntaje de taza,
+humedad, defectos (Total Green Defects) y granulometría (mallas 10 a 21),
+como promedio ponderado por peso de la última catación de cada fuente. Los
+lotes usan su catación más reciente (y su humedad de ingreso si la catación no
+la trae); las subpartidas su score y humedad propios, y la catación más
+reciente de su partida para defectos y granulometría.
+
+También busca proporciones: recorre todas las combinaciones en pasos de N %
+(con el peso máximo de cada fuente) y devuelve las que más se acercan al
+puntaje objetivo. La calidad de cada fuente se lee una sola vez y cada
+combinación se evalúa sobre esos valores, sin volver a la base de datos.
+"""
+import math
+import time
+from itertools import combinations
+
+from django.db.models import Q
+
+from .models import Catacion, Lote, SubPartida
+
+MALLAS = list(range(10, 22))
+CAMPOS_MALLA = [f'gran_{malla}' for malla in MALLAS]
+MALLA_MINIMA_PREPARACION = 15  # "sobre malla 15" en la preparación de exportación
+
+MAX_COMPONENTES = 15  # mismo límite que el formulario de mezclas
+PASOS_PERMITIDOS = (1, 2, 5, 10, 20, 25, 50)
+MAX_COMBINACIONES = 50000
+CANDIDATOS = 5
+
+
+def _numero(valor):
+    return float(valor) if valor is not None else None
+
+
+# ==========================================
+# DATOS DE CALIDAD
+# ==========================================
+
+def cargar_fuentes(lote_ids=(), subpartida_ids=()):
+    """
+    Calidad de cada fuente: {('lote', id) | ('subpartida', id): {codigo, puntaje,
+    humedad, defectos, granulometria}}. Los valores sin dato quedan en None.
+    Tres consultas fijas: lotes, subpartidas y las cataciones de todos ellos.
+    """
+    lotes = list(Lote.objects.filter(pk__in=lote_ids).values('id', 'codigo', 'humedad'))
+    subpartidas = list(SubPartida.objects.filter(pk__in=subpartida_ids).values(
+        'id', 'numero_subpartida', 'nombre', 'partida_id', 'score', 'humedad',
+    ))
+    partida_ids = {subpartida['partida_id'] for subpartida in subpartidas}
+
+    # La primera fila de cada lote/partida es su catación más reciente
+    ultima_por_lote, ultima_por_partida = {}, {}
+    cataciones = Catacion.objects.filter(
+        Q(lote_id__in=[lote['id'] for lote in lotes]) | Q(partida_id__in=partida_ids)
+    ).order_by('-fecha_catacion', '-id').values(
+        'lote_id', 'partida_id', 'codigo_muestra', 'puntaje_total', 'humedad_grano',
+        'total_green_defects', *CAMPOS_MALLA,
+    )
+    for catacion in cataciones:
+        if catacion['lote_id']:
+            ultima_por_lote.setdefault(catacion['lote_id'], catacion)
+        if catacion['partida_id']:
+            ultima_por_partida.setdefault(catacion['partida_id'], catacion)
+
+    def granulometria(catacion):
+        if catacion is None:
+            return None
+        perfil = [float(catacion[campo] or 0) for campo in CAMPOS_MALLA]
+        return perfil if any(perfil) else None
+
+    fuentes = {}
+    for lote in lotes:
+        catacion = ultima_por_lote.get(lote['id'])
+        fuentes[('lote', lote['id'])] = {
+            'codigo': lote['codigo'],
+            'catacion': catacion['codigo_muestra'] if catacion else None,
+            'puntaje': _numero(catacion['puntaje_total']) if catacion and catacion['puntaje_total'] else None,
+            'humedad': _numero((catacion and catacion['humedad_grano']) or lote['humedad']),
+            'defectos': _numero(catacion['total_green_defects']) if catacion else None,
+            'granulometria': granulometria(catacion),
+        }
+    for subpartida in subpartidas:
+        catacion = ultima_por_partida.get(subpartida['partida_id'])
+        puntaje = subpartida['score'] or (catacion and catacion['puntaje_total']) or None
+        fuentes[('subpartida', subpartida['id'])] = {
+            'codigo': f"{subpartida['numero_subpartida']} - {subpartida['nombre']}",
+            'catacion': catacion['codigo_muestra'] if catacion else None,
+            'puntaje': _numero(puntaje),
+            'humedad': _numero(subpartida['humedad'] or (catacion and catacion['humedad_grano']) or None),
+            'defectos': _numero(catacion['total_green_defects']) if catacion else None,
+            'granulometria': granulometria(catacion),
+        }
+    return fuentes
+
+
+# ==========================================
+# PREDICCIÓN
+# ==========================================
+
+def _promedio(pesos, valores):
+    """Promedio ponderado de los valores presentes y la fracción del peso que tiene dato"""
+    total = sum(pesos)
+    con_dato = [(peso, valor) for peso, valor in zip(pesos, valores) if valor is not None and peso]
+    peso_con_dato = sum(peso for peso, _ in con_dato)
+    if not peso_con_dato:
+        return None, 0.0
+    valor = sum(peso * valor for peso, valor in con_dato) / peso_con_dato
+    return round(valor, 2), round(peso_con_dato / total * 100, 1) if total else 0.0
+
+
+def predecir(calidades, pesos):
+    """
+    Calidad esperada de la mezcla. calidades y pesos van en el mismo orden.
+    La cobertura indica qué porcentaje del peso tenía dato para cada métrica.
+    """
+    prediccion, cobertura = {}, {}
+    for metrica in ('puntaje', 'humedad', 'defectos'):
+        prediccion[metrica], cobertura[metrica] = _promedio(pesos, [calidad[metrica] for calidad in calidades])
+
+    perfiles = [calidad['granulometria'] for calidad in calidades]
+    pesos_perfil = [peso for peso, perfil in zip(pesos, perfiles) if perfil and peso]
+    if pesos_perfil:
+        total_perfil = sum(pesos_perfil)
+        mezcla = [
+            sum(peso * perfil[indice] for peso, perfil in zip(pesos, perfiles) if perfil and peso) / total_perfil
+            for indice in range(len(MALLAS))
+        ]
+        prediccion['granulometria'] = {str(malla): round(valor, 2) for malla, valor in zip(MALLAS, mezcla)}
+        prediccion['sobre_malla_15'] = round(sum(
+            valor for malla, valor in zip(MALLAS, mezcla) if malla >= MALLA_MINIMA_PREPARACION
+        ), 2)
+        cobertura['granulometria'] = round(total_perfil / sum(pesos) * 100, 1)
+    else:
+        prediccion['granulometria'] = None
+        prediccion['sobre_malla_15'] = None
+        cobertura['granulometria'] = 0.0
+
+    prediccion['cobertura'] = cobertura
+    return prediccion
+
+
+# ==========================================
+# BÚSQUEDA DE PROPORCIONES
+# ==========================================
+
+def _numero_combinaciones(componentes, unidades):
+    return math.comb(unidades + componentes - 1, componentes - 1)
+
+
+def _paso_factible(componentes, paso):
+    """El paso pedido, o el siguiente más grueso que no exceda MAX_COMBINACIONES"""
+    for candidato in PASOS_PERMITIDOS:
+        if candidato >= paso and _numero_combinaciones(componentes, 100 // candidato) <= MAX_COMBINACIONES:
+            return candidato
+    return PASOS_PERMITIDOS[-1]
+
+
+def buscar_proporciones(calidades, objetivo, peso_total, maximos=None, paso=5, limite=CANDIDATOS):
+    """
+    Combinaciones de proporciones (múltiplos de paso %, suman 100 %) cuyo puntaje
+    previsto queda más cerca del objetivo; a igual distancia gana la de menos
+    defectos. maximos: kg máximos por fuente (None = sin límite).
+    """
+    inicio = time.perf_counter()
+    cantidad = len(calidades)
+    paso = _paso_factible(cantidad, paso)
+    unidades = 100 // paso
+
+    # Tope de unidades de cada fuente según su peso máximo
+    topes = [
+        unidades if not maximo else min(unidades, int(maximo / peso_total * 100 // paso))
+        for maximo in (maximos or [None] * cantidad)
+    ]
+    puntajes = [calidad['puntaje'] for calidad in calidades]
+    defectos = [calidad['defectos'] or 0.0 for calidad in calidades]
+    con_puntaje = [puntaje is not None for puntaje in puntajes]
+    puntajes = [puntaje or 0.0 for puntaje in puntajes]
+
+    evaluadas = 0
+    mejores = []  # (distancia, defectos, proporciones)
+    # Barras y estrellas: cada combinación de cantidad-1 separadores es un reparto de unidades
+    for separadores in combinations(range(unidades + cantidad - 1), cantidad - 1):
+        previo = -1
+        reparto = []
+        for separador in separadores:
+            reparto.append(separador - previo - 1)
+            previo = separador
+        reparto.append(unidades + cantidad - 2 - previo)
+        if any(parte > tope for parte, tope in zip(reparto, topes)):
+            continue
+        evaluadas += 1
+
+        unidades_puntaje = sum(parte for parte, tiene in zip(reparto, con_puntaje) if tiene)
+        if not unidades_puntaje:
+            continue
+        puntaje = sum(parte * valor for parte, valor in zip(reparto, puntajes)) / unidades_puntaje
+        carga = sum(parte * valor for parte, valor in zip(reparto, defectos)) / unidades
+        clave = (abs(puntaje - objetivo), carga)
+        if len(mejores) < limite or clave < mejores[-1][:2]:
+            mejores.append((*clave, reparto))
+            mejores.sort(key=lambda mejor: mejor[:2])
+            del mejores[limite:]
+
+    candidatos = []
+    for distancia, _, reparto in mejores:
+        proporciones = [parte * paso for parte in reparto]
+        pesos = [round(peso_total * proporcion / 100, 2) for proporcion in proporciones]
+        candidatos.append({
+            'proporciones': proporciones,
+            'pesos_kg': pesos,
+            'diferencia_objetivo': round(distancia, 2),
+            'prediccion': predecir(calidades, pesos),
+        })
+
+    return {
+        'objetivo': objetivo,
+        'paso': paso,
+        'evaluadas': evaluadas,
+        'milisegundos': round((time.perf_counter() - inicio) * 1000, 1),
+        'candidatos': candidatos,
+    }
@@ -1,3 +1,1504 @@
-from django.test import TestCase
+import importlib
+import json
+import uuid
+from io import StringIO
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    analitica_proveedores, analitica_rendimiento, busqueda, catalogos, diario_inventario, inventario, recalculos,
+    simulador_mezcla, ubicaciones,
+)
+from .models import (
+    Bodega, CambioComponenteMezcla, CambioRegistroDiario, Catacion, Compra, Comprador, ContenidoUbicacion,
+    DetalleMezcla, EtiquetaLote, HistorialMantenimiento, Lote, MantenimientoPlanta, Mezcla, MovimientoInventario,
+    OperacionSincronizacion, Partida, PlanillaSemanal, Procesado, ReciboCafe, RegistroDiario, Reproceso,
+    ResumenCorteSemanal, ResumenOperacionPlanta, ResumenProveedor, ResumenRendimientoMensual, ResumenTurnoPlanta,
+    SubPartida, TipoCafe, Trabajador, UbicacionBodega, UsoPlanta, Venta,
+)
+from .unidades import FACTORES_VENTA_KG, KG_POR_QUINTAL, KG_POR_QUINTAL_VENTA, a_kg, desde_kg, expresion_kg
+
+
+def crear_lote(bodega, peso_kg=0, precio_quintal=100, proveedor='Finca'):
+    return Lote.objects.create(
+        tipo_cafe='Catuai', bodega=bodega, peso_kg=peso_kg, humedad=12,
+        fecha_ingreso=timezone.now(), proveedor=proveedor, precio_quintal=precio_quintal,
+    )
+
+
+# ==========================================
+# MANTENIMIENTO DE PLANTA
+# ==========================================
+
+class MantenimientoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('planta', password='x', is_staff=True)
+
+    def setUp(self):
+        self.control = MantenimientoPlanta.get_or_create_control()
+
+    def test_registrar_uso_suma_y_cambia_de_estado_al_llegar_al_limite(self):
+        MantenimientoPlanta.registrar_uso(25)
+        self.control.refresh_from_db()
+        self.assertEqual((self.control.horas_acumuladas, self.control.estado), (Decimal('25'), 'operativa'))
+
+        MantenimientoPlanta.registrar_uso(15)
+        self.control.refresh_from_db()
+        self.assertEqual((self.control.horas_acumuladas, self.control.estado), (Decimal('40'), 'requiere_mantenimiento'))
+        self.assertEqual(UsoPlanta.objects.count(), 2)
+
+    def test_registrar_uso_no_pisa_horas_de_una_copia_vieja(self):
+        copia = MantenimientoPlanta.objects.get(pk=self.control.pk)
+        MantenimientoPlanta.registrar_uso(3)
+        copia.agregar_horas(2)
+        self.assertEqual(copia.horas_acumuladas, Decimal('5'))
+
+    def test_mantenimiento_anota_las_horas_actuales_y_deja_ajuste(self):
+        copia = MantenimientoPlanta.objects.get(pk=self.control.pk)
+        MantenimientoPlanta.registrar_uso(12)  # llega después de que se leyó la copia
+
+        copia.realizar_mantenimiento(self.usuario, 'Cambio de bandas', tipo_mantenimiento='correctivo')
+
+        self.assertEqual(HistorialMantenimiento.objects.get().horas_acumuladas, Decimal('12'))
+        self.assertEqual((copia.horas_acumuladas, copia.estado), (Decimal('0'), 'operativa'))
+        reinicio = UsoPlanta.objects.get(tipo_proceso='ajuste', horas__lt=0)
+        self.assertEqual(reinicio.horas, Decimal('-12'))
+        self.assertEqual(UsoPlanta.objects.aggregate(total=Sum('horas'))['total'], 0)
+
+    def test_comando_reconstruye_el_contador_desde_los_eventos(self):
+        MantenimientoPlanta.registrar_uso(10)
+        self.control.realizar_mantenimiento(self.usuario)
+        MantenimientoPlanta.registrar_uso(4)
+        MantenimientoPlanta.registrar_uso(3)
+        MantenimientoPlanta.objects.filter(pk=self.control.pk).update(horas_acumuladas=99)
+
+        call_command('recalcular_horas_mantenimiento', stdout=StringIO())
+
+        self.control.refresh_from_db()
+        self.assertEqual((self.control.horas_acumuladas, self.control.estado), (Decimal('7'), 'operativa'))
+
+    def test_vista_realizar_mantenimiento(self):
+        MantenimientoPlanta.registrar_uso(41)
+        self.client.force_login(self.usuario)
+
+        respuesta = self.client.post(reverse('realizar_mantenimiento'), {
+            'tipo_mantenimiento': 'preventivo', 'observaciones': '', 'tiempo_mantenimiento_horas': '2', 'costo': '150',
+        })
+
+        self.assertRedirects(respuesta, reverse('control_mantenimiento'), fetch_redirect_response=False)
+        historial = HistorialMantenimiento.objects.get()
+        self.assertEqual((historial.horas_acumuladas, historial.costo), (Decimal('41'), Decimal('150')))
+        self.control.refresh_from_db()
+        self.assertEqual(self.control.horas_acumuladas, 0)
+
+
+# ==========================================
+# ANALÍTICA DE PLANTA
+# ==========================================
+
+class AnaliticaPlantaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('operador', password='x')
+        bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+        cls.lote = crear_lote(bodega, peso_kg=1000)
+
+    def procesado(self, inicio, final, registrado, kg=100):
+        procesado = Procesado.objects.create(
+            lote=self.lote, peso_inicial_kg=kg, peso_final_kg=kg * Decimal('0.8'),
+            hora_inicio=inicio, hora_final=final, operador=self.usuario,
+        )
+        # fecha es cuándo se registró el proceso, no cuándo arrancó
+        Procesado.objects.filter(pk=procesado.pk).update(fecha=registrado)
+        return procesado
+
+    def registrado(self, dia, hora, minuto=0):
+        return timezone.make_aware(datetime(2026, 3, dia, hora, minuto))
+
+    def dias(self):
+        from .analitica_planta import FUENTES, procesos_con_duracion
+        return dict(procesos_con_duracion(FUENTES[0]).values_list('pk', 'dia'))
+
+    def test_dia_del_turno_segun_la_hora_de_inicio(self):
+        casos = [
+            (time(22), time(2), self.registrado(11, 2, 30), date(2026, 3, 10)),  # nocturno registrado tras medianoche
+            (time(3), time(5), self.registrado(11, 5, 10), date(2026, 3, 10)),   # madrugada: turno de la noche anterior
+            (time(23), time(1), self.registrado(11, 9), date(2026, 3, 10)),     # registrado a la mañana siguiente
+            (time(8), time(17), self.registrado(11, 23, 50), date(2026, 3, 11)),
+        ]
+        procesados = [(self.procesado(inicio, final, registrado), dia) for inicio, final, registrado, dia in casos]
+
+        dias = self.dias()
+        self.assertEqual([dias[procesado.pk] for procesado, _ in procesados], [dia for _, dia in procesados])
+
+    def test_resumen_por_turno_descuenta_solapes(self):
+        from .analitica_planta import generar_resumen
+        self.procesado(time(8), time(10), self.registrado(11, 12))
+        self.procesado(time(9), time(12), self.registrado(11, 12))
+        self.procesado(time(14), time(15), self.registrado(11, 16))
+
+        generar_resumen(date(2026, 3, 11), date(2026, 3, 11))
+
+        turno = ResumenTurnoPlanta.objects.get(fecha=date(2026, 3, 11), turno='diurno')
+        self.assertEqual(turno.horas_operacion, Decimal('5'))
+        self.assertEqual((turno.numero_brechas, turno.mayor_brecha_horas), (1, Decimal('2')))
+        operacion = ResumenOperacionPlanta.objects.get()
+        self.assertEqual((operacion.numero_procesos, operacion.horas_operacion), (3, Decimal('6')))
+
+    def test_comando_nocturno_rehace_turnos_de_dias_anteriores(self):
+        # Registrado el 13 a la 01:00; arrancó el 12 a las 03:00, turno nocturno del 11
+        self.procesado(time(3), time(5), self.registrado(13, 1))
+
+        call_command('generar_resumen_planta', '--hasta', '2026-03-13', '--dias', '1', stdout=StringIO())
+
+        self.assertTrue(ResumenTurnoPlanta.objects.filter(fecha=date(2026, 3, 11), turno='nocturno').exists())
+
+
+# ==========================================
+# PRONÓSTICO DE MANTENIMIENTO
+# ==========================================
+
+class PronosticoMantenimientoTests(TestCase):
+    def test_tasa_cierra_el_dia_y_cuenta_dias_sin_uso(self):
+        from .pronostico_mantenimiento import ALFA, actualizar_tasa
+        lunes = date(2026, 3, 9)
+
+        tasa, horas_dia, fecha_dia = actualizar_tasa(0, 0, None, 6, lunes)
+        tasa, horas_dia, fecha_dia = actualizar_tasa(tasa, horas_dia, fecha_dia, 4, lunes)
+        self.assertEqual((tasa, horas_dia, fecha_dia), (0, Decimal('10'), lunes))
+
+        # El miércoles cierra el lunes (10 h) y el martes sin uso
+        tasa, horas_dia, fecha_dia = actualizar_tasa(tasa, horas_dia, fecha_dia, 5, lunes + timedelta(days=2))
+        self.assertEqual(tasa, ALFA * 10 * (1 - ALFA))
+        self.assertEqual(horas_dia, Decimal('5'))
+
+    def test_simulacion_con_planificados(self):
+        from .pronostico_mantenimiento import proyectar_fecha_limite, simular
+        hoy = date(2026, 3, 9)
+
+        self.assertEqual(proyectar_fecha_limite(10, 40, Decimal('3'), hoy), hoy + timedelta(days=10))
+        fecha, serie = simular(10, 40, Decimal('3'), hoy, {hoy + timedelta(days=1): Decimal('20')})
+        # 13 el primer día, 33 con la jornada planificada y luego 3 h por día
+        self.assertEqual(fecha, hoy + timedelta(days=4))
+        self.assertEqual(serie[1], (hoy + timedelta(days=1), Decimal('33')))
+        self.assertEqual(simular(10, 40, 0, hoy), (None, [(hoy, Decimal('10'))]))
+
+    def test_vista_valida_el_cuerpo(self):
+        self.client.force_login(User.objects.create_user('planta', password='x', is_staff=True))
+        url = reverse('simular_mantenimiento')
+        hoy = timezone.localdate().isoformat()
+
+        def post(datos):
+            return self.client.post(url, json.dumps(datos), content_type='application/json')
+
+        respuesta = post({'planificados': [{'fecha': hoy, 'horas': 50}]})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['fecha_con_planificados'], hoy)
+        for invalido in ([1, 2], {'planificados': [{'fecha': hoy, 'horas': 'Infinity'}]},
+                         {'planificados': [{'fecha': hoy, 'horas': 'NaN'}]},
+                         {'planificados': [{'fecha': hoy, 'horas': -1}]},
+                         {'planificados': [{'fecha': hoy, 'hora_inicio': '25:00', 'hora_final': '08:00'}]}):
+            self.assertEqual(post(invalido).status_code, 400, invalido)
+
+
+# ==========================================
+# COMPRADORES: COMPARACIÓN
+# ==========================================
+
+class CompararCompradoresTests(TestCase):
+    def test_suma_kg_de_unidades_distintas_y_ultima_compra(self):
+        self.client.force_login(User.objects.create_user('compras', password='x'))
+        ana, beto = (Comprador.objects.create(nombre=nombre) for nombre in ('Ana', 'Beto'))
+        for cantidad, unidad, dias in ((1, 'qq', 3), (100, 'lb', 2), (50, 'kg', 1)):
+            ultima = Compra.objects.create(
+                comprador=ana, cantidad=cantidad, unidad=unidad, precio_unitario=10,
+                fecha_compra=timezone.now() - timedelta(days=dias),
+            )
+
+        respuesta = self.client.post(reverse('comparar_compradores'), {'compradores': [ana.pk, beto.pk]})
+
+        datos = {fila['comprador'].pk: fila for fila in respuesta.context['comparacion_data']}
+        esperado = a_kg(1, 'qq') + a_kg(100, 'lb') + a_kg(50, 'kg')
+        self.assertAlmostEqual(datos[ana.pk]['peso_total_kg'], float(esperado), places=2)
+        self.assertEqual(datos[ana.pk]['total_compras'], 3)
+        self.assertEqual(datos[ana.pk]['ultima_compra']['monto_total'], ultima.monto_total)
+        self.assertEqual((datos[beto.pk]['total_compras'], datos[beto.pk]['ultima_compra']), (0, None))
+
+
+# ==========================================
+# COMPRADORES: TOTALES GUARDADOS
+# ==========================================
+
+class TotalesCompradorTests(TestCase):
+    CAMPOS = ('numero_compras', 'monto_comprado', 'kg_comprados', 'monto_pendiente', 'fecha_ultima_compra')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('compras', password='x', is_staff=True)
+        cls.compradores = [Comprador.objects.create(nombre=nombre) for nombre in ('Ana', 'Beto')]
+
+    def compra(self, comprador, cantidad, precio, dias=0, **extra):
+        return Compra.objects.create(
+            comprador=comprador, cantidad=cantidad, unidad='qq', precio_unitario=precio,
+            fecha_compra=timezone.now() - timedelta(days=dias), **extra,
+        )
+
+    def totales(self):
+        return list(Comprador.objects.order_by('pk').values_list(*self.CAMPOS))
+
+    def assertTotalesCoinciden(self):
+        guardados = self.totales()
+        Comprador.recalcular_totales()
+        self.assertEqual(guardados, self.totales())
+
+    def test_alta(self):
+        self.compra(self.compradores[0], 2, 500)
+        self.compra(self.compradores[0], 1, 300, estado_pago='pagado')
+        ana = Comprador.objects.get(pk=self.compradores[0].pk)
+        self.assertEqual(
+            (ana.numero_compras, ana.monto_comprado, ana.kg_comprados, ana.monto_pendiente),
+            (2, Decimal('1300'), 3 * KG_POR_QUINTAL, Decimal('1000')),
+        )
+        self.assertTotalesCoinciden()
+
+    def test_edicion_cambio_de_comprador_y_baja(self):
+        vieja = self.compra(self.compradores[0], 1, 100, dias=10)
+        reciente = self.compra(self.compradores[0], 2, 100, dias=1)
+
+        # Una copia vieja de la compra: se descuentan los valores guardados, no los de memoria
+        copia = Compra.objects.get(pk=reciente.pk)
+        reciente.cantidad = 3
+        reciente.save()
+        copia.comprador = self.compradores[1]
+        copia.estado_pago = 'pagado'
+        copia.save()
+        self.assertTotalesCoinciden()
+
+        vieja.delete()
+        self.assertTotalesCoinciden()
+        self.assertEqual(Comprador.objects.get(pk=self.compradores[0].pk).numero_compras, 0)
+
+    def test_cambio_de_estado_masivo(self):
+        compras = [self.compra(comprador, 1, 200) for comprador in self.compradores]
+        self.client.force_login(self.usuario)
+        url = reverse('cambiar_estado_compras_masivo')
+
+        for estado in ('pagado', 'pagado', 'pendiente'):
+            respuesta = self.client.post(url, json.dumps({
+                'compras_ids': [compra.pk for compra in compras], 'nuevo_estado': estado,
+            }), content_type='application/json')
+            self.assertTrue(respuesta.json()['success'])
+            self.assertTotalesCoinciden()
+        self.assertEqual(Comprador.objects.get(pk=self.compradores[0].pk).monto_pendiente, Decimal('200'))
+
+
+# ==========================================
+# COMPRAS: PAGINACIÓN Y EXPORTACIÓN
+# ==========================================
+
+class ListaComprasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .views import COMPRAS_POR_PAGINA
+        cls.usuario = User.objects.create_user('compras', password='x')
+        comprador = Comprador.objects.create(nombre='Ana')
+        ahora = timezone.now()
+        # Varias compras comparten fecha_compra: el id desempata el orden
+        Compra.objects.bulk_create([
+            Compra(comprador=comprador, cantidad=1, precio_unitario=10, monto_total=10,
+                   fecha_compra=ahora - timedelta(hours=numero // 3))
+            for numero in range(COMPRAS_POR_PAGINA * 2 + 5)
+        ])
+        cls.orden = list(Compra.objects.order_by('-fecha_compra', '-id').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def pagina(self, **parametros):
+        respuesta = self.client.get(reverse('lista_compras'), parametros)
+        return respuesta.context, [compra.pk for compra in respuesta.context['compras']]
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        vistos = []
+        contexto, ids = self.pagina()
+        vistos += ids
+        self.assertIsNone(contexto['cursor_anterior'])
+        while contexto['cursor_siguiente']:
+            contexto, ids = self.pagina(despues=contexto['cursor_siguiente'])
+            vistos += ids
+        self.assertEqual(vistos, self.orden)
+
+    def test_volver_a_la_pagina_anterior(self):
+        primera, ids_primera = self.pagina()
+        segunda, _ = self.pagina(despues=primera['cursor_siguiente'])
+
+        _, ids = self.pagina(antes=segunda['cursor_anterior'])
+        self.assertEqual(ids, ids_primera)
+
+    def test_cursor_invalido_muestra_la_primera_pagina(self):
+        _, ids = self.pagina(despues='no-es-un-cursor')
+        self.assertEqual(ids, self.orden[:len(ids)])
+
+    def test_exportacion_csv_en_streaming(self):
+        respuesta = self.client.get(reverse('exportar_compras_csv'))
+        self.assertTrue(respuesta.streaming)
+        lineas = b''.join(respuesta.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lineas), len(self.orden) + 1)
+        self.assertEqual(lineas[1].split(',')[0], str(self.orden[0]))
+
+
+# ==========================================
+# RECIBOS: PESO DEL LOTE POR DIFERENCIAS
+# ==========================================
+
+class PesoRecibosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+
+    def recibo(self, lote, peso, unidad='qq'):
+        recibo = ReciboCafe(lote=lote, peso=peso, unidad=unidad, humedad=12, proveedor='Finca', precio_quintal=100)
+        recibo.save()
+        return recibo
+
+    def peso(self, lote):
+        return Lote.objects.values_list('peso_kg', flat=True).get(pk=lote.pk)
+
+    def test_alta_edicion_y_baja_ajustan_el_peso(self):
+        lote = crear_lote(self.bodega, peso_kg=10)
+        recibo = self.recibo(lote, 2)
+        self.assertEqual(self.peso(lote), 10 + 2 * KG_POR_QUINTAL)
+
+        recibo.peso = 3
+        recibo.save()
+        self.assertEqual(self.peso(lote), 10 + 3 * KG_POR_QUINTAL)
+
+        recibo.delete()
+        self.assertEqual(self.peso(lote), 10)
+
+    def test_mover_recibo_entre_lotes(self):
+        origen = crear_lote(self.bodega)
+        destino = crear_lote(self.bodega)
+        recibo = self.recibo(origen, 100, unidad='kg')
+
+        recibo.lote = destino
+        recibo.save()
+        self.assertEqual(self.peso(origen), 0)
+        self.assertEqual(self.peso(destino), 100)
+
+    def test_no_pisa_cambios_concurrentes_del_lote(self):
+        lote = crear_lote(self.bodega)
+        recibo = self.recibo(lote, 1)
+        # Otro proceso suma peso al lote después de que este recibo lo leyó
+        Lote.objects.filter(pk=lote.pk).update(peso_kg=lote.peso_kg + 500)
+
+        recibo.peso = 2
+        recibo.save()
+        self.assertEqual(self.peso(lote), 500 + 2 * KG_POR_QUINTAL)
+
+    def test_crear_varios(self):
+        lote = crear_lote(self.bodega)
+        ReciboCafe.crear_varios(lote, [
+            ReciboCafe(peso=1, unidad='qq', humedad=12, proveedor='Finca', precio_quintal=100),
+            ReciboCafe(peso=50, unidad='kg', humedad=12, proveedor='Finca', precio_quintal=100),
+        ])
+        self.assertEqual(self.peso(lote), KG_POR_QUINTAL + 50)
+        numeros = list(ReciboCafe.objects.filter(lote=lote).values_list('numero_recibo', flat=True))
+        self.assertEqual(len(set(numeros)), 2)
+
+    def test_carga_masiva_reporta_filas_invalidas_sin_guardar(self):
+        self.client.force_login(User.objects.create_user('bodega', password='x', is_staff=True))
+        lote = crear_lote(self.bodega)
+        url = reverse('agregar_recibos_masivo', args=[lote.pk])
+        datos = {
+            'fecha_recibo': ['2026-10-01T08:00', '', ''], 'peso': ['1', 'NaN', 'Infinity'], 'unidad': ['qq'] * 3,
+            'humedad': ['12'] * 3, 'proveedor': [''] * 3, 'precio_quintal': ['100'] * 3,
+            'numero_boletas': [''] * 3, 'observaciones': [''] * 3,
+        }
+
+        respuesta = self.client.post(url, datos)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            [str(mensaje)[:6] for mensaje in respuesta.context['messages']], ['Fila 2', 'Fila 3'],
+        )
+        self.assertFalse(ReciboCafe.objects.exists())
+
+        datos['peso'] = ['1', '100', '']
+        datos['unidad'] = ['qq', 'kg', 'qq']
+        self.assertRedirects(
+            self.client.post(url, datos), reverse('detalle_lote', args=[lote.pk]), fetch_redirect_response=False,
+        )
+        self.assertEqual(self.peso(lote), KG_POR_QUINTAL + 100)
+
+
+# ==========================================
+# UNIDADES: CONVERSIÓN A KILOGRAMOS
+# ==========================================
+
+class UnidadesTests(TestCase):
+    def test_quintal_del_beneficio(self):
+        self.assertEqual(a_kg(2, 'qq'), Decimal('92.00'))
+        self.assertEqual(a_kg(100, 'lb'), Decimal('45.36'))
+        self.assertEqual(desde_kg(92, 'qq'), 2)
+
+    def test_expresion_sql_coincide_con_a_kg(self):
+        comprador = Comprador.objects.create(nombre='Ana')
+        for cantidad, unidad in ((2, 'qq'), (150, 'lb'), (80, 'kg')):
+            Compra.objects.create(comprador=comprador, cantidad=cantidad, unidad=unidad, precio_unitario=10)
+        for compra in Compra.objects.annotate(kg=expresion_kg('cantidad', 'unidad')):
+            self.assertEqual(round(compra.kg, 2), a_kg(compra.cantidad, compra.unidad))
+
+    def test_ventas_se_cotizan_en_quintal_de_45_36(self):
+        self.assertEqual(FACTORES_VENTA_KG['quintales'], KG_POR_QUINTAL_VENTA)
+        self.assertEqual(FACTORES_VENTA_KG['sacos'], KG_POR_QUINTAL)
+        venta = Venta.objects.create(tipo_producto='mezcla', peso_vendido_kg=Decimal('90.72'), precio_quintal=1000)
+        self.assertEqual(venta.precio_total, Decimal('2000'))
+        self.assertEqual(venta.quintales_vendidos, 2)
+
+        # Editar otros datos no recotiza la venta
+        venta.observaciones = 'Entregada'
+        venta.save()
+        venta.refresh_from_db()
+        self.assertEqual(venta.precio_total, Decimal('2000.00'))
+
+
+# ==========================================
+# PLANILLAS: CUADRÍCULA Y SINCRONIZACIÓN
+# ==========================================
+
+class DetallePlanillaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('oficina', password='x', is_staff=True)
+        cls.tipo = TipoCafe.objects.create(nombre='Caturra', descripcion='')
+        cls.planilla = PlanillaSemanal.objects.create(
+            fecha_inicio=date(2026, 10, 12), fecha_fin=date(2026, 10, 17), created_by=cls.usuario,
+        )
+        cls.trabajadores = [Trabajador.objects.create(nombre_completo=f'Cortador {i}') for i in range(2)]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def registro(self, trabajador, dia, fecha, libras, planilla=None, **extra):
+        return RegistroDiario.objects.create(
+            planilla=planilla or self.planilla, trabajador=trabajador, dia_semana=dia, fecha=fecha,
+            libras_cortadas=libras, **extra,
+        )
+
+    def detalle(self):
+        return self.client.get(reverse('detalle_planilla', args=[self.planilla.pk])).context
+
+    def test_pivote_trabajador_por_dia(self):
+        ana, beto = self.trabajadores
+        lunes = self.registro(ana, 'lunes', date(2026, 10, 12), 30, tipo_cafe=self.tipo)
+        self.registro(ana, 'martes', date(2026, 10, 13), 20, tipo_cafe_manual='Bourbon')
+        self.registro(beto, 'lunes', date(2026, 10, 12), 50)
+        # Un registro de otra semana no entra en esta planilla
+        otra = PlanillaSemanal.objects.create(
+            fecha_inicio=date(2026, 10, 19), fecha_fin=date(2026, 10, 24), created_by=self.usuario,
+        )
+        self.registro(ana, 'lunes', date(2026, 10, 19), 99, planilla=otra)
+
+        contexto = self.detalle()
+        filas = {fila['trabajador'].pk: fila for fila in contexto['tabla_datos']}
+        self.assertEqual(filas[ana.pk]['total_libras'], Decimal('50'))
+        self.assertEqual(filas[ana.pk]['registros_dias']['lunes'], {
+            'pk': lunes.pk, 'libras_cortadas': Decimal('30'), 'tipo_cafe': 'Caturra',
+        })
+        self.assertEqual(filas[ana.pk]['registros_dias']['martes']['tipo_cafe'], 'Bourbon')
+        self.assertIsNone(filas[ana.pk]['registros_dias']['miercoles'])
+        self.assertEqual(contexto['totales_dias']['lunes'], Decimal('80'))
+        self.assertEqual(contexto['totales_cafe'], {
+            'Bourbon': Decimal('20'), 'Caturra': Decimal('30'), 'No especificado': Decimal('50'),
+        })
+        self.assertEqual(contexto['total_libras_semana'], Decimal('100'))
+
+    def test_consultas_no_crecen_con_los_trabajadores(self):
+        def consultas():
+            with CaptureQueriesContext(connection) as capturadas:
+                self.detalle()
+            return len(capturadas)
+
+        self.registro(self.trabajadores[0], 'lunes', date(2026, 10, 12), 10, tipo_cafe=self.tipo)
+        antes = consultas()
+        for i in range(10):
+            trabajador = Trabajador.objects.create(nombre_completo=f'Nuevo {i}')
+            self.registro(trabajador, 'martes', date(2026, 10, 13), 15, tipo_cafe=self.tipo)
+        self.assertEqual(consultas(), antes)
+
+
+class CorteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('oficina', password='x', is_staff=True)
+        cls.tipo = TipoCafe.objects.create(nombre='Caturra', descripcion='')
+        cls.planilla = PlanillaSemanal.objects.create(
+            fecha_inicio=date(2026, 10, 12), fecha_fin=date(2026, 10, 17), created_by=cls.usuario,
+        )
+        cls.trabajadores = [Trabajador.objects.create(nombre_completo=f'Cortador {i}') for i in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def post(self, nombre, datos, *args):
+        return self.client.post(reverse(nombre, args=args), json.dumps(datos), content_type='application/json')
+
+    def test_cuadricula_reenviada_no_duplica(self):
+        celdas = [
+            {'trabajador_id': trabajador.pk, 'dia_semana': dia, 'libras_cortadas': '25', 'tipo_cafe_id': self.tipo.pk}
+            for trabajador in self.trabajadores for dia in ('lunes', 'martes')
+        ]
+        for _ in range(2):
+            respuesta = self.post('guardar_cuadricula_planilla', {'celdas': celdas}, self.planilla.pk)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta.json()['total_libras'], 150)
+
+        registros = self.planilla.registros_diarios.all()
+        self.assertEqual(registros.count(), 6)
+        self.assertEqual(registros.get(trabajador=self.trabajadores[0], dia_semana='martes').fecha, date(2026, 10, 13))
+
+    def test_cuadricula_elimina_y_conserva_campos_no_enviados(self):
+        trabajador = self.trabajadores[0]
+        RegistroDiario.objects.create(
+            planilla=self.planilla, trabajador=trabajador, dia_semana='lunes', fecha=date(2026, 10, 12),
+            libras_cortadas=10, tipo_cafe_manual='Bourbon', observaciones='Lluvia',
+        )
+        RegistroDiario.objects.create(
+            planilla=self.planilla, trabajador=trabajador, dia_semana='martes', fecha=date(2026, 10, 13),
+            libras_cortadas=20,
+        )
+        respuesta = self.post('guardar_cuadricula_planilla', {'celdas': [
+            {'trabajador_id': trabajador.pk, 'dia_semana': 'lunes', 'libras_cortadas': '15'},
+            {'trabajador_id': trabajador.pk, 'dia_semana': 'martes', 'libras_cortadas': None},
+        ]}, self.planilla.pk)
+
+        self.assertEqual(respuesta.json()['eliminados'], 1)
+        registro = self.planilla.registros_diarios.get()
+        self.assertEqual(registro.libras_cortadas, Decimal('15'))
+        self.assertEqual((registro.tipo_cafe_manual, registro.observaciones), ('Bourbon', 'Lluvia'))
+
+    def test_cuadricula_invalida_no_guarda_nada(self):
+        respuesta = self.post('guardar_cuadricula_planilla', {'celdas': [
+            {'trabajador_id': self.trabajadores[0].pk, 'dia_semana': 'lunes', 'libras_cortadas': '10'},
+            {'trabajador_id': self.trabajadores[1].pk, 'dia_semana': 'lunes', 'libras_cortadas': '-1'},
+        ]}, self.planilla.pk)
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(self.planilla.registros_diarios.exists())
+
+    def test_sincronizacion_reenviada_se_responde_como_duplicada(self):
+        operaciones = [
+            {
+                'clave': str(uuid.uuid4()), 'planilla_id': self.planilla.pk, 'trabajador_id': trabajador.pk,
+                'dia_semana': 'lunes', 'libras_cortadas': '100', 'tipo_cafe_id': self.tipo.pk,
+            }
+            for trabajador in self.trabajadores
+        ]
+        primera = self.post('sincronizar_registros_corte', {'operaciones': operaciones}).json()
+        self.assertEqual({op['estado'] for op in primera['operaciones']}, {'aplicada'})
+
+        # El dispositivo no recibió la respuesta y reenvía el lote, ya con otro valor en pantalla
+        operaciones[0]['libras_cortadas'] = '999'
+        segunda = self.post('sincronizar_registros_corte', {
+            'operaciones': operaciones, 'cursor': primera['cursor'],
+        }).json()
+
+        self.assertEqual({op['estado'] for op in segunda['operaciones']}, {'duplicada'})
+        self.assertEqual(segunda['cambios'], [])
+        self.assertEqual(segunda['operaciones'][0]['registro']['libras_cortadas'], '100.00')
+        self.assertEqual(RegistroDiario.objects.count(), 3)
+        self.assertEqual(OperacionSincronizacion.objects.count(), 3)
+
+    def test_sincronizacion_clave_repetida_en_el_lote(self):
+        clave = str(uuid.uuid4())
+        operacion = {
+            'clave': clave, 'planilla_id': self.planilla.pk, 'trabajador_id': self.trabajadores[0].pk,
+            'dia_semana': 'martes', 'libras_cortadas': '50',
+        }
+        respuesta = self.post('sincronizar_registros_corte', {'operaciones': [operacion, dict(operacion)]}).json()
+
+        self.assertEqual(len(respuesta['operaciones']), 1)
+        self.assertEqual(RegistroDiario.objects.count(), 1)
+
+    def test_sincronizacion_devuelve_borrados_desde_el_cursor(self):
+        registro = RegistroDiario.objects.create(
+            planilla=self.planilla, trabajador=self.trabajadores[0], dia_semana='lunes',
+            fecha=date(2026, 10, 12), libras_cortadas=10,
+        )
+        registro_id = registro.pk
+        cursor = self.post('sincronizar_registros_corte', {}).json()['cursor']
+        registro.delete()
+
+        respuesta = self.post('sincronizar_registros_corte', {'cursor': cursor}).json()
+        self.assertEqual([eliminado['id'] for eliminado in respuesta['eliminados']], [registro_id])
+
+    def test_sincronizacion_sigue_la_bitacora_y_no_repite_borrados(self):
+        self.post('guardar_cuadricula_planilla', {'celdas': [
+            {'trabajador_id': trabajador.pk, 'dia_semana': 'lunes', 'libras_cortadas': '25'}
+            for trabajador in self.trabajadores[:2]
+        ]}, self.planilla.pk)
+        primera = self.post('sincronizar_registros_corte', {}).json()
+        self.assertEqual(len(primera['cambios']), 2)
+        primero, segundo = RegistroDiario.objects.order_by('trabajador_id')
+
+        # Una transacción que confirma tarde trae un updated_at anterior al cursor ya entregado:
+        # el orden lo da la bitácora, no la hora
+        RegistroDiario.objects.filter(pk=primero.pk).update(libras_cortadas=77, updated_at=timezone.now() - timedelta(hours=1))
+        CambioRegistroDiario.anotar([primero])
+        segunda = self.post('sincronizar_registros_corte', {'cursor': primera['cursor']}).json()
+        self.assertEqual([(fila['id'], fila['libras_cortadas']) for fila in segunda['cambios']], [(primero.pk, '77.00')])
+
+        segundo_id = segundo.pk
+        segundo.delete()
+        tercera = self.post('sincronizar_registros_corte', {'cursor': segunda['cursor']}).json()
+        self.assertEqual(([eliminado['id'] for eliminado in tercera['eliminados']], tercera['cambios']), ([segundo_id], []))
+        cuarta = self.post('sincronizar_registros_corte', {'cursor': tercera['cursor']}).json()
+        self.assertEqual((cuarta['eliminados'], cuarta['cursor']), ([], tercera['cursor']))
+
+    def test_sincronizacion_acepta_el_cursor_anterior(self):
+        registro = RegistroDiario.objects.create(
+            planilla=self.planilla, trabajador=self.trabajadores[0], dia_semana='lunes',
+            fecha=date(2026, 10, 12), libras_cortadas=10,
+        )
+        viejo = f"{(timezone.now() - timedelta(minutes=1)).isoformat()}_{registro.pk}"
+        respuesta = self.post('sincronizar_registros_corte', {'cursor': viejo}).json()
+        self.assertEqual([fila['id'] for fila in respuesta['cambios']], [registro.pk])
+        self.assertEqual(respuesta['cursor'], str(CambioRegistroDiario.objects.latest('id').pk))
+        self.assertEqual(self.post('sincronizar_registros_corte', {'cursor': 'x'}).status_code, 400)
+
+
+class ProductividadCorteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('oficina', password='x', is_staff=True)
+        cls.tipo = TipoCafe.objects.create(nombre='Caturra', descripcion='')
+        cls.semanas = [
+            PlanillaSemanal.objects.create(fecha_inicio=inicio, fecha_fin=inicio + timedelta(days=5), created_by=cls.usuario)
+            for inicio in (date(2026, 10, 12), date(2026, 10, 19))
+        ]
+        cls.ana, cls.beto = [Trabajador.objects.create(nombre_completo=nombre) for nombre in ('Ana', 'Beto')]
+
+    def registro(self, planilla, trabajador, dia, libras, **extra):
+        return RegistroDiario.objects.create(
+            planilla=planilla, trabajador=trabajador, dia_semana=dia, fecha=planilla.fecha_inicio,
+            libras_cortadas=libras, **extra,
+        )
+
+    def resumen(self):
+        return sorted(ResumenCorteSemanal.objects.values_list(
+            'planilla_id', 'trabajador_id', 'tipo_cafe', 'temporada', 'dias_trabajados', 'libras_cortadas',
+        ))
+
+    def test_resumen_sigue_a_los_registros(self):
+        primera = self.semanas[0]
+        lunes = self.registro(primera, self.ana, 'lunes', 40, tipo_cafe=self.tipo)
+        self.registro(primera, self.ana, 'martes', 60, tipo_cafe=self.tipo)
+        self.assertEqual(self.resumen(), [(primera.pk, self.ana.pk, 'Caturra', '2026-2027', 2, Decimal('100'))])
+
+        lunes.libras_cortadas = 10
+        lunes.save()
+        lunes.refresh_from_db()
+        lunes.delete()
+        self.assertEqual(self.resumen(), [(primera.pk, self.ana.pk, 'Caturra', '2026-2027', 1, Decimal('60'))])
+
+        # Reconstruir desde cero da las mismas filas
+        guardado = self.resumen()
+        ResumenCorteSemanal.objects.all().delete()
+        call_command('generar_resumen_corte', stdout=StringIO())
+        self.assertEqual(self.resumen(), guardado)
+
+    def test_ranking_con_variacion_semanal(self):
+        primera, segunda = self.semanas
+        self.registro(primera, self.ana, 'lunes', 100, tipo_cafe=self.tipo)
+        self.registro(segunda, self.ana, 'lunes', 150, tipo_cafe_manual='Bourbon')
+        self.registro(primera, self.beto, 'lunes', 80)
+        self.registro(primera, self.beto, 'martes', 80)
+
+        self.client.force_login(self.usuario)
+        datos = self.client.get(reverse('productividad_temporada_api'), {
+            'temporada': '2026-2027', 'trabajador': self.ana.pk,
+        }).json()
+
+        self.assertEqual([fila['trabajador'] for fila in datos['ranking']], ['Ana', 'Beto'])
+        ana = datos['ranking'][0]
+        self.assertEqual((ana['libras'], ana['dias'], ana['semanas']), (250, 2, 2))
+        self.assertEqual(ana['por_tipo_cafe'], {'Bourbon': 150, 'Caturra': 100})
+        self.assertEqual((ana['variacion_semanal'], ana['variacion_porcentaje']), (50, 50))
+        self.assertEqual(datos['ranking'][1]['variacion_semanal'], -160)
+        self.assertEqual([semana['variacion_semanal'] for semana in datos['semanas']], [None, 50])
+
+
+# ==========================================
+# CATÁLOGOS EN MEMORIA
+# ==========================================
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CatalogosTests(TestCase):
+    def setUp(self):
+        catalogos._en_memoria.clear()
+
+    def test_segunda_lectura_no_consulta(self):
+        Bodega.objects.create(codigo='A', capacidad_kg=1000, ubicacion='Planta')
+        with self.captureOnCommitCallbacks(execute=True):
+            TipoCafe.objects.create(nombre='Caturra', descripcion='')
+        self.assertEqual([bodega.codigo for bodega in catalogos.bodegas()], ['A'])
+        self.assertEqual(len(catalogos.tipos_cafe()), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(catalogos.bodega(catalogos.bodegas()[0].pk).codigo, 'A')
+            self.assertEqual(catalogos.tipos_cafe()[0].nombre, 'Caturra')
+
+    def test_guardar_invalida_al_confirmar(self):
+        bodega = Bodega.objects.create(codigo='A', capacidad_kg=1000, ubicacion='Planta')
+        catalogos.bodegas()
+
+        with self.captureOnCommitCallbacks() as pendientes:
+            bodega.codigo = 'B'
+            bodega.save()
+        # Sin confirmar, los demás siguen leyendo la versión anterior
+        self.assertEqual(catalogos.bodegas()[0].codigo, 'A')
+
+        for callback in pendientes:
+            callback()
+        self.assertEqual(catalogos.bodegas()[0].codigo, 'B')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            EtiquetaLote.objects.create(nombre='Especial')
+        self.assertEqual(catalogos.etiqueta_por_nombre('especial').nombre, 'Especial')
+
+
+# ==========================================
+# BÚSQUEDA DE PRODUCTOS
+# ==========================================
+
+class BusquedaProductosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('bodega', password='x')
+        bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+        cls.lotes = [crear_lote(bodega, peso_kg=1000, proveedor=proveedor) for proveedor in ('Finca Sol', 'El Roble')]
+        cls.procesados = [
+            Procesado.objects.create(
+                lote=cls.lotes[0], peso_inicial_kg=400, peso_final_kg=300, operador=cls.usuario, finalizado=finalizado,
+            )
+            for finalizado in (False, True)
+        ]
+
+    def buscar(self, **parametros):
+        self.client.force_login(self.usuario)
+        return self.client.get(reverse('buscar_productos'), parametros)
+
+    def test_codigo_exacto_primero_y_peso_disponible(self):
+        lote = self.lotes[0]
+        resultados = busqueda.buscar_productos(lote.codigo.lower(), tipos=('lote', 'procesado'))
+        self.assertEqual((resultados[0]['tipo'], resultados[0]['id']), ('lote', lote.pk))
+        self.assertEqual(resultados[0]['peso_disponible'], 200)
+
+    def test_proveedor_sin_distinguir_mayusculas(self):
+        resultados = busqueda.buscar_productos('el ro', tipos=('lote',))
+        self.assertEqual([fila['id'] for fila in resultados], [self.lotes[1].pk])
+
+    def test_endpoint_filtra_pendientes_y_limita(self):
+        datos = self.buscar(q='finca', tipos='procesado', pendientes='1').json()
+        self.assertEqual([fila['id'] for fila in datos['resultados']], [self.procesados[0].pk])
+        self.assertEqual(len(self.buscar(limite='1').json()['resultados']), 1)
+        self.assertEqual(self.buscar(tipos='venta').status_code, 400)
+
+
+# ==========================================
+# BÚSQUEDA POR CÓDIGO
+# ==========================================
+
+class CodigosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('oficina', password='x')
+        bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+        cls.lote = crear_lote(bodega, peso_kg=1000)
+        cls.procesado = Procesado.objects.create(lote=cls.lote, peso_inicial_kg=100, peso_final_kg=80, operador=cls.usuario)
+        cls.recibo = ReciboCafe.objects.create(
+            lote=cls.lote, peso=1, unidad='qq', humedad=12, proveedor='Finca', precio_quintal=100,
+        )
+        cls.partida = Partida.objects.create(bodega=bodega)
+        cls.subpartida = SubPartida.objects.create(partida=cls.partida, nombre='Punto', peso_bruto_kg=KG_POR_QUINTAL)
+
+    def test_resuelve_cada_prefijo_completando_ceros(self):
+        def numero(codigo):
+            return int(codigo.rsplit('-', 1)[1])
+
+        casos = {
+            f' l-{numero(self.lote.codigo)} ': ('detalle_lote', self.lote.pk),
+            f't-{numero(self.procesado.numero_trilla)}': ('detalle_procesado', self.procesado.pk),
+            f'REC-{numero(self.recibo.numero_recibo)}': ('detalle_lote', self.lote.pk),
+            self.partida.numero_partida.lower(): ('detalle_partida', self.partida.pk),
+            f'{self.partida.numero_partida}-{numero(self.subpartida.numero_subpartida)}': (
+                'detalle_subpartida', self.subpartida.pk,
+            ),
+        }
+        for texto, destino in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(busqueda.resolver_codigo(texto), destino)
+        for texto in ('L-9999', 'X-1', '', 'L-'):
+            self.assertIsNone(busqueda.resolver_codigo(texto))
+
+    def test_ir_a_codigo_redirige_al_detalle_o_avisa(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('ir_a_codigo'), {'codigo': self.recibo.numero_recibo})
+        self.assertRedirects(respuesta, reverse('detalle_lote', args=[self.lote.pk]), fetch_redirect_response=False)
+
+        respuesta = self.client.get(reverse('ir_a_codigo'), {'codigo': 'L-9999'}, HTTP_REFERER='http://evil.example/')
+        self.assertRedirects(respuesta, reverse('dashboard'), fetch_redirect_response=False)
+
+
+# ==========================================
+# MEZCLAS: COMPONENTES
+# ==========================================
+
+class ComponentesMezclaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('mezclas', password='x')
+        cls.bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+        cls.lotes = [crear_lote(cls.bodega, peso_kg=1000) for _ in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def componentes(self, *pesos):
+        return json.dumps([{'lote_id': lote.pk, 'peso': peso} for lote, peso in pesos])
+
+    def detalles(self, mezcla):
+        return sorted(mezcla.detalles.values_list('lote_id', 'peso_kg', 'porcentaje'))
+
+    def test_crear_en_bloque(self):
+        a, b, _ = self.lotes
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(reverse('crear_mezcla'), {
+                'descripcion': 'Exportación', 'destino': 'Puerto', 'hora_inicio': '08:00', 'hora_final': '10:30',
+                'componentes': self.componentes((a, 300), (a, 100), (b, 100)),
+            })
+
+        mezcla = Mezcla.objects.get()
+        self.assertRedirects(respuesta, reverse('detalle_mezcla', args=[mezcla.pk]), fetch_redirect_response=False)
+        self.assertEqual(mezcla.peso_total_kg, Decimal('500'))
+        self.assertEqual(self.detalles(mezcla), [(a.pk, Decimal('400'), Decimal('80')), (b.pk, Decimal('100'), Decimal('20'))])
+        self.assertEqual(UsoPlanta.objects.get(mezcla=mezcla).horas, Decimal('2.5'))
+
+    def test_crear_con_lote_inexistente_no_guarda(self):
+        self.client.post(reverse('crear_mezcla'), {
+            'descripcion': 'x', 'destino': 'x', 'componentes': json.dumps([{'lote_id': 999999, 'peso': 10}]),
+        })
+        self.assertFalse(Mezcla.objects.exists())
+
+    def mezcla(self, *pesos):
+        mezcla = Mezcla.objects.create(descripcion='x', destino='x', peso_total_kg=sum(peso for _, peso in pesos))
+        for lote, peso in pesos:
+            DetalleMezcla.objects.create(mezcla=mezcla, lote=lote, peso_kg=peso, porcentaje=0)
+        return mezcla
+
+    def editar(self, mezcla, *pesos, recalcular=True):
+        with self.captureOnCommitCallbacks(execute=recalcular):
+            return self.client.post(reverse('editar_mezcla', args=[mezcla.pk]), {
+                'descripcion': 'x', 'destino': 'x', 'fecha': '2026-10-19 08:00',
+                'componentes': self.componentes(*pesos),
+            })
+
+    def test_editar_aplica_solo_las_diferencias(self):
+        a, b, c = self.lotes
+        mezcla = self.mezcla((a, 100), (b, 100))
+        detalle_a = mezcla.detalles.get(lote=a)
+
+        self.editar(mezcla, (a, 150), (c, 50))
+
+        mezcla.refresh_from_db()
+        self.assertEqual(mezcla.peso_total_kg, Decimal('200'))
+        self.assertEqual(self.detalles(mezcla), [(a.pk, Decimal('150'), Decimal('75')), (c.pk, Decimal('50'), Decimal('25'))])
+        self.assertEqual(mezcla.detalles.get(lote=a).pk, detalle_a.pk)
+        self.assertEqual(sorted(mezcla.cambios_componentes.values_list('lote_codigo', 'accion', 'peso_anterior_kg', 'peso_nuevo_kg')), [
+            (a.codigo, 'modificado', Decimal('100'), Decimal('150')),
+            (b.codigo, 'eliminado', Decimal('100'), Decimal('0')),
+            (c.codigo, 'agregado', Decimal('0'), Decimal('50')),
+        ])
+
+        # Reenviar lo mismo no cambia nada ni deja constancia
+        self.editar(mezcla, (a, 150), (c, 50))
+        self.assertEqual(CambioComponenteMezcla.objects.count(), 3)
+
+    def test_editar_con_consultas_fijas(self):
+        def consultas(mezcla, *pesos):
+            # Solo la transacción de la edición; los recálculos al confirmar se prueban aparte
+            with CaptureQueriesContext(connection) as capturadas:
+                self.editar(mezcla, *pesos, recalcular=False)
+            return len(capturadas)
+
+        a, b, c = self.lotes
+        otros = [crear_lote(self.bodega, peso_kg=1000) for _ in range(6)]
+        pocos = consultas(self.mezcla((a, 100), (b, 100)), (a, 150), (c, 50))
+        muchos = consultas(
+            self.mezcla((a, 100), (b, 100), *[(lote, 10) for lote in otros[:3]]),
+            (a, 150), (c, 50), *[(lote, 20) for lote in otros],
+        )
+        self.assertEqual(muchos, pocos)
+
+
+# ==========================================
+# MEZCLAS: SIMULADOR DE CALIDAD
+# ==========================================
+
+class SimuladorMezclaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('catador', password='x')
+        bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+        cls.lotes = [crear_lote(bodega, peso_kg=1000) for _ in range(2)]
+        cls.puntajes = []
+        for lote, nota in zip(cls.lotes, (8, 7)):
+            atributos = dict.fromkeys(
+                ('fragancia_aroma', 'sabor', 'sabor_residual', 'acidez', 'cuerpo', 'balance', 'puntaje_catador'), nota,
+            )
+            catacion = Catacion.objects.create(tipo_muestra='lote', lote=lote, catador=cls.usuario, **atributos)
+            cls.puntajes.append(float(catacion.puntaje_total))
+
+    def simular(self, datos):
+        self.client.force_login(self.usuario)
+        return self.client.post(reverse('simular_mezcla'), json.dumps(datos), content_type='application/json')
+
+    def test_prediccion_ponderada_y_busqueda(self):
+        alto, bajo = self.puntajes
+        objetivo = (alto + bajo) / 2
+        datos = self.simular({
+            'componentes': [{'lote_id': self.lotes[0].pk, 'peso': 300}, {'lote_id': self.lotes[1].pk, 'peso': 100}],
+            'objetivo': objetivo,
+        }).json()
+
+        self.assertEqual(datos['prediccion']['puntaje'], round((3 * alto + bajo) / 4, 2))
+        self.assertEqual(datos['prediccion']['humedad'], 12)
+        self.assertEqual(datos['prediccion']['cobertura']['puntaje'], 100)
+        mejor = datos['busqueda']['candidatos'][0]
+        self.assertEqual((mejor['proporciones'], mejor['pesos_kg']), ([50, 50], [200, 200]))
+        self.assertEqual(mejor['diferencia_objetivo'], 0)
+
+    def test_busqueda_respeta_el_peso_maximo(self):
+        calidades = [{'puntaje': 90.0, 'defectos': 0.0, 'humedad': None, 'granulometria': None},
+                     {'puntaje': 80.0, 'defectos': 5.0, 'humedad': None, 'granulometria': None}]
+        resultado = simulador_mezcla.buscar_proporciones(calidades, 90, 1000, maximos=[300, None], paso=10)
+        self.assertEqual(resultado['candidatos'][0]['proporciones'], [30, 70])
+        self.assertEqual(resultado['evaluadas'], 4)
+
+    def test_datos_invalidos(self):
+        for datos in ([1, 2], {'componentes': [{'lote_id': self.lotes[0].pk, 'peso': -1}]}, {'componentes': []}):
+            self.assertEqual(self.simular(datos).status_code, 400)
+        respuesta = self.simular({'componentes': [{'lote_id': 999999, 'peso': 10}]})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+# ==========================================
+# ANALÍTICA DE RENDIMIENTO
+# ==========================================
+
+class AnaliticaRendimientoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('trillador', password='x', is_staff=True)
+        cls.bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+
+    def resumen(self):
+        return {
+            (fila.proveedor, fila.numero_trillas, fila.kg_entrada, fila.kg_salida, fila.catadura)
+            for fila in ResumenRendimientoMensual.objects.all()
+        }
+
+    def test_guardar_trillas_y_lote_recalcula_sus_grupos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lote = crear_lote(self.bodega, peso_kg=1000, proveedor='Finca A')
+        with self.captureOnCommitCallbacks(execute=True):
+            Procesado.objects.create(lote=lote, peso_inicial_kg=100, peso_final_kg=80, catadura=5, operador=self.usuario)
+            Procesado.objects.create(lote=lote, peso_inicial_kg=100, peso_final_kg=70, operador=self.usuario)
+        self.assertEqual(self.resumen(), {('Finca A', 2, Decimal('200'), Decimal('150'), Decimal('5'))})
+
+        # Cambiar el proveedor del lote mueve sus trillas de grupo
+        with self.captureOnCommitCallbacks(execute=True):
+            lote.proveedor = 'Finca B'
+            lote.save()
+        self.assertEqual(self.resumen(), {('Finca B', 2, Decimal('200'), Decimal('150'), Decimal('5'))})
+
+        hoy = timezone.localdate()
+        fila, = analitica_rendimiento.rendimiento_por('proveedor', hoy, hoy)
+        self.assertEqual((fila['grupo'], fila['rendimiento'], fila['merma_pct']), ('Finca B', 75.0, 2.5))
+        self.assertEqual((fila['p10'], fila['p50'], fila['p90']), (71.0, 75.0, 79.0))
+
+    def test_comando_reconstruye_el_resumen(self):
+        lote = crear_lote(self.bodega, peso_kg=1000)
+        Procesado.objects.create(lote=lote, peso_inicial_kg=100, peso_final_kg=80, operador=self.usuario)
+        ResumenRendimientoMensual.objects.all().delete()
+        ResumenRendimientoMensual.objects.create(mes=date(2000, 1, 1), proveedor='Viejo')
+
+        call_command('generar_resumen_rendimiento', stdout=StringIO())
+        self.assertEqual(self.resumen(), {('Finca', 1, Decimal('100'), Decimal('80'), Decimal('0'))})
+
+
+# ==========================================
+# FICHA DE PROVEEDORES
+# ==========================================
+
+class AnaliticaProveedoresTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('catador', password='x', is_staff=True)
+        cls.bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+
+    def test_ficha_junta_mayusculas_y_sigue_los_cambios(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lote = crear_lote(self.bodega, peso_kg=100, precio_quintal=1000, proveedor='Finca A')
+            crear_lote(self.bodega, peso_kg=300, precio_quintal=2000, proveedor='FINCA A')
+        with self.captureOnCommitCallbacks(execute=True):
+            procesado = Procesado.objects.create(lote=lote, peso_inicial_kg=100, peso_final_kg=80, operador=self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            catacion = Catacion.objects.create(
+                tipo_muestra='procesado', procesado=procesado, catador=self.usuario,
+                **dict.fromkeys(('fragancia_aroma', 'sabor', 'sabor_residual', 'acidez', 'cuerpo', 'balance', 'puntaje_catador'), 8),
+            )
+
+        ficha = ResumenProveedor.objects.get()
+        self.assertEqual((ficha.clave, ficha.numero_lotes, ficha.kg_entregados), ('FINCA A', 2, Decimal('400')))
+        self.assertEqual(ficha.precio_promedio_quintal, Decimal('1750'))  # ponderado por kg
+        self.assertEqual((ficha.numero_trillas, ficha.rendimiento), (1, Decimal('80')))
+        self.assertEqual((ficha.numero_cataciones, ficha.puntaje_maximo), (1, catacion.puntaje_total))
+
+        # Al cambiar de proveedor, el lote (y su trilla y catación) pasa a la otra ficha
+        with self.captureOnCommitCallbacks(execute=True):
+            lote.proveedor = 'Finca B'
+            lote.save()
+        fichas = {ficha.clave: ficha for ficha in ResumenProveedor.objects.all()}
+        self.assertEqual((fichas['FINCA A'].numero_lotes, fichas['FINCA A'].numero_trillas), (1, 0))
+        self.assertEqual((fichas['FINCA B'].numero_trillas, fichas['FINCA B'].numero_cataciones), (1, 1))
+
+        orden = analitica_proveedores.ficha_proveedores('-kg_entregados')
+        self.assertEqual([ficha.clave for ficha in orden], ['FINCA A', 'FINCA B'])
+        orden = analitica_proveedores.ficha_proveedores('rendimiento')
+        self.assertEqual([ficha.clave for ficha in orden], ['FINCA B', 'FINCA A'])  # sin trillas al final
+        self.assertEqual([ficha.clave for ficha in analitica_proveedores.ficha_proveedores(texto='finca b')], ['FINCA B'])
+
+    def test_comando_reconstruye_la_ficha(self):
+        crear_lote(self.bodega, peso_kg=100, proveedor='Finca')
+        ResumenProveedor.objects.all().delete()
+        ResumenProveedor.objects.create(clave='VIEJO', proveedor='Viejo')
+
+        call_command('generar_resumen_proveedores', stdout=StringIO())
+        self.assertEqual(list(ResumenProveedor.objects.values_list('clave', 'kg_entregados')), [('FINCA', Decimal('100'))])
+
+
+# ==========================================
+# COSTOS
+# ==========================================
+
+class CostosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('planta', password='x', is_staff=True)
+        cls.bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+
+    def costo(self, objeto):
+        return type(objeto).objects.values_list('costo_kg', flat=True).get(pk=objeto.pk)
+
+    def test_cambio_de_precio_se_arrastra_a_los_derivados(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lote = crear_lote(self.bodega, peso_kg=460, precio_quintal=1000)
+        with self.captureOnCommitCallbacks(execute=True):
+            procesado = Procesado.objects.create(lote=lote, peso_inicial_kg=100, peso_final_kg=80, operador=self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            reproceso = Reproceso.objects.create(
+                procesado=procesado, peso_inicial_kg=50, peso_final_kg=40, motivo='Limpieza', operador=self.usuario,
+            )
+        self.assertAlmostEqual(self.costo(lote), Decimal('1000') / KG_POR_QUINTAL, places=3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lote.precio_quintal = 1380
+            lote.save()
+
+        costo_lote = Decimal('1380') / KG_POR_QUINTAL
+        self.assertAlmostEqual(self.costo(lote), costo_lote, places=3)
+        self.assertAlmostEqual(self.costo(procesado), costo_lote * 100 / 80, places=3)
+        self.assertAlmostEqual(self.costo(reproceso), costo_lote * 100 / 80 * 50 / 40, places=3)
+
+    def test_recibo_nuevo_recalcula_el_promedio_del_lote(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lote = crear_lote(self.bodega, peso_kg=460, precio_quintal=1000)
+        with self.captureOnCommitCallbacks(execute=True):
+            ReciboCafe.objects.create(lote=lote, peso=10, unidad='qq', humedad=11, proveedor='Finca', precio_quintal=1460)
+
+        # (10 qq a 1000 + 10 qq a 1460) / 920 kg
+        self.assertAlmostEqual(self.costo(lote), Decimal('24600') / 920, places=3)
+
+    def test_mezcla_pondera_sus_componentes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            barato = crear_lote(self.bodega, peso_kg=460, precio_quintal=920)
+            caro = crear_lote(self.bodega, peso_kg=460, precio_quintal=1840)
+        self.client.force_login(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('crear_mezcla'), {
+                'descripcion': 'Mezcla', 'destino': 'Exportación',
+                'componentes': json.dumps([{'lote_id': barato.pk, 'peso': 30}, {'lote_id': caro.pk, 'peso': 10}]),
+            })
+
+        mezcla = Mezcla.objects.get()
+        self.assertAlmostEqual(self.costo(mezcla), Decimal('25'), places=3)  # (20 × 30 + 40 × 10) / 40
+
+        with self.captureOnCommitCallbacks(execute=True):
+            caro.precio_quintal = 2760
+            caro.save()
+        self.assertAlmostEqual(self.costo(mezcla), Decimal('30'), places=3)  # (20 × 30 + 60 × 10) / 40
+
+
+# ==========================================
+# VALORACIÓN DE INVENTARIO
+# ==========================================
+
+class ValoracionInventarioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('contador', password='x', is_staff=True)
+        cls.bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+        cls.destino = Bodega.objects.create(codigo='B', capacidad_kg=100000, ubicacion='Planta')
+
+    def valoracion(self):
+        return {
+            (fila['bodega_id'], fila['tipo_producto']): (fila['kg_disponibles'], fila['valor'])
+            for fila in inventario.valoracion_actual()
+        }
+
+    def test_valora_el_saldo_de_cada_producto_a_su_costo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lote = crear_lote(self.bodega, peso_kg=460, precio_quintal=920)  # 20 por kg
+        with self.captureOnCommitCallbacks(execute=True):
+            Procesado.objects.create(
+                lote=lote, peso_inicial_kg=100, peso_final_kg=80, operador=self.usuario, bodega_destino=self.destino,
+            )
+        self.assertEqual(self.valoracion(), {
+            (self.bodega.pk, 'lote'): (Decimal('360.00'), Decimal('7200.00')),
+            (self.destino.pk, 'procesado'): (Decimal('80.00'), Decimal('2000.00')),
+        })
+
+        # Lo mezclado sale del lote y entra a la mezcla una sola vez
+        with self.captureOnCommitCallbacks(execute=True):
+            otro = crear_lote(self.bodega, peso_kg=460, precio_quintal=1840)  # 40 por kg, sin trillas
+        self.client.force_login(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('crear_mezcla'), {
+                'descripcion': 'Mezcla', 'destino': 'Exportación',
+                'componentes': json.dumps([{'lote_id': otro.pk, 'peso': 60}]),
+            })
+        valoracion = self.valoracion()
+        self.assertEqual(valoracion[(self.bodega.pk, 'lote')], (Decimal('760.00'), Decimal('23200.00')))
+        self.assertEqual(valoracion[(None, 'mezcla')], (Decimal('60.00'), Decimal('2400.00')))
+        self.assertEqual(sum(valor for _, valor in valoracion.values()), Decimal('27600.00'))
+
+    def test_corte_guardado_y_exportacion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_lote(self.bodega, peso_kg=460, precio_quintal=920)
+        call_command('generar_valoracion_inventario', '--fecha', '2024-01-31', stdout=StringIO())
+        call_command('generar_valoracion_inventario', '--fecha', '2024-01-31', stdout=StringIO())
+
+        corte = inventario.corte_guardado(date(2024, 1, 31))
+        self.assertEqual(len(corte), 1)
+        self.assertEqual((corte[0]['kg_disponibles'], corte[0]['valor']), (Decimal('460.00'), Decimal('9200.00')))
+
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('exportar_valoracion_csv'))
+        lineas = b''.join(respuesta.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lineas), 2)
+        self.assertTrue(lineas[1].endswith(',460.00,20.0000,9200.00'))
+
+
+# ==========================================
+# DIARIO DE INVENTARIO
+# ==========================================
+
+class DiarioInventarioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('bodega', password='x', is_staff=True)
+        cls.bodega = Bodega.objects.create(codigo='A', capacidad_kg=100000, ubicacion='Planta')
+
+    def saldos(self):
+        return {
+            (tipo, producto): kg
+            for tipo, producto, kg in MovimientoInventario.objects.values_list(
+                'tipo_producto', 'producto_id',
+            ).annotate(kg=Sum('kg')).order_by()
+            if kg
+        }
+
+    def test_borrar_lote_revierte_sus_movimientos_en_cascada(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lote = crear_lote(self.bodega, peso_kg=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            ReciboCafe.objects.create(lote=lote, peso=50, unidad='kg', humedad=12, proveedor='Finca', precio_quintal=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            procesado = Procesado.objects.create(
+                lote=lote, peso_inicial_kg=60, peso_final_kg=50, operador=self.usuario, bodega_destino=self.bodega,
+            )
+        self.assertEqual(self.saldos(), {('lote', lote.pk): Decimal('90'), ('procesado', procesado.pk): Decimal('50')})
+
+        movimientos = MovimientoInventario.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            lote.delete()
+
+        # El historial se conserva: cada efecto tiene su reverso y los saldos quedan en cero
+        self.assertEqual(self.saldos(), {})
+        self.assertGreater(MovimientoInventario.objects.count(), movimientos)
+
+    def test_editar_recibo_registra_solo_la_diferencia(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lote = crear_lote(self.bodega)
+        with self.captureOnCommitCallbacks(execute=True):
+            recibo = ReciboCafe.objects.create(lote=lote, peso=1, unidad='qq', humedad=12, proveedor='Finca', precio_quintal=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            recibo.peso = 2
+            recibo.save()
+
+        self.assertEqual(self.saldos(), {('lote', lote.pk): 2 * KG_POR_QUINTAL})
+        with self.captureOnCommitCallbacks(execute=True):
+            recibo.delete()
+        self.assertEqual(self.saldos(), {})
+
+    def test_registrar_bloquea_el_origen_antes_de_leer_lo_anotado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lote = crear_lote(self.bodega, peso_kg=100)
+        movimientos = MovimientoInventario.objects.count()
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(diario_inventario.registrar('lote', lote.pk), 0)
+
+        # Ya estaba al día: no se agrega nada, y la fila de origen se toma antes de sumar el diario
+        self.assertEqual(MovimientoInventario.objects.count(), movimientos)
+        sentencias = [consulta['sql'] for consulta in consultas.captured_queries]
+        primera_lectura = next(i for i, sql in enumerate(sentencias) if sql.startswith('SELECT'))
+        self.assertIn(Lote._meta.db_table, sentencias[primera_lectura])
+        self.assertNotIn(MovimientoInventario._meta.db_table, sentencias[primera_lectura])
+
+
+# ==========================================
+# ÍNDICE DE UBICACIONES
+# ==========================================
+
+class UbicacionesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('bodeguero', password='x', is_staff=True)
+        cls.bodega = Bodega.objects.create(codigo='A', nombre='Bodega A', capacidad_kg=1000, ubicacion='Planta')
+        cls.grande = Bodega.objects.create(codigo='B', nombre='Bodega B', capacidad_kg=5000, ubicacion='Planta')
+
+    def ocupacion(self):
+        return {
+            (ubicacion['bodega_id'], ubicacion['percha'], ubicacion['fila']): [
+                (producto['tipo'], producto['kg']) for producto in ubicacion['productos']
+            ]
+            for ubicacion in ubicaciones.mapa()
+        }
+
+    def test_mover_un_lote_libera_su_ubicacion_anterior(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lote = Lote.objects.create(
+                tipo_cafe='Catuai', bodega=self.bodega, percha=' percha  3 ', fila='1', peso_kg=100, humedad=12,
+                fecha_ingreso=timezone.now(), proveedor='Finca', precio_quintal=100,
+            )
+        self.assertEqual(self.ocupacion(), {(self.bodega.pk, 'PERCHA 3', '1'): [('lote', 100.0)]})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lote.percha = 'Percha 4'
+            lote.save()
+        self.assertEqual(self.ocupacion(), {
+            (self.bodega.pk, 'PERCHA 3', '1'): [],
+            (self.bodega.pk, 'PERCHA 4', '1'): [('lote', 100.0)],
+        })
+
+        ContenidoUbicacion.objects.all().delete()
+        call_command('generar_indice_ubicaciones', stdout=StringIO())
+        self.assertEqual(self.ocupacion()[(self.bodega.pk, 'PERCHA 4', '1')], [('lote', 100.0)])
+
+    def test_libres_por_capacidad_de_la_bodega(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Lote.objects.create(
+                tipo_cafe='Catuai', bodega=self.bodega, percha='P1', fila='1', peso_kg=600, humedad=12,
+                fecha_ingreso=timezone.now(), proveedor='Finca', precio_quintal=100,
+            )
+        UbicacionBodega.objects.create(bodega=self.bodega, percha='P2', fila='1')
+        UbicacionBodega.objects.create(bodega=self.grande, percha='P1', fila='1')
+        self.client.force_login(self.usuario)
+
+        def libres(**parametros):
+            respuesta = self.client.get(reverse('ubicaciones_libres_api'), parametros)
+            return [
+                (ubicacion['bodega'], ubicacion['percha'], ubicacion['capacidad_libre_kg'])
+                for ubicacion in respuesta.json()['ubicaciones']
+            ]
+
+        self.assertEqual(libres(), [('Bodega B', 'P1', 5000.0), ('Bodega A', 'P2', 400.0)])
+        self.assertEqual(libres(kg=500), [('Bodega B', 'P1', 5000.0)])
+        self.assertEqual(libres(limite=-5), [('Bodega B', 'P1', 5000.0)])
+        self.assertEqual(self.client.get(reverse('ubicaciones_libres_api'), {'kg': 'x'}).status_code, 400)
+
+
+# ==========================================
+# RECÁLCULOS AL CONFIRMAR
+# ==========================================
+
+class RecalculosTests(TestCase):
+    def pendientes(self):
+        return recalculos._tareas_pendientes()['prueba']
+
+    def anotar_y_revertir(self, valor):
+        try:
+            with transaction.atomic():
+                recalculos.anotar({('prueba', valor)})
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+    def test_transaccion_revertida_descarta_sus_tareas(self):
+        self.anotar_y_revertir(1)
+        self.assertEqual(self.pendientes(), {1})
+
+        with self.captureOnCommitCallbacks() as pedidos:
+            recalculos.anotar({('prueba', 2)})
+        self.assertEqual(self.pendientes(), {2})
+        self.assertIn(recalculos.ejecutar_pendientes, pedidos)
+
+    def test_savepoint_revertido_no_descarta_las_anteriores(self):
+        with self.captureOnCommitCallbacks():
+            recalculos.anotar({('prueba', 1)})
+            self.anotar_y_revertir(2)
+            recalculos.anotar({('prueba', 3)})
+        self.assertEqual(self.pendientes(), {1, 2, 3})
+
+
+# ==========================================
+# MIGRACIONES DE DATOS
+# ==========================================
+
+class UnificarEtiquetasTests(TestCase):
+    """0060: el texto libre de la subpartida pasa a la etiqueta del catálogo"""
+
+    migracion = importlib.import_module('beneficio.migrations.0060_unificar_etiquetas_subpartida')
+
+    @classmethod
+    def setUpTestData(cls):
+        # Modelos tal como estaban tras 0059, con etiqueta_texto y la FK nueva a la vez
+        # (se leen de los archivos de migración aunque MIGRATION_MODULES las desactive)
+        with override_settings(MIGRATION_MODULES={}):
+            estado = MigrationLoader(None, ignore_no_migrations=True).project_state(
+                ('beneficio', '0059_subpartida_etiqueta_fk'),
+            )
+        cls.apps = estado.apps
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'ALTER TABLE {SubPartida._meta.db_table} ADD COLUMN etiqueta_texto varchar(100) NULL'
+            )
+        cls.partida = Partida.objects.create(bodega=Bodega.objects.create(codigo='A', capacidad_kg=1, ubicacion='x'))
+
+    def subpartidas(self, *textos):
+        SubPartidaHistorica = self.apps.get_model('beneficio', 'SubPartida')
+        subpartidas = []
+        for texto in textos:
+            subpartida = SubPartida.objects.create(partida=self.partida, nombre='Punto', peso_bruto_kg=KG_POR_QUINTAL)
+            SubPartidaHistorica.objects.filter(pk=subpartida.pk).update(etiqueta_texto=texto)
+            subpartidas.append(subpartida)
+        return subpartidas
+
+    def etiquetas(self, subpartidas):
+        SubPartidaHistorica = self.apps.get_model('beneficio', 'SubPartida')
+        return list(
+            SubPartidaHistorica.objects.filter(pk__in=[s.pk for s in subpartidas])
+            .order_by('pk').values_list('etiqueta__nombre', flat=True)
+        )
+
+    def test_une_variantes_con_la_etiqueta_del_catalogo(self):
+        EtiquetaLote.objects.create(nombre='Premium')
+        subpartidas = self.subpartidas('premium', 'PREMIUM ', 'Premium')
+
+        self.migracion.unificar_etiquetas(self.apps, None)
+
+        self.assertEqual(self.etiquetas(subpartidas), ['Premium'] * 3)
+        self.assertEqual(EtiquetaLote.objects.count(), 1)
+
+    def test_crea_etiqueta_con_la_escritura_mas_usada(self):
+        subpartidas = self.subpartidas('nuevo', 'Nuevo', 'nuevo', '  ', None)
+
+        self.migracion.unificar_etiquetas(self.apps, None)
+
+        self.assertEqual(self.etiquetas(subpartidas), ['nuevo', 'nuevo', 'nuevo', None, None])
+        self.assertEqual(list(EtiquetaLote.objects.values_list('nombre', flat=True)), ['nuevo'])
+
+    def test_reversa_copia_el_nombre(self):
+        subpartidas = self.subpartidas('Especial')
+        self.migracion.unificar_etiquetas(self.apps, None)
+        SubPartidaHistorica = self.apps.get_model('beneficio', 'SubPartida')
+        SubPartidaHistorica.objects.update(etiqueta_texto=None)
+
+        self.migracion.copiar_nombres(self.apps, None)
+
+        self.assertEqual(
+            SubPartidaHistorica.objects.get(pk=subpartidas[0].pk).etiqueta_texto, 'Especial',
+        )
+
+
+class BitacoraRegistrosTests(TestCase):
+    """0063: los registros existentes y los borrados ya anotados pasan a la bitácora"""
+
+    migracion = importlib.import_module('beneficio.migrations.0063_cambio_registro_diario')
+
+    @classmethod
+    def setUpTestData(cls):
+        with override_settings(MIGRATION_MODULES={}):
+            estado = MigrationLoader(None, ignore_no_migrations=True).project_state(
+                ('beneficio', '0063_cambio_registro_diario'),
+            )
+        cls.apps = estado.apps
+        Eliminado = cls.apps.get_model('beneficio', 'RegistroDiarioEliminado')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {Eliminado._meta.db_table} (id integer PRIMARY KEY AUTOINCREMENT, '
+                'registro_id integer NOT NULL, planilla_id integer NOT NULL, trabajador_id integer NOT NULL, '
+                'dia_semana varchar(10) NOT NULL, fecha date NOT NULL, eliminado_en datetime NOT NULL)'
+            )
+        usuario = User.objects.create_user('oficina', password='x')
+        cls.planilla = PlanillaSemanal.objects.create(
+            fecha_inicio=date(2026, 10, 12), fecha_fin=date(2026, 10, 17), created_by=usuario,
+        )
+        cls.trabajador = Trabajador.objects.create(nombre_completo='Cortador')
+
+    def test_intercala_registros_y_borrados_por_momento(self):
+        inicio = timezone.now() - timedelta(days=1)
+        registros = [
+            RegistroDiario.objects.create(
+                planilla=self.planilla, trabajador=self.trabajador, dia_semana=dia, fecha=fecha, libras_cortadas=10,
+            )
+            for dia, fecha in (('lunes', date(2026, 10, 12)), ('martes', date(2026, 10, 13)))
+        ]
+        for horas, registro in enumerate(registros):
+            RegistroDiario.objects.filter(pk=registro.pk).update(updated_at=inicio + timedelta(hours=2 * horas))
+        Eliminado = self.apps.get_model('beneficio', 'RegistroDiarioEliminado')
+        Eliminado.objects.create(
+            registro_id=999, planilla_id=self.planilla.pk, trabajador_id=self.trabajador.pk,
+            dia_semana='miercoles', fecha=date(2026, 10, 14),
+        )
+        Eliminado.objects.update(eliminado_en=inicio + timedelta(hours=1))  # auto_now_add
+        CambioRegistroDiario.objects.all().delete()
+
+        self.migracion.poblar_bitacora(self.apps, None)
+        self.assertEqual(
+            list(CambioRegistroDiario.objects.values_list('registro_id', 'eliminado')),
+            [(registros[0].pk, False), (999, True), (registros[1].pk, False)],
+        )
 
-# Create your tests here.
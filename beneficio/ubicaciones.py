@@ -0,0 +1,257 @@
+"""
+Índice de ubicaciones físicas (bodega / percha / fila).
+
+Lote, Procesado, Reproceso y Mezcla guardan percha y fila en texto libre; las
+subpartidas toman bodega y percha de su Partida y la fila propia. Aquí cada
+combinación distinta es una UbicacionBodega (bodega, percha, fila únicas, con
+índice compuesto) y cada producto ubicado es un ContenidoUbicacion con sus kg
+del diario de existencias. Percha y fila se normalizan (sin espacios de más,
+en mayúsculas) para que "percha 3" y "PERCHA 3 " sean el mismo lugar.
+
+Al confirmar un cambio de lugar se llama a sincronizar() (registro en
+recalculos.py al final de la sección de sincronización), y diario_inventario a
+actualizar_kg() cuando cambian sus existencias; el comando
+generar_indice_ubicaciones reconstruye todo.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import (
+    ContenidoUbicacion, Lote, Mezcla, MovimientoInventario, Partida, Procesado, Reproceso, SubPartida,
+    UbicacionBodega,
+)
+from .recalculos import al_confirmar, cambio, movido, observar
+
+# tipo: (modelo, bodega, percha, fila)
+UBICACION_DE = {
+    'lote': (Lote, 'bodega_id', 'percha', 'fila'),
+    'procesado': (Procesado, 'bodega_destino_id', 'percha', 'fila'),
+    'reproceso': (Reproceso, 'bodega_destino_id', 'percha', 'fila'),
+    'mezcla': (Mezcla, 'bodega_destino_id', 'percha', 'fila'),
+    'partida': (SubPartida, 'partida__bodega_id', 'partida__percha', 'fila'),
+}
+
+CAMPO_PESO = DecimalField(max_digits=14, decimal_places=2)
+
+
+def normalizar(valor):
+    """'  percha  3 ' -> 'PERCHA 3'; None -> ''"""
+    return ' '.join((valor or '').split()).upper()
+
+
+def _codigos(tipo, ids):
+    from .inventario import FUENTES
+
+    return dict(UBICACION_DE[tipo][0].objects.filter(pk__in=ids).annotate(
+        codigo_ubicacion=FUENTES[tipo][4],
+    ).values_list('pk', 'codigo_ubicacion'))
+
+
+def _filtro_productos(claves):
+    """Q de los (tipo, producto_id) indicados, un IN por tipo"""
+    ids_por_tipo = defaultdict(set)
+    for tipo, producto_id in claves:
+        ids_por_tipo[tipo].add(producto_id)
+    filtro = Q(pk__in=[])
+    for tipo, ids in ids_por_tipo.items():
+        filtro |= Q(tipo_producto=tipo, producto_id__in=ids)
+    return filtro
+
+
+def _kg_diario(claves):
+    """{(tipo, producto_id): saldo del diario} en una consulta agrupada"""
+    filtro = _filtro_productos(claves)
+    return {
+        (tipo, producto_id): kg
+        for tipo, producto_id, kg in MovimientoInventario.objects.filter(filtro).values_list(
+            'tipo_producto', 'producto_id',
+        ).annotate(total=Sum('kg')).order_by()
+    }
+
+
+# ==========================================
+# SINCRONIZACIÓN
+# ==========================================
+
+@transaction.atomic
+def sincronizar(tipo, producto_ids):
+    """
+    Deja el índice igual a la ubicación actual de los productos: crea la
+    ubicación si es nueva, mueve el contenido o lo quita si el producto ya no
+    existe o no tiene percha ni fila.
+    """
+    producto_ids = {pk for pk in producto_ids if pk}
+    if not producto_ids:
+        return
+    modelo, bodega, percha, fila = UBICACION_DE[tipo]
+    lugares = {
+        pk: (bodega_id, normalizar(valor_percha), normalizar(valor_fila))
+        for pk, bodega_id, valor_percha, valor_fila in modelo.objects.filter(pk__in=producto_ids).values_list(
+            'pk', bodega, percha, fila,
+        )
+    }
+    lugares = {pk: lugar for pk, lugar in lugares.items() if lugar[0] and (lugar[1] or lugar[2])}
+
+    ContenidoUbicacion.objects.filter(tipo_producto=tipo, producto_id__in=producto_ids - set(lugares)).delete()
+    if not lugares:
+        return
+
+    ubicaciones = {}
+    for lugar in set(lugares.values()):
+        ubicaciones[lugar], _ = UbicacionBodega.objects.get_or_create(
+            bodega_id=lugar[0], percha=lugar[1], fila=lugar[2],
+        )
+    codigos = _codigos(tipo, lugares)
+    kg = _kg_diario([(tipo, pk) for pk in lugares])
+
+    existentes = {
+        contenido.producto_id: contenido
+        for contenido in ContenidoUbicacion.objects.filter(tipo_producto=tipo, producto_id__in=lugares)
+    }
+    nuevos, cambiados = [], []
+    for pk, lugar in lugares.items():
+        contenido = existentes.get(pk) or ContenidoUbicacion(tipo_producto=tipo, producto_id=pk)
+        contenido.ubicacion = ubicaciones[lugar]
+        contenido.codigo = codigos.get(pk) or ''
+        contenido.kg = kg.get((tipo, pk)) or 0
+        (cambiados if contenido.pk else nuevos).append(contenido)
+    ContenidoUbicacion.objects.bulk_create(nuevos)
+    ContenidoUbicacion.objects.bulk_update(cambiados, ['ubicacion', 'codigo', 'kg'])
+
+
+def actualizar_kg(claves):
+    """Refresca los kg de los productos ubicados cuyas existencias cambiaron en el diario"""
+    claves = set(claves)
+    if not claves:
+        return
+    contenidos = list(ContenidoUbicacion.objects.filter(_filtro_productos(claves)))
+    if contenidos:
+        kg = _kg_diario(claves)
+        for contenido in contenidos:
+            contenido.kg = kg.get((contenido.tipo_producto, contenido.producto_id)) or 0
+        ContenidoUbicacion.objects.bulk_update(contenidos, ['kg'])
+
+
+def regenerar_indice():
+    """Reconstruye el índice completo; las ubicaciones sin contenido se conservan como libres"""
+    ContenidoUbicacion.objects.all().delete()
+    total = 0
+    for tipo, (modelo, *_) in UBICACION_DE.items():
+        ids = set(modelo.objects.values_list('pk', flat=True))
+        sincronizar(tipo, ids)
+        total += ContenidoUbicacion.objects.filter(tipo_producto=tipo).count()
+    return total
+
+
+# ==========================================
+# RECÁLCULO AL GUARDAR
+# ==========================================
+
+def _tareas(tipo, *campos):
+    def tareas(pk, antes, despues):
+        return {('ubicacion', (tipo, pk))} if cambio(antes, despues, *campos) else set()
+    return tareas
+
+
+def _tareas_partida(pk, antes, despues):
+    """Bodega y percha de las subpartidas son las de su partida"""
+    if movido(antes, despues, 'bodega_id') or movido(antes, despues, 'percha'):
+        return {
+            ('ubicacion', ('partida', subpartida_id))
+            for subpartida_id in SubPartida.objects.filter(partida_id=pk).values_list('pk', flat=True)
+        }
+    return set()
+
+
+def _ejecutar(pendientes):
+    """Después del diario (orden 40), porque el índice lee sus kg"""
+    por_tipo = defaultdict(set)
+    for tipo, pk in pendientes['ubicacion']:
+        por_tipo[tipo].add(pk)
+    for tipo, ids in por_tipo.items():
+        sincronizar(tipo, ids)
+
+
+for _modelo, _tipo, _campos in (
+    (Lote, 'lote', ('bodega_id', 'percha', 'fila', 'codigo')),
+    (Procesado, 'procesado', ('bodega_destino_id', 'percha', 'fila', 'numero_trilla')),
+    (Reproceso, 'reproceso', ('procesado_id', 'numero', 'bodega_destino_id', 'percha', 'fila')),
+    (Mezcla, 'mezcla', ('numero', 'bodega_destino_id', 'percha', 'fila')),
+    (SubPartida, 'partida', ('partida_id', 'numero_subpartida', 'fila')),
+):
+    observar(_modelo, _tareas(_tipo, *_campos), _campos)
+observar(Partida, _tareas_partida, ('bodega_id', 'percha'))
+al_confirmar(50, _ejecutar)
+
+
+# ==========================================
+# CONSULTAS
+# ==========================================
+
+def _ubicaciones(bodega_id=None, percha=None, fila=None):
+    ubicaciones = UbicacionBodega.objects.filter(activo=True)
+    if bodega_id:
+        ubicaciones = ubicaciones.filter(bodega_id=bodega_id)
+    if percha:
+        ubicaciones = ubicaciones.filter(percha=normalizar(percha))
+    if fila:
+        ubicaciones = ubicaciones.filter(fila=normalizar(fila))
+    return ubicaciones
+
+
+def mapa(bodega_id=None, percha=None, fila=None):
+    """
+    Ubicaciones con su ocupación y su contenido en una sola consulta (LEFT JOIN
+    de ubicación y contenido). Los productos sin existencias no cuentan.
+    """
+    filas = _ubicaciones(bodega_id, percha, fila).values(
+        'pk', 'bodega_id', 'bodega__nombre', 'percha', 'fila',
+        'contenido__tipo_producto', 'contenido__producto_id', 'contenido__codigo', 'contenido__kg',
+    ).order_by('bodega__nombre', 'percha', 'fila', 'contenido__tipo_producto', 'contenido__codigo')
+
+    ubicaciones = {}
+    for registro in filas:
+        ubicacion = ubicaciones.setdefault(registro['pk'], {
+            'id': registro['pk'],
+            'bodega_id': registro['bodega_id'],
+            'bodega': registro['bodega__nombre'],
+            'percha': registro['percha'],
+            'fila': registro['fila'],
+            'kg': 0.0,
+            'productos': [],
+        })
+        if registro['contenido__kg'] and registro['contenido__kg'] > 0:
+            ubicacion['productos'].append({
+                'tipo': registro['contenido__tipo_producto'],
+                'id': registro['contenido__producto_id'],
+                'codigo': registro['contenido__codigo'],
+                'kg': float(registro['contenido__kg']),
+            })
+            ubicacion['kg'] += float(registro['contenido__kg'])
+    for ubicacion in ubicaciones.values():
+        ubicacion['libre'] = not ubicacion['productos']
+    return list(ubicaciones.values())
+
+
+def ubicaciones_libres(kg=None, bodega_id=None, limite=20):
+    """
+    Ubicaciones sin existencias para una entrada nueva, primero las de las
+    bodegas con más capacidad libre (capacidad_kg menos su saldo en el diario).
+    Con kg solo se proponen bodegas donde cabe esa cantidad.
+    """
+    saldo_bodega = MovimientoInventario.objects.filter(bodega=OuterRef('bodega_id')).order_by().values(
+        'bodega_id',
+    ).annotate(total=Sum('kg')).values('total')
+    libres = _ubicaciones(bodega_id).filter(bodega__activo=True).annotate(
+        bodega_nombre=F('bodega__nombre'),
+        ocupados=Count('contenido', filter=Q(contenido__kg__gt=0)),
+        capacidad_libre=F('bodega__capacidad_kg') - Coalesce(
+            Subquery(saldo_bodega, output_field=CAMPO_PESO), Value(0), output_field=CAMPO_PESO,
+        ),
+    ).filter(ocupados=0)
+    if kg:
+        libres = libres.filter(capacidad_libre__gte=kg)
+    return libres.order_by('-capacidad_libre', 'bodega_nombre', 'percha', 'fila')[:limite]
@@ -0,0 +1,112 @@
+"""
+Motor de unidades de peso.
+
+Todas las conversiones pasan por aquí: helpers en Python para instancias y
+expresiones ORM equivalentes para sumar y filtrar en SQL. El quintal del
+beneficio es de 46 kg (el mismo con el que se registran lotes, recibos y
+compras); ventas y exportaciones se cotizan en quintal comercial de 45.36 kg.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import Case, DecimalField, F, Value, When
+
+KG_POR_QUINTAL = Decimal('46')
+KG_POR_QUINTAL_VENTA = Decimal('45.36')  # precio_quintal de Venta y Exportacion
+KG_POR_LIBRA = Decimal('0.453592')
+LIBRAS_POR_SACO = Decimal('152')  # saco de café oro de 69 kg
+
+# Kilogramos por unidad. Las unidades sin peso fijo (sacos de compra) se toman tal cual.
+FACTORES_KG = {
+    'kg': Decimal('1'),
+    'g': Decimal('0.001'),
+    'qq': KG_POR_QUINTAL,
+    'lb': KG_POR_LIBRA,
+}
+
+# Kilogramos por unidad en los formularios de venta y exportación
+# ("bolsas" se multiplica además por las lb de cada bolsa)
+FACTORES_VENTA_KG = {
+    'kg': Decimal('1'),
+    'gramos': Decimal('0.001'),
+    'libras': KG_POR_LIBRA,
+    'quintales': KG_POR_QUINTAL_VENTA,
+    'bolsas': KG_POR_LIBRA,
+    'sacos': KG_POR_QUINTAL,
+}
+
+# Nombres largos que aparecen en formularios antiguos
+ALIAS = {
+    'kilogramos': 'kg',
+    'kilos': 'kg',
+    'gramos': 'g',
+    'quintales': 'qq',
+    'libras': 'lb',
+}
+
+DOS_DECIMALES = Decimal('0.01')
+CAMPO_KG = DecimalField(max_digits=14, decimal_places=4)
+
+
+def normalizar_unidad(unidad):
+    """Devuelve el código corto de la unidad ('kg', 'g', 'qq', 'lb') o la unidad tal cual"""
+    unidad = (unidad or '').strip().lower()
+    return ALIAS.get(unidad, unidad)
+
+
+def factor_kg(unidad):
+    """Kilogramos por unidad (1 si la unidad no tiene peso fijo)"""
+    return FACTORES_KG.get(normalizar_unidad(unidad), Decimal('1'))
+
+
+def a_kg(valor, unidad, redondear=True):
+    """Convierte valor en la unidad indicada a kilogramos (Decimal)"""
+    kg = Decimal(str(valor or 0)) * factor_kg(unidad)
+    return kg.quantize(DOS_DECIMALES, ROUND_HALF_UP) if redondear else kg
+
+
+def desde_kg(kg, unidad):
+    """Convierte kilogramos a la unidad indicada (Decimal, sin redondear)"""
+    return Decimal(str(kg or 0)) / factor_kg(unidad)
+
+
+def kg_a_quintales(kg):
+    return desde_kg(kg, 'qq')
+
+
+def kg_a_quintales_venta(kg):
+    """Quintales comerciales (45.36 kg) con los que se cotizan ventas y exportaciones"""
+    return Decimal(str(kg or 0)) / KG_POR_QUINTAL_VENTA
+
+
+def kg_a_libras(kg):
+    return desde_kg(kg, 'lb')
+
+
+def describir_sacos(valor, unidad):
+    """Texto con los sacos de 152 lb (69 kg) que salen de un peso"""
+    peso_lb = float(desde_kg(a_kg(valor, unidad, redondear=False), 'lb'))
+    saco_lb = float(LIBRAS_POR_SACO)
+    sacos_completos = int(peso_lb // saco_lb)
+    sobrante_lb = peso_lb % saco_lb
+    sobrante_kg = sobrante_lb * float(KG_POR_LIBRA)
+
+    if sacos_completos == 0:
+        return f"1 saco de {sobrante_lb:.2f} lb ({sobrante_kg:.2f} kg)"
+    if sobrante_lb < 1:  # Despreciar sobrantes menores a 1 lb
+        return f"{sacos_completos} sacos de 152 lb (69 kg)"
+    return f"{sacos_completos} sacos de 152 lb + 1 de {sobrante_lb:.2f} lb ({sobrante_kg:.2f} kg)"
+
+
+def expresion_kg(campo_valor, campo_unidad):
+    """
+    Expresión SQL equivalente a a_kg(campo_valor, campo_unidad) sin redondear.
+    Acepta rutas de relación, p. ej. expresion_kg('compras__cantidad', 'compras__unidad').
+    """
+    casos = []
+    for unidad, factor in FACTORES_KG.items():
+        unidades = [unidad] + [alias for alias, destino in ALIAS.items() if destino == unidad]
+        casos.append(When(
+            **{f'{campo_unidad}__in': unidades},
+            then=F(campo_valor) * Value(factor, output_field=CAMPO_KG),
+        ))
+    return Case(*casos, default=F(campo_valor), output_field=CAMPO_KG)
@@ -15,12 +15,14 @@ urlpatterns = [
     # Lotes
     path('lotes/', views.lista_lotes, name='lista_lotes'),
     path('lotes/crear/', views.crear_lote, name='crear_lote'),
+    path('lotes/proveedores/', views.ficha_proveedores_view, name='ficha_proveedores'),
     path('lotes/<int:pk>/', views.detalle_lote, name='detalle_lote'),
     path('lotes/<int:pk>/editar/', views.editar_lote, name='editar_lote'),
     path('lotes/<int:pk>/eliminar/', views.eliminar_lote, name='eliminar_lote'),
     
     # Procesados
     path('procesados/', views.lista_procesados, name='lista_procesados'),
+    path('procesados/rendimiento/', views.rendimiento_procesados_view, name='rendimiento_procesados'),
     path('procesados/seleccionar-lote/', views.seleccionar_lote_procesar, name='seleccionar_lote_procesar'),
     path('lotes/<int:lote_id>/procesar/', views.crear_procesado, name='crear_procesado'),
     path('procesados/<int:pk>/', views.detalle_procesado, name='detalle_procesado'),
@@ -40,8 +42,11 @@ urlpatterns = [
     path('reprocesos/<int:pk>/eliminar/', views.eliminar_reproceso, name='eliminar_reproceso'),
     
     # Mezclas
+    path('productos/buscar/', views.buscar_productos_api, name='buscar_productos'),
+    path('buscar/codigo/', views.ir_a_codigo, name='ir_a_codigo'),
     path('mezclas/', views.lista_mezclas, name='lista_mezclas'),
     path('mezclas/crear/', views.crear_mezcla, name='crear_mezcla'),
+    path('mezclas/simular/', views.simular_mezcla_api, name='simular_mezcla'),
     path('mezclas/<int:mezcla_id>/continuar/', views.continuar_mezcla, name='continuar_mezcla'),
     path('mezclas/<int:pk>/', views.detalle_mezcla, name='detalle_mezcla'),
     path('mezclas/<int:pk>/editar/', views.editar_mezcla, name='editar_mezcla'),
@@ -64,6 +69,7 @@ urlpatterns = [
 
     # Compras
     path('compras/', views.lista_compras, name='lista_compras'),
+    path('compras/exportar/', views.exportar_compras_csv, name='exportar_compras_csv'),
     path('compradores/<int:comprador_id>/compras/agregar/', views.agregar_compra, name='agregar_compra'),
     path('compras/<int:pk>/editar/', views.editar_compra, name='editar_compra'),
     path('compras/<int:pk>/eliminar/', views.eliminar_compra, name='eliminar_compra'),
@@ -73,9 +79,11 @@ urlpatterns = [
     path('mantenimiento/', views.control_mantenimiento, name='control_mantenimiento'),
     path('mantenimiento/realizar/', views.realizar_mantenimiento, name='realizar_mantenimiento'),
     path('mantenimiento/historial/', views.historial_mantenimiento, name='historial_mantenimiento'),
+    path('mantenimiento/simular/', views.simular_mantenimiento, name='simular_mantenimiento'),
 
     # Recibos de Café
     path('lotes/<int:lote_id>/recibos/agregar/', views.agregar_recibo, name='agregar_recibo'),
+    path('lotes/<int:lote_id>/recibos/agregar-varios/', views.agregar_recibos_masivo, name='agregar_recibos_masivo'),
     path('recibos/<int:pk>/editar/', views.editar_recibo, name='editar_recibo'),
     path('recibos/<int:pk>/eliminar/', views.eliminar_recibo, name='eliminar_recibo'),
     path('recibos/<int:recibo_id>/procesar/', views.procesar_desde_recibo, name='procesar_desde_recibo'),
@@ -95,6 +103,11 @@ urlpatterns = [
 
      # Resumen
     path('resumen-beneficio/', views.resumen_beneficio, name='resumen_beneficio'),
+    path('inventario/valoracion/', views.valoracion_inventario_view, name='valoracion_inventario'),
+    path('inventario/valoracion/exportar/', views.exportar_valoracion_csv, name='exportar_valoracion_csv'),
+    path('inventario/existencias/', views.existencias_al_view, name='existencias_al'),
+    path('inventario/ubicaciones/api/', views.ubicaciones_api, name='ubicaciones_api'),
+    path('inventario/ubicaciones/libres/api/', views.ubicaciones_libres_api, name='ubicaciones_libres_api'),
 
 
     # Lista de partidas
@@ -131,9 +144,16 @@ urlpatterns = [
     path('beneficiado-finca/planillas/<int:pk>/', views.detalle_planilla_view, name='detalle_planilla'),
     path('beneficiado-finca/planillas/<int:pk>/editar/', views.editar_planilla_view, name='editar_planilla'),
     path('beneficiado-finca/planillas/<int:pk>/eliminar/', views.eliminar_planilla_view, name='eliminar_planilla'),
+    path('beneficiado-finca/planillas/<int:pk>/cuadricula/', views.cuadricula_planilla_view, name='cuadricula_planilla'),
+    path('beneficiado-finca/planillas/<int:pk>/cuadricula/guardar/', views.guardar_cuadricula_planilla, name='guardar_cuadricula_planilla'),
 
     # Registros Diarios
     path('beneficiado-finca/planillas/<int:planilla_id>/registros/agregar/', views.agregar_registro_view, name='agregar_registro'),
     path('beneficiado-finca/registros/<int:pk>/eliminar/', views.eliminar_registro_view, name='eliminar_registro'),
+    path('beneficiado-finca/registros/sincronizar/', views.sincronizar_registros_corte, name='sincronizar_registros_corte'),
+
+    # Productividad por temporada
+    path('beneficiado-finca/productividad/', views.productividad_cortadores_view, name='productividad_cortadores'),
+    path('beneficiado-finca/productividad/api/', views.productividad_temporada_api, name='productividad_temporada_api'),
 
 ]
\ No newline at end of file
@@ -2,10 +2,10 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.http import JsonResponse
-from django.db.models import Sum, Count, Avg, Q
-from django.db.models.functions import ExtractYear
+from django.db.models import Sum, Count, Avg, Max, Q, F, OuterRef, Subquery, Value, DecimalField
+from django.db.models.functions import ExtractYear, Coalesce
 from django.core.paginator import Paginator
 from collections import OrderedDict
 from django.utils import timezone
@@ -19,11 +19,22 @@ from django.db.models.functions import TruncMonth, TruncYear, TruncDate, Extract
 from .models import Procesado, Reproceso, Mezcla, Venta, Exportacion, Comprador
 
 from .models import (
-    Lote, Procesado, Reproceso, Mezcla, DetalleMezcla,
-    Bodega, TipoCafe, Catacion, DefectoCatacion, Comprador, Compra,
+    Lote, Procesado, Reproceso, Mezcla, DetalleMezcla, CambioComponenteMezcla,
+    Bodega, Catacion, DefectoCatacion, Comprador, Compra,
     MantenimientoPlanta, HistorialMantenimiento, ReciboCafe, Partida, SubPartida,
-    Trabajador, PlanillaSemanal, RegistroDiario, MovimientoSubPartida, EtiquetaLote
+    Trabajador, PlanillaSemanal, RegistroDiario, MovimientoSubPartida,
+    OperacionSincronizacion, CambioRegistroDiario, ValoracionInventario
 )
+from .analitica_planta import utilizacion_por_turno, rendimiento_mensual, ranking
+from .productividad_corte import (
+    actualizar_resumen_planilla, ranking_temporada, semanas_trabajador, temporada_de,
+    temporadas_disponibles, tipos_cafe_temporada,
+)
+from . import catalogos
+from .busqueda import buscar_productos, TIPOS_PRODUCTO, LIMITE_POR_DEFECTO
+from . import simulador_mezcla
+from .recalculos import anotar
+from .unidades import FACTORES_VENTA_KG, a_kg, desde_kg, kg_a_quintales, kg_a_quintales_venta
 
 # ==========================================
 # VISTAS DE AUTENTICACIÓN
@@ -74,7 +85,7 @@ def dashboard(request):
     total_compradores = Comprador.objects.filter(activo=True).count()
     
     # Obtener información de bodegas
-    bodegas = Bodega.objects.all()
+    bodegas = catalogos.bodegas()
     bodegas_data = []
     for bodega in bodegas:
         ocupado = Lote.objects.filter(bodega=bodega, activo=True).aggregate(
@@ -146,6 +157,11 @@ def dashboard(request):
     # Crear las listas finales para el gráfico
     labels_por_dia = [dia.strftime('%d-%b') for dia in dias_en_rango.keys()]
     data_por_dia = list(dias_en_rango.values())
+
+    # --- Rendimiento de planta kg/h por mes (resumen precalculado) ---
+    rendimiento_planta = rendimiento_mensual(twelve_months_ago, today)
+    labels_rendimiento = [f"{month_names[fila['mes'].month]}-{fila['mes'].year}" for fila in rendimiento_planta]
+    data_rendimiento = [fila['kg_por_hora'] for fila in rendimiento_planta]
     
     # ========== NUEVO CÓDIGO DE CATACIÓN ==========
     
@@ -275,6 +291,8 @@ def dashboard(request):
         'data_por_mes': json.dumps(data_por_mes),
         'labels_por_dia': json.dumps(labels_por_dia),
         'data_por_dia': json.dumps(data_por_dia),
+        'labels_rendimiento': json.dumps(labels_rendimiento),
+        'data_rendimiento': json.dumps(data_rendimiento),
         
         # Nuevos datos de catación
         'year_filter': year_filter,
@@ -385,6 +403,25 @@ def lista_lotes(request):
     return render(request, 'beneficio/lotes/lista.html', context)
 
 
+@login_required
+def ficha_proveedores_view(request):
+    """Ficha de proveedores ordenable por entregas, precio, rendimiento o catación"""
+    from .analitica_proveedores import ORDENES, ORDEN_POR_DEFECTO, ficha_proveedores
+
+    orden = request.GET.get('orden') or ORDEN_POR_DEFECTO
+    if orden.lstrip('-') not in ORDENES:
+        orden = ORDEN_POR_DEFECTO
+    texto = request.GET.get('q', '').strip()
+
+    context = {
+        'proveedores': ficha_proveedores(orden, texto),
+        'orden': orden,
+        'ordenes': ORDENES,
+        'texto': texto,
+    }
+    return render(request, 'beneficio/lotes/proveedores.html', context)
+
+
 @login_required
 def crear_lote(request):
     """Crear nuevo lote"""
@@ -412,7 +449,7 @@ def crear_lote(request):
             messages.error(request, f'Error al crear lote: {str(e)}')
     
     context = {
-        'bodegas': Bodega.objects.all(),
+        'bodegas': catalogos.bodegas(),
 
     }
     return render(request, 'beneficio/lotes/crear.html', context)
@@ -458,7 +495,7 @@ def editar_lote(request, pk):
     
     context = {
         'lote': lote,
-        'bodegas': Bodega.objects.all(),
+        'bodegas': catalogos.bodegas(),
 
     }
     return render(request, 'beneficio/lotes/editar.html', context)
@@ -524,12 +561,43 @@ def lista_procesados(request):
     
     context = {
         'procesados': procesados_paginados, # Usar la variable paginada
-        'lotes': Lote.objects.all(), # Para el filtro
+        'filtros': {'fecha': fecha or '', 'lote': lote_codigo or '', 'year': year_filter or ''},
         'years': years,
         'estadisticas': estadisticas,
     }
     return render(request, 'beneficio/procesados/lista.html', context)
 
+
+@login_required
+def rendimiento_procesados_view(request):
+    """Rendimiento y mermas de trilla por proveedor, tipo de café, operador o mes"""
+    from .analitica_rendimiento import AGRUPACIONES, rendimiento_por, trillas_atipicas
+
+    hoy = timezone.localdate()
+    try:
+        desde = datetime.strptime(request.GET['desde'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        desde = (hoy - timedelta(days=365)).replace(day=1)
+    try:
+        hasta = datetime.strptime(request.GET['hasta'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        hasta = hoy
+    agrupar_por = request.GET.get('agrupar_por')
+    if agrupar_por not in AGRUPACIONES:
+        agrupar_por = 'proveedor'
+
+    context = {
+        'desde': desde,
+        'hasta': hasta,
+        'agrupar_por': agrupar_por,
+        'agrupaciones': [
+            ('proveedor', 'Proveedor'), ('tipo_cafe', 'Tipo de Café'), ('operador', 'Operador'), ('mes', 'Mes'),
+        ],
+        'filas': rendimiento_por(agrupar_por, desde, hasta),
+        'atipicas': trillas_atipicas(desde, hasta),
+    }
+    return render(request, 'beneficio/procesados/rendimiento.html', context)
+
 @login_required
 def crear_procesado(request, lote_id):
     lote = get_object_or_404(Lote, pk=lote_id)
@@ -619,7 +687,7 @@ def crear_procesado(request, lote_id):
     # GET - Mostrar formulario
     context = {
         'lote': lote,
-        'bodegas': Bodega.objects.all(),
+        'bodegas': catalogos.bodegas(),
         'today': timezone.now()
     }
     return render(request, 'beneficio/procesados/crear.html', context)
@@ -677,7 +745,7 @@ def editar_procesado(request, pk):
     
     context = {
         'procesado': procesado,
-        'bodegas': Bodega.objects.all(),
+        'bodegas': catalogos.bodegas(),
     }
     return render(request, 'beneficio/procesados/editar.html', context)
 
@@ -737,7 +805,7 @@ def crear_procesado_desde_recibo(request, recibo_id):
     
     context = {
         'lote': lote,
-        'bodegas': Bodega.objects.all(),
+        'bodegas': catalogos.bodegas(),
         'recibo': recibo,
         'peso_sugerido_kg': recibo.convertir_a_kg() 
     }
@@ -845,7 +913,7 @@ def crear_reproceso(request, procesado_id):
     siguiente_numero = (ultimo_reproceso.numero + 1) if ultimo_reproceso else 1
     
     context = {
-        'bodegas': Bodega.objects.all(),  
+        'bodegas': catalogos.bodegas(),  
         'procesado': procesado,
         'siguiente_numero': siguiente_numero,
     }
@@ -856,7 +924,7 @@ def crear_reproceso(request, procesado_id):
 def editar_reproceso(request, pk):
     """Vista para editar un reproceso existente"""
     reproceso = get_object_or_404(Reproceso, id=pk)
-    bodegas = Bodega.objects.all()
+    bodegas = catalogos.bodegas()
     
     if request.method == 'POST':
         try:
@@ -962,7 +1030,7 @@ def reprocesar_reproceso(request, pk):
             messages.error(request, f'Error al crear reproceso: {str(e)}')
     
     context = {
-        'bodegas': Bodega.objects.all(),  
+        'bodegas': catalogos.bodegas(),  
         'reproceso_origen': reproceso_origen,
     }
     return render(request, 'beneficio/reprocesos/crear_desde_reproceso.html', context)
@@ -998,6 +1066,71 @@ def lista_mezclas(request):
     return render(request, 'beneficio/mezclas/lista.html', context)
 
 
+@login_required
+def buscar_productos_api(request):
+    """
+    Autocompletado de lotes, procesados y reprocesos para los selectores.
+    GET: q (código, tipo de café o proveedor), tipos (lote,procesado,reproceso),
+    limite y pendientes=1 para dejar solo procesados sin finalizar.
+    """
+    tipos = [tipo for tipo in request.GET.get('tipos', '').split(',') if tipo] or list(TIPOS_PRODUCTO)
+    if any(tipo not in TIPOS_PRODUCTO for tipo in tipos):
+        return JsonResponse({'success': False, 'error': 'Tipo de producto inválido'}, status=400)
+    try:
+        limite = int(request.GET.get('limite', LIMITE_POR_DEFECTO))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Límite inválido'}, status=400)
+
+    resultados = buscar_productos(
+        request.GET.get('q', ''), tipos, limite,
+        pendientes=request.GET.get('pendientes') == '1',
+    )
+    return JsonResponse({'success': True, 'resultados': resultados})
+
+
+@login_required
+def ir_a_codigo(request):
+    """
+    Salta al detalle del registro cuyo código se escribió (L-0042, T-0107,
+    REC-00031, VEN-00012, EXP-00003, PAR-0026A-004, CAT-P-0099).
+    GET: codigo. Si no existe se vuelve a la página anterior con un aviso.
+    """
+    from django.utils.http import url_has_allowed_host_and_scheme
+    from .busqueda import resolver_codigo
+
+    codigo = request.GET.get('codigo', '').strip()
+    destino = resolver_codigo(codigo)
+    if destino:
+        return redirect(*destino)
+
+    messages.warning(request, f'No se encontró ningún registro con el código "{codigo}".')
+    anterior = request.META.get('HTTP_REFERER')
+    if anterior and url_has_allowed_host_and_scheme(anterior, allowed_hosts={request.get_host()}):
+        return redirect(anterior)
+    return redirect('dashboard')
+
+
+def _leer_componentes_mezcla(texto):
+    """
+    Componentes [{lote_id, peso}] del formulario de mezcla.
+    Devuelve ({lote_id: peso}, {lote_id: Lote}); los pesos del mismo lote se suman
+    (un procesado y su lote de origen comparten detalle). ValueError si falta algún lote.
+    """
+    pesos = {}
+    for componente in json.loads(texto or '[]'):
+        lote_id = componente.get('lote_id')
+        peso = Decimal(str(componente.get('peso') or 0))
+        if lote_id and peso > 0:
+            lote_id = int(lote_id)
+            pesos[lote_id] = pesos.get(lote_id, Decimal('0')) + peso
+
+    lotes = Lote.objects.in_bulk(list(pesos))
+    faltantes = [str(lote_id) for lote_id in pesos if lote_id not in lotes]
+    if faltantes:
+        raise ValueError(f"Lotes no encontrados: {', '.join(faltantes)}")
+    return pesos, lotes
+
+
 @login_required
 def crear_mezcla(request):
     """Crear nueva mezcla (LÓGICA ORIGINAL)"""
@@ -1024,35 +1157,25 @@ def crear_mezcla(request):
                 mezcla.descripcion = request.POST.get('descripcion', '')
                 mezcla.destino = request.POST.get('destino', '')
                 mezcla.responsable = request.user
-                mezcla.save()
-                
-                componentes = json.loads(request.POST.get('componentes', '[]'))
-                
-                peso_total = Decimal(0)
-                for comp in componentes:
 
-                    lote_id = comp.get('lote_id')
-                    peso = Decimal(comp.get('peso', 0))
-                    
-                    if lote_id and peso > 0:
-                        lote = get_object_or_404(Lote, pk=lote_id)
-                        peso_total += peso
-                        
-                        DetalleMezcla.objects.create(
-                            mezcla=mezcla,
-                            lote=lote,
-                            peso_kg=peso,
-                            porcentaje=0 
-                        )
-                
-                if peso_total > 0:
-                    for detalle in mezcla.detalles.all():
-                        detalle.porcentaje = (Decimal(detalle.peso_kg) / peso_total) * 100
-                        detalle.save()
-                
+                pesos, lotes = _leer_componentes_mezcla(request.POST.get('componentes', '[]'))
+                peso_total = sum(pesos.values(), Decimal('0'))
                 mezcla.peso_total_kg = peso_total
+                # Un solo save: número, peso total y horas de mantenimiento en esta transacción
                 mezcla.save()
-                
+
+                DetalleMezcla.objects.bulk_create([
+                    DetalleMezcla(
+                        mezcla=mezcla,
+                        lote=lotes[lote_id],
+                        peso_kg=peso,
+                        porcentaje=(peso / peso_total * 100).quantize(Decimal('0.01')),
+                    )
+                    for lote_id, peso in pesos.items()
+                ])
+                # bulk_create no envía señales: costo y diario de existencias al confirmar
+                anotar({('costos_mezclas', mezcla.pk), ('diario', ('componente_mezcla', mezcla.pk))})
+
                 messages.success(request, f'Mezcla #{mezcla.numero} creada exitosamente')
                 return redirect('detalle_mezcla', pk=mezcla.id)
                 
@@ -1060,46 +1183,79 @@ def crear_mezcla(request):
             messages.error(request, f'Error al crear mezcla: {str(e)}')
     
     
-    opciones_mezcla = []
-    
-    # 1. LOTES
-    for lote in Lote.objects.filter(activo=True):
-        opciones_mezcla.append({
-            'lote_id': lote.id, 
-            'tipo': '📦 Lote',
-            'codigo': lote.codigo,
-            'descripcion': f"{lote.tipo_cafe} - Bodega {lote.bodega.codigo}",
-            'peso_disponible': float(lote.peso_kg)
-        })
-    
-    # 2. PROCESADOS
-    for procesado in Procesado.objects.select_related('lote').all():
-        opciones_mezcla.append({
-            'lote_id': procesado.lote.id, 
-            'tipo': '⚙️ Procesado',
-            'codigo': f"Trilla #{procesado.numero_trilla}",
-            'descripcion': f"Lote {procesado.lote.codigo} - {procesado.lote.tipo_cafe}",
-            'peso_disponible': float(procesado.peso_final_kg)
-        })
-    
-    # 3. REPROCESOS
-    for reproceso in Reproceso.objects.select_related('procesado__lote').all():
-        nombre = reproceso.nombre if reproceso.nombre else f"Reproceso #{reproceso.numero}"
-        opciones_mezcla.append({
-            'lote_id': reproceso.procesado.lote.id, 
-            'tipo': '🔄 Reproceso',
-            'codigo': nombre,
-            'descripcion': f"Lote {reproceso.procesado.lote.codigo} - De Trilla #{reproceso.procesado.numero_trilla}",
-            'peso_disponible': float(reproceso.peso_final_kg)
-        })
-    
+    # Los componentes se buscan con buscar_productos_api mientras se escribe
     context = {
-        'bodegas': Bodega.objects.all(), 
-        'opciones_json': json.dumps(opciones_mezcla),
-        'total_opciones': len(opciones_mezcla)
+        'bodegas': catalogos.bodegas(),
     }
     return render(request, 'beneficio/mezclas/crear.html', context)
 
+@login_required
+def simular_mezcla_api(request):
+    """
+    Calidad prevista de una mezcla candidata.
+    Recibe JSON: {"componentes": [{"lote_id": 1, "peso": 500, "peso_max": 800},
+    {"subpartida_id": 4, "peso": 200}, ...], "objetivo": 84.5, "paso": 5}
+    Responde la calidad de cada fuente, la predicción con los pesos enviados y, si
+    hay objetivo, las proporciones que más se acercan a ese puntaje (peso_max limita
+    cuántos kg puede aportar cada fuente).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        componentes = {}
+        for componente in data.get('componentes', []):
+            if componente.get('subpartida_id'):
+                clave = ('subpartida', int(componente['subpartida_id']))
+            else:
+                clave = ('lote', int(componente['lote_id']))
+            peso = float(componente.get('peso') or 0)
+            peso_max = float(componente['peso_max']) if componente.get('peso_max') else None
+            if peso < 0 or (peso_max is not None and peso_max <= 0):
+                raise ValueError
+            anterior = componentes.get(clave, (0.0, None))
+            componentes[clave] = (anterior[0] + peso, peso_max or anterior[1])
+        objetivo = float(data['objetivo']) if data.get('objetivo') not in (None, '') else None
+        paso = int(data.get('paso') or 5)
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Datos inválidos'}, status=400)
+
+    if not componentes or len(componentes) > simulador_mezcla.MAX_COMPONENTES:
+        return JsonResponse(
+            {'success': False, 'error': f'Envíe entre 1 y {simulador_mezcla.MAX_COMPONENTES} componentes'}, status=400
+        )
+    peso_total = sum(peso for peso, _ in componentes.values())
+    if peso_total <= 0:
+        return JsonResponse({'success': False, 'error': 'El peso total debe ser mayor a 0'}, status=400)
+
+    fuentes = simulador_mezcla.cargar_fuentes(
+        [fuente_id for tipo, fuente_id in componentes if tipo == 'lote'],
+        [fuente_id for tipo, fuente_id in componentes if tipo == 'subpartida'],
+    )
+    faltantes = [f'{tipo} {fuente_id}' for tipo, fuente_id in componentes if (tipo, fuente_id) not in fuentes]
+    if faltantes:
+        return JsonResponse({'success': False, 'error': f"No encontrados: {', '.join(faltantes)}"}, status=400)
+
+    claves = list(componentes)
+    calidades = [fuentes[clave] for clave in claves]
+    pesos = [componentes[clave][0] for clave in claves]
+    datos = {
+        'success': True,
+        'fuentes': [
+            {'tipo': tipo, 'id': fuente_id, 'peso': peso, **calidad}
+            for (tipo, fuente_id), peso, calidad in zip(claves, pesos, calidades)
+        ],
+        'prediccion': simulador_mezcla.predecir(calidades, pesos),
+    }
+    if objetivo is not None:
+        datos['busqueda'] = simulador_mezcla.buscar_proporciones(
+            calidades, objetivo, peso_total,
+            maximos=[componentes[clave][1] for clave in claves], paso=paso,
+        )
+    return JsonResponse(datos)
+
+
 @login_required
 def detalle_mezcla(request, pk):
     """Ver detalle de una mezcla"""
@@ -1109,6 +1265,7 @@ def detalle_mezcla(request, pk):
     context = {
         'mezcla': mezcla,
         'detalles': detalles,
+        'cambios': mezcla.cambios_componentes.select_related('usuario')[:50],
     }
     return render(request, 'beneficio/mezclas/detalle.html', context)
 
@@ -1137,7 +1294,7 @@ def editar_mezcla(request, pk):
 
     context = {
         'mezcla': mezcla,
-        'bodegas': Bodega.objects.all(),
+        'bodegas': catalogos.bodegas(),
     }
     return render(request, 'beneficio/mezclas/editar.html', context)
 
@@ -1530,7 +1687,7 @@ def seleccionar_lote_procesar(request):
     
     context = {
         'lotes': lotes,
-        'bodegas': Bodega.objects.all(),
+        'bodegas': catalogos.bodegas(),
     }
     return render(request, 'beneficio/procesados/seleccionar_lote.html', context)
 
@@ -1596,10 +1753,7 @@ def lista_compradores(request):
     elif estado == 'inactivo':
         compradores = compradores.filter(activo=False)
     
-    compradores = compradores.annotate(
-        num_compras=Count('compras'),
-        total_comprado=Sum('compras__monto_total')
-    ).order_by('nombre')
+    compradores = compradores.order_by('nombre')
     
     context = {
         'compradores': compradores,
@@ -1841,8 +1995,28 @@ def cambiar_estado_compras_masivo(request):
         if nuevo_estado not in ['pagado', 'parcial', 'pendiente']:
             return JsonResponse({'success': False, 'error': 'Estado de pago inválido'})
 
-        # Actualizar las compras
-        compras_actualizadas = Compra.objects.filter(pk__in=compras_ids).update(estado_pago=nuevo_estado)
+        with transaction.atomic():
+            compras = Compra.objects.filter(pk__in=compras_ids)
+            # Bloquear las compras antes de leer su estado: otra petición que cambie las
+            # mismas compras esperará y no volverá a mover el mismo monto pendiente
+            list(compras.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+            # Monto que entra o sale de "pendiente" por comprador, antes de cambiar el estado
+            if nuevo_estado == 'pagado':
+                cambios_pendiente = compras.exclude(estado_pago='pagado')
+                signo = -1
+            else:
+                cambios_pendiente = compras.filter(estado_pago='pagado')
+                signo = 1
+            deltas = list(cambios_pendiente.values('comprador').annotate(monto=Sum('monto_total')).order_by())
+
+            # Actualizar las compras
+            compras_actualizadas = compras.update(estado_pago=nuevo_estado)
+
+            for delta in deltas:
+                Comprador.objects.filter(pk=delta['comprador']).update(
+                    monto_pendiente=F('monto_pendiente') + signo * delta['monto']
+                )
 
         return JsonResponse({
             'success': True,
@@ -1856,17 +2030,11 @@ def cambiar_estado_compras_masivo(request):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
-@login_required
-def lista_compras(request):
-    """Vista general de todas las compras"""
-    compras = Compra.objects.select_related(
-        'comprador',
-        'lote__bodega',
-        'procesado__lote__bodega',
-        'mezcla'
-    ).all().order_by('-fecha_compra')
+COMPRAS_POR_PAGINA = 50
 
-    # Filtros
+
+def _filtrar_compras(request, compras):
+    """Aplica los filtros de la lista de compras (GET) a un queryset"""
     comprador_id = request.GET.get('comprador')
     fecha_desde = request.GET.get('fecha_desde')
     fecha_hasta = request.GET.get('fecha_hasta')
@@ -1883,23 +2051,139 @@ def lista_compras(request):
         compras = compras.filter(estado_pago=estado_pago)
     if metodo_pago:
         compras = compras.filter(metodo_pago=metodo_pago)
+    return compras
 
-    # Estadísticas
+
+def _cursor_compra(compra):
+    """Cursor de paginación: posición de la compra en el orden (fecha_compra, id)"""
+    return f"{compra.fecha_compra.isoformat()}_{compra.pk}"
+
+
+def _leer_cursor(valor):
+    """Devuelve (fecha_compra, id) o None si el cursor no es válido"""
+    try:
+        fecha, pk = valor.rsplit('_', 1)
+        return datetime.fromisoformat(fecha), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+@login_required
+def lista_compras(request):
+    """
+    Vista general de todas las compras.
+    Paginación por cursor sobre (fecha_compra, id): ?despues=<cursor> o ?antes=<cursor>,
+    así cada página cuesta lo mismo sin importar qué tan atrás esté.
+    """
+    compras = _filtrar_compras(request, Compra.objects.all())
+
+    # Estadísticas (sobre todo el filtro, no solo la página)
     estadisticas = compras.aggregate(
         total_cantidad=Sum('cantidad'),
         total_monto=Sum('monto_total'),
         total_compras=Count('id')
     )
 
+    pagina = compras.select_related('comprador', 'lote', 'procesado', 'mezcla')
+    despues = _leer_cursor(request.GET.get('despues'))
+    antes = _leer_cursor(request.GET.get('antes'))
+
+    if antes:
+        fecha, pk = antes
+        pagina = pagina.filter(
+            Q(fecha_compra__gt=fecha) | Q(fecha_compra=fecha, pk__gt=pk)
+        ).order_by('fecha_compra', 'id')
+        pagina = list(pagina[:COMPRAS_POR_PAGINA + 1])
+        hay_anteriores = len(pagina) > COMPRAS_POR_PAGINA
+        pagina = pagina[:COMPRAS_POR_PAGINA][::-1]
+        hay_siguientes = True
+    else:
+        if despues:
+            fecha, pk = despues
+            pagina = pagina.filter(
+                Q(fecha_compra__lt=fecha) | Q(fecha_compra=fecha, pk__lt=pk)
+            )
+        pagina = list(pagina.order_by('-fecha_compra', '-id')[:COMPRAS_POR_PAGINA + 1])
+        hay_siguientes = len(pagina) > COMPRAS_POR_PAGINA
+        pagina = pagina[:COMPRAS_POR_PAGINA]
+        hay_anteriores = despues is not None
+
+    # Filtros actuales para conservarlos en los enlaces de paginación y exportación
+    filtros = request.GET.copy()
+    filtros.pop('despues', None)
+    filtros.pop('antes', None)
+
     context = {
-        'compras': compras,
+        'compras': pagina,
         'compradores': Comprador.objects.filter(activo=True),
         'estadisticas': estadisticas,
         'metodos_pago': Compra.METODO_PAGO_CHOICES,
+        'filtros_query': filtros.urlencode(),
+        'cursor_siguiente': _cursor_compra(pagina[-1]) if pagina and hay_siguientes else None,
+        'cursor_anterior': _cursor_compra(pagina[0]) if pagina and hay_anteriores else None,
     }
     return render(request, 'beneficio/compradores/lista_compras.html', context)
 
 
+class _EcoCSV:
+    """Pseudo-archivo para csv.writer: devuelve cada línea en lugar de guardarla"""
+    def write(self, valor):
+        return valor
+
+
+@login_required
+def exportar_compras_csv(request):
+    """
+    Exporta las compras filtradas a CSV en streaming: las filas se leen por
+    bloques con iterator(), así la memoria no crece con el número de compras.
+    """
+    import csv
+    from django.http import StreamingHttpResponse
+
+    compras = _filtrar_compras(request, Compra.objects.all()).annotate(
+        kg=F('cantidad_kg')
+    ).order_by('-fecha_compra', '-id').values_list(
+        'id', 'fecha_compra', 'comprador__nombre', 'comprador__empresa', 'descripcion',
+        'numero_factura', 'cantidad', 'unidad', 'kg', 'precio_unitario', 'monto_total',
+        'estado_pago', 'metodo_pago', 'lote__codigo', 'procesado__numero_trilla', 'mezcla__numero',
+    )
+
+    unidades = dict(Compra.UNIDAD_CHOICES)
+    estados = dict(Compra.ESTADO_PAGO_CHOICES)
+    metodos = dict(Compra.METODO_PAGO_CHOICES)
+
+    def filas():
+        # BOM para que Excel abra el archivo con los acentos correctos
+        yield '\ufeff'
+        yield escritor.writerow([
+            'ID', 'Fecha', 'Proveedor', 'Empresa', 'Descripción', 'Factura', 'Cantidad', 'Unidad',
+            'Kg', 'Precio Unitario', 'Monto Total', 'Estado Pago', 'Método Pago', 'Producto',
+        ])
+        for (pk, fecha, nombre, empresa, descripcion, factura, cantidad, unidad, kg, precio,
+             monto, estado, metodo, lote, trilla, mezcla) in compras.iterator(chunk_size=2000):
+            if lote:
+                producto = f'Lote {lote}'
+            elif trilla:
+                producto = f'Procesado {trilla}'
+            elif mezcla:
+                producto = f'Mezcla #{mezcla}'
+            else:
+                producto = ''
+            yield escritor.writerow([
+                pk, timezone.localtime(fecha).strftime('%d/%m/%Y %H:%M'), nombre, empresa or '',
+                descripcion or '', factura or '', cantidad, unidades.get(unidad, unidad),
+                round(kg or 0, 2), precio, monto, estados.get(estado, estado),
+                metodos.get(metodo, metodo or ''), producto,
+            ])
+
+    escritor = csv.writer(_EcoCSV())
+    response = StreamingHttpResponse(filas(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = (
+        f'attachment; filename="compras_{timezone.localdate().strftime("%Y%m%d")}.csv"'
+    )
+    return response
+
+
 @login_required
 def comparar_compradores(request):
     """Comparar múltiples compradores seleccionados"""
@@ -1912,47 +2196,41 @@ def comparar_compradores(request):
             messages.warning(request, 'Debes seleccionar al menos un comprador para comparar')
             return redirect('comparar_compradores')
 
-        # Obtener compradores seleccionados
-        compradores = Comprador.objects.filter(id__in=compradores_ids, activo=True)
+        # Una sola consulta agrupada: la conversión de unidades a kg se hace en SQL
+        # y la última compra sale de subconsultas correlacionadas
+        ultimas_compras = Compra.objects.filter(
+            comprador=OuterRef('pk')
+        ).order_by('-fecha_compra', '-id')
+
+        compradores = Comprador.objects.filter(
+            id__in=compradores_ids, activo=True
+        ).annotate(
+            num_compras=Count('compras'),
+            suma_cantidad=Sum('compras__cantidad'),
+            suma_monto=Sum('compras__monto_total'),
+            promedio_precio=Avg('compras__precio_unitario'),
+            suma_kg=Sum('compras__cantidad_kg'),
+            ultima_fecha=Subquery(ultimas_compras.values('fecha_compra')[:1]),
+            ultimo_monto=Subquery(ultimas_compras.values('monto_total')[:1]),
+        )
 
         # Preparar datos de comparación
         comparacion_data = []
 
         for comprador in compradores:
-            # Obtener todas las compras del comprador
-            compras = Compra.objects.filter(comprador=comprador)
-
-            # Calcular estadísticas
-            stats = compras.aggregate(
-                total_compras=Count('id'),
-                total_cantidad=Sum('cantidad'),
-                total_monto=Sum('monto_total'),
-                precio_promedio=Avg('precio_unitario')
-            )
-
-            # Calcular peso total en kg (convertir según unidad)
-            peso_total_kg = 0
-            for compra in compras:
-                cantidad = float(compra.cantidad or 0)
-                if compra.unidad == 'kg':
-                    peso_total_kg += cantidad
-                elif compra.unidad == 'qq':
-                    peso_total_kg += cantidad * 46  # Convertir quintales a kg
-                elif compra.unidad == 'lb':
-                    peso_total_kg += cantidad * 0.453592  # Convertir libras a kg
-                else:
-                    # Para sacos u otras unidades, usar cantidad directamente
-                    peso_total_kg += cantidad
-
+            peso_total_kg = float(comprador.suma_kg or 0)
             comparacion_data.append({
                 'comprador': comprador,
-                'total_compras': stats['total_compras'] or 0,
-                'total_cantidad': stats['total_cantidad'] or 0,
-                'total_monto': stats['total_monto'] or 0,
-                'precio_promedio': stats['precio_promedio'] or 0,
+                'total_compras': comprador.num_compras,
+                'total_cantidad': comprador.suma_cantidad or 0,
+                'total_monto': comprador.suma_monto or 0,
+                'precio_promedio': comprador.promedio_precio or 0,
                 'peso_total_kg': peso_total_kg,
-                'peso_quintales': peso_total_kg / 46 if peso_total_kg > 0 else 0,
-                'ultima_compra': compras.order_by('-fecha_compra').first(),
+                'peso_quintales': float(kg_a_quintales(peso_total_kg)),
+                'ultima_compra': {
+                    'fecha_compra': comprador.ultima_fecha,
+                    'monto_total': comprador.ultimo_monto,
+                } if comprador.ultima_fecha else None,
             })
 
         # Calcular totales generales
@@ -1971,10 +2249,7 @@ def comparar_compradores(request):
         return render(request, 'beneficio/compradores/comparacion_resultado.html', context)
 
     # Si es GET, mostrar formulario de selección
-    compradores = Comprador.objects.filter(activo=True).annotate(
-        total_compras=Count('compras'),
-        monto_total=Sum('compras__monto_total')
-    ).order_by('-monto_total')
+    compradores = Comprador.objects.filter(activo=True).order_by('-monto_comprado')
 
     context = {
         'compradores': compradores,
@@ -2121,6 +2396,13 @@ def control_mantenimiento(request):
         nivel_alerta = 'normal'
         mensaje_alerta = 'La planta está operando normalmente'
     
+    # Utilización por turno (últimos 30 días) y rendimiento (últimos 90 días)
+    hoy = timezone.localdate()
+    desde_utilizacion = hoy - timedelta(days=29)
+    serie_utilizacion = utilizacion_por_turno(desde_utilizacion, hoy)
+    dias_utilizacion = [desde_utilizacion + timedelta(days=i) for i in range(30)]
+    desde_rendimiento = hoy - timedelta(days=89)
+    
     context = {
         'control': control,
         'historial_reciente': historial_reciente,
@@ -2130,10 +2412,71 @@ def control_mantenimiento(request):
         'mezclas_recientes': mezclas_recientes,
         'nivel_alerta': nivel_alerta,
         'mensaje_alerta': mensaje_alerta,
+        'dashoffset_medidor': 703.717 - (703.717 * min(porcentaje, 100) / 100),
+        'utilizacion_labels': json.dumps([dia.strftime('%d-%b') for dia in dias_utilizacion]),
+        'utilizacion_diurno': json.dumps([serie_utilizacion.get(dia, {}).get('diurno', 0) for dia in dias_utilizacion]),
+        'utilizacion_nocturno': json.dumps([serie_utilizacion.get(dia, {}).get('nocturno', 0) for dia in dias_utilizacion]),
+        'ranking_operadores': ranking(desde_rendimiento, hoy, 'operador')[:10],
+        'ranking_tipos_cafe': ranking(desde_rendimiento, hoy, 'tipo_cafe')[:10],
+        'tasa_horas_dia': control.tasa_estimada,
+        'dias_para_mantenimiento': (
+            (timezone.localtime(control.proximo_mantenimiento_estimado).date() - hoy).days
+            if control.proximo_mantenimiento_estimado else None
+        ),
     }
     return render(request, 'beneficio/mantenimiento/control.html', context)
 
 
+@login_required
+def simular_mantenimiento(request):
+    """
+    Proyecta la fecha del próximo mantenimiento agregando procesos planificados.
+    Recibe JSON: {"planificados": [{"fecha": "AAAA-MM-DD", "horas": 6}, ...]}
+    (en lugar de "horas" se puede enviar "hora_inicio"/"hora_final" en HH:MM).
+    """
+    from .pronostico_mantenimiento import horas_entre
+
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        planificados = {}
+        for item in data.get('planificados', []):
+            fecha = datetime.strptime(item['fecha'], '%Y-%m-%d').date()
+            if item.get('horas') not in (None, ''):
+                horas = Decimal(str(item['horas']))
+            else:
+                horas = horas_entre(
+                    datetime.strptime(item['hora_inicio'], '%H:%M').time(),
+                    datetime.strptime(item['hora_final'], '%H:%M').time(),
+                )
+            if not horas.is_finite():
+                raise ValueError
+            if horas < 0:
+                return JsonResponse({'success': False, 'error': 'Las horas no pueden ser negativas'}, status=400)
+            planificados[fecha] = planificados.get(fecha, Decimal('0')) + horas
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError, AttributeError, InvalidOperation):
+        return JsonResponse({'success': False, 'error': 'Datos inválidos'}, status=400)
+
+    control = MantenimientoPlanta.get_or_create_control()
+    hoy = timezone.localdate()
+    fecha_base, _ = control.simular_mantenimiento()
+    fecha_plan, serie = control.simular_mantenimiento(planificados)
+
+    return JsonResponse({
+        'success': True,
+        'tasa_horas_dia': float(control.tasa_estimada),
+        'fecha_estimada': fecha_base.isoformat() if fecha_base else None,
+        'fecha_con_planificados': fecha_plan.isoformat() if fecha_plan else None,
+        'dias_con_planificados': (fecha_plan - hoy).days if fecha_plan else None,
+        'serie': [
+            {'fecha': dia.isoformat(), 'horas_acumuladas': float(horas)}
+            for dia, horas in serie[:60]
+        ],
+    })
+
+
 @login_required
 def realizar_mantenimiento(request):
     """Registrar un mantenimiento y reiniciar el contador"""
@@ -2146,23 +2489,14 @@ def realizar_mantenimiento(request):
             tiempo_mantenimiento = request.POST.get('tiempo_mantenimiento_horas', 0)
             costo = request.POST.get('costo', 0)
             
-            # Crear registro de mantenimiento
-            mantenimiento = HistorialMantenimiento.objects.create(
-                control_mantenimiento=control,
-                horas_acumuladas=control.horas_acumuladas,
+            control.realizar_mantenimiento(
+                request.user,
+                observaciones,
                 tipo_mantenimiento=tipo_mantenimiento,
-                observaciones=observaciones,
                 tiempo_mantenimiento_horas=tiempo_mantenimiento,
                 costo=costo,
-                realizado_por=request.user
             )
             
-            # Reiniciar contador
-            control.horas_acumuladas = 0
-            control.estado = 'operativa'
-            control.ultimo_mantenimiento = timezone.now()
-            control.save()
-            
             messages.success(request, f'Mantenimiento registrado exitosamente. Contador reiniciado a 0 horas.')
             return redirect('control_mantenimiento')
             
@@ -2266,11 +2600,80 @@ def agregar_recibo(request, lote_id):
     return render(request, 'beneficio/recibos/agregar.html', context)
 
 
+@login_required
+def agregar_recibos_masivo(request, lote_id):
+    """Registrar varios recibos de un lote de una sola vez (un insert y una actualización del lote)"""
+    lote = get_object_or_404(Lote, pk=lote_id)
+
+    if request.method == 'POST':
+        fechas = request.POST.getlist('fecha_recibo')
+        pesos = request.POST.getlist('peso')
+        unidades = request.POST.getlist('unidad')
+        humedades = request.POST.getlist('humedad')
+        proveedores = request.POST.getlist('proveedor')
+        precios = request.POST.getlist('precio_quintal')
+        boletas = request.POST.getlist('numero_boletas')
+        observaciones = request.POST.getlist('observaciones')
+
+        recibos = []
+        errores = []
+        for i, peso_str in enumerate(pesos):
+            # Filas vacías del formulario se ignoran
+            if not peso_str.strip():
+                continue
+            fila = i + 1
+            try:
+                recibo = ReciboCafe(
+                    peso=Decimal(peso_str),
+                    unidad=unidades[i] if unidades[i] in dict(ReciboCafe.UNIDAD_CHOICES) else 'qq',
+                    humedad=Decimal(humedades[i]),
+                    proveedor=proveedores[i] or lote.proveedor,
+                    precio_quintal=Decimal(precios[i]),
+                    numero_boletas=int(boletas[i]) if boletas[i] else 0,
+                    observaciones=observaciones[i],
+                )
+                if fechas[i]:
+                    recibo.fecha_recibo = timezone.make_aware(datetime.strptime(fechas[i], '%Y-%m-%dT%H:%M'))
+            except (IndexError, ValueError, InvalidOperation):
+                errores.append(f'Fila {fila}: complete peso, humedad y precio con valores numéricos y una fecha válida')
+                continue
+            # Decimal acepta "NaN" e "Infinity", que no se pueden comparar ni guardar
+            if not all(valor.is_finite() for valor in (recibo.peso, recibo.humedad, recibo.precio_quintal)):
+                errores.append(f'Fila {fila}: complete peso, humedad y precio con valores numéricos y una fecha válida')
+                continue
+            if recibo.peso <= 0:
+                errores.append(f'Fila {fila}: el peso debe ser mayor a 0')
+                continue
+            recibos.append(recibo)
+
+        if errores:
+            for error in errores:
+                messages.error(request, error)
+        elif not recibos:
+            messages.warning(request, 'No se ingresó ningún recibo')
+        else:
+            try:
+                creados = ReciboCafe.crear_varios(lote, recibos, request.user)
+                messages.success(
+                    request,
+                    f'{len(creados)} recibo(s) agregados al Lote {lote.codigo}. Peso actual: {lote.peso_kg} kg'
+                )
+                return redirect('detalle_lote', pk=lote.pk)
+            except Exception as e:
+                messages.error(request, f'Error al agregar recibos: {str(e)}')
+
+    context = {
+        'lote': lote,
+        'filas': range(10),
+        'unidades': ReciboCafe.UNIDAD_CHOICES,
+    }
+    return render(request, 'beneficio/recibos/agregar_masivo.html', context)
+
+
 @login_required
 def editar_recibo(request, pk):
     """Editar un recibo existente"""
     recibo = get_object_or_404(ReciboCafe, pk=pk)
-    peso_anterior_kg = recibo.convertir_a_kg()
     
     if request.method == 'POST':
         try:
@@ -2308,18 +2711,7 @@ def editar_recibo(request, pk):
                     
                 recibo.observaciones = request.POST.get('observaciones', '')
                 
-                # Calcular nuevo peso en kg
-                nuevo_peso_kg = recibo.convertir_a_kg()
-                diferencia_kg = nuevo_peso_kg - peso_anterior_kg
-                
-                # Actualizar peso del lote
-                recibo.lote.peso_kg = Decimal(str(recibo.lote.peso_kg)) + Decimal(str(diferencia_kg))
-                recibo.lote.save(update_fields=['peso_kg'])
-                
-                # Recalcular monto
-                peso_qq = recibo.convertir_a_quintales()
-                recibo.monto_total = Decimal(str(peso_qq)) * recibo.precio_quintal
-                
+                # save() recalcula el monto y aplica la diferencia de peso al lote
                 recibo.save()
                 
                 messages.success(request, f'Recibo {recibo.numero_recibo} actualizado exitosamente')
@@ -2377,12 +2769,7 @@ def procesar_desde_recibo(request, recibo_id):
                 peso_a_procesar = Decimal(request.POST.get('peso_inicial_kg', '0'))
                 
                 # Calcular peso disponible en kg
-                if recibo.unidad == 'qq':
-                    peso_disponible_kg = Decimal(str(recibo.peso_disponible)) * Decimal('46')
-                elif recibo.unidad == 'lb':
-                    peso_disponible_kg = Decimal(str(recibo.peso_disponible)) * Decimal('0.453592')
-                else:  # kg
-                    peso_disponible_kg = Decimal(str(recibo.peso_disponible))
+                peso_disponible_kg = a_kg(recibo.peso_disponible, recibo.unidad, redondear=False)
                 
                 if peso_a_procesar > peso_disponible_kg:
                     messages.error(
@@ -2417,12 +2804,7 @@ def procesar_desde_recibo(request, recibo_id):
                 
                 # Registrar el peso procesado en el recibo
                 # Convertir peso_a_procesar a la unidad del recibo
-                if recibo.unidad == 'qq':
-                    cantidad_procesada_en_unidad_recibo = peso_a_procesar / Decimal('46')
-                elif recibo.unidad == 'lb':
-                    cantidad_procesada_en_unidad_recibo = peso_a_procesar / Decimal('0.453592')
-                else:  # kg
-                    cantidad_procesada_en_unidad_recibo = peso_a_procesar
+                cantidad_procesada_en_unidad_recibo = desde_kg(peso_a_procesar, recibo.unidad)
                 
                 recibo.registrar_procesamiento(cantidad_procesada_en_unidad_recibo)
                 
@@ -2438,12 +2820,7 @@ def procesar_desde_recibo(request, recibo_id):
             print(traceback.format_exc())  
     
     # Calcular peso sugerido (todo el peso disponible del recibo en kg)
-    if recibo.unidad == 'qq':
-        peso_sugerido_kg = float(recibo.peso_disponible) * 46
-    elif recibo.unidad == 'lb':
-        peso_sugerido_kg = float(recibo.peso_disponible) * 0.453592
-    else:  # kg
-        peso_sugerido_kg = float(recibo.peso_disponible)
+    peso_sugerido_kg = float(a_kg(recibo.peso_disponible, recibo.unidad, redondear=False))
     
     context = {
         'recibo': recibo,
@@ -2452,6 +2829,60 @@ def procesar_desde_recibo(request, recibo_id):
     }
     return render(request, 'beneficio/recibos/procesar.html', context)
 
+def _actualizar_componentes_mezcla(mezcla, pesos, lotes, usuario):
+    """
+    Lleva los detalles de la mezcla a {lote_id: peso} como diferencia contra los
+    existentes: un bulk_update para pesos/porcentajes que cambian, un bulk_create
+    para lotes nuevos y un DELETE para los quitados. Cada componente afectado deja
+    un CambioComponenteMezcla. Devuelve el peso total.
+    """
+    peso_total = sum(pesos.values(), Decimal('0'))
+    existentes = {detalle.lote_id: detalle for detalle in mezcla.detalles.all()}
+    # Los códigos de los lotes quitados también hacen falta para la constancia
+    faltantes = [lote_id for lote_id in existentes if lote_id not in lotes]
+    if faltantes:
+        lotes = {**lotes, **Lote.objects.only('codigo').in_bulk(faltantes)}
+
+    def porcentaje(peso):
+        return (peso / peso_total * 100).quantize(Decimal('0.01'))
+
+    nuevos, modificados, cambios = [], [], []
+    for lote_id, peso in pesos.items():
+        detalle = existentes.get(lote_id)
+        if detalle is None:
+            nuevos.append(DetalleMezcla(mezcla=mezcla, lote=lotes[lote_id], peso_kg=peso, porcentaje=porcentaje(peso)))
+            cambios.append(CambioComponenteMezcla(accion='agregado', lote_id=lote_id, peso_nuevo_kg=peso))
+            continue
+        peso_anterior = detalle.peso_kg
+        if peso_anterior != peso or detalle.porcentaje != porcentaje(peso):
+            detalle.peso_kg = peso
+            detalle.porcentaje = porcentaje(peso)
+            modificados.append(detalle)
+        if peso_anterior != peso:
+            cambios.append(CambioComponenteMezcla(
+                accion='modificado', lote_id=lote_id, peso_anterior_kg=peso_anterior, peso_nuevo_kg=peso,
+            ))
+
+    quitados = [detalle for lote_id, detalle in existentes.items() if lote_id not in pesos]
+    cambios += [
+        CambioComponenteMezcla(accion='eliminado', lote_id=detalle.lote_id, peso_anterior_kg=detalle.peso_kg)
+        for detalle in quitados
+    ]
+
+    if quitados:
+        DetalleMezcla.objects.filter(pk__in=[detalle.pk for detalle in quitados]).delete()
+    if modificados:
+        DetalleMezcla.objects.bulk_update(modificados, ['peso_kg', 'porcentaje'])
+    if nuevos:
+        DetalleMezcla.objects.bulk_create(nuevos)
+    for cambio in cambios:
+        cambio.mezcla = mezcla
+        cambio.usuario = usuario
+        cambio.lote_codigo = lotes[cambio.lote_id].codigo
+    CambioComponenteMezcla.objects.bulk_create(cambios)
+    return peso_total
+
+
 @login_required
 def editar_mezcla(request, pk):
     """Editar una mezcla completa con sus componentes"""
@@ -2479,40 +2910,15 @@ def editar_mezcla(request, pk):
                 except:
                     pass
                 
-                # ELIMINAR TODOS LOS COMPONENTES EXISTENTES
-                mezcla.detalles.all().delete()
-                
-                # AGREGAR NUEVOS COMPONENTES
-                componentes = json.loads(request.POST.get('componentes', '[]'))
-                
-                if not componentes:
+                pesos, lotes = _leer_componentes_mezcla(request.POST.get('componentes', '[]'))
+                if not pesos:
                     raise Exception("Debe agregar al menos un componente a la mezcla")
-                
-                peso_total = Decimal('0')
-                
-                for comp in componentes:
-                    lote = get_object_or_404(Lote, pk=comp['lote_id'])
-                    peso = Decimal(str(comp['peso']))
-                    
-                    DetalleMezcla.objects.create(
-                        mezcla=mezcla,
-                        lote=lote,
-                        peso_kg=peso,
-                        porcentaje=0  # Se recalculará después
-                    )
-                    
-                    peso_total += peso
-                
-                # Actualizar peso total de la mezcla
-                mezcla.peso_total_kg = peso_total
-                
-                # Recalcular porcentajes
-                if peso_total > 0:
-                    for detalle in mezcla.detalles.all():
-                        detalle.porcentaje = (Decimal(str(detalle.peso_kg)) / peso_total) * 100
-                        detalle.save()
-                
+
+                # Solo se tocan los componentes que cambiaron (consultas fijas)
+                mezcla.peso_total_kg = _actualizar_componentes_mezcla(mezcla, pesos, lotes, request.user)
                 mezcla.save()
+                # Los componentes se escriben en bloque: costo y diario de existencias al confirmar
+                anotar({('costos_mezclas', mezcla.pk), ('diario', ('componente_mezcla', mezcla.pk))})
                 
                 messages.success(request, f'✅ Mezcla #{mezcla.numero} actualizada exitosamente')
                 return redirect('detalle_mezcla', pk=mezcla.pk)
@@ -2526,7 +2932,7 @@ def editar_mezcla(request, pk):
     componentes_existentes = []
     for detalle in mezcla.detalles.all():
         componentes_existentes.append({
-            'lote_id': detalle.lote.id,
+            'lote_id': detalle.lote_id,
             'peso': float(detalle.peso_kg),
             'porcentaje': float(detalle.porcentaje)
         })
@@ -2567,7 +2973,7 @@ def editar_mezcla(request, pk):
     
     context = {
         'mezcla': mezcla,
-        'bodegas': Bodega.objects.all(),
+        'bodegas': catalogos.bodegas(),
         'opciones_json': json.dumps(opciones_mezcla),
         'componentes_existentes': json.dumps(componentes_existentes),
     }
@@ -2637,15 +3043,16 @@ def continuar_mezcla(request, mezcla_id):
                 mezcla.peso_total_kg = peso_total_mezcla
                 
                 # Actualizar porcentajes de TODOS los componentes
-                for detalle in mezcla.detalles.all():
-                    if peso_total_mezcla > 0:
+                if peso_total_mezcla > 0:
+                    detalles = list(mezcla.detalles.all())
+                    for detalle in detalles:
                         detalle.porcentaje = (detalle.peso_kg / peso_total_mezcla) * 100
-                        detalle.save()
+                    DetalleMezcla.objects.bulk_update(detalles, ['porcentaje'])
                 
                 mezcla.save()
                 
                 messages.success(request, f'Mezcla #{mezcla.numero} actualizada exitosamente. Se agregaron {len(lotes_ids)} nuevos componentes.')
-                return redirect('detalle_mezcla', mezcla_id=mezcla.id)
+                return redirect('detalle_mezcla', pk=mezcla.id)
                 
         except Exception as e:
             messages.error(request, f'Error al continuar la mezcla: {str(e)}')
@@ -2658,7 +3065,7 @@ def continuar_mezcla(request, mezcla_id):
         'detalles_actuales': detalles_actuales,
         'peso_actual': peso_actual,
         'lotes_disponibles': lotes_disponibles,
-        'bodegas': Bodega.objects.all(),
+        'bodegas': catalogos.bodegas(),
     }
     
     return render(request, 'beneficio/mezclas/continuar.html', context)
@@ -2878,14 +3285,7 @@ def venta_crear(request, tipo_producto, producto_id):
                 return redirect('venta_crear', tipo_producto=tipo_producto, producto_id=producto_id)
             
             # PASO 4: Calcular peso en kilogramos
-            factores_conversion = {
-                'kg': Decimal('1'),
-                'gramos': Decimal('0.001'),
-                'libras': Decimal('0.453592'),
-                'quintales': Decimal('45.36'),
-                'bolsas': Decimal('0.453592'),
-                'sacos': Decimal('46'),
-            }
+            factores_conversion = FACTORES_VENTA_KG
             
             if unidad_medida not in factores_conversion:
                 messages.error(request, f'❌ Unidad de medida inválida: {unidad_medida}')
@@ -2915,7 +3315,7 @@ def venta_crear(request, tipo_producto, producto_id):
                 return redirect('venta_crear', tipo_producto=tipo_producto, producto_id=producto_id)
             
             # PASO 7: Calcular precio total
-            quintales = peso_vendido_kg / Decimal('45.36')
+            quintales = kg_a_quintales_venta(peso_vendido_kg)
             precio_total = quintales * precio_quintal
             
             print(f"💰 Cálculo precio:")
@@ -3102,14 +3502,7 @@ def exportacion_crear(request, tipo_producto, producto_id):
                     return redirect('exportacion_crear', tipo_producto=tipo_producto, producto_id=producto_id)
                 
                 # PASO 4: Calcular peso en kilogramos
-                factores_conversion = {
-                    'kg': Decimal('1'),
-                    'gramos': Decimal('0.001'),
-                    'libras': Decimal('0.453592'),
-                    'quintales': Decimal('45.36'),
-                    'bolsas': Decimal('0.453592'),
-                    'sacos': Decimal('46'),
-                }
+                factores_conversion = FACTORES_VENTA_KG
                 
                 if unidad_medida not in factores_conversion:
                     messages.error(request, f'❌ Unidad de medida inválida: {unidad_medida}')
@@ -3168,7 +3561,7 @@ def exportacion_crear(request, tipo_producto, producto_id):
                     comprador = Comprador.objects.get(id=comprador_id)
                 
                 # Calcular precio total
-                quintales = Decimal(str(peso_exportado_kg)) / Decimal('45.36')
+                quintales = kg_a_quintales_venta(peso_exportado_kg)
                 precio_total = quintales * precio_quintal
                 
                 print(f"💰 Cálculo precio:")
@@ -3317,7 +3710,6 @@ def resumen_beneficio(request):
     
     context = {
         'stats': stats,
-        'procesados': procesados,
         'reprocesos': reprocesos,
         'mezclas': mezclas,
         'defectos_procesados_data': [12, 8, 5, 3, 2],  # Datos de ejemplo
@@ -3332,6 +3724,155 @@ def resumen_beneficio(request):
     
     return render(request, 'beneficio/resumen/resumen_beneficio.html', context)
 
+
+@login_required
+def valoracion_inventario_view(request):
+    """
+    Inventario valorizado a costo promedio por bodega y tipo de producto: el
+    actual (calculado en SQL al vuelo) o un corte guardado. El personal staff
+    puede guardar el corte del día.
+    """
+    from . import inventario
+
+    if request.method == 'POST':
+        if not request.user.is_staff:
+            messages.error(request, 'No tienes permiso para guardar cortes de inventario.')
+            return redirect('valoracion_inventario')
+        hoy = timezone.localdate()
+        filas = inventario.generar_corte(hoy)
+        messages.success(request, f'Corte de inventario del {hoy.strftime("%d/%m/%Y")} guardado ({filas} filas).')
+        return redirect(f"{request.path}?fecha={hoy.isoformat()}")
+
+    fechas = inventario.fechas_de_corte()
+    fecha = None
+    try:
+        fecha = datetime.strptime(request.GET['fecha'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        pass
+
+    filas = inventario.corte_guardado(fecha) if fecha else inventario.valoracion_actual()
+    bodegas, total = inventario.por_bodega(filas, {bodega.id: bodega.nombre for bodega in catalogos.bodegas()})
+
+    context = {
+        'fecha': fecha,
+        'fechas': fechas,
+        'bodegas': bodegas,
+        'total': total,
+    }
+    return render(request, 'beneficio/resumen/valoracion.html', context)
+
+
+@login_required
+def existencias_al_view(request):
+    """Existencias por bodega y producto al cierre de una fecha, reconstruidas del diario"""
+    from .diario_inventario import detalle_existencias_al
+
+    fecha = timezone.localdate()
+    try:
+        fecha = datetime.strptime(request.GET['fecha'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        pass
+    try:
+        bodega_id = int(request.GET['bodega'])
+    except (KeyError, ValueError):
+        bodega_id = None
+
+    # Cierre del día en hora local
+    momento = timezone.make_aware(datetime.combine(fecha + timedelta(days=1), datetime.min.time())) - timedelta(microseconds=1)
+    nombres_bodega = {bodega.id: bodega.nombre for bodega in catalogos.bodegas()}
+    tipos = dict(ValoracionInventario.TIPO_PRODUCTO_CHOICES)
+
+    bodegas = OrderedDict()
+    for fila in detalle_existencias_al(momento, bodega_id):
+        bodega = bodegas.setdefault(fila['bodega_id'], {
+            'nombre': nombres_bodega.get(fila['bodega_id'], 'Sin bodega'), 'productos': [], 'kg': Decimal('0'),
+        })
+        bodega['productos'].append({**fila, 'tipo': tipos[fila['tipo_producto']]})
+        bodega['kg'] += fila['kg']
+
+    context = {
+        'fecha': fecha,
+        'bodega_id': bodega_id,
+        'bodegas_disponibles': catalogos.bodegas(),
+        'bodegas': list(bodegas.values()),
+        'total_kg': sum((bodega['kg'] for bodega in bodegas.values()), Decimal('0')),
+    }
+    return render(request, 'beneficio/resumen/existencias_al.html', context)
+
+
+@login_required
+def ubicaciones_api(request):
+    """
+    Ocupación y contenido de las ubicaciones de bodega en JSON.
+    GET: bodega (id), percha y fila (opcionales, sin distinguir mayúsculas ni espacios).
+    """
+    from .ubicaciones import mapa
+
+    try:
+        bodega_id = int(request.GET['bodega']) if request.GET.get('bodega') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Bodega inválida'}, status=400)
+
+    ubicaciones = mapa(bodega_id, request.GET.get('percha'), request.GET.get('fila'))
+    return JsonResponse({'success': True, 'ubicaciones': ubicaciones})
+
+
+@login_required
+def ubicaciones_libres_api(request):
+    """
+    Ubicaciones sin existencias para ubicar una entrada nueva.
+    GET: kg (solo bodegas donde cabe), bodega (id) y limite.
+    """
+    from .ubicaciones import ubicaciones_libres
+
+    try:
+        kg = Decimal(request.GET['kg']) if request.GET.get('kg') else None
+        bodega_id = int(request.GET['bodega']) if request.GET.get('bodega') else None
+        limite = max(1, min(int(request.GET.get('limite', 20)), 100))
+    except (ValueError, InvalidOperation):
+        return JsonResponse({'success': False, 'error': 'Parámetros inválidos'}, status=400)
+
+    libres = [
+        {
+            'id': ubicacion.pk,
+            'bodega_id': ubicacion.bodega_id,
+            'bodega': ubicacion.bodega_nombre,
+            'percha': ubicacion.percha,
+            'fila': ubicacion.fila,
+            'capacidad_libre_kg': float(ubicacion.capacidad_libre),
+        }
+        for ubicacion in ubicaciones_libres(kg, bodega_id, limite)
+    ]
+    return JsonResponse({'success': True, 'ubicaciones': libres})
+
+
+@login_required
+def exportar_valoracion_csv(request):
+    """Detalle del inventario valorizado actual, un producto por fila, en streaming"""
+    import csv
+    from django.http import StreamingHttpResponse
+    from .inventario import detalle_existencias
+
+    nombres_bodega = {bodega.id: bodega.nombre for bodega in catalogos.bodegas()}
+    tipos = dict(ValoracionInventario.TIPO_PRODUCTO_CHOICES)
+
+    def filas():
+        # BOM para que Excel abra el archivo con los acentos correctos
+        yield '\ufeff'
+        yield escritor.writerow(['Bodega', 'Tipo', 'Código', 'Kg Disponibles', 'Costo por Kg', 'Valor'])
+        for tipo, codigo, bodega_id, kg, costo, valor in detalle_existencias():
+            yield escritor.writerow([
+                nombres_bodega.get(bodega_id, 'Sin bodega'), tipos[tipo], codigo, kg,
+                '' if costo is None else costo, '' if valor is None else valor,
+            ])
+
+    escritor = csv.writer(_EcoCSV())
+    response = StreamingHttpResponse(filas(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = (
+        f'attachment; filename="inventario_{timezone.localdate().strftime("%Y%m%d")}.csv"'
+    )
+    return response
+
 @login_required
 def lista_partidas(request):
     """Lista todas las partidas con filtros"""
@@ -3375,7 +3916,7 @@ def lista_partidas(request):
 
 @login_required
 def crear_partida(request):
-    bodegas = Bodega.objects.all()
+    bodegas = catalogos.bodegas()
     
     if request.method == 'POST':
         try:
@@ -3472,7 +4013,7 @@ def detalle_partida(request, pk):
 @login_required
 def editar_partida(request, pk):
     partida = get_object_or_404(Partida, pk=pk, activo=True)
-    bodegas = Bodega.objects.all()
+    bodegas = catalogos.bodegas()
     
     if request.method == 'POST':
         try:
@@ -3594,7 +4135,7 @@ def editar_partida(request, pk):
     partida = get_object_or_404(Partida, pk=pk, activo=True)
     
     # ⭐ OBTENER BODEGAS
-    bodegas = Bodega.objects.all()
+    bodegas = catalogos.bodegas()
     
     if request.method == 'POST':
         print("\n" + "=" * 60)
@@ -3822,7 +4363,7 @@ def agregar_subpartida(request, partida_id):
                 if peso_bruto_val > 0:
                     subpartida.peso_bruto_kg = peso_bruto_val
                 else:
-                    subpartida.peso_bruto_kg = quintales_val * 46
+                    subpartida.peso_bruto_kg = a_kg(quintales_val, 'qq')
 
                 subpartida.tara_kg = safe_decimal(request.POST.get('tara', '0'), Decimal('0'))
                 subpartida.unidad_medida = 'qq'
@@ -3835,12 +4376,8 @@ def agregar_subpartida(request, partida_id):
                 if fila:
                     subpartida.fila = fila
 
-                # Etiqueta
-                etiqueta = request.POST.get('etiqueta', '').strip()
-                if etiqueta:
-                    subpartida.etiqueta = etiqueta
-                    # Crear la etiqueta en el catálogo si no existe
-                    EtiquetaLote.objects.get_or_create(nombre=etiqueta)
+                # Etiqueta (se crea en el catálogo si no existe)
+                subpartida.etiqueta = catalogos.etiqueta_para(request.POST.get('etiqueta'))
 
                 # === Campos de Análisis de Calidad ===
                 subpartida.rendimiento_b15 = safe_decimal(request.POST.get('rendimiento_b15', ''))
@@ -3900,7 +4437,7 @@ def agregar_subpartida(request, partida_id):
         except Exception as e:
             messages.error(request, f'❌ Error: {str(e)}')
 
-    etiquetas = EtiquetaLote.objects.all()
+    etiquetas = catalogos.etiquetas()
     context = {'partida': partida, 'etiquetas': etiquetas}
     return render(request, 'beneficio/partidas/agregar_subpartida.html', context)
 
@@ -3912,23 +4449,23 @@ def control_etiquetas(request):
     from django.core.serializers.json import DjangoJSONEncoder
     import json
 
-    etiqueta_seleccionada = request.GET.get('etiqueta', '')
+    # ?etiqueta=<id>; se acepta también el nombre de los enlaces anteriores
+    valor = request.GET.get('etiqueta', '')
+    etiqueta_seleccionada = catalogos.etiqueta(valor) or catalogos.etiqueta_por_nombre(valor)
 
     # Obtener TODAS las subpartidas activas para estadísticas generales
     todas_subpartidas = SubPartida.objects.filter(activo=True)
 
-    # Obtener etiquetas únicas que están en uso en las subpartidas
-    etiquetas = todas_subpartidas.filter(
+    # Etiquetas en uso: ids distintos de las subpartidas, nombres del catálogo en memoria
+    en_uso = set(todas_subpartidas.filter(
         etiqueta__isnull=False
-    ).exclude(etiqueta='').values_list('etiqueta', flat=True).distinct().order_by('etiqueta')
+    ).values_list('etiqueta_id', flat=True).distinct().order_by())
+    etiquetas = [etiqueta for etiqueta in catalogos.etiquetas() if etiqueta.pk in en_uso]
 
     # Subpartidas filtradas por etiqueta si se seleccionó una
+    subpartidas = todas_subpartidas.select_related('partida', 'partida__bodega', 'etiqueta').order_by('-fecha_creacion')
     if etiqueta_seleccionada:
-        subpartidas = todas_subpartidas.filter(
-            etiqueta__iexact=etiqueta_seleccionada
-        ).select_related('partida', 'partida__bodega').order_by('-fecha_creacion')
-    else:
-        subpartidas = todas_subpartidas.select_related('partida', 'partida__bodega').order_by('-fecha_creacion')
+        subpartidas = subpartidas.filter(etiqueta=etiqueta_seleccionada)
 
     # === ESTADÍSTICAS GENERALES ===
     totales_generales = todas_subpartidas.aggregate(
@@ -3956,13 +4493,17 @@ def control_etiquetas(request):
     ).order_by('-total_quintales'))
 
     # 2. Distribución por Etiqueta (top 10)
-    stats_etiquetas = list(todas_subpartidas.filter(
-        etiqueta__isnull=False
-    ).exclude(etiqueta='').values('etiqueta').annotate(
-        total_lotes=Count('id'),
-        total_quintales=Sum('quintales'),
-        total_sacos=Sum('numero_sacos')
-    ).order_by('-total_quintales')[:10])
+    nombres_etiqueta = {etiqueta.pk: etiqueta.nombre for etiqueta in etiquetas}
+    stats_etiquetas = [
+        {**fila, 'etiqueta': nombres_etiqueta.get(fila['etiqueta'], '')}
+        for fila in todas_subpartidas.filter(
+            etiqueta__isnull=False
+        ).values('etiqueta').annotate(
+            total_lotes=Count('id'),
+            total_quintales=Sum('quintales'),
+            total_sacos=Sum('numero_sacos')
+        ).order_by('-total_quintales')[:10]
+    ]
 
     # 3. Distribución por Bodega
     stats_bodega = list(todas_subpartidas.filter(
@@ -4055,7 +4596,7 @@ def editar_subpartida(request, pk):
                 if peso_bruto_val > 0:
                     subpartida.peso_bruto_kg = peso_bruto_val
                 else:
-                    subpartida.peso_bruto_kg = quintales_val * 46
+                    subpartida.peso_bruto_kg = a_kg(quintales_val, 'qq')
 
                 subpartida.tara_kg = safe_decimal(request.POST.get('tara', '0'), Decimal('0'))
                 subpartida.unidad_medida = 'qq'
@@ -4097,13 +4638,8 @@ def editar_subpartida(request, pk):
                 perfil_sensorial = request.POST.get('perfil_sensorial', '').strip()
                 subpartida.perfil_sensorial = perfil_sensorial if perfil_sensorial else None
 
-                # Etiqueta
-                etiqueta = request.POST.get('etiqueta', '').strip()
-                if etiqueta:
-                    subpartida.etiqueta = etiqueta
-                    EtiquetaLote.objects.get_or_create(nombre=etiqueta)
-                else:
-                    subpartida.etiqueta = None
+                # Etiqueta (se crea en el catálogo si no existe)
+                subpartida.etiqueta = catalogos.etiqueta_para(request.POST.get('etiqueta'))
 
                 # Otros campos
                 proveedor = request.POST.get('proveedor', '').strip()
@@ -4121,7 +4657,7 @@ def editar_subpartida(request, pk):
         except Exception as e:
             messages.error(request, f'❌ Error: {str(e)}')
 
-    etiquetas = EtiquetaLote.objects.all()
+    etiquetas = catalogos.etiquetas()
     context = {'subpartida': subpartida, 'etiquetas': etiquetas}
     return render(request, 'beneficio/partidas/editar_subpartida.html', context)
 
@@ -4186,7 +4722,7 @@ def procesar_subpartida(request, pk):
         return redirect('detalle_subpartida', pk=pk)
 
     # Obtener procesados, reprocesos y mezclas disponibles para seleccionar
-    procesados = Procesado.objects.filter(finalizado=False).order_by('-fecha')
+    # Las trillas se buscan con buscar_productos_api (solo las no finalizadas)
     reprocesos = Reproceso.objects.all().order_by('-fecha')[:50]
     mezclas = Mezcla.objects.all().order_by('-fecha')[:50]
 
@@ -4250,7 +4786,6 @@ def procesar_subpartida(request, pk):
 
     context = {
         'subpartida': subpartida,
-        'procesados': procesados,
         'reprocesos': reprocesos,
         'mezclas': mezclas,
         'tipos_destino': MovimientoSubPartida.TIPO_DESTINO_CHOICES,
@@ -4458,27 +4993,59 @@ def crear_planilla_view(request):
     return render(request, 'beneficio/beneficiado_finca/crear_planilla.html')
 
 
+def _totales_planilla(planilla):
+    """
+    Totales de la planilla con un pivote tipo de café × día en una sola consulta
+    (incluye registros de trabajadores inactivos).
+    Devuelve (totales_dias, totales_cafe, total_libras).
+    """
+    dias = [codigo for codigo, _ in RegistroDiario.DIAS_SEMANA]
+    cero = Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+    por_tipo = (
+        planilla.registros_diarios
+        .values(tipo=RegistroDiario.expresion_tipo_cafe())
+        .annotate(
+            total=Sum('libras_cortadas'),
+            **{dia: Coalesce(Sum('libras_cortadas', filter=Q(dia_semana=dia)), cero) for dia in dias},
+        )
+        .order_by('tipo')
+    )
+
+    totales_dias = {dia: Decimal('0.00') for dia in dias}
+    totales_cafe = {}
+    for fila_tipo in por_tipo:
+        totales_cafe[fila_tipo['tipo']] = fila_tipo['total']
+        for dia in dias:
+            totales_dias[dia] += fila_tipo[dia]
+
+    return totales_dias, totales_cafe, sum(totales_cafe.values(), Decimal('0.00'))
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def detalle_planilla_view(request, pk):
     """Vista detallada de planilla semanal con tabla de trabajadores × días - Solo administradores"""
     planilla = get_object_or_404(PlanillaSemanal, pk=pk)
 
-    # Obtener todos los trabajadores activos
-    trabajadores = Trabajador.objects.filter(activo=True).order_by('nombre_completo')
-
-    # Obtener todos los registros de esta planilla
-    registros = planilla.registros_diarios.select_related('trabajador', 'tipo_cafe').all()
-
-    # Crear diccionario de registros: {trabajador_id: {dia: registro}}
-    registros_dict = {}
-    for registro in registros:
-        if registro.trabajador_id not in registros_dict:
-            registros_dict[registro.trabajador_id] = {}
-        registros_dict[registro.trabajador_id][registro.dia_semana] = registro
-
     # Días de la semana
-    dias = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado']
+    dias = [codigo for codigo, _ in RegistroDiario.DIAS_SEMANA]
+    cero = Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+    # Pivote trabajador × día sobre los registros de esta planilla (no de toda la temporada):
+    # libras, registro y tipo de café de cada día, agrupado por trabajador
+    columnas = {}
+    for dia in dias:
+        del_dia = Q(dia_semana=dia)
+        columnas[f'libras_{dia}'] = Coalesce(Sum('libras_cortadas', filter=del_dia), cero)
+        columnas[f'registro_{dia}'] = Max('id', filter=del_dia)
+        columnas[f'tipo_{dia}'] = Max(RegistroDiario.expresion_tipo_cafe(), filter=del_dia)
+
+    pivote = {
+        fila['trabajador_id']: fila
+        for fila in planilla.registros_diarios.values('trabajador_id').annotate(**columnas).order_by()
+    }
+    trabajadores = Trabajador.objects.filter(activo=True).order_by('nombre_completo')
 
     # Preparar datos para la tabla
     tabla_datos = []
@@ -4489,33 +5056,25 @@ def detalle_planilla_view(request, pk):
             'total_libras': Decimal('0.00'),
         }
 
+        dias_trabajador = pivote.get(trabajador.pk, {})
         for dia in dias:
-            if trabajador.id in registros_dict and dia in registros_dict[trabajador.id]:
-                registro = registros_dict[trabajador.id][dia]
-                fila['registros_dias'][dia] = registro
-                fila['total_libras'] += registro.libras_cortadas
-            else:
+            registro_id = dias_trabajador.get(f'registro_{dia}')
+            if registro_id is None:
                 fila['registros_dias'][dia] = None
+                continue
+            libras = dias_trabajador[f'libras_{dia}']
+            fila['registros_dias'][dia] = {
+                'pk': registro_id,
+                'libras_cortadas': libras,
+                'tipo_cafe': dias_trabajador[f'tipo_{dia}'],
+            }
+            fila['total_libras'] += libras
 
         # Calcular quintales
         fila['total_qq'] = fila['total_libras'] / Decimal('100.00')
         tabla_datos.append(fila)
 
-    # Totales por día
-    totales_dias = {}
-    for dia in dias:
-        total = registros.filter(dia_semana=dia).aggregate(
-            total=Sum('libras_cortadas')
-        )['total'] or Decimal('0.00')
-        totales_dias[dia] = total
-
-    # Totales por tipo de café
-    totales_cafe = {}
-    for registro in registros:
-        tipo = registro.get_tipo_cafe_display_full()
-        if tipo not in totales_cafe:
-            totales_cafe[tipo] = Decimal('0.00')
-        totales_cafe[tipo] += registro.libras_cortadas
+    totales_dias, totales_cafe, total_libras_semana = _totales_planilla(planilla)
 
     context = {
         'planilla': planilla,
@@ -4523,6 +5082,8 @@ def detalle_planilla_view(request, pk):
         'dias': dias,
         'totales_dias': totales_dias,
         'totales_cafe': totales_cafe,
+        'total_libras_semana': total_libras_semana,
+        'total_qq_semana': total_libras_semana / Decimal('100.00'),
     }
     return render(request, 'beneficio/beneficiado_finca/detalle_planilla.html', context)
 
@@ -4651,7 +5212,7 @@ def agregar_registro_view(request, planilla_id):
 
     # GET request - mostrar formulario
     trabajadores = Trabajador.objects.filter(activo=True).order_by('nombre_completo')
-    tipos_cafe = TipoCafe.objects.all().order_by('nombre')
+    tipos_cafe = catalogos.tipos_cafe()
 
     # Obtener registro si existe (para edición)
     registro = None
@@ -4678,6 +5239,407 @@ def agregar_registro_view(request, planilla_id):
     return render(request, 'beneficio/beneficiado_finca/agregar_registro.html', context)
 
 
+def _leer_celda(celda):
+    """
+    Valida una celda trabajador × día recibida en JSON.
+    Devuelve (trabajador_id, dia_semana, cambio); lanza ValueError con el motivo.
+    """
+    try:
+        trabajador_id = int(celda['trabajador_id'])
+        dia_semana = celda['dia_semana']
+        tipo_cafe_id = int(celda['tipo_cafe_id']) if celda.get('tipo_cafe_id') else None
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('trabajador, día o tipo de café inválido')
+    if dia_semana not in dict(RegistroDiario.DIAS_SEMANA):
+        raise ValueError(f'día "{dia_semana}" inválido')
+
+    cambio = {
+        'eliminar': 'libras_cortadas' in celda and celda['libras_cortadas'] in (None, ''),
+        'libras_cortadas': None,
+        'cambia_tipo': 'tipo_cafe_id' in celda or 'tipo_cafe_manual' in celda,
+        'tipo_cafe_id': tipo_cafe_id,
+        'tipo_cafe_manual': (celda.get('tipo_cafe_manual') or '').strip(),
+        'observaciones': celda.get('observaciones'),
+    }
+    if celda.get('libras_cortadas') not in (None, ''):
+        try:
+            cambio['libras_cortadas'] = Decimal(str(celda['libras_cortadas']))
+        except InvalidOperation:
+            raise ValueError('libras inválidas')
+        if cambio['libras_cortadas'] < 0:
+            raise ValueError('las libras no pueden ser negativas')
+    return trabajador_id, dia_semana, cambio
+
+
+def _validar_referencias_celdas(trabajador_ids, cambios):
+    """Comprueba que existan los trabajadores (una consulta) y los tipos de café (catálogo en memoria)"""
+    errores = []
+    faltantes = set(trabajador_ids) - set(Trabajador.objects.filter(pk__in=trabajador_ids).values_list('pk', flat=True))
+    if faltantes:
+        errores.append(f'Trabajadores inexistentes: {", ".join(map(str, sorted(faltantes)))}')
+    tipo_ids = {cambio['tipo_cafe_id'] for cambio in cambios if cambio['tipo_cafe_id']}
+    if tipo_ids - {tipo.pk for tipo in catalogos.tipos_cafe()}:
+        errores.append('Tipo de café inexistente')
+    return errores
+
+
+def _por_celda(registros, planillas):
+    """
+    {(planilla_id, trabajador_id, dia_semana): registro}. unique_together incluye la fecha:
+    si una celda tiene registros de varias fechas se toma el de la fecha del día en la planilla.
+    """
+    celdas = {}
+    for registro in registros:
+        celda = (registro.planilla_id, registro.trabajador_id, registro.dia_semana)
+        if celda not in celdas or registro.fecha == planillas[registro.planilla_id].fecha_del_dia(registro.dia_semana):
+            celdas[celda] = registro
+    return celdas
+
+
+def _aplicar_celdas(planilla, cambios):
+    """
+    Aplica {(trabajador_id, dia_semana): cambio} sobre la planilla (llamar dentro de transaction.atomic).
+    Los campos no enviados conservan su valor; las celdas vaciadas se eliminan y el resto
+    se escribe con un solo bulk_create(update_conflicts=True). Devuelve (guardados, eliminados).
+    """
+    trabajador_ids = {trabajador_id for trabajador_id, _ in cambios}
+    existentes = {
+        (trabajador_id, dia_semana): registro
+        for (_, trabajador_id, dia_semana), registro in _por_celda(
+            planilla.registros_diarios.select_for_update().filter(trabajador_id__in=trabajador_ids),
+            {planilla.pk: planilla},
+        ).items()
+    }
+
+    a_guardar = []
+    a_eliminar = []
+    for (trabajador_id, dia_semana), cambio in cambios.items():
+        actual = existentes.get((trabajador_id, dia_semana))
+        if cambio['eliminar']:
+            if actual:
+                a_eliminar.append(actual.pk)
+            continue
+
+        # Instancia nueva (sin pk) partiendo del registro existente; el conflicto se resuelve por unique_together
+        registro = RegistroDiario(
+            planilla=planilla,
+            trabajador_id=trabajador_id,
+            dia_semana=dia_semana,
+            fecha=actual.fecha if actual else planilla.fecha_del_dia(dia_semana),
+            libras_cortadas=actual.libras_cortadas if actual else Decimal('0.00'),
+            tipo_cafe_id=actual.tipo_cafe_id if actual else None,
+            tipo_cafe_manual=actual.tipo_cafe_manual if actual else None,
+            observaciones=actual.observaciones if actual else '',
+        )
+        if cambio['libras_cortadas'] is not None:
+            registro.libras_cortadas = cambio['libras_cortadas']
+
+        # Tipo de café - dual selection
+        if cambio['cambia_tipo']:
+            if cambio['tipo_cafe_id']:
+                registro.tipo_cafe_id = cambio['tipo_cafe_id']
+                registro.tipo_cafe_manual = None
+            elif cambio['tipo_cafe_manual']:
+                registro.tipo_cafe_id = None
+                registro.tipo_cafe_manual = cambio['tipo_cafe_manual']
+            else:
+                registro.tipo_cafe_id = None
+                registro.tipo_cafe_manual = None
+
+        if cambio['observaciones'] is not None:
+            registro.observaciones = str(cambio['observaciones']).strip()
+
+        a_guardar.append(registro)
+
+    if a_eliminar:
+        RegistroDiario.objects.filter(pk__in=a_eliminar).delete()
+    RegistroDiario.objects.bulk_create(
+        a_guardar,
+        update_conflicts=True,
+        unique_fields=['planilla', 'trabajador', 'dia_semana', 'fecha'],
+        update_fields=['libras_cortadas', 'tipo_cafe', 'tipo_cafe_manual', 'observaciones', 'updated_at'],
+    )
+    # bulk_create no dispara post_save: la bitácora de sincronización y el resumen de temporada van aparte
+    guardados = {(registro.trabajador_id, registro.dia_semana, registro.fecha) for registro in a_guardar}
+    CambioRegistroDiario.anotar(
+        registro for registro in planilla.registros_diarios.filter(trabajador_id__in=trabajador_ids)
+        if (registro.trabajador_id, registro.dia_semana, registro.fecha) in guardados
+    )
+    actualizar_resumen_planilla(planilla.pk, trabajador_ids)
+    return len(a_guardar), len(a_eliminar)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def cuadricula_planilla_view(request, pk):
+    """Captura de toda la planilla en una cuadrícula trabajadores × días - Solo administradores"""
+    planilla = get_object_or_404(PlanillaSemanal, pk=pk)
+
+    celdas = {}
+    for registro in planilla.registros_diarios.values(
+        'trabajador_id', 'dia_semana', 'libras_cortadas', 'tipo_cafe_id', 'tipo_cafe_manual'
+    ):
+        celdas[f"{registro['trabajador_id']}-{registro['dia_semana']}"] = {
+            'libras_cortadas': str(registro['libras_cortadas']),
+            'tipo_cafe_id': registro['tipo_cafe_id'],
+            'tipo_cafe_manual': registro['tipo_cafe_manual'] or '',
+        }
+
+    totales_dias, _, total_libras_semana = _totales_planilla(planilla)
+
+    context = {
+        'planilla': planilla,
+        'trabajadores': Trabajador.objects.filter(activo=True).order_by('nombre_completo'),
+        'tipos_cafe': catalogos.tipos_cafe(),
+        'dias_choices': RegistroDiario.DIAS_SEMANA,
+        'celdas': celdas,
+        'totales_dias': totales_dias,
+        'total_libras_semana': total_libras_semana,
+    }
+    return render(request, 'beneficio/beneficiado_finca/cuadricula_planilla.html', context)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def guardar_cuadricula_planilla(request, pk):
+    """
+    Guarda varias celdas trabajador × día de la planilla en una sola transacción.
+    Recibe JSON: {"celdas": [{"trabajador_id": 1, "dia_semana": "lunes", "libras_cortadas": "120.50",
+    "tipo_cafe_id": 2, "tipo_cafe_manual": "", "observaciones": ""}, ...]}
+    Solo se modifican los campos enviados; "libras_cortadas": null elimina la celda.
+    """
+    planilla = get_object_or_404(PlanillaSemanal, pk=pk)
+
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+
+    try:
+        celdas = json.loads(request.body).get('celdas', [])
+        if not isinstance(celdas, list):
+            raise ValueError
+    except (json.JSONDecodeError, ValueError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Datos inválidos'}, status=400)
+
+    # Validar celdas; si una misma celda viene repetida gana la última
+    errores = []
+    cambios = {}
+    for numero, celda in enumerate(celdas, start=1):
+        try:
+            trabajador_id, dia_semana, cambio = _leer_celda(celda)
+        except ValueError as ve:
+            errores.append(f'Celda {numero}: {ve}')
+            continue
+        cambios[(trabajador_id, dia_semana)] = cambio
+
+    trabajador_ids = {trabajador_id for trabajador_id, _ in cambios}
+    errores += _validar_referencias_celdas(trabajador_ids, cambios.values())
+    if errores:
+        return JsonResponse({'success': False, 'error': 'Datos inválidos', 'errores': errores}, status=400)
+
+    with transaction.atomic():
+        guardados, eliminados = _aplicar_celdas(planilla, cambios)
+
+    totales_dias, totales_cafe, total_libras_semana = _totales_planilla(planilla)
+    totales_trabajadores = planilla.registros_diarios.filter(
+        trabajador_id__in=trabajador_ids
+    ).values('trabajador_id').annotate(total=Sum('libras_cortadas'))
+    por_trabajador = {trabajador_id: 0.0 for trabajador_id in trabajador_ids}
+    por_trabajador.update({fila['trabajador_id']: float(fila['total']) for fila in totales_trabajadores})
+
+    return JsonResponse({
+        'success': True,
+        'guardados': guardados,
+        'eliminados': eliminados,
+        'totales_dias': {dia: float(total) for dia, total in totales_dias.items()},
+        'totales_cafe': {tipo: float(total) for tipo, total in totales_cafe.items()},
+        'totales_trabajadores': por_trabajador,
+        'total_libras': float(total_libras_semana),
+        'total_qq': float(total_libras_semana / Decimal('100.00')),
+    })
+
+
+# Máximo de cambios de la bitácora por sincronización; el dispositivo repite con el nuevo cursor si hay_mas
+REGISTROS_POR_SINCRONIZACION = 500
+
+
+def _registro_sincronizacion(registro):
+    """Fila autoritativa de un RegistroDiario para el dispositivo de campo"""
+    return {
+        'id': registro.pk,
+        'planilla_id': registro.planilla_id,
+        'trabajador_id': registro.trabajador_id,
+        'dia_semana': registro.dia_semana,
+        'fecha': registro.fecha.isoformat(),
+        'libras_cortadas': str(registro.libras_cortadas),
+        'tipo_cafe_id': registro.tipo_cafe_id,
+        'tipo_cafe_manual': registro.tipo_cafe_manual or '',
+        'tipo_cafe': registro.get_tipo_cafe_display_full(),
+        'observaciones': registro.observaciones or '',
+        'actualizado': registro.updated_at.isoformat(),
+    }
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def sincronizar_registros_corte(request):
+    """
+    Sincronización de registros de corte desde dispositivos de campo.
+    Recibe JSON: {"cursor": "<cursor anterior o null>", "planilla_id": <opcional, limita la descarga>,
+    "operaciones": [{"clave": "<uuid del dispositivo>", "planilla_id": 1, "trabajador_id": 1,
+    "dia_semana": "lunes", "libras_cortadas": "120.50", "tipo_cafe_id": 2, ...}, ...]}
+    Cada operación es un upsert con la misma semántica que la cuadrícula. Las claves ya aplicadas
+    se ignoran, así un lote reenviado tras un corte de conexión no duplica nada. Todo el lote se
+    aplica en una sola transacción o no se aplica.
+    Responde con las filas autoritativas de las operaciones, los cambios posteriores al cursor
+    (incluidos los borrados) y el nuevo cursor.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        operaciones = data.get('operaciones', [])
+        if not isinstance(operaciones, list):
+            raise ValueError
+        planilla_filtro = int(data['planilla_id']) if data.get('planilla_id') else None
+    except (json.JSONDecodeError, ValueError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Datos inválidos'}, status=400)
+
+    # Cursor: id de CambioRegistroDiario; se aceptan también los (updated_at, id) anteriores
+    cursor = None
+    if data.get('cursor'):
+        valor = str(data['cursor'])
+        cursor = int(valor) if valor.isdigit() else _leer_cursor(valor)
+        if cursor is None:
+            return JsonResponse({'success': False, 'error': 'Cursor inválido'}, status=400)
+
+    # Validar operaciones; una clave repetida dentro del lote se aplica una sola vez
+    errores = []
+    por_clave = {}
+    for numero, operacion in enumerate(operaciones, start=1):
+        try:
+            clave = str(operacion['clave']).strip()
+            planilla_id = int(operacion['planilla_id'])
+        except (KeyError, TypeError, ValueError):
+            errores.append(f'Operación {numero}: clave y planilla son obligatorias')
+            continue
+        if not clave or len(clave) > 64:
+            errores.append(f'Operación {numero}: clave de idempotencia inválida')
+            continue
+        try:
+            trabajador_id, dia_semana, cambio = _leer_celda(operacion)
+        except ValueError as ve:
+            errores.append(f'Operación {numero}: {ve}')
+            continue
+        por_clave[clave] = (planilla_id, trabajador_id, dia_semana, cambio)
+
+    aplicadas = set(
+        OperacionSincronizacion.objects.filter(clave__in=por_clave).values_list('clave', flat=True)
+    )
+    pendientes = {clave: valor for clave, valor in por_clave.items() if clave not in aplicadas}
+
+    planillas = PlanillaSemanal.objects.in_bulk({valor[0] for valor in por_clave.values()})
+    faltantes = {valor[0] for valor in pendientes.values()} - set(planillas)
+    if faltantes:
+        errores.append(f'Planillas inexistentes: {", ".join(map(str, sorted(faltantes)))}')
+    errores += _validar_referencias_celdas(
+        {valor[1] for valor in pendientes.values()},
+        [valor[3] for valor in pendientes.values()],
+    )
+    if errores:
+        return JsonResponse({'success': False, 'error': 'Datos inválidos', 'errores': errores}, status=400)
+
+    for intento in range(2):
+        # Agrupar por planilla; dentro del lote gana la última operación sobre cada celda
+        por_planilla = {}
+        for planilla_id, trabajador_id, dia_semana, cambio in pendientes.values():
+            por_planilla.setdefault(planilla_id, {})[(trabajador_id, dia_semana)] = cambio
+
+        try:
+            with transaction.atomic():
+                for planilla_id, cambios in por_planilla.items():
+                    _aplicar_celdas(planillas[planilla_id], cambios)
+
+                resultantes = _por_celda(
+                    RegistroDiario.objects.filter(
+                        planilla_id__in=planillas,
+                        trabajador_id__in={valor[1] for valor in por_clave.values()},
+                    ).select_related('tipo_cafe'),
+                    planillas,
+                )
+
+                OperacionSincronizacion.objects.bulk_create([
+                    OperacionSincronizacion(
+                        clave=clave,
+                        registro=resultantes.get((planilla_id, trabajador_id, dia_semana)),
+                        usuario=request.user,
+                    )
+                    for clave, (planilla_id, trabajador_id, dia_semana, _) in pendientes.items()
+                ])
+            break
+        except IntegrityError:
+            # Un reenvío simultáneo del mismo lote guardó antes alguna de las claves:
+            # esas se responden como duplicadas y se aplica solo el resto
+            if intento:
+                raise
+            aplicadas = set(
+                OperacionSincronizacion.objects.filter(clave__in=por_clave).values_list('clave', flat=True)
+            )
+            pendientes = {clave: valor for clave, valor in por_clave.items() if clave not in aplicadas}
+
+    resultados = []
+    for clave, (planilla_id, trabajador_id, dia_semana, _) in por_clave.items():
+        registro = resultantes.get((planilla_id, trabajador_id, dia_semana))
+        resultados.append({
+            'clave': clave,
+            'estado': 'duplicada' if clave in aplicadas else 'aplicada',
+            'registro': _registro_sincronizacion(registro) if registro else None,
+        })
+
+    # Cambios desde el último cursor, en el orden de la bitácora
+    bitacora = CambioRegistroDiario.objects.order_by('id')
+    if planilla_filtro:
+        bitacora = bitacora.filter(planilla_id=planilla_filtro)
+    if isinstance(cursor, int):
+        bitacora = bitacora.filter(id__gt=cursor)
+    elif cursor:
+        # Cursor (updated_at, id) de versiones anteriores: se reenvía desde ese momento
+        bitacora = bitacora.filter(momento__gte=cursor[0])
+
+    pagina = list(bitacora[:REGISTROS_POR_SINCRONIZACION + 1])
+    hay_mas = len(pagina) > REGISTROS_POR_SINCRONIZACION
+    pagina = pagina[:REGISTROS_POR_SINCRONIZACION]
+
+    # Cada registro una vez, con su estado actual; los que ya no existen van como eliminados
+    ultimos = {cambio.registro_id: cambio for cambio in pagina}
+    vigentes = RegistroDiario.objects.select_related('tipo_cafe').in_bulk(ultimos)
+    cambios = [vigentes[registro_id] for registro_id in ultimos if registro_id in vigentes]
+    eliminados = [
+        cambio for registro_id, cambio in ultimos.items()
+        # Primera sincronización: el dispositivo no tiene nada que borrar
+        if registro_id not in vigentes and cursor
+    ]
+    nuevo_cursor = str(pagina[-1].pk) if pagina else data.get('cursor') or None
+
+    return JsonResponse({
+        'success': True,
+        'operaciones': resultados,
+        'cambios': [_registro_sincronizacion(registro) for registro in cambios],
+        'eliminados': [
+            {
+                'id': eliminado.registro_id,
+                'planilla_id': eliminado.planilla_id,
+                'trabajador_id': eliminado.trabajador_id,
+                'dia_semana': eliminado.dia_semana,
+                'fecha': eliminado.fecha.isoformat(),
+            }
+            for eliminado in eliminados
+        ],
+        'cursor': nuevo_cursor,
+        'hay_mas': hay_mas,
+    })
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def eliminar_registro_view(request, pk):
@@ -4697,6 +5659,82 @@ def eliminar_registro_view(request, pk):
     return render(request, 'beneficio/beneficiado_finca/eliminar_registro.html', context)
 
 
+# ==========================================
+# BENEFICIADO FINCA - PRODUCTIVIDAD POR TEMPORADA
+# ==========================================
+
+def _parametros_productividad(request):
+    """Temporada (por defecto la actual), tipo de café y trabajador desde GET"""
+    temporada = request.GET.get('temporada') or temporada_de(timezone.localdate())
+    tipo_cafe = request.GET.get('tipo_cafe') or None
+    try:
+        trabajador_id = int(request.GET['trabajador'])
+    except (KeyError, ValueError):
+        trabajador_id = None
+    return temporada, tipo_cafe, trabajador_id
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def productividad_cortadores_view(request):
+    """Ranking de cortadores de la temporada - Solo administradores"""
+    temporada, tipo_cafe, trabajador_id = _parametros_productividad(request)
+    resultado = ranking_temporada(temporada, tipo_cafe)
+
+    trabajador = None
+    serie_trabajador = []
+    if trabajador_id:
+        trabajador = Trabajador.objects.filter(pk=trabajador_id).first()
+        serie_trabajador = semanas_trabajador(temporada, trabajador_id)
+
+    temporadas = temporadas_disponibles()
+    if temporada not in temporadas:
+        temporadas.insert(0, temporada)
+
+    context = {
+        'temporada': temporada,
+        'temporadas': temporadas,
+        'tipo_cafe': tipo_cafe,
+        'tipos_cafe': tipos_cafe_temporada(temporada),
+        'ranking': resultado['ranking'],
+        'ultima_semana': resultado['ultima_semana'],
+        'semana_anterior': resultado['semana_anterior'],
+        'trabajador': trabajador,
+        'serie_trabajador': serie_trabajador,
+    }
+    return render(request, 'beneficio/beneficiado_finca/productividad.html', context)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def productividad_temporada_api(request):
+    """
+    Ranking de la temporada en JSON.
+    GET: temporada (AAAA-AAAA), tipo_cafe, limite; con trabajador=<id> devuelve además su serie semanal.
+    """
+    temporada, tipo_cafe, trabajador_id = _parametros_productividad(request)
+    try:
+        limite = int(request.GET.get('limite', 0)) or None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Límite inválido'}, status=400)
+
+    resultado = ranking_temporada(temporada, tipo_cafe, limite)
+    datos = {
+        'success': True,
+        'temporada': temporada,
+        'tipo_cafe': tipo_cafe,
+        'ultima_semana': resultado['ultima_semana'].isoformat() if resultado['ultima_semana'] else None,
+        'semana_anterior': resultado['semana_anterior'].isoformat() if resultado['semana_anterior'] else None,
+        'ranking': resultado['ranking'],
+    }
+    if trabajador_id:
+        datos['semanas'] = [
+            {**semana, 'semana': semana['semana'].isoformat()}
+            for semana in semanas_trabajador(temporada, trabajador_id)
+        ]
+    return JsonResponse(datos)
+
+
 
 
 
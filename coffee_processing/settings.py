@@ -74,6 +74,12 @@ DATABASES = {
     'default': env.db(default='sqlite:///db.sqlite3')
 }
 
+# Caché compartida por los workers de Gunicorn (sellos de versión de los catálogos, ver beneficio/catalogos.py).
+# En producción puede apuntarse a Redis/Memcached con CACHE_URL.
+CACHES = {
+    'default': env.cache('CACHE_URL', default=f'filecache://{BASE_DIR / "cache"}')
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
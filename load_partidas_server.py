@@ -15,20 +15,21 @@ django.setup()
 
 from decimal import Decimal
 from datetime import date
-from beneficio.models import Partida, SubPartida, Bodega, EtiquetaLote
+from functools import lru_cache
+from beneficio import catalogos
+from beneficio.unidades import KG_POR_QUINTAL
+from beneficio.models import Partida, SubPartida
 from django.contrib.auth.models import User
 
-def get_or_create_etiqueta(nombre):
-    """Crear o obtener etiqueta"""
-    if nombre:
-        etiqueta, _ = EtiquetaLote.objects.get_or_create(nombre=nombre)
-        return nombre
-    return None
+@lru_cache(maxsize=None)
+def usuario_carga():
+    """Usuario al que se atribuye la carga (se consulta una sola vez)"""
+    return User.objects.first()
 
 def crear_partida(nombre, descripcion=None):
     """Crear una partida y retornarla"""
-    bodega = Bodega.objects.filter(activo=True).first()
-    user = User.objects.first()
+    bodega = next(iter(catalogos.bodegas_activas()), None)
+    user = usuario_carga()
 
     partida = Partida.objects.create(
         nombre=nombre,
@@ -43,11 +44,11 @@ def crear_subpartida(partida, nombre, tipo_proceso, quintales, sacos=1, humedad=
                      score=None, taza='SANA LIMPIA', cualidades=None, etiqueta=None,
                      fecha=None, defectos=None, rb=None, rn=None):
     """Crear una subpartida"""
-    user = User.objects.first()
-    peso_kg = Decimal(str(quintales)) * Decimal('46')
+    user = usuario_carga()
+    peso_kg = Decimal(str(quintales)) * KG_POR_QUINTAL
 
-    # Procesar etiqueta
-    etiqueta_valor = get_or_create_etiqueta(etiqueta) if etiqueta else None
+    # Procesar etiqueta (se crea en el catálogo si no existe)
+    etiqueta_valor = catalogos.etiqueta_para(etiqueta)
 
     subpartida = SubPartida.objects.create(
         partida=partida,
@@ -539,7 +540,7 @@ def main():
 
     total_partidas = Partida.objects.count()
     total_subpartidas = SubPartida.objects.count()
-    total_quintales = sum([float(p.peso_total_kg) / 46 for p in Partida.objects.all()])
+    total_quintales = sum([float(p.peso_total_kg) / float(KG_POR_QUINTAL) for p in Partida.objects.all()])
 
     print(f"Total de Partidas: {total_partidas}")
     print(f"Total de SubPartidas: {total_subpartidas}")